@@ -0,0 +1,246 @@
+"""
+Persistent cache of battle results.
+
+The GameManager is deterministic, so a battle between deterministic bots on the same map with the same sides always
+ends the same way. The cache key is built from:
+    The map content hash.
+    Each bot's fingerprint - its class, the source of the modules defining its class hierarchy, its parameters
+    (the content of the instance attributes) and its VERSION.
+    The side assignment (player 1 / player 2).
+    The engine code, so engine changes invalidate the cache.
+    The battle seed, if one of the bots is not DETERMINISTIC.
+    The adjudication rules, if any.
+Bots are cached only if they are DETERMINISTIC or SEED_REPRODUCIBLE (their battles are reproducible given the battle
+seed), both are False by default.
+
+Usage:
+    tournament = Tournament(players, maps, battle_cache=BattleCache("battle_cache.sqlite"))
+"""
+import hashlib
+import inspect
+import pickle
+import random
+import sqlite3
+import sys
+import time
+from typing import Optional, Sequence, TYPE_CHECKING
+
+from planet_wars.planet_wars import Player
+
+if TYPE_CHECKING:
+    from planet_wars.battles.tournament import BattleResult
+
+
+def get_map_hash(map_str: str) -> str:
+    """
+    :param map_str: The map
+    :return: Hash of the map content (ignoring trailing white spaces)
+    """
+    normalized = "\n".join(line.rstrip() for line in map_str.strip().splitlines())
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+def _get_source(obj) -> str:
+    """
+    :return: The object source code, or a description of its code objects if the source is not available
+    """
+    try:
+        return inspect.getsource(obj)
+    except (OSError, TypeError):
+        pass
+    if inspect.isclass(obj):
+        return repr(sorted(
+            (name, value.__code__.co_code.hex() + repr(value.__code__.co_consts) if hasattr(value, "__code__")
+             else repr(value))
+            for name, value in vars(obj).items() if not name.startswith("__")
+        ))
+    return repr(obj)
+
+
+def _get_engine_fingerprint() -> str:
+    """
+    :return: Hash of the engine code
+    """
+    from planet_wars import planet_wars
+    from planet_wars.engine import game_logic
+    return hashlib.sha256((_get_source(planet_wars) + _get_source(game_logic)).encode()).hexdigest()
+
+
+def _get_state_fingerprint(value, seen: frozenset = frozenset()) -> str:
+    """
+    Describe the value by its content, recursively - unlike repr, never by its memory address.
+    :param value: A bot attribute
+    :param seen: The ids of the objects being described (the containers of the value), to stop on cycles
+    :return: The value description
+    """
+    if value is None or isinstance(value, (bool, int, float, complex, str, bytes)):
+        return f"{type(value).__name__}:{value!r}"
+    if id(value) in seen:
+        return "<cycle>"
+    seen = seen | {id(value)}
+    name = f"{type(value).__module__}.{type(value).__qualname__}"
+    if isinstance(value, (list, tuple)):
+        return f"{name}[{','.join(_get_state_fingerprint(item, seen) for item in value)}]"
+    if isinstance(value, (set, frozenset)):
+        return f"{name}{{{','.join(sorted(_get_state_fingerprint(item, seen) for item in value))}}}"
+    if isinstance(value, dict):
+        items = sorted(
+            f"{_get_state_fingerprint(key, seen)}:{_get_state_fingerprint(item, seen)}" for key, item in value.items()
+        )
+        return f"{name}{{{','.join(items)}}}"
+    if isinstance(value, random.Random):
+        return f"{name}({_get_state_fingerprint(value.getstate(), seen)})"
+    if inspect.isfunction(value) or inspect.ismethod(value) or inspect.isclass(value):
+        return f"{name}({_get_source(value)})"
+    if inspect.ismodule(value):
+        return f"{name}({value.__name__})"
+    if hasattr(value, "dtype") and hasattr(value, "tobytes"):  # numpy arrays and scalars
+        return f"{name}({value.dtype},{getattr(value, 'shape', ())},{value.tobytes().hex()})"
+    attributes = dict(vars(value)) if hasattr(value, "__dict__") else {}
+    for cls in type(value).__mro__:
+        for slot in getattr(cls, "__slots__", ()):
+            if slot not in ("__dict__", "__weakref__") and hasattr(value, slot):
+                attributes[slot] = getattr(value, slot)
+    # Objects without attributes (locks, connections etc.) are described by their type only
+    return f"{name}({_get_state_fingerprint(attributes, seen)})"
+
+
+def get_player_fingerprint(player: Player) -> str:
+    """
+    :param player: The bot
+    :return: Hash of the bot code, parameters and VERSION
+    """
+    parts = [type(player).__module__, type(player).__qualname__, repr(player.VERSION)]
+    for cls in type(player).__mro__:
+        if cls in (Player, object):
+            continue
+        module = sys.modules.get(cls.__module__)
+        parts.append(_get_source(module) if module is not None else "")
+        parts.append(_get_source(cls))
+    parts.append(_get_state_fingerprint(vars(player)))
+    return hashlib.sha256("\0".join(parts).encode()).hexdigest()
+
+
+def _is_deterministic(player: Player) -> bool:
+    return getattr(player, "DETERMINISTIC", False)
+
+
+def is_cacheable(player1: Player, player2: Player, seed: Optional[int] = None) -> bool:
+    """
+    :param seed: The battle seed, if the battle is seeded
+    :return: True if the battle between the given players can be cached
+    """
+    return all(
+        _is_deterministic(player) or (seed is not None and getattr(player, "SEED_REPRODUCIBLE", False))
+        for player in (player1, player2)
+    )
+
+
+class BattleCache:
+    """
+    Battle results cache in SQLite file, with least recently used eviction.
+    Safe to share between processes (each process opens its own connection).
+    """
+
+    def __init__(self, path: str, max_entries: int = 100_000, max_bytes: int = 2 * 1024 ** 3):
+        """
+        :param path: The SQLite file path
+        :param max_entries: Max number of cached battles
+        :param max_bytes: Max total size of the cached battles
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._connection = None
+        self._engine_fingerprint = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_connection"] = None
+        return state
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.path, timeout=60)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS battles "
+                "(key TEXT PRIMARY KEY, result BLOB NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._connection.execute("CREATE INDEX IF NOT EXISTS battles_last_used ON battles (last_used)")
+            self._connection.commit()
+        return self._connection
+
+    def get_battle_key(
+            self, map_str: str, player1: Player, player2: Player, seed: Optional[int] = None,
+            adjudication_rules: Optional[Sequence] = None
+    ) -> str:
+        """
+        :param seed: The battle seed - part of the key only if one of the players is not DETERMINISTIC
+        :param adjudication_rules: The battle adjudication rules (their repr is part of the key)
+        :return: The cache key of the battle
+        """
+        if self._engine_fingerprint is None:
+            self._engine_fingerprint = _get_engine_fingerprint()
+        parts = [
+            self._engine_fingerprint, get_map_hash(map_str),
+            get_player_fingerprint(player1), get_player_fingerprint(player2)
+        ]
+        if not (_is_deterministic(player1) and _is_deterministic(player2)):
+            parts.append(repr(seed))
+        if adjudication_rules:
+            parts.append(repr(tuple(adjudication_rules)))
+        return hashlib.sha256("\0".join(parts).encode()).hexdigest()
+
+    def get(self, key: str) -> Optional["BattleResult"]:
+        """
+        :return: The cached battle result or None
+        """
+        row = self.connection.execute("SELECT result FROM battles WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        with self.connection:
+            self.connection.execute("UPDATE battles SET last_used = ? WHERE key = ?", (time.time(), key))
+        return pickle.loads(row[0])
+
+    def put(self, key: str, battle_result: "BattleResult"):
+        """
+        Cache the battle result, evict the least recently used battles if the cache is full
+        """
+        data = pickle.dumps(battle_result, protocol=pickle.HIGHEST_PROTOCOL)
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO battles (key, result, size, last_used) VALUES (?, ?, ?, ?)",
+                (key, data, len(data), time.time())
+            )
+            self._evict()
+
+    def _evict(self):
+        count, total_size = self.connection.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM battles").fetchone()
+        while count > self.max_entries or total_size > self.max_bytes:
+            rows = self.connection.execute(
+                "SELECT key, size FROM battles ORDER BY last_used LIMIT ?", (max(1, count - self.max_entries),)
+            ).fetchall()
+            for key, size in rows:
+                self.connection.execute("DELETE FROM battles WHERE key = ?", (key,))
+                count -= 1
+                total_size -= size
+                if count <= self.max_entries and total_size <= self.max_bytes:
+                    break
+
+    def clear(self):
+        """
+        Delete all the cached battles
+        """
+        with self.connection:
+            self.connection.execute("DELETE FROM battles")
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
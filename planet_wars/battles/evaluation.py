@@ -0,0 +1,337 @@
+"""
+Evaluate a bot against competitors, running battles in parallel and stopping as soon as the result is clear.
+
+Example:
+    tester = EarlyStoppingTestBot(
+        player=MyBot(), competitors=[AttackWeakestPlanetFromStrongestBot()],
+        maps=[get_map_by_id(map_id) for map_id in range(1, 101)]
+    )
+    tester.run_tournament()
+    print(tester.get_evaluation_report())
+"""
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass
+from statistics import NormalDist
+from typing import List, Optional, Sequence, Tuple
+
+from planet_wars.battles.battle_cache import BattleCache
+from planet_wars.battles.parallel import play_battle
+from planet_wars.battles.tournament import TestBot, BattleResult, PlayerScore
+from planet_wars.engine.adjudication import AdjudicationRule
+from planet_wars.engine.resource_limits import ResourceLimits
+from planet_wars.planet_wars import Player, list_to_data_frame
+
+BETTER = "better"
+WORSE = "worse"
+UNDECIDED = "undecided"
+
+
+def wilson_interval(points: float, battle_count: int, confidence: float) -> Tuple[float, float]:
+    """
+    Wilson score interval of the win rate (tie counts as half a win).
+    :param points: won + 0.5 * tie
+    :param battle_count: Number of battles
+    :param confidence: The confidence level, for example 0.95
+    :return: The lower and upper bounds
+    """
+    if battle_count == 0:
+        return 0.0, 1.0
+    z = NormalDist().inv_cdf(1 - (1 - confidence) / 2)
+    p = points / battle_count
+    denominator = 1 + z * z / battle_count
+    centre = p + z * z / (2 * battle_count)
+    margin = z * math.sqrt(p * (1 - p) / battle_count + z * z / (4 * battle_count * battle_count))
+    return (centre - margin) / denominator, (centre + margin) / denominator
+
+
+def sprt_log_likelihood_ratio(points: float, battle_count: int, p0: float, p1: float) -> float:
+    """
+    Log likelihood ratio of H1 (win rate is p1) vs H0 (win rate is p0). Tie counts as half a win and half a loss.
+    """
+    return points * math.log(p1 / p0) + (battle_count - points) * math.log((1 - p1) / (1 - p0))
+
+
+@dataclass
+class CompetitorEvaluation:
+    """
+    The tested player's results against a single competitor.
+    """
+    competitor_name: str
+    battle_count: int  # How many battles were used for the decision
+    won: int
+    lost: int
+    tie: int
+    points: float  # won + 0.5 * tie
+    win_rate: float  # points / battle_count
+    lower_bound: float  # Wilson lower bound of the win rate
+    upper_bound: float  # Wilson upper bound of the win rate
+    log_likelihood_ratio: float  # SPRT log likelihood ratio (H1: tested player is better)
+    decision: str  # "better" / "worse" - the tested player is better/worse than the competitor, or "undecided"
+    battles_scheduled: int  # How many battles a full TestBot run would have fought against this competitor
+    battles_run: int  # How many battles were actually run (including battles that finished after the decision)
+    battles_saved: int  # battles_scheduled - battles_run
+
+
+@dataclass
+class EvaluationReport:
+    """
+    The summary of an EarlyStoppingTestBot run.
+    """
+    player_score: PlayerScore  # The tested player score, calculated on the battles used for the decisions
+    battles_scheduled: int
+    battles_run: int
+    battles_saved: int
+    competitors: List[CompetitorEvaluation]
+
+
+class EarlyStoppingTestBot(TestBot):
+    """
+    TestBot that runs the battles on a process pool and stops battling a competitor once it is clear whether the
+    tested player is better or worse than it.
+
+    Two stopping rules:
+    "wilson" - stop when the Wilson confidence interval of the win rate doesn't contain 0.5.
+    "sprt" - sequential probability ratio test of win rate 0.5 + sprt_margin vs 0.5 - sprt_margin.
+
+    The battles against each competitor are consumed in schedule order (map by map, both sides) no matter which
+    worker finished first, so the decisions don't depend on the number of workers.
+    """
+
+    WILSON = "wilson"
+    SPRT = "sprt"
+
+    def __init__(
+            self,
+            player: Player,
+            competitors: List[Player],
+            maps: List[str],
+            always_be_player_1: bool = False,
+            raise_bot_exceptions: bool = True,
+            max_workers: Optional[int] = None,
+            stopping_rule: str = WILSON,
+            confidence: float = 0.95,
+            sprt_margin: float = 0.1,
+            sprt_alpha: float = 0.05,
+            sprt_beta: float = 0.05,
+            min_battles: int = 6,
+            battle_cache: Optional[BattleCache] = None,
+            seed: Optional[int] = None,
+            adjudication_rules: Optional[Sequence[AdjudicationRule]] = None,
+            resource_limits: Optional[ResourceLimits] = None,
+            sampling_interval: Optional[float] = None
+    ):
+        """
+        :param player: The player to test
+        :param competitors: The players it should battle
+        :param maps: A list of maps to run the battles on.
+        :param always_be_player_1: See TestBot
+        :param raise_bot_exceptions: If False catch exceptions from the player bots
+        :param max_workers: Number of worker processes, None uses the number of CPUs, 0 runs the battles in this process
+        :param stopping_rule: "wilson" or "sprt"
+        :param confidence: The Wilson interval confidence level
+        :param sprt_margin: The SPRT hypotheses are win rate 0.5 + sprt_margin and 0.5 - sprt_margin
+        :param sprt_alpha: The SPRT false positive rate
+        :param sprt_beta: The SPRT false negative rate
+        :param min_battles: Never decide before this number of battles against a competitor
+        :param battle_cache: If given, battles between deterministic bots are taken from the cache when possible
+        :param seed: The test seed, see Tournament
+        :param adjudication_rules: Rules that end decided battles early, see planet_wars.engine.adjudication
+        :param resource_limits: Limits of the bots turns, see planet_wars.engine.resource_limits
+        :param sampling_interval: If given, the bots turns are profiled, see Tournament
+        """
+        assert stopping_rule in (self.WILSON, self.SPRT), f"unknown stopping rule {stopping_rule}"
+        assert 0 < sprt_margin < 0.5, "sprt_margin should be between 0 and 0.5"
+        super().__init__(
+            player, competitors, maps, always_be_player_1, raise_bot_exceptions, battle_cache, seed, adjudication_rules,
+            resource_limits, sampling_interval
+        )
+        self.max_workers = max_workers
+        self.stopping_rule = stopping_rule
+        self.confidence = confidence
+        self.sprt_margin = sprt_margin
+        self.sprt_alpha = sprt_alpha
+        self.sprt_beta = sprt_beta
+        self.min_battles = min_battles
+        self.competitor_evaluations: List[CompetitorEvaluation] = []
+
+    def _get_schedule(self, competitor: Player) -> List[Tuple[str, Player, Player]]:
+        """
+        :return: The battles a full TestBot run would fight against the given competitor, in order
+        """
+        schedule = []
+        for map_str in self.maps:
+            schedule.append((map_str, self.player, competitor))
+            if not self.always_be_player_1:
+                schedule.append((map_str, competitor, self.player))
+        return schedule
+
+    def _get_battle_seed(self, competitor_index: int, battle_index: int) -> int:
+        """
+        :return: The seed of the battle in a full TestBot run (TestBot.run_tournament plays the maps in order, and in
+                 each map all the competitors), so it doesn't depend on the workers scheduling and an early stopped
+                 test plays the same battles as the full test
+        """
+        sides = 1 if self.always_be_player_1 else 2
+        map_index, side = divmod(battle_index, sides)
+        return self.get_battle_seed((map_index * len(self.competitors) + competitor_index) * sides + side + 1)
+
+    def _new_evaluation(self, competitor: Player, battles_scheduled: int) -> CompetitorEvaluation:
+        return CompetitorEvaluation(
+            competitor_name=self._get_player_name(competitor), battle_count=0, won=0, lost=0, tie=0, points=0.0,
+            win_rate=0.0, lower_bound=0.0, upper_bound=1.0, log_likelihood_ratio=0.0, decision=UNDECIDED,
+            battles_scheduled=battles_scheduled, battles_run=0, battles_saved=battles_scheduled
+        )
+
+    def _update_evaluation(self, evaluation: CompetitorEvaluation, battle_result: BattleResult, player_number: int):
+        """
+        Add the battle to the evaluation statistics and check the stopping rule
+        :param player_number: 1 if the tested player was player 1 in the battle, otherwise 2
+        """
+        if battle_result.winner == 0:
+            evaluation.tie += 1
+        elif battle_result.winner == player_number:
+            evaluation.won += 1
+        else:
+            evaluation.lost += 1
+        evaluation.battle_count += 1
+        evaluation.points = evaluation.won + 0.5 * evaluation.tie
+        evaluation.win_rate = evaluation.points / evaluation.battle_count
+        evaluation.lower_bound, evaluation.upper_bound = wilson_interval(
+            evaluation.points, evaluation.battle_count, self.confidence
+        )
+        evaluation.log_likelihood_ratio = sprt_log_likelihood_ratio(
+            evaluation.points, evaluation.battle_count, p0=0.5 - self.sprt_margin, p1=0.5 + self.sprt_margin
+        )
+
+        if evaluation.battle_count < self.min_battles:
+            return
+        if self.stopping_rule == self.WILSON:
+            if evaluation.lower_bound > 0.5:
+                evaluation.decision = BETTER
+            elif evaluation.upper_bound < 0.5:
+                evaluation.decision = WORSE
+        else:
+            if evaluation.log_likelihood_ratio >= math.log((1 - self.sprt_beta) / self.sprt_alpha):
+                evaluation.decision = BETTER
+            elif evaluation.log_likelihood_ratio <= math.log(self.sprt_beta / (1 - self.sprt_alpha)):
+                evaluation.decision = WORSE
+
+    def run_tournament(self) -> List[BattleResult]:
+        """
+        Run the "test" - the given player will battle each competitor until the result against it is clear
+        or all the maps were played.
+        :return: The BattleResults used for the decisions
+        """
+        self.battle_results = []
+        schedules = [self._get_schedule(competitor) for competitor in self.competitors]
+        self.competitor_evaluations = [
+            self._new_evaluation(competitor, len(schedule)) for competitor, schedule in zip(self.competitors, schedules)
+        ]
+        # Per competitor: the next battle to submit, the next battle to consume and finished battles waiting for
+        # the battles scheduled before them
+        next_to_submit = [0] * len(schedules)
+        next_to_consume = [0] * len(schedules)
+        finished = [{} for _ in schedules]
+
+        def is_active(competitor_index: int) -> bool:
+            return (
+                    self.competitor_evaluations[competitor_index].decision == UNDECIDED and
+                    next_to_submit[competitor_index] < len(schedules[competitor_index])
+            )
+
+        def next_battle() -> Optional[Tuple[int, int]]:
+            active = [i for i in range(len(schedules)) if is_active(i)]
+            if len(active) == 0:
+                return None
+            competitor_index = min(active, key=lambda i: next_to_submit[i])
+            next_to_submit[competitor_index] += 1
+            return competitor_index, next_to_submit[competitor_index] - 1
+
+        def consume(competitor_index: int, battle_index: int, battle_result: BattleResult):
+            evaluation = self.competitor_evaluations[competitor_index]
+            evaluation.battles_run += 1
+            evaluation.battles_saved = evaluation.battles_scheduled - evaluation.battles_run
+            finished[competitor_index][battle_index] = battle_result
+            while next_to_consume[competitor_index] in finished[competitor_index]:
+                battle_index = next_to_consume[competitor_index]
+                battle_result = finished[competitor_index].pop(battle_index)
+                next_to_consume[competitor_index] += 1
+                if evaluation.decision == UNDECIDED:
+                    player_number = 1 if schedules[competitor_index][battle_index][1] is self.player else 2
+                    self.add_battle_result(battle_result)
+                    self._update_evaluation(evaluation, battle_result, player_number)
+
+        if self.max_workers == 0:
+            battle = next_battle()
+            while battle is not None:
+                competitor_index, battle_index = battle
+                consume(competitor_index, battle_index, play_battle(
+                    *schedules[competitor_index][battle_index],
+                    raise_bot_exceptions=self.raise_bot_exceptions, battle_cache=self.battle_cache,
+                    seed=self._get_battle_seed(competitor_index, battle_index),
+                    adjudication_rules=self.adjudication_rules, resource_limits=self.resource_limits,
+                    sampling_interval=self.sampling_interval
+                ))
+                battle = next_battle()
+            return self.battle_results
+
+        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            max_in_flight = 2 * (self.max_workers or os.cpu_count() or 1)
+            in_flight = {}
+
+            def submit_battles():
+                while len(in_flight) < max_in_flight:
+                    battle = next_battle()
+                    if battle is None:
+                        return
+                    competitor_index, battle_index = battle
+                    future = executor.submit(
+                        play_battle, *schedules[competitor_index][battle_index],
+                        raise_bot_exceptions=self.raise_bot_exceptions, battle_cache=self.battle_cache,
+                        seed=self._get_battle_seed(competitor_index, battle_index),
+                        adjudication_rules=self.adjudication_rules, resource_limits=self.resource_limits,
+                        sampling_interval=self.sampling_interval
+                    )
+                    in_flight[future] = battle
+
+            submit_battles()
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    competitor_index, battle_index = in_flight.pop(future)
+                    if future.cancelled():
+                        continue
+                    consume(competitor_index, battle_index, future.result())
+                    if self.competitor_evaluations[competitor_index].decision != UNDECIDED:
+                        # Battles that didn't start yet are not needed anymore
+                        for other_future, (other_competitor_index, _) in in_flight.items():
+                            if other_competitor_index == competitor_index:
+                                other_future.cancel()
+                submit_battles()
+
+        return self.battle_results
+
+    def get_evaluation_report(self) -> EvaluationReport:
+        """
+        :return: The tested player score, the decision against each competitor and how many battles were saved
+        """
+        battles_scheduled = sum(e.battles_scheduled for e in self.competitor_evaluations)
+        battles_run = sum(e.battles_run for e in self.competitor_evaluations)
+        return EvaluationReport(
+            player_score=self.get_score_object(),
+            battles_scheduled=battles_scheduled,
+            battles_run=battles_run,
+            battles_saved=battles_scheduled - battles_run,
+            competitors=self.competitor_evaluations
+        )
+
+    def get_competitor_evaluations_data_frame(self):
+        """
+        :return: Data frame with the evaluation against each competitor, see CompetitorEvaluation doc
+        """
+        return list_to_data_frame(
+            lst=self.competitor_evaluations,
+            columns=list(CompetitorEvaluation.__dataclass_fields__.keys())
+        )
@@ -0,0 +1,159 @@
+from typing import List, Optional, TYPE_CHECKING
+
+from planet_wars.battles.tournament import Tournament, BattleResult
+from planet_wars.engine.game_logic import GameManager
+from planet_wars.engine.multi_player_game_logic import MultiPlayerGameManager
+from planet_wars.engine.resource_limits import ResourceLimits
+from planet_wars.engine.seeding import seeded_global_random
+from planet_wars.planet_wars import Player, list_to_data_frame
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+class FreeForAllTournament(Tournament):
+    """
+    Tournament of free-for-all battles - all the players battle together on maps with a home planet for each
+    player (see planet_wars.engine.map_generator.generate_multi_player_map), instead of a duel for each pair.
+    See planet_wars.engine.multi_player_game_logic for the rules.
+
+    On each map the players play a battle in each seat rotation (player k plays seat k, k + 1, ...), so every player
+    starts from every home planet once. The winner of a battle gets a point, in a tie all the leaders get half a
+    point. In the player scores the enemy score of a battle is the best score of the other players.
+    """
+
+    def __init__(
+            self,
+            players: List[Player],
+            maps: List[str],
+            raise_bot_exceptions: bool = False,
+            rotate_seats: bool = True,
+            seed: Optional[int] = None,
+            resource_limits: Optional[ResourceLimits] = None
+    ):
+        """
+        :param players: List of players, all of them play in each battle
+        :param maps: List of maps with len(players) home planets
+        :param raise_bot_exceptions: If False catch exceptions from the player bots
+        :param rotate_seats: If True play a battle in each seat rotation on each map, otherwise one battle per map
+        :param seed: The tournament seed, see Tournament
+        :param resource_limits: Limits of the bots turns, see planet_wars.engine.resource_limits
+        """
+        super().__init__(players, maps, raise_bot_exceptions, seed=seed, resource_limits=resource_limits)
+        self.rotate_seats = rotate_seats
+
+    def run_tournament(self) -> List[BattleResult]:
+        """
+        Run the free-for-all battles on all the maps
+        :return: The battle results
+        """
+        self.battle_results = []
+        for map_str in self.maps:
+            for rotation in range(len(self.players) if self.rotate_seats else 1):
+                seats = self.players[rotation:] + self.players[:rotation]
+                self.battle_results.append(self.run_free_for_all_battle(map_str, seats))
+        return self.battle_results
+
+    def run_free_for_all_battle(self, map_str: str, players: List[Player], seed: Optional[int] = None) -> BattleResult:
+        """
+        Run a battle between all the given players in the given map
+        :param map_str: The map to battle in
+        :param players: The players, players[k] is player k + 1
+        :param seed: The battle seed, None takes the next seed of the tournament
+        :return: The BattleResult
+        """
+        if seed is None:
+            seed = self.next_battle_seed()
+        print(f"run free-for-all battle between {', '.join(self._get_player_name(p) for p in players)}")
+        game_manager = MultiPlayerGameManager(
+            map_str, players, self.raise_bot_exceptions, seed=seed, resource_limits=self.resource_limits
+        )
+        with seeded_global_random(seed):
+            finish_state = game_manager.run_game()
+        return self.create_battle_result(game_manager, finish_state)
+
+    def create_battle_result(self, game_manager: GameManager, finish_state: str) -> BattleResult:
+        """
+        Create the BattleResult of a free-for-all battle, with all the players' names and scores
+        """
+        battle_result = super().create_battle_result(game_manager, finish_state)
+        battle_result.winner = MultiPlayerGameManager.get_winner(finish_state)
+        battle_result.player_names = [self._get_player_name(player) for player in game_manager.players]
+        battle_result.player_scores = game_manager.get_player_scores()
+        battle_result.resource_usage = [
+            game_manager.resource_usage[player_num] for player_num in range(1, len(game_manager.players) + 1)
+        ]
+        return battle_result
+
+    def get_battle_results_data_frame(self) -> "pd.DataFrame":
+        """
+        :return: data frame with all the battles fought in the tournament, including all the players' names and scores
+        """
+        assert len(self.battle_results) > 0, "first run the tournament"
+        return list_to_data_frame(
+            lst=self.battle_results,
+            columns=[
+                "battle_id", "player_names", "player_scores", "winner", "finish_state", "turns",
+                "description_for_display", "seed"
+            ]
+        ).set_index("battle_id")
+
+    def get_extended_battle_results_data_frame_for_player(self, player_name) -> "pd.DataFrame":
+        """
+        Get data frame with all the battles fought by the given player, see Tournament.
+        The enemy_name is the best of the other players in the battle (by score) and the enemy_score is its score.
+        """
+        assert len(self.battle_results) > 0, "first run the tournament"
+        rows = []
+        for battle_result in self.battle_results:
+            if player_name not in battle_result.player_names:
+                continue
+            player_index = battle_result.player_names.index(player_name)
+            enemy_index = max(
+                (i for i in range(len(battle_result.player_names)) if i != player_index),
+                key=lambda i: battle_result.player_scores[i]
+            )
+            won = battle_result.winner == player_index + 1
+            tie = battle_result.winner == 0
+            rows.append({
+                "player_name": player_name,
+                "enemy_name": battle_result.player_names[enemy_index],
+                "won": won,
+                "tie": tie,
+                "lost": not won and not tie,
+                "player_score": battle_result.player_scores[player_index],
+                "enemy_score": battle_result.player_scores[enemy_index],
+                "player_number": player_index + 1,
+                "finish_state": battle_result.finish_state,
+                "turns": battle_result.turns,
+                "battle_id": battle_result.battle_id,
+            })
+        import pandas as pd
+
+        df = pd.DataFrame(rows, columns=[
+            'player_name', 'enemy_name', 'won', 'tie', 'lost', 'player_score', 'enemy_score',
+            'player_number', 'finish_state', 'turns', 'battle_id'
+        ]).set_index("battle_id")
+        return self.add_resource_usage_columns(df)
+
+
+if __name__ == "__main__":
+    import random
+
+    from planet_wars.engine.map_generator import generate_multi_player_map, multi_player_map_to_str
+    from planet_wars.player_bots.baseline_code.baseline_bot import (
+        AttackWeakestPlanetFromStrongestBot, AttackEnemyWeakestPlanetFromStrongestBot,
+        AttackWeakestPlanetFromStrongestSmarterNumOfShipsBot
+    )
+
+    ffa_players = [
+        AttackWeakestPlanetFromStrongestBot(), AttackEnemyWeakestPlanetFromStrongestBot(),
+        AttackWeakestPlanetFromStrongestSmarterNumOfShipsBot()
+    ]
+    ffa_maps = [
+        multi_player_map_to_str(generate_multi_player_map(len(ffa_players), random.Random(i))) for i in range(3)
+    ]
+    tournament = FreeForAllTournament(ffa_players, ffa_maps, seed=0)
+    tournament.run_tournament()
+    print(tournament.get_battle_results_data_frame()[["player_names", "player_scores", "winner", "turns"]])
+    print(tournament.get_player_scores_data_frame())
@@ -0,0 +1,87 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Sequence, Tuple
+
+from planet_wars.battles.battle_cache import BattleCache
+from planet_wars.battles.tournament import BattleResult, Tournament
+from planet_wars.engine.adjudication import AdjudicationRule
+from planet_wars.engine.resource_limits import ResourceLimits
+from planet_wars.planet_wars import Player
+
+
+def play_battle(
+        map_str: str,
+        player1: Player,
+        player2: Player,
+        raise_bot_exceptions: bool = False,
+        battle_cache: Optional[BattleCache] = None,
+        seed: Optional[int] = None,
+        adjudication_rules: Optional[Sequence[AdjudicationRule]] = None,
+        resource_limits: Optional[ResourceLimits] = None,
+        sampling_interval: Optional[float] = None
+) -> BattleResult:
+    """
+    Run a single battle. This is a module level function so it can run in a worker process.
+    The returned battle_id is meaningless - the caller should set it.
+
+    :param map_str: The map to battle in
+    :param player1: Player 1 bot
+    :param player2: Player 2 bot
+    :param raise_bot_exceptions: If False catch exceptions from the player bots
+    :param battle_cache: If given, take the battle from the cache when possible
+    :param seed: The battle seed, None uses a random seed
+    :param adjudication_rules: Rules that end decided battles early, see planet_wars.engine.adjudication
+    :param resource_limits: Limits of the bots turns, see planet_wars.engine.resource_limits
+    :param sampling_interval: If given, the bots turns are profiled, see planet_wars.engine.sampling_profiler
+    :return: The BattleResult
+    """
+    tournament = Tournament(
+        [player1, player2], [map_str], raise_bot_exceptions, battle_cache=battle_cache,
+        adjudication_rules=adjudication_rules, resource_limits=resource_limits, sampling_interval=sampling_interval
+    )
+    return tournament.run_battle(map_str, player1, player2, seed=seed)
+
+
+def run_battles_in_parallel(
+        battles: List[Tuple[str, Player, Player]],
+        raise_bot_exceptions: bool = False,
+        max_workers: Optional[int] = None,
+        battle_cache: Optional[BattleCache] = None,
+        seeds: Optional[List[int]] = None,
+        adjudication_rules: Optional[Sequence[AdjudicationRule]] = None,
+        resource_limits: Optional[ResourceLimits] = None,
+        sampling_interval: Optional[float] = None
+) -> List[BattleResult]:
+    """
+    Run the given battles on a process pool. The players are pickled to the worker processes, so bots keeping
+    state between battles will not see the other battles.
+
+    :param battles: List of (map_str, player1, player2) tuples
+    :param raise_bot_exceptions: If False catch exceptions from the player bots
+    :param max_workers: Number of worker processes, None uses the number of CPUs, 0 runs the battles in this process
+    :param battle_cache: If given, take the battles from the cache when possible
+    :param seeds: The seed of each battle, None uses random seeds
+    :param adjudication_rules: Rules that end decided battles early, see planet_wars.engine.adjudication
+    :param resource_limits: Limits of the bots turns, see planet_wars.engine.resource_limits
+    :param sampling_interval: If given, the bots turns are profiled, see planet_wars.engine.sampling_profiler
+    :return: The BattleResults, in the same order as the given battles
+    """
+    if seeds is None:
+        seeds = [None] * len(battles)
+    if max_workers == 0:
+        return [
+            play_battle(
+                map_str, player1, player2, raise_bot_exceptions, battle_cache, seed, adjudication_rules,
+                resource_limits, sampling_interval
+            )
+            for (map_str, player1, player2), seed in zip(battles, seeds)
+        ]
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(
+                play_battle, map_str, player1, player2, raise_bot_exceptions, battle_cache, seed, adjudication_rules,
+                resource_limits, sampling_interval
+            )
+            for (map_str, player1, player2), seed in zip(battles, seeds)
+        ]
+        return [future.result() for future in futures]
@@ -0,0 +1,289 @@
+"""
+Incremental rating of the bots (Glicko style - a rating and a rating deviation per player),
+and matchmaking that picks the most informative next battles.
+
+With many bots a full round-robin is too expensive. RatedTournament runs the battles in small batches, updates the
+ratings after each battle and asks the MatchmakingScheduler for the pairs whose results will teach us the most,
+until the ratings are accurate enough.
+"""
+import math
+import random
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from planet_wars.battles.battle_cache import BattleCache
+from planet_wars.battles.tournament import Tournament, BattleResult, PlayerScore
+from planet_wars.engine.adjudication import AdjudicationRule
+from planet_wars.engine.resource_limits import ResourceLimits
+from planet_wars.engine.seeding import derive_seed
+from planet_wars.planet_wars import Player, list_to_data_frame
+
+_Q = math.log(10) / 400
+
+
+def _g(deviation: float) -> float:
+    return 1 / math.sqrt(1 + 3 * _Q * _Q * deviation * deviation / (math.pi * math.pi))
+
+
+@dataclass
+class PlayerRating:
+    """
+    The rating of a player
+    """
+    player_name: str
+    rating: float  # The estimated strength, 1500 is the initial rating
+    deviation: float  # The uncertainty of the rating, ~95% of the time the real strength is rating +- 2 * deviation
+    battle_count: int
+    won: int
+    lost: int
+    tie: int
+
+    @property
+    def conservative_rating(self) -> float:
+        """
+        Rating lower bound - good for ranking, a player with few battles doesn't get the first place by luck
+        """
+        return self.rating - 2 * self.deviation
+
+
+class RatingEngine:
+    """
+    Update the ratings battle by battle (Glicko-1 update applied after every battle instead of rating periods).
+    """
+
+    def __init__(self, initial_rating: float = 1500.0, initial_deviation: float = 350.0, min_deviation: float = 30.0):
+        """
+        :param initial_rating: The rating of a new player
+        :param initial_deviation: The rating deviation of a new player
+        :param min_deviation: The deviation never drops below this value so the ratings keep following the results
+        """
+        self.initial_rating = initial_rating
+        self.initial_deviation = initial_deviation
+        self.min_deviation = min_deviation
+        self.ratings: Dict[str, PlayerRating] = {}
+
+    def get_rating(self, player_name: str) -> PlayerRating:
+        """
+        :return: The player rating, new players get the initial rating
+        """
+        if player_name not in self.ratings:
+            self.ratings[player_name] = PlayerRating(
+                player_name=player_name, rating=self.initial_rating, deviation=self.initial_deviation,
+                battle_count=0, won=0, lost=0, tie=0
+            )
+        return self.ratings[player_name]
+
+    def expected_score(self, player_name: str, enemy_name: str) -> float:
+        """
+        :return: The probability the player wins the enemy (tie counts as half a win)
+        """
+        player = self.get_rating(player_name)
+        enemy = self.get_rating(enemy_name)
+        combined_deviation = math.sqrt(player.deviation ** 2 + enemy.deviation ** 2)
+        return 1 / (1 + 10 ** (-_g(combined_deviation) * (player.rating - enemy.rating) / 400))
+
+    def _new_rating_and_deviation(self, player: PlayerRating, enemy: PlayerRating, score: float) -> Tuple[float, float]:
+        g = _g(enemy.deviation)
+        expected = 1 / (1 + 10 ** (-g * (player.rating - enemy.rating) / 400))
+        d_squared_inverse = _Q * _Q * g * g * expected * (1 - expected)
+        precision = 1 / (player.deviation ** 2) + d_squared_inverse
+        rating = player.rating + _Q / precision * g * (score - expected)
+        deviation = max(math.sqrt(1 / precision), self.min_deviation)
+        return rating, deviation
+
+    def update(self, battle_result: BattleResult):
+        """
+        Update the ratings of the two players of the battle.
+        :param battle_result: The battle that ended
+        """
+        if battle_result.winner is None:
+            return
+        player_1 = self.get_rating(battle_result.player_1_name)
+        player_2 = self.get_rating(battle_result.player_2_name)
+        if player_1 is player_2:
+            return  # Battle against yourself teaches us nothing
+
+        score_1 = {1: 1.0, 2: 0.0, 0: 0.5}[battle_result.winner]
+        new_1 = self._new_rating_and_deviation(player_1, player_2, score_1)
+        new_2 = self._new_rating_and_deviation(player_2, player_1, 1 - score_1)
+        player_1.rating, player_1.deviation = new_1
+        player_2.rating, player_2.deviation = new_2
+
+        for player, score in ((player_1, score_1), (player_2, 1 - score_1)):
+            player.battle_count += 1
+            player.won += score == 1
+            player.lost += score == 0
+            player.tie += score == 0.5
+
+    def update_many(self, battle_results: Iterable[BattleResult]):
+        """
+        Update the ratings with a stream of battle results
+        """
+        for battle_result in battle_results:
+            self.update(battle_result)
+
+    def get_ratings(self) -> List[PlayerRating]:
+        """
+        :return: The ratings, sorted by conservative rating (best first)
+        """
+        return sorted(self.ratings.values(), key=lambda r: r.conservative_rating, reverse=True)
+
+    def get_ratings_data_frame(self):
+        """
+        :return: Data frame with the ratings, see PlayerRating doc
+        """
+        ratings = self.get_ratings()
+        df = list_to_data_frame(lst=ratings, columns=list(PlayerRating.__dataclass_fields__.keys()))
+        df["conservative_rating"] = [r.conservative_rating for r in ratings]
+        return df
+
+
+class MatchmakingScheduler:
+    """
+    Pick the next battles - the pairs whose result is most uncertain and whose ratings are least known.
+    The information of a battle between a and b is estimated as
+        (deviation_a^2 + deviation_b^2) * p * (1 - p) / (1 + battles already fought between a and b)
+    where p is the expected score - close ratings and high deviations give the most informative battles.
+    """
+
+    def __init__(self, rating_engine: RatingEngine, players: List[Player], maps: List[str], rng: random.Random = None):
+        """
+        :param rating_engine: The rating engine with the current ratings
+        :param players: The players to pair
+        :param maps: The maps to battle on, each pair goes over the maps in order and switches sides every battle
+        :param rng: Random generator used to break ties between equally informative pairs
+        """
+        self.rating_engine = rating_engine
+        self.players = players
+        self.maps = maps
+        self.rng = rng if rng is not None else random.Random()
+        self.pair_battle_count: Dict[Tuple[int, int], int] = defaultdict(int)
+
+    def _pair_information(self, i: int, j: int) -> float:
+        name_i = Tournament._get_player_name(self.players[i])
+        name_j = Tournament._get_player_name(self.players[j])
+        rating_i = self.rating_engine.get_rating(name_i)
+        rating_j = self.rating_engine.get_rating(name_j)
+        p = self.rating_engine.expected_score(name_i, name_j)
+        return (
+                (rating_i.deviation ** 2 + rating_j.deviation ** 2) * p * (1 - p) /
+                (1 + self.pair_battle_count[(i, j)])
+        )
+
+    def next_battles(self, count: int) -> List[Tuple[str, Player, Player]]:
+        """
+        :param count: The number of battles to schedule. Each player plays at most once in the returned batch
+                      (if there are enough players) so the batch can run in parallel and be rated together.
+        :return: List of (map_str, player1, player2) tuples
+        """
+        pairs = [(i, j) for i in range(len(self.players)) for j in range(i + 1, len(self.players))]
+        self.rng.shuffle(pairs)
+        pairs.sort(key=lambda pair: self._pair_information(*pair), reverse=True)
+
+        battles = []
+        busy = set()
+        for allow_busy in (False, True):
+            for i, j in pairs:
+                if len(battles) >= count:
+                    break
+                if not allow_busy and (i in busy or j in busy):
+                    continue
+                battle_number = self.pair_battle_count[(i, j)]
+                self.pair_battle_count[(i, j)] += 1
+                busy.update((i, j))
+                map_str = self.maps[(battle_number // 2) % len(self.maps)]
+                player1, player2 = self.players[i], self.players[j]
+                battles.append((map_str, player1, player2) if battle_number % 2 == 0 else (map_str, player2, player1))
+        return battles
+
+
+class RatedTournament(Tournament):
+    """
+    Tournament that runs the most informative battles in batches and ranks the players by rating.
+    Stops when all the rating deviations are below target_deviation or after max_battles battles.
+    """
+
+    def __init__(
+            self,
+            players: List[Player],
+            maps: List[str],
+            raise_bot_exceptions: bool = False,
+            max_battles: Optional[int] = None,
+            target_deviation: float = 50.0,
+            batch_size: Optional[int] = None,
+            max_workers: Optional[int] = 0,
+            rating_engine: Optional[RatingEngine] = None,
+            rng: random.Random = None,
+            battle_cache: Optional[BattleCache] = None,
+            seed: Optional[int] = None,
+            adjudication_rules: Optional[Sequence[AdjudicationRule]] = None,
+            resource_limits: Optional[ResourceLimits] = None
+    ):
+        """
+        :param players: List of players
+        :param maps: List of maps
+        :param raise_bot_exceptions: If False catch exceptions from the player bots
+        :param max_battles: Max number of battles, None means the number of battles of a full round-robin
+        :param target_deviation: Stop when all the players' rating deviations are below this value
+        :param batch_size: Number of battles scheduled together, None means half the number of players
+        :param max_workers: Number of worker processes, None uses the number of CPUs, 0 runs the battles in this process
+        :param rating_engine: Start from existing ratings, by default all players start with the initial rating
+        :param rng: Random generator used by the matchmaking, by default derived from the tournament seed
+        :param battle_cache: If given, battles between deterministic bots are taken from the cache when possible
+        :param seed: The tournament seed, see Tournament
+        :param adjudication_rules: Rules that end decided battles early, see planet_wars.engine.adjudication
+        :param resource_limits: Limits of the bots turns, see planet_wars.engine.resource_limits
+        """
+        super().__init__(
+            players, maps, raise_bot_exceptions, battle_cache=battle_cache, seed=seed,
+            adjudication_rules=adjudication_rules, resource_limits=resource_limits
+        )
+        full_round_robin = len(players) * (len(players) - 1) * len(maps)
+        self.max_battles = max_battles if max_battles is not None else full_round_robin
+        self.target_deviation = target_deviation
+        self.batch_size = batch_size if batch_size is not None else max(1, len(players) // 2)
+        self.max_workers = max_workers
+        self.rating_engine = rating_engine if rating_engine is not None else RatingEngine()
+        if rng is None:
+            rng = random.Random(derive_seed(self.seed, "matchmaking"))
+        self.scheduler = MatchmakingScheduler(self.rating_engine, players, maps, rng)
+
+    def is_converged(self) -> bool:
+        """
+        :return: True if all the players' rating deviations are below the target deviation
+        """
+        return all(
+            self.rating_engine.get_rating(self._get_player_name(player)).deviation < self.target_deviation
+            for player in self.players
+        )
+
+    def run_tournament(self) -> List[BattleResult]:
+        """
+        Run batches of the most informative battles, updating the ratings after each batch.
+        :return: The battle results
+        """
+        self.battle_results = []
+        while len(self.battle_results) < self.max_battles and not self.is_converged():
+            batch_size = min(self.batch_size, self.max_battles - len(self.battle_results))
+            battle_results = self.run_battles_in_parallel(self.scheduler.next_battles(batch_size), self.max_workers)
+            self.rating_engine.update_many(battle_results)
+        return self.battle_results
+
+    def get_player_scores(self) -> List[PlayerScore]:
+        """
+        :return: List of all players scores, ranked by conservative rating (and not by points)
+        """
+        player_scores = [self.get_player_score_object(self._get_player_name(player)) for player in self.players]
+        player_scores.sort(
+            key=lambda ps: self.rating_engine.get_rating(ps.player_name).conservative_rating, reverse=True
+        )
+        for rank, player_score in enumerate(player_scores):
+            player_score.rank = rank + 1
+        return player_scores
+
+    def get_ratings_data_frame(self):
+        """
+        :return: Data frame with the players' ratings, see PlayerRating doc
+        """
+        return self.rating_engine.get_ratings_data_frame()
@@ -0,0 +1,300 @@
+"""
+Hyperparameter sweep of a bot - search the parameter space for the configuration that wins the most against the
+competitors, dropping weak configurations early by successive halving.
+
+Each round all the remaining configurations battle the competitors on new maps (both sides), the rounds get
+eta times more maps each time. After each round only the best 1 / eta of the configurations (by win rate on all
+their battles so far) go on. So most of the battles are spent on the promising configurations.
+All the configurations play the same battles (same maps, sides and seeds), so they are compared on equal terms.
+The battles run on a process pool. With a battle cache, configurations that were already swept (same parameters,
+maps and seed) are taken from the cache.
+
+Example:
+    sweep = ParameterSweep(
+        player_factory=AttackWeakestPlanetFromStrongestSmarterNumOfShipsBot,
+        parameter_space={"neutral_margin": [0, 5, 10], "enemy_fraction": [0.5, 0.75, 1.0]},
+        competitors=[AttackWeakestPlanetFromStrongestBot(), AttackEnemyWeakestPlanetFromStrongestBot()],
+        maps=[get_map_by_id(map_id) for map_id in range(1, 31)],
+        battle_cache=BattleCache("battle_cache.sqlite")
+    )
+    sweep.run()
+    print(sweep.get_results_data_frame())
+"""
+import itertools
+import math
+import random
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from planet_wars.battles.battle_cache import BattleCache
+from planet_wars.battles.parallel import run_battles_in_parallel
+from planet_wars.battles.tournament import TestBot
+from planet_wars.engine.adjudication import AdjudicationRule
+from planet_wars.engine.resource_limits import ResourceLimits
+from planet_wars.engine.seeding import derive_seed, new_seed
+from planet_wars.planet_wars import Player
+
+
+@dataclass
+class ConfigurationResult:
+    """
+    The sweep result of a parameters configuration
+    """
+    config_id: int
+    player_name: str
+    parameters: Dict[str, Any]
+    battle_count: int  # How many battles the configuration fought
+    points: float  # won + 0.5 * tie
+    win_rate: float  # points / battle_count
+    mean_score_difference: float  # The mean of the player score minus the enemy score, breaks win rate ties
+    rounds: int  # How many rounds the configuration played
+    eliminated_in_round: Optional[int]  # The round the configuration was dropped after, None if it was never dropped
+
+
+class ParameterSweep:
+    """
+    Successive halving search of a bot's parameters, see the module documentation
+    """
+
+    def __init__(
+            self,
+            player_factory: Callable[..., Player],
+            parameter_space: Dict[str, Sequence[Any]],
+            competitors: List[Player],
+            maps: List[str],
+            maps_in_first_round: int = 2,
+            eta: int = 2,
+            max_configurations: Optional[int] = None,
+            always_be_player_1: bool = False,
+            raise_bot_exceptions: bool = False,
+            max_workers: Optional[int] = None,
+            battle_cache: Optional[BattleCache] = None,
+            seed: Optional[int] = None,
+            adjudication_rules: Optional[Sequence[AdjudicationRule]] = None,
+            resource_limits: Optional[ResourceLimits] = None,
+            sampling_interval: Optional[float] = None
+    ):
+        """
+        :param player_factory: Creates the bot given the parameters as keyword arguments (usually the bot class)
+        :param parameter_space: parameter name -> the values to try. The configurations are all the combinations
+        :param competitors: The players each configuration battles
+        :param maps: The maps, in the order the rounds use them
+        :param maps_in_first_round: The number of maps of the first round
+        :param eta: Each round keeps 1 / eta of the configurations and plays eta times more maps
+        :param max_configurations: If given and there are more combinations, sample this number of them
+        :param always_be_player_1: If True the configurations are always player 1, see TestBot
+        :param raise_bot_exceptions: If False catch exceptions from the player bots
+        :param max_workers: Number of worker processes, None uses the number of CPUs, 0 runs the battles in this process
+        :param battle_cache: If given, battles between deterministic bots are taken from the cache when possible
+        :param seed: The sweep seed, the configurations sample and the battles seeds are derived from it
+        :param adjudication_rules: Rules that end decided battles early, see planet_wars.engine.adjudication
+        :param resource_limits: Limits of the bots turns, see planet_wars.engine.resource_limits
+        :param sampling_interval: If given, the bots turns are profiled - see the hotspots of a configuration with
+                                  testers[config_id].get_hotspots_data_frame(), and planet_wars.engine.sampling_profiler
+        """
+        assert len(parameter_space) >= 1, "the sweep needs at least 1 parameter"
+        assert len(competitors) >= 1, "the sweep needs at least 1 competitor"
+        assert len(maps) >= 1, "the sweep needs at least 1 map"
+        assert eta >= 2, "eta should be at least 2"
+        self.player_factory = player_factory
+        self.parameter_space = parameter_space
+        self.competitors = competitors
+        self.maps = maps
+        self.maps_in_first_round = maps_in_first_round
+        self.eta = eta
+        self.always_be_player_1 = always_be_player_1
+        self.raise_bot_exceptions = raise_bot_exceptions
+        self.max_workers = max_workers
+        self.battle_cache = battle_cache
+        self.seed = seed if seed is not None else new_seed()
+        self.adjudication_rules = adjudication_rules
+        self.resource_limits = resource_limits
+        self.sampling_interval = sampling_interval
+        self.configurations = self.get_configurations(max_configurations)
+        # config_id -> TestBot holding the configuration's battles, for its PlayerScore
+        self.testers: Dict[int, TestBot] = {}
+        self.results: Dict[int, ConfigurationResult] = {}
+        self.battles_run = 0
+
+    def get_configurations(self, max_configurations: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        :param max_configurations: If given and there are more combinations, sample this number of them
+        :return: The parameters configurations to sweep
+        """
+        names = list(self.parameter_space.keys())
+        configurations = [
+            dict(zip(names, values)) for values in itertools.product(*(self.parameter_space[name] for name in names))
+        ]
+        if max_configurations is not None and len(configurations) > max_configurations:
+            rng = random.Random(derive_seed(self.seed, "configurations"))
+            configurations = rng.sample(configurations, max_configurations)
+        return configurations
+
+    def create_player(self, parameters: Dict[str, Any]) -> Player:
+        """
+        :param parameters: The configuration
+        :return: The bot of the configuration, named by its parameters (so the configurations are told apart)
+        """
+        player = self.player_factory(**parameters)
+        base_name = TestBot._get_player_name(player)
+        player.NAME = f"{base_name}({', '.join(f'{name}={value!r}' for name, value in parameters.items())})"
+        return player
+
+    def _get_round_maps(self) -> List[List[int]]:
+        """
+        :return: The map indexes of each round, each round has eta times more maps
+        """
+        rounds = []
+        first_map, num_maps = 0, self.maps_in_first_round
+        while first_map < len(self.maps):
+            rounds.append(list(range(first_map, min(first_map + num_maps, len(self.maps)))))
+            first_map += num_maps
+            num_maps *= self.eta
+        return rounds
+
+    def _get_battles(self, player: Player, map_indexes: List[int]) -> List[Tuple[Tuple[str, Player, Player], int]]:
+        """
+        :return: The battles of the player against all the competitors on the given maps, with their seeds.
+                 The seed depends only on the battle place (map, competitor and side), not on the configuration
+        """
+        battles = []
+        for map_index in map_indexes:
+            for competitor_index, competitor in enumerate(self.competitors):
+                map_str = self.maps[map_index]
+                battles.append((
+                    (map_str, player, competitor), derive_seed(self.seed, "sweep", map_index, competitor_index, 1)
+                ))
+                if not self.always_be_player_1:
+                    battles.append((
+                        (map_str, competitor, player), derive_seed(self.seed, "sweep", map_index, competitor_index, 2)
+                    ))
+        return battles
+
+    def _update_result(self, config_id: int, rounds: int):
+        player_score = self.testers[config_id].get_score_object()
+        result = self.results[config_id]
+        result.battle_count = int(player_score.battle_count)
+        result.points = float(player_score.points)
+        result.win_rate = result.points / max(result.battle_count, 1)
+        result.mean_score_difference = float(player_score.mean_score - player_score.mean_enemy_score)
+        result.rounds = rounds
+
+    def run(self) -> List[ConfigurationResult]:
+        """
+        Run the sweep - successive halving rounds until one configuration is left or all the maps were played
+        :return: The configurations results, best first
+        """
+        self.testers = {}
+        self.results = {}
+        self.battles_run = 0
+        for config_id, parameters in enumerate(self.configurations):
+            player = self.create_player(parameters)
+            self.testers[config_id] = TestBot(
+                player, self.competitors, self.maps, self.always_be_player_1, self.raise_bot_exceptions,
+                seed=self.seed
+            )
+            self.results[config_id] = ConfigurationResult(
+                config_id=config_id, player_name=player.NAME, parameters=parameters, battle_count=0, points=0.0,
+                win_rate=0.0, mean_score_difference=0.0, rounds=0, eliminated_in_round=None
+            )
+
+        alive = list(self.results.keys())
+        for round_number, map_indexes in enumerate(self._get_round_maps(), start=1):
+            battles = [
+                (config_id, battle, seed)
+                for config_id in alive
+                for battle, seed in self._get_battles(self.testers[config_id].player, map_indexes)
+            ]
+            print(f"sweep round {round_number}: {len(alive)} configurations, {len(battles)} battles")
+            battle_results = run_battles_in_parallel(
+                [battle for _, battle, _ in battles], self.raise_bot_exceptions, self.max_workers, self.battle_cache,
+                seeds=[seed for _, _, seed in battles], adjudication_rules=self.adjudication_rules,
+                resource_limits=self.resource_limits, sampling_interval=self.sampling_interval
+            )
+            self.battles_run += len(battle_results)
+            for (config_id, _, _), battle_result in zip(battles, battle_results):
+                self.testers[config_id].add_battle_result(battle_result)
+            for config_id in alive:
+                self._update_result(config_id, round_number)
+
+            if len(alive) == 1:
+                break
+            alive.sort(key=lambda config_id: self._get_rank_key(self.results[config_id]))
+            keep = max(1, math.ceil(len(alive) / self.eta))
+            for config_id in alive[keep:]:
+                self.results[config_id].eliminated_in_round = round_number
+            alive = alive[:keep]
+            if len(alive) == 1:
+                break
+
+        return self.get_results()
+
+    @staticmethod
+    def _get_rank_key(result: ConfigurationResult) -> tuple:
+        return -result.rounds, -result.win_rate, -result.mean_score_difference, result.config_id
+
+    def get_results(self) -> List[ConfigurationResult]:
+        """
+        :return: The configurations results, best first - by the number of rounds played, then by win rate
+        """
+        assert len(self.results) > 0, "first run the sweep"
+        return sorted(self.results.values(), key=self._get_rank_key)
+
+    def get_best_parameters(self) -> Dict[str, Any]:
+        """
+        :return: The parameters of the best configuration
+        """
+        return self.get_results()[0].parameters
+
+    def get_battles_in_full_grid(self) -> int:
+        """
+        :return: The number of battles running all the configurations on all the maps would take
+        """
+        sides = 1 if self.always_be_player_1 else 2
+        return len(self.configurations) * len(self.maps) * len(self.competitors) * sides
+
+    def get_results_data_frame(self):
+        """
+        :return: Data frame with a row for each configuration (best first) and a column for each parameter,
+                 see ConfigurationResult doc
+        """
+        import pandas as pd
+
+        rows = []
+        for result in self.get_results():
+            row = {"config_id": result.config_id, "player_name": result.player_name}
+            row.update(result.parameters)
+            row.update({
+                "battle_count": result.battle_count,
+                "points": result.points,
+                "win_rate": result.win_rate,
+                "mean_score_difference": result.mean_score_difference,
+                "rounds": result.rounds,
+                "eliminated_in_round": result.eliminated_in_round,
+            })
+            rows.append(row)
+        return pd.DataFrame(rows).set_index("config_id")
+
+
+if __name__ == "__main__":
+    import contextlib
+    import io
+
+    from planet_wars.battles.tournament import get_map_by_id
+    from planet_wars.player_bots.baseline_code.baseline_bot import (
+        AttackWeakestPlanetFromStrongestBot, AttackEnemyWeakestPlanetFromStrongestBot,
+        AttackWeakestPlanetFromStrongestSmarterNumOfShipsBot
+    )
+
+    sweep = ParameterSweep(
+        player_factory=AttackWeakestPlanetFromStrongestSmarterNumOfShipsBot,
+        parameter_space={"neutral_margin": [0, 1, 5, 10], "enemy_fraction": [0.5, 0.6, 0.75, 0.9]},
+        competitors=[AttackWeakestPlanetFromStrongestBot(), AttackEnemyWeakestPlanetFromStrongestBot()],
+        maps=[get_map_by_id(map_id) for map_id in range(1, 31)],
+        seed=0
+    )
+    with contextlib.redirect_stdout(io.StringIO()):
+        sweep.run()
+    print(sweep.get_results_data_frame().drop(columns="player_name").to_string())
+    print(f"{sweep.battles_run} battles run, a full grid is {sweep.get_battles_in_full_grid()} battles")
+    print(f"best parameters: {sweep.get_best_parameters()}")
@@ -0,0 +1,177 @@
+import math
+from collections import defaultdict
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from planet_wars.battles.battle_cache import BattleCache
+from planet_wars.battles.tournament import Tournament, BattleResult, PlayerScore
+from planet_wars.engine.adjudication import AdjudicationRule
+from planet_wars.engine.resource_limits import ResourceLimits
+from planet_wars.planet_wars import Player
+
+
+class SwissTournament(Tournament):
+    """
+    Swiss-system tournament - a fair ranking of a large number of players in O(log(players)) rounds.
+
+    In each round the players are sorted by their current points and paired with a close player they didn't fight
+    yet, a rematch only if the greedy pairing can't avoid it. Each pair battles on all the maps, on both sides, and all
+    the battles of the round run in parallel.
+    With an odd number of players the lowest ranked player that didn't get a bye yet gets a bye: it sits out the round
+    and gets half of the round points (as if all its battles ended in a tie).
+
+    The final ranking is by points (including byes), ties are broken by the Buchholz score - the sum of the points of
+    the player's opponents.
+    """
+
+    def __init__(
+            self,
+            players: List[Player],
+            maps: List[str],
+            raise_bot_exceptions: bool = False,
+            rounds: Optional[int] = None,
+            max_workers: Optional[int] = None,
+            battle_cache: Optional[BattleCache] = None,
+            seed: Optional[int] = None,
+            adjudication_rules: Optional[Sequence[AdjudicationRule]] = None,
+            resource_limits: Optional[ResourceLimits] = None,
+            sampling_interval: Optional[float] = None
+    ):
+        """
+        :param players: List of players
+        :param maps: List of maps, each pair battles on all the maps in each round
+        :param raise_bot_exceptions: If False catch exceptions from the player bots
+        :param rounds: Number of rounds, None means ceil(log2(number of players))
+        :param max_workers: Number of worker processes, None uses the number of CPUs, 0 runs the battles in this process
+        :param battle_cache: If given, battles between deterministic bots are taken from the cache when possible
+        :param seed: The tournament seed, see Tournament
+        :param adjudication_rules: Rules that end decided battles early, see planet_wars.engine.adjudication
+        :param resource_limits: Limits of the bots turns, see planet_wars.engine.resource_limits
+        :param sampling_interval: If given, the bots turns are profiled, see Tournament
+        """
+        super().__init__(
+            players, maps, raise_bot_exceptions, battle_cache=battle_cache, seed=seed,
+            adjudication_rules=adjudication_rules, resource_limits=resource_limits, sampling_interval=sampling_interval
+        )
+        self.rounds = rounds if rounds is not None else max(1, math.ceil(math.log2(len(players))))
+        self.max_workers = max_workers
+        self.points: Dict[int, float] = {}
+        self.opponents: Dict[int, Set[int]] = {}
+        self.byes: Dict[int, int] = {}
+        self.round_pairs: List[List[Tuple[str, str]]] = []
+
+    def _standings(self) -> List[int]:
+        """
+        :return: The players indexes, sorted by points and Buchholz score
+        """
+        return sorted(range(len(self.players)), key=lambda i: (self.points[i], self._buchholz(i)), reverse=True)
+
+    def _buchholz(self, player_index: int) -> float:
+        return sum(self.points[opponent] for opponent in self.opponents[player_index])
+
+    def _pair(self, standings: List[int]) -> List[Tuple[int, int]]:
+        """
+        Pair the players greedily: each player, from the best, with the highest ranked unpaired player it didn't fight
+        yet - a close player, as the standings are sorted by points. If it fought all the unpaired players it gets a
+        rematch with the highest ranked of them, then the rematch is swapped with the players of the lowest ranked pair
+        that can be re-paired without rematches, if there is one.
+        O(players^2) per rematch, unlike a search over all the pairings.
+        :param standings: The players to pair, best first (even number of players)
+        :return: The pairs
+        """
+        pairs = []
+        unpaired = list(standings)
+        while unpaired:
+            player = unpaired.pop(0)
+            opponent = next((i for i in unpaired if i not in self.opponents[player]), unpaired[0])
+            unpaired.remove(opponent)
+            pairs.append((player, opponent))
+
+        for index, (player, opponent) in enumerate(pairs):
+            if opponent in self.opponents[player]:
+                self._swap_rematch(pairs, index)
+        return pairs
+
+    def _swap_rematch(self, pairs: List[Tuple[int, int]], index: int):
+        """
+        Swap the players of the rematch pairs[index] with the players of the lowest ranked pair that can be re-paired
+        with them without rematches, if there is one
+        """
+        player, opponent = pairs[index]
+        for other_index in reversed(range(len(pairs))):
+            if other_index == index:
+                continue
+            other_player, other_opponent = pairs[other_index]
+            for swapped in (((player, other_player), (other_opponent, opponent)),
+                            ((player, other_opponent), (other_player, opponent))):
+                if all(j not in self.opponents[i] for i, j in swapped):
+                    pairs[index], pairs[other_index] = swapped
+                    return
+
+    def _get_round_pairs(self) -> List[Tuple[int, int]]:
+        """
+        Choose the bye (if needed) and the pairs of the next round
+        """
+        standings = self._standings()
+        if len(standings) % 2 == 1:
+            bye = min(reversed(standings), key=lambda i: self.byes[i])
+            self.byes[bye] += 1
+            self.points[bye] += len(self.maps)
+            standings.remove(bye)
+        return self._pair(standings)
+
+    def _update_points(self, battle_result: BattleResult, player1_index: int, player2_index: int):
+        if battle_result.winner == 1:
+            self.points[player1_index] += 1
+        elif battle_result.winner == 2:
+            self.points[player2_index] += 1
+        elif battle_result.winner == 0:
+            self.points[player1_index] += 0.5
+            self.points[player2_index] += 0.5
+
+    def run_tournament(self) -> List[BattleResult]:
+        """
+        Run the Swiss rounds.
+        :return: The battle results
+        """
+        self.battle_results = []
+        self.points = {i: 0.0 for i in range(len(self.players))}
+        self.opponents = defaultdict(set)
+        self.byes = {i: 0 for i in range(len(self.players))}
+        self.round_pairs = []
+
+        for round_number in range(1, self.rounds + 1):
+            pairs = self._get_round_pairs()
+            self.round_pairs.append(
+                [(self._get_player_name(self.players[i]), self._get_player_name(self.players[j])) for i, j in pairs]
+            )
+            print(f"Round {round_number}\n" + "\t".join(f"{p1}-{p2}" for p1, p2 in self.round_pairs[-1]))
+
+            battles = []
+            battle_players = []
+            for i, j in pairs:
+                self.opponents[i].add(j)
+                self.opponents[j].add(i)
+                for map_str in self.maps:
+                    battles.append((map_str, self.players[i], self.players[j]))
+                    battle_players.append((i, j))
+                    battles.append((map_str, self.players[j], self.players[i]))
+                    battle_players.append((j, i))
+
+            battle_results = self.run_battles_in_parallel(battles, self.max_workers)
+            for battle_result, (player1_index, player2_index) in zip(battle_results, battle_players):
+                self._update_points(battle_result, player1_index, player2_index)
+
+        return self.battle_results
+
+    def get_player_scores(self) -> List[PlayerScore]:
+        """
+        :return: List of all players scores, ranked by the Swiss standings.
+        Note: points include the byes points.
+        """
+        player_scores = []
+        for rank, player_index in enumerate(self._standings()):
+            player_score = self.get_player_score_object(self._get_player_name(self.players[player_index]))
+            player_score.points = self.points[player_index]
+            player_score.rank = rank + 1
+            player_scores.append(player_score)
+        return player_scores
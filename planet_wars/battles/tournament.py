@@ -1,16 +1,23 @@
 import os
 import random
-import time
-from typing import List, Optional
-
-import pandas as pd
+import subprocess
+from typing import Dict, List, Optional, Sequence, Tuple, TYPE_CHECKING
 
 from dataclasses import dataclass
 
 from planet_wars import PLANET_WARS_MODULE_PATH
+from planet_wars.battles.battle_cache import BattleCache, is_cacheable
+from planet_wars.engine.adjudication import AdjudicationRule
 from planet_wars.engine.game_logic import GameManager
+from planet_wars.engine.resource_limits import BotResourceUsage, ResourceLimits
+from planet_wars.engine.sampling_profiler import BotProfile, SamplingProfiler
+from planet_wars.engine.seeding import derive_seed, new_seed, seeded_global_random
 from planet_wars.planet_wars import Player, PlanetWars, list_to_data_frame
 
+if TYPE_CHECKING:
+    # The data frame reports load pandas lazily (in list_to_data_frame), the battles don't need it
+    import pandas as pd
+
 
 @dataclass
 class BattleResult:
@@ -27,6 +34,18 @@ class BattleResult:
     turns: int  # How many turns the battle occurred
     description_for_display: str  # String representation of the battle for display
     end_game_object: PlanetWars  # The PlanetWars object after the game ended
+    seed: Optional[int] = None  # The battle seed - rerun the battle with it to reproduce it, see engine.seeding
+    # All the players names and scores by player number (player k in place k - 1), free-for-all battles have more
+    # than 2 players - the player_1 and player_2 fields are the first 2 seats
+    player_names: Optional[List[str]] = None
+    player_scores: Optional[List[int]] = None
+    adjudicated_turn: Optional[int] = None  # The turn the battle was ended early in as decided, None if played out
+    adjudication_reason: Optional[str] = None  # Why the battle was decided, see engine.adjudication
+    # The resources each player's bot used, by player number (player k in place k - 1), see engine.resource_limits
+    resource_usage: Optional[List[BotResourceUsage]] = None
+    # The sampled stacks of each player's bot, by player number, if the battle was profiled. See
+    # engine.sampling_profiler
+    bot_profiles: Optional[List[BotProfile]] = None
 
 
 @dataclass
@@ -49,6 +68,12 @@ class PlayerScore:
     all_units_died: int  # How many games ended with the enemy killing all the player ships
     wins_as_player_1: int  # how many times the player won as player 1
     wins_as_player_2: int   # How many times the player won as player 2
+    bot_turns: int  # How many turns the player's bot played in all battles
+    total_cpu_time: float  # The CPU seconds of the player's bot in all battles
+    mean_turn_cpu_time: float  # The mean CPU seconds of a turn
+    max_turn_cpu_time: float  # The CPU seconds of the slowest turn
+    peak_turn_memory: int  # The most memory allocated in a turn in bytes (0 if not tracked, see ResourceLimits)
+    resource_limit_forfeits: int  # How many battles the player forfeited by going over the resource limits
 
 
 class Tournament:
@@ -72,7 +97,12 @@ class Tournament:
             players: List[Player],
             maps: List[str],
             raise_bot_exceptions: bool=False,
-            all_against_all: bool = True
+            all_against_all: bool = True,
+            battle_cache: Optional[BattleCache] = None,
+            seed: Optional[int] = None,
+            adjudication_rules: Optional[Sequence[AdjudicationRule]] = None,
+            resource_limits: Optional[ResourceLimits] = None,
+            sampling_interval: Optional[float] = None
     ):
         """
         Battles will be between each player in each map.
@@ -81,6 +111,13 @@ class Tournament:
         :param maps: List of maps
         :param raise_bot_exceptions: If False catch exceptions from the player bots
         :param all_against_all: If True all bots play against all bots
+        :param battle_cache: If given, battles between deterministic bots are taken from the cache when possible
+        :param seed: The tournament seed, all the battles and bots random streams are derived from it.
+                     None uses a random seed (see self.seed). Running with the same seed gives the same results.
+        :param adjudication_rules: Rules that end decided battles early, see planet_wars.engine.adjudication
+        :param resource_limits: Limits of the bots turns, see planet_wars.engine.resource_limits
+        :param sampling_interval: If given, the bots turns are profiled by sampling their stacks every sampling_interval
+                                  seconds, see get_hotspots_data_frame and planet_wars.engine.sampling_profiler
         """
         assert len(players) >= 2, "tournament needs at least 2 players"
         assert len(maps) >= 1, "tournament needs at least 1 map"
@@ -90,6 +127,27 @@ class Tournament:
         self.battle_results = []
         self.last_battle_id = 0
         self.all_against_all = all_against_all
+        self.battle_cache = battle_cache
+        self.seed = seed if seed is not None else new_seed()
+        self.rng = random.Random(derive_seed(self.seed, "tournament"))
+        self.last_battle_seed_index = 0
+        self.adjudication_rules = tuple(adjudication_rules or ())
+        self.resource_limits = resource_limits
+        self.sampling_interval = sampling_interval
+
+    def next_battle_seed(self) -> int:
+        """
+        :return: The seed of the next battle in the tournament schedule
+        """
+        self.last_battle_seed_index += 1
+        return self.get_battle_seed(self.last_battle_seed_index)
+
+    def get_battle_seed(self, battle_seed_index: int) -> int:
+        """
+        :param battle_seed_index: The position of the battle in the tournament schedule, starting from 1
+        :return: The seed of the battle
+        """
+        return derive_seed(self.seed, "battle", battle_seed_index)
 
     def run_tournament(self) -> List[BattleResult]:
         """
@@ -109,7 +167,7 @@ class Tournament:
             else:
                 # Shuffle the players so the pairs are random
                 shuffled_players = self.players.copy()
-                random.shuffle(shuffled_players)
+                self.rng.shuffle(shuffled_players)
                 next_round_players = shuffled_players
 
                 # Some initializations
@@ -180,7 +238,7 @@ class Tournament:
             player_score.rank = rank + 1
         return player_scores
 
-    def get_player_scores_data_frame(self) -> pd.DataFrame:
+    def get_player_scores_data_frame(self) -> "pd.DataFrame":
         """
         :return: Data frame with all the player scores details
         """
@@ -210,10 +268,95 @@ class Tournament:
             killed_all_enemy_units=(df['enemy_score'] == 0).sum(),
             all_units_died=(df["player_score"] == 0).sum(),
             wins_as_player_1=((df["player_number"] == 1) & df["won"]).sum(),
-            wins_as_player_2=((df["player_number"] == 2) & df["won"]).sum()
+            wins_as_player_2=((df["player_number"] == 2) & df["won"]).sum(),
+            bot_turns=df["bot_turns"].sum(),
+            total_cpu_time=df["cpu_time"].sum(),
+            mean_turn_cpu_time=df["cpu_time"].sum() / max(df["bot_turns"].sum(), 1),
+            max_turn_cpu_time=df["max_turn_cpu_time"].max(),
+            peak_turn_memory=df["peak_turn_memory"].max(),
+            resource_limit_forfeits=df["resource_limit_exceeded"].notna().sum()
         )
 
-    def get_extended_battle_results_data_frame_for_player(self, player_name) -> pd.DataFrame:
+    @staticmethod
+    def get_resource_usage(battle_result: BattleResult, player_number: int) -> BotResourceUsage:
+        """
+        :param battle_result: The battle
+        :param player_number: The player number in the battle
+        :return: The resources the player's bot used in the battle (empty usage if the battle has none)
+        """
+        if not battle_result.resource_usage:
+            return BotResourceUsage()
+        return battle_result.resource_usage[player_number - 1]
+
+    def add_resource_usage_columns(self, df: "pd.DataFrame") -> "pd.DataFrame":
+        """
+        Add the player's bot resource usage columns to a data frame of the player battles (indexed by battle_id, with
+        player_number column): 'bot_turns', 'cpu_time', 'max_turn_cpu_time', 'peak_turn_memory' and
+        'resource_limit_exceeded' (the limit the bot went over, None if it didn't)
+        """
+        battle_results = {battle_result.battle_id: battle_result for battle_result in self.battle_results}
+        usages = [
+            self.get_resource_usage(battle_results[battle_id], int(player_number))
+            for battle_id, player_number in zip(df.index, df["player_number"])
+        ]
+        df["bot_turns"] = [usage.turns for usage in usages]
+        df["cpu_time"] = [usage.cpu_time for usage in usages]
+        df["max_turn_cpu_time"] = [usage.max_turn_cpu_time for usage in usages]
+        df["peak_turn_memory"] = [usage.peak_turn_memory for usage in usages]
+        df["resource_limit_exceeded"] = [usage.limit_exceeded for usage in usages]
+        return df
+
+    def get_bot_profiles(self) -> Dict[str, BotProfile]:
+        """
+        :return: player name -> the bot profile merged over all the profiled battles
+        """
+        bot_profiles = {}
+        for battle_result in self.battle_results:
+            if not battle_result.bot_profiles:
+                continue
+            player_names = battle_result.player_names or [battle_result.player_1_name, battle_result.player_2_name]
+            for player_name, bot_profile in zip(player_names, battle_result.bot_profiles):
+                if player_name not in bot_profiles:
+                    bot_profiles[player_name] = BotProfile(bot_profile.interval)
+                bot_profiles[player_name].merge(bot_profile)
+        return bot_profiles
+
+    def get_hotspots_data_frame(self, player_name: Optional[str] = None, top: Optional[int] = None) -> "pd.DataFrame":
+        """
+        Get the hotspots of the bots over all the profiled battles (run with sampling_interval)
+        :param player_name: The bot to get, None gets all the bots
+        :param top: If given, only the top functions (by self samples) of each bot
+        :return: Data frame indexed by player_name and function, see BotProfile.get_hotspots_data_frame
+        """
+        import pandas as pd
+
+        bot_profiles = self.get_bot_profiles()
+        assert len(bot_profiles) > 0, "no profiled battles - run the tournament with sampling_interval"
+        if player_name is not None:
+            bot_profiles = {player_name: bot_profiles[player_name]}
+        hotspots = {}
+        for name, bot_profile in bot_profiles.items():
+            df = bot_profile.get_hotspots_data_frame()
+            hotspots[name] = df.head(top) if top is not None else df
+        return pd.concat(hotspots, names=["player_name", "function"])
+
+    def write_collapsed_stacks(self, directory: str) -> List[str]:
+        """
+        Write the collapsed stacks file of each profiled bot, for flame graph tools
+        :param directory: The directory to write the files in, <player name>.collapsed
+        :return: The written files paths
+        """
+        os.makedirs(directory, exist_ok=True)
+        paths = []
+        for player_name, bot_profile in self.get_bot_profiles().items():
+            path = os.path.join(directory, f"{''.join(c if c.isalnum() or c in '-_.' else '_' for c in player_name)}"
+                                           f".collapsed")
+            with open(path, "w") as f:
+                f.write(bot_profile.get_collapsed_stacks() + "\n")
+            paths.append(path)
+        return paths
+
+    def get_extended_battle_results_data_frame_for_player(self, player_name) -> "pd.DataFrame":
         """
         Get data frame with all the battles fought by the given player. Each battle is a row in the data frame.
         The df is from the player perspective player_score will be the score of the given player and enemy score is
@@ -223,7 +366,8 @@ class Tournament:
             'won' (True if the player won), 'tie' (True if tie), 'lost' (True is the player lost),
             'player_score', 'enemy_score',
             'player_number' (1 is the player was player 1 in this battle or 2 is it was player 2),
-            'finish_state', 'turns'
+            'finish_state', 'turns',
+            and the player's bot resource usage columns, see add_resource_usage_columns
 
         :param player_name: The player to get the battle results for
         :return: Data frame with all the battles fought by the given player
@@ -253,13 +397,15 @@ class Tournament:
         df["won"] = df["player_number"] == df["winner"]
         df["tie"] = df["winner"] == 0
         df["lost"] = (~df["won"] & ~df["tie"])
+        df = self.add_resource_usage_columns(df)
 
         return df[
             ['player_name', 'enemy_name', 'won', 'tie', 'lost', 'player_score', 'enemy_score',
-             'player_number', 'finish_state', 'turns']
+             'player_number', 'finish_state', 'turns', 'bot_turns', 'cpu_time', 'max_turn_cpu_time',
+             'peak_turn_memory', 'resource_limit_exceeded']
         ]
 
-    def get_battle_results_data_frame(self) -> pd.DataFrame:
+    def get_battle_results_data_frame(self) -> "pd.DataFrame":
         """
         Get data frame with all the battles fought in the tournament.
         See BattleResult doc of explanation on the data frame columns.
@@ -270,22 +416,125 @@ class Tournament:
             lst=self.battle_results,
             columns=[
                 "battle_id", "player_1_name", "player_2_name", "winner", "finish_state",
-                "player_1_score", "player_2_score", "turns", "description_for_display"
+                "player_1_score", "player_2_score", "turns", "description_for_display", "seed",
+                "adjudicated_turn", "adjudication_reason"
             ]
         ).set_index("battle_id")
 
-    def run_battle(self, map_str: str, player1: Player, player2: Player) -> BattleResult:
+    def run_battle(self, map_str: str, player1: Player, player2: Player, seed: Optional[int] = None) -> BattleResult:
         """
         Run a battle in the given map between the given player 1 and player 2. Returns the battle results.
         :param map_str: The map to battle in
         :param player1: Player 1 bot
         :param player2: Player 2 bot
+        :param seed: The battle seed, None takes the next seed of the tournament
         :return: The BattleResult
         """
+        if seed is None:
+            seed = self.next_battle_seed()
+        cache_key = None
+        # Resource limits depend on the host load, so battles with limits are not cached. Profiled battles are run to
+        # get their profiles
+        if (self.battle_cache is not None and self.resource_limits is None and self.sampling_interval is None and
+                is_cacheable(player1, player2, seed)):
+            cache_key = self.battle_cache.get_battle_key(map_str, player1, player2, seed, self.adjudication_rules)
+            battle_result = self.battle_cache.get(cache_key)
+            if battle_result is not None:
+                self.last_battle_id += 1
+                battle_result.battle_id = self.last_battle_id
+                battle_result.seed = seed
+                return battle_result
+
         print(f"run battle between {self._get_player_name(player1)} and {self._get_player_name(player2)}")
-        game_manager = GameManager(map_str, player1, player2, self.raise_bot_exceptions)
-        finish_state = game_manager.run_game()
+        profiler = SamplingProfiler(self.sampling_interval) if self.sampling_interval is not None else None
+        game_manager = GameManager(
+            map_str, player1, player2, self.raise_bot_exceptions, seed=seed, adjudication_rules=self.adjudication_rules,
+            resource_limits=self.resource_limits, profiler=profiler
+        )
+        try:
+            with seeded_global_random(seed):
+                finish_state = game_manager.run_game()
+        finally:
+            if profiler is not None:
+                profiler.stop()
+        battle_result = self.create_battle_result(game_manager, finish_state)
+        if cache_key is not None:
+            self.battle_cache.put(cache_key, battle_result)
+        return battle_result
+
+    def run_battles_concurrently(
+            self, battles: List[Tuple[str, Player, Player]], max_concurrent_battles: int = 100
+    ) -> List[BattleResult]:
+        """
+        Run the given battles concurrently on one asyncio event loop. Useful when some of the players are
+        RemotePlayer bots - while one battle waits for a remote bot the other battles keep playing.
+        See planet_wars.engine.async_game_logic for more details.
+        The battles share the global random module, so only bots using game.rng are reproducible here.
+
+        :param battles: List of (map_str, player1, player2) tuples
+        :param max_concurrent_battles: The max number of battles running at the same time
+        :return: The BattleResults, in the same order as the given battles
+        """
+        import asyncio
+        from planet_wars.engine.async_game_logic import AsyncGameManager, run_games
+
+        game_managers = [
+            AsyncGameManager(
+                map_str, player1, player2, self.raise_bot_exceptions, seed=self.next_battle_seed(),
+                adjudication_rules=self.adjudication_rules, resource_limits=self.resource_limits
+            )
+            for map_str, player1, player2 in battles
+        ]
+        finish_states = asyncio.run(run_games(game_managers, max_concurrent_games=max_concurrent_battles))
+        battle_results = [
+            self.create_battle_result(game_manager, finish_state)
+            for game_manager, finish_state in zip(game_managers, finish_states)
+        ]
+        self.battle_results.extend(battle_results)
+        return battle_results
 
+    def run_battles_in_parallel(
+            self, battles: List[Tuple[str, Player, Player]], max_workers: Optional[int] = None
+    ) -> List[BattleResult]:
+        """
+        Run the given battles on a process pool, see planet_wars.battles.parallel for more details.
+
+        :param battles: List of (map_str, player1, player2) tuples
+        :param max_workers: Number of worker processes, None uses the number of CPUs, 0 runs the battles in this process
+        :return: The BattleResults, in the same order as the given battles
+        """
+        from planet_wars.battles.parallel import run_battles_in_parallel
+
+        # The seeds are taken here in the battles order, so the results don't depend on the workers scheduling
+        seeds = [self.next_battle_seed() for _ in battles]
+        battle_results = run_battles_in_parallel(
+            battles, self.raise_bot_exceptions, max_workers, self.battle_cache, seeds=seeds,
+            adjudication_rules=self.adjudication_rules, resource_limits=self.resource_limits,
+            sampling_interval=self.sampling_interval
+        )
+        for battle_result in battle_results:
+            self.add_battle_result(battle_result)
+        return battle_results
+
+    def add_battle_result(self, battle_result: BattleResult):
+        """
+        Add battle that was run outside of the tournament (for example in worker process) to the battle results.
+        The battle gets a new battle_id.
+        :param battle_result: The battle result to add
+        """
+        self.last_battle_id += 1
+        battle_result.battle_id = self.last_battle_id
+        self.battle_results.append(battle_result)
+
+    def create_battle_result(self, game_manager: GameManager, finish_state: str) -> BattleResult:
+        """
+        Create the BattleResult of a battle that ended.
+        :param game_manager: The GameManager that ran the battle
+        :param finish_state: The battle finish state
+        :return: The BattleResult
+        """
+        player1 = game_manager.player_1
+        player2 = game_manager.player_2
         winner = None
         if finish_state == GameManager.PLAYER_1_WIN_STATE:
             winner = 1
@@ -295,49 +544,71 @@ class Tournament:
             winner = 0
 
         self.last_battle_id += 1
+        player_1_score = game_manager.get_player_score(player_num=1)
+        player_2_score = game_manager.get_player_score(player_num=2)
         return BattleResult(
             battle_id=self.last_battle_id,
             finish_state=finish_state,
             winner=winner,
             player_1_name=self._get_player_name(player1),
             player_2_name=self._get_player_name(player2),
-            player_1_score=game_manager.get_player_score(player_num=1),
-            player_2_score=game_manager.get_player_score(player_num=2),
+            player_1_score=player_1_score,
+            player_2_score=player_2_score,
             turns=game_manager.turns,
             description_for_display=game_manager.get_description_for_display(),
-            end_game_object=game_manager.game
+            end_game_object=game_manager.game,
+            seed=game_manager.seed,
+            player_names=[self._get_player_name(player1), self._get_player_name(player2)],
+            player_scores=[player_1_score, player_2_score],
+            adjudicated_turn=game_manager.adjudicated_turn,
+            adjudication_reason=game_manager.adjudication_reason,
+            resource_usage=[game_manager.resource_usage[player_num] for player_num in (1, 2)],
+            bot_profiles=self.get_battle_bot_profiles(game_manager, 2)
         )
 
+    @staticmethod
+    def get_battle_bot_profiles(game_manager: GameManager, num_players: int) -> Optional[List[BotProfile]]:
+        """
+        :return: The bot profile of each player (by player number) if the game manager has a profiler, else None
+        """
+        profiler = game_manager.profiler
+        if profiler is None:
+            return None
+        return [profiler.profiles.get(player_num, BotProfile(profiler.interval)) for player_num in
+                range(1, num_players + 1)]
+
     def view_battle(self, battle_id: int):
         """
-        Open the java viewer to view in cool GUI the given battle.
+        Open the java viewer to view in cool GUI the given battle and wait for its window to close.
         see view_battle_given_battle_description function doc
         :param battle_id: The id of the battle to view
         """
         battle = [b for b in self.battle_results if b.battle_id == battle_id][0]
-        self.view_battle_given_battle_description(battle.description_for_display)
+        self.view_battle_given_battle_description(battle.description_for_display).wait()
 
     @staticmethod
-    def view_battle_given_battle_description(battle_description_for_display: str):
+    def view_battle_given_battle_description(battle_description_for_display: str) -> subprocess.Popen:
         """
         Open the java viewer to view in cool GUI the given battle.
         Note: The viewer can only open one battle at a time - so before viewing new battle close the window of the
         previous one.
         Requirements: Java should be installed on your device.
+        The battle is piped to the viewer stdin, so there is no limit on the battle size. This function returns once
+        the whole battle was written, without waiting for the viewer window to close (view_battle waits for it).
+        For headless servers see planet_wars.replays (replay server and renderer).
 
         :param battle_description_for_display: String representation of the battle for display
+        :return: The viewer process
         """
         view_path = os.path.join(PLANET_WARS_MODULE_PATH, "viewer", "ShowGame.jar")
-        # in windows we need to save the battle to file because there is limit to the cmd command length of 8161 chars
-        if os.name == "nt":
-            battle_file_path = os.path.join(PLANET_WARS_MODULE_PATH, "tmp", f"battle_{time.time()}.txt")
-            with open(battle_file_path, "w") as f:
-                f.write(battle_description_for_display)
-            command = f'type {battle_file_path} | java -jar {view_path}'
-        else:
-            command = f'echo "{battle_description_for_display}" | java -jar {view_path}'
-        print(command)
-        os.system(command)
+        viewer = subprocess.Popen(["java", "-jar", view_path], stdin=subprocess.PIPE)
+
+        try:
+            viewer.stdin.write(battle_description_for_display.encode())
+            viewer.stdin.close()
+        except OSError:
+            pass  # The viewer was closed before reading the whole battle
+        return viewer
 
 
 class TestBot(Tournament):
@@ -354,7 +625,12 @@ class TestBot(Tournament):
             competitors: List[Player],
             maps: List[str],
             always_be_player_1: bool = False,
-            raise_bot_exceptions: bool = True
+            raise_bot_exceptions: bool = True,
+            battle_cache: Optional[BattleCache] = None,
+            seed: Optional[int] = None,
+            adjudication_rules: Optional[Sequence[AdjudicationRule]] = None,
+            resource_limits: Optional[ResourceLimits] = None,
+            sampling_interval: Optional[float] = None
     ):
         """
         Battle will run between the given player and all other competitors on all the given maps
@@ -364,12 +640,20 @@ class TestBot(Tournament):
         :param always_be_player_1: If True the given player will always be player 1 in all battle, if False
                                    will run 2 battle in each map against each bot - changing sides between the battles.
         :param raise_bot_exceptions: If False catch exceptions from the player bots
+        :param battle_cache: If given, battles between deterministic bots are taken from the cache when possible
+        :param seed: The test seed, see Tournament
+        :param adjudication_rules: Rules that end decided battles early, see planet_wars.engine.adjudication
+        :param resource_limits: Limits of the bots turns, see planet_wars.engine.resource_limits
+        :param sampling_interval: If given, the bots turns are profiled, see Tournament
         """
         assert len(maps) >= 1, "tournament needs at least 1 map"
         self.player = player
         self.competitors = competitors
         self.always_be_player_1 = always_be_player_1
-        super().__init__(competitors + [player], maps, raise_bot_exceptions)
+        super().__init__(
+            competitors + [player], maps, raise_bot_exceptions, battle_cache=battle_cache, seed=seed,
+            adjudication_rules=adjudication_rules, resource_limits=resource_limits, sampling_interval=sampling_interval
+        )
 
     def run_tournament(self) -> List[BattleResult]:
         """
@@ -388,7 +672,7 @@ class TestBot(Tournament):
                     )
         return self.battle_results
 
-    def get_testing_results_data_frame(self) -> pd.DataFrame:
+    def get_testing_results_data_frame(self) -> "pd.DataFrame":
         """
         :return: Data frame with all the battles fought by the player you test
         """
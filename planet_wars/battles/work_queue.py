@@ -0,0 +1,437 @@
+"""
+Run a tournament on many hosts through a durable work queue in an SQLite file - no external service, only a
+filesystem shared by the hosts.
+
+The coordinator puts the battles of the schedule in the queue, workers (any number, on any host that sees the file)
+claim battles, play them and store the BattleResults, and the coordinator merges the results into the tournament as
+they arrive, so all the tournament data frames work as usual.
+A claim is a lease: a worker renews it while the battle runs, and if the worker crashes the lease expires and another
+worker retries the battle. A battle that failed max_attempts times is given up.
+Restarting the coordinator with the same queue file resumes the tournament - finished battles are not run again.
+
+The players are pickled into the queue, so the workers must be able to import the bots' code.
+The queue uses the SQLite rollback journal (not WAL), which works on network filesystems with working file locks.
+
+Usage:
+    # coordinator
+    tournament = DistributedTournament(players, maps, queue_path="/shared/nightly.sqlite", local_workers=4)
+    tournament.run_tournament()
+    print(tournament.get_player_scores_data_frame())
+    # on each other host
+    python -m planet_wars.battles.work_queue worker /shared/nightly.sqlite
+"""
+import os
+import pickle
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+from multiprocessing import Process
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from planet_wars.battles.battle_cache import BattleCache
+from planet_wars.battles.parallel import play_battle
+from planet_wars.battles.tournament import Tournament, BattleResult
+from planet_wars.engine.adjudication import AdjudicationRule
+from planet_wars.engine.resource_limits import ResourceLimits
+from planet_wars.planet_wars import Player
+
+PENDING = "pending"
+CLAIMED = "claimed"
+DONE = "done"
+FAILED = "failed"
+
+
+def get_worker_id() -> str:
+    """
+    :return: A unique id of this worker process
+    """
+    return f"{socket.gethostname()}-{os.getpid()}-{threading.get_ident()}"
+
+
+class WorkQueue:
+    """
+    Battles work queue in an SQLite file, with leased claims.
+    Safe to share between processes and hosts (each process opens its own connection).
+    """
+
+    def __init__(self, path: str, lease_seconds: float = 600.0, max_attempts: int = 3):
+        """
+        :param path: The SQLite file path
+        :param lease_seconds: How long a claim lasts without renewal, a battle whose claim expired is retried
+        :param max_attempts: How many times a battle is tried before it is given up
+        """
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._connection = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_connection"] = None
+        return state
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS battles ("
+                "battle_index INTEGER PRIMARY KEY, payload BLOB NOT NULL, state TEXT NOT NULL, worker TEXT, "
+                "lease_expires REAL, attempts INTEGER NOT NULL DEFAULT 0, result BLOB, error TEXT, finished REAL)"
+            )
+            self._connection.execute("CREATE INDEX IF NOT EXISTS battles_state ON battles (state, battle_index)")
+        return self._connection
+
+    def _transaction(self, func: Callable[[sqlite3.Connection], object]):
+        """
+        Run func in a write transaction - taking the write lock first, so claims of different workers don't race
+        """
+        connection = self.connection
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            result = func(connection)
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+        return result
+
+    def put_battles(
+            self,
+            battles: List[Tuple[str, Player, Player]],
+            seeds: List[Optional[int]],
+            raise_bot_exceptions: bool = False,
+            battle_cache: Optional[BattleCache] = None,
+            adjudication_rules: Optional[Sequence[AdjudicationRule]] = None,
+            resource_limits: Optional[ResourceLimits] = None,
+            sampling_interval: Optional[float] = None
+    ):
+        """
+        Add the battles to the queue, battle k gets battle_index k. Does nothing if the queue already has the battles
+        (a restarted coordinator resumes).
+        :param battles: List of (map_str, player1, player2) tuples
+        :param seeds: The seed of each battle
+        Other parameters are passed to play_battle, see planet_wars.battles.parallel.play_battle
+        """
+        def put(connection: sqlite3.Connection):
+            count = connection.execute("SELECT COUNT(*) FROM battles").fetchone()[0]
+            if count > 0:
+                assert count == len(battles), f"the queue has {count} battles, not the {len(battles)} battles given"
+                return
+            connection.executemany(
+                "INSERT INTO battles (battle_index, payload, state) VALUES (?, ?, ?)",
+                (
+                    (battle_index, pickle.dumps(
+                        (map_str, player1, player2, raise_bot_exceptions, battle_cache, seed, adjudication_rules,
+                         resource_limits, sampling_interval),
+                        protocol=pickle.HIGHEST_PROTOCOL
+                    ), PENDING)
+                    for battle_index, ((map_str, player1, player2), seed) in enumerate(zip(battles, seeds))
+                )
+            )
+        self._transaction(put)
+
+    def claim(self, worker_id: str) -> Optional[Tuple[int, tuple]]:
+        """
+        Claim the first pending battle (or a battle whose lease expired)
+        :param worker_id: The claiming worker
+        :return: (battle_index, play_battle arguments), None if there is no battle to claim
+        """
+        def claim(connection: sqlite3.Connection):
+            now = time.time()
+            row = connection.execute(
+                "SELECT battle_index, payload FROM battles "
+                "WHERE (state = ? OR (state = ? AND lease_expires < ?)) AND attempts < ? "
+                "ORDER BY battle_index LIMIT 1",
+                (PENDING, CLAIMED, now, self.max_attempts)
+            ).fetchone()
+            if row is None:
+                self._give_up_expired(connection, now)
+                return None
+            connection.execute(
+                "UPDATE battles SET state = ?, worker = ?, lease_expires = ?, attempts = attempts + 1 "
+                "WHERE battle_index = ?",
+                (CLAIMED, worker_id, now + self.lease_seconds, row[0])
+            )
+            return row
+        row = self._transaction(claim)
+        if row is None:
+            return None
+        return row[0], pickle.loads(row[1])
+
+    def _give_up_expired(self, connection: sqlite3.Connection, now: float):
+        """
+        Give up the battles whose lease expired on their last attempt
+        """
+        connection.execute(
+            "UPDATE battles SET state = ?, error = 'lease expired' "
+            "WHERE state = ? AND lease_expires < ? AND attempts >= ?",
+            (FAILED, CLAIMED, now, self.max_attempts)
+        )
+
+    def give_up_expired(self):
+        """
+        Give up the battles whose lease expired on their last attempt (their worker crashed every attempt)
+        """
+        self._transaction(lambda connection: self._give_up_expired(connection, time.time()))
+
+    def renew_lease(self, battle_index: int, worker_id: str) -> bool:
+        """
+        :return: False if the worker doesn't hold the battle's claim anymore
+        """
+        cursor = self.connection.execute(
+            "UPDATE battles SET lease_expires = ? WHERE battle_index = ? AND state = ? AND worker = ?",
+            (time.time() + self.lease_seconds, battle_index, CLAIMED, worker_id)
+        )
+        return cursor.rowcount == 1
+
+    def complete(self, battle_index: int, worker_id: str, battle_result: BattleResult):
+        """
+        Store the battle result. If the battle was already completed by another worker the result is dropped.
+        """
+        self.connection.execute(
+            "UPDATE battles SET state = ?, worker = ?, result = ?, finished = ? WHERE battle_index = ? AND state != ?",
+            (DONE, worker_id, pickle.dumps(battle_result, protocol=pickle.HIGHEST_PROTOCOL), time.time(),
+             battle_index, DONE)
+        )
+
+    def fail(self, battle_index: int, worker_id: str, error: str):
+        """
+        Release the battle after an error - it is retried, or given up if it failed max_attempts times
+        """
+        self.connection.execute(
+            "UPDATE battles SET state = CASE WHEN attempts >= ? THEN ? ELSE ? END, error = ?, lease_expires = NULL "
+            "WHERE battle_index = ? AND state = ? AND worker = ?",
+            (self.max_attempts, FAILED, PENDING, error, battle_index, CLAIMED, worker_id)
+        )
+
+    def get_progress(self) -> Dict[str, int]:
+        """
+        :return: state -> number of battles
+        """
+        progress = {PENDING: 0, CLAIMED: 0, DONE: 0, FAILED: 0}
+        for state, count in self.connection.execute("SELECT state, COUNT(*) FROM battles GROUP BY state"):
+            progress[state] = count
+        return progress
+
+    def get_finished(self, exclude: Sequence[int] = ()) -> List[Tuple[int, str, Optional[BattleResult], str]]:
+        """
+        :param exclude: battle indexes the caller already has
+        :return: (battle_index, state, battle result or None, error) of the done and failed battles
+        """
+        excluded = set(exclude)
+        finished = []
+        for battle_index, state, result, error in self.connection.execute(
+                "SELECT battle_index, state, result, error FROM battles WHERE state IN (?, ?) ORDER BY battle_index",
+                (DONE, FAILED)
+        ):
+            if battle_index not in excluded:
+                finished.append((battle_index, state, pickle.loads(result) if result is not None else None, error))
+        return finished
+
+
+def run_worker(
+        queue_path: str,
+        exit_when_empty: bool = True,
+        poll_interval: float = 1.0,
+        lease_seconds: float = 600.0,
+        max_attempts: int = 3
+) -> int:
+    """
+    Claim battles from the queue, play them and store the results
+    :param queue_path: The queue SQLite file
+    :param exit_when_empty: If True return when there are no battles left to claim, otherwise keep polling
+    :param poll_interval: Seconds to wait between claims when the queue is empty
+    :param lease_seconds: See WorkQueue
+    :param max_attempts: See WorkQueue
+    :return: The number of battles played
+    """
+    queue = WorkQueue(queue_path, lease_seconds, max_attempts)
+    worker_id = get_worker_id()
+    played = 0
+    while True:
+        claimed = queue.claim(worker_id)
+        if claimed is None:
+            progress = queue.get_progress()
+            if exit_when_empty and progress[PENDING] == 0 and progress[CLAIMED] == 0:
+                return played
+            time.sleep(poll_interval)
+            continue
+
+        battle_index, arguments = claimed
+        # Renew the lease from another thread (with its own connection) while the battle runs
+        battle_finished = threading.Event()
+
+        def renew_lease():
+            heartbeat_queue = WorkQueue(queue_path, lease_seconds, max_attempts)
+            while not battle_finished.wait(lease_seconds / 3):
+                heartbeat_queue.renew_lease(battle_index, worker_id)
+
+        heartbeat = threading.Thread(target=renew_lease, daemon=True)
+        heartbeat.start()
+        try:
+            battle_result = play_battle(*arguments)
+        except Exception as e:
+            print(f"battle {battle_index} failed: {e.__class__.__name__}: {e}")
+            queue.fail(battle_index, worker_id, traceback.format_exc())
+        else:
+            queue.complete(battle_index, worker_id, battle_result)
+            played += 1
+        finally:
+            battle_finished.set()
+            heartbeat.join()
+
+
+def run_battles_on_queue(
+        battles: List[Tuple[str, Player, Player]],
+        queue: WorkQueue,
+        seeds: List[Optional[int]],
+        raise_bot_exceptions: bool = False,
+        battle_cache: Optional[BattleCache] = None,
+        adjudication_rules: Optional[Sequence[AdjudicationRule]] = None,
+        resource_limits: Optional[ResourceLimits] = None,
+        sampling_interval: Optional[float] = None,
+        local_workers: int = 0,
+        poll_interval: float = 1.0,
+        on_result: Optional[Callable[[int, Optional[BattleResult]], None]] = None
+) -> List[Optional[BattleResult]]:
+    """
+    Coordinate the given battles on the queue - put them in the queue, start local workers and wait for the results
+    :param battles: List of (map_str, player1, player2) tuples
+    :param queue: The work queue
+    :param seeds: The seed of each battle
+    :param local_workers: Number of worker processes to start on this host (other hosts can run more workers)
+    :param poll_interval: Seconds between checks of the queue
+    :param on_result: Called with (battle index, battle result) for each result as it arrives, the battle result is
+                      None for battles that were given up
+    Other parameters are passed to play_battle, see planet_wars.battles.parallel.play_battle
+    :return: The BattleResults, in the same order as the given battles - None for battles that were given up
+    """
+    queue.put_battles(
+        battles, seeds, raise_bot_exceptions, battle_cache, adjudication_rules, resource_limits, sampling_interval
+    )
+    workers = [
+        Process(target=run_worker, args=(queue.path, True, poll_interval, queue.lease_seconds, queue.max_attempts))
+        for _ in range(local_workers)
+    ]
+    for worker in workers:
+        worker.start()
+
+    battle_results: List[Optional[BattleResult]] = [None] * len(battles)
+    finished = set()
+    try:
+        while len(finished) < len(battles):
+            queue.give_up_expired()
+            new_finished = queue.get_finished(exclude=finished)
+            for battle_index, state, battle_result, error in new_finished:
+                finished.add(battle_index)
+                if state == FAILED:
+                    print(f"battle {battle_index} was given up:\n{error}")
+                battle_results[battle_index] = battle_result
+                if on_result is not None:
+                    on_result(battle_index, battle_result)
+            if len(finished) < len(battles):
+                if len(new_finished) == 0 and workers and not any(worker.is_alive() for worker in workers):
+                    # The local workers exited with claimed battles (crashed) - retry them here
+                    run_worker(queue.path, True, poll_interval, queue.lease_seconds, queue.max_attempts)
+                else:
+                    time.sleep(poll_interval)
+    finally:
+        for worker in workers:
+            worker.join()
+    return battle_results
+
+
+class DistributedTournament(Tournament):
+    """
+    All against all Tournament whose battles run on a work queue, see the module documentation.
+    The results are merged in the schedule order as they arrive, so the battle ids are the same as in Tournament.
+    """
+
+    def __init__(
+            self,
+            players: List[Player],
+            maps: List[str],
+            queue_path: str,
+            raise_bot_exceptions: bool = False,
+            local_workers: int = 0,
+            lease_seconds: float = 600.0,
+            max_attempts: int = 3,
+            poll_interval: float = 1.0,
+            battle_cache: Optional[BattleCache] = None,
+            seed: Optional[int] = None,
+            adjudication_rules: Optional[Sequence[AdjudicationRule]] = None,
+            resource_limits: Optional[ResourceLimits] = None,
+            sampling_interval: Optional[float] = None
+    ):
+        """
+        :param players: List of players
+        :param maps: List of maps
+        :param queue_path: The queue SQLite file, on a filesystem all the workers' hosts share
+        :param raise_bot_exceptions: If False catch exceptions from the player bots
+        :param local_workers: Number of worker processes to start on the coordinator host
+        :param lease_seconds: See WorkQueue
+        :param max_attempts: See WorkQueue
+        :param poll_interval: Seconds between checks of the queue
+        :param battle_cache: If given, battles between deterministic bots are taken from the cache when possible
+        :param seed: The tournament seed, see Tournament. Use the same seed when resuming a tournament
+        :param adjudication_rules: Rules that end decided battles early, see planet_wars.engine.adjudication
+        :param resource_limits: Limits of the bots turns, see planet_wars.engine.resource_limits
+        :param sampling_interval: If given, the bots turns are profiled, see Tournament
+        """
+        super().__init__(
+            players, maps, raise_bot_exceptions, battle_cache=battle_cache, seed=seed,
+            adjudication_rules=adjudication_rules, resource_limits=resource_limits, sampling_interval=sampling_interval
+        )
+        self.queue = WorkQueue(queue_path, lease_seconds, max_attempts)
+        self.local_workers = local_workers
+        self.poll_interval = poll_interval
+
+    def get_schedule(self) -> List[Tuple[str, Player, Player]]:
+        """
+        :return: The battles of the tournament - each player against each other player on each map, in the Tournament
+                 order
+        """
+        return [
+            (map_str, player1, player2)
+            for map_str in self.maps for player1 in self.players for player2 in self.players if player1 != player2
+        ]
+
+    def run_tournament(self) -> List[BattleResult]:
+        """
+        Run the tournament on the work queue
+        :return: The battle results
+        """
+        self.battle_results = []
+        battles = self.get_schedule()
+        seeds = [self.next_battle_seed() for _ in battles]
+        # Results arrive in any order, they are added in the schedule order (battles that were given up are skipped)
+        arrived: Dict[int, Optional[BattleResult]] = {}
+        next_index = 0
+
+        def merge(battle_index: int, battle_result: Optional[BattleResult]):
+            nonlocal next_index
+            arrived[battle_index] = battle_result
+            while next_index in arrived:
+                next_battle_result = arrived.pop(next_index)
+                if next_battle_result is not None:
+                    self.add_battle_result(next_battle_result)
+                next_index += 1
+            progress = self.queue.get_progress()
+            print(f"{progress[DONE]}/{len(battles)} battles done, {progress[FAILED]} given up")
+
+        run_battles_on_queue(
+            battles, self.queue, seeds, self.raise_bot_exceptions, self.battle_cache, self.adjudication_rules,
+            self.resource_limits, self.sampling_interval, self.local_workers, self.poll_interval, on_result=merge
+        )
+        return self.battle_results
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) >= 3 and sys.argv[1] == "worker":
+        print(f"played {run_worker(sys.argv[2], exit_when_empty='--wait' not in sys.argv)} battles")
+    else:
+        print("usage: python -m planet_wars.battles.work_queue worker <queue path> [--wait]")
@@ -0,0 +1,136 @@
+"""
+Early adjudication - end battles whose outcome is already decided instead of playing the dead turns till MAX_TURNS.
+
+The GameManager checks its adjudication rules after every turn that didn't end the game, the first rule that
+decides the battle ends it. The turn and the reason are kept in the GameManager (adjudicated_turn,
+adjudication_reason) and in the BattleResult.
+
+    NoRecaptureRule - provably safe: gives the same winner as playing the battle to the end, whatever the bots do.
+    ShipRatioRule - heuristic: the leader is far ahead. Comebacks from there are rare but possible, use it to cut
+                    tournament time, not when every battle must be exact.
+
+Usage:
+    tournament = Tournament(players, maps, adjudication_rules=TOURNAMENT_ADJUDICATION_RULES)
+"""
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Optional, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from planet_wars.engine.game_logic import GameManager
+
+
+class AdjudicationRule:
+    """
+    Base class of the adjudication rules.
+    Rules are frozen dataclasses - their repr describes them, it is part of the battle cache key.
+    """
+
+    def adjudicate(self, game_manager: "GameManager") -> Optional[Tuple[int, str]]:
+        """
+        :param game_manager: The game after a turn that didn't end it
+        :return: (winner player number, reason) if the battle is decided, otherwise None
+        """
+        raise NotImplementedError()
+
+
+@dataclass(frozen=True)
+class NoRecaptureRule(AdjudicationRule):
+    """
+    The loser has no planets, none of its fleets can capture a planet, and its fleets can't outscore the other player
+    at MAX_TURNS, so the other player will win.
+    A fleet (with the loser's other fleets arriving with it) can't capture its destination if the destination
+    belongs to the other player and the fleet is smaller than the destination growth rate - the other player can
+    empty the planet but the growth comes before the arrival. Neutral planets can be emptied (by a tie), so fleets
+    heading to neutral planets can always capture.
+    The loser's fleets that are still flying at MAX_TURNS count in its score. The winner can't lose its planets, so
+    after the last turn it has at least its growth rate minus the loser's ships arriving in the last turn - if that
+    is more than the loser's ships arriving after MAX_TURNS (or there are none), the winner wins on ships too.
+    """
+
+    def adjudicate(self, game_manager: "GameManager") -> Optional[Tuple[int, str]]:
+        game = game_manager.game
+        for loser, winner in ((1, 2), (2, 1)):
+            if game_manager.total_planets[loser] > 0:
+                continue
+            arrivals = defaultdict(int)
+            for fleet in game.fleets:
+                if fleet.owner == loser:
+                    arrivals[(fleet.destination_planet_id, fleet.turns_remaining)] += fleet.num_ships
+            if not all(
+                    game.get_planet_by_id(planet_id).owner == winner and
+                    num_ships < game.get_planet_by_id(planet_id).growth_rate
+                    for (planet_id, _), num_ships in arrivals.items()
+            ):
+                continue
+            last_turn = game_manager.MAX_TURNS - game_manager.turns
+            late_ships = sum(num_ships for (_, turns_remaining), num_ships in arrivals.items()
+                             if turns_remaining > last_turn)
+            last_turn_ships = sum(num_ships for (_, turns_remaining), num_ships in arrivals.items()
+                                  if turns_remaining == last_turn)
+            if late_ships == 0 or game_manager.total_growth[winner] - last_turn_ships > late_ships:
+                return winner, f"player {loser} has no planets and its fleets can't capture any planet"
+        return None
+
+
+@dataclass(frozen=True)
+class ShipRatioRule(AdjudicationRule):
+    """
+    Heuristic - after min_turn, the leader has at least min_ratio times the ships and the growth rate of the other
+    player.
+    """
+    min_ratio: float = 5.0
+    min_turn: int = 30
+
+    def adjudicate(self, game_manager: "GameManager") -> Optional[Tuple[int, str]]:
+        if game_manager.turns < self.min_turn:
+            return None
+        for leader, other in ((1, 2), (2, 1)):
+            if (
+                    game_manager.total_ships[leader] >= self.min_ratio * game_manager.total_ships[other] and
+                    game_manager.total_growth[leader] >= self.min_ratio * game_manager.total_growth[other]
+            ):
+                return leader, (
+                    f"player {leader} has {game_manager.total_ships[leader]} ships and growth "
+                    f"{game_manager.total_growth[leader]} against {game_manager.total_ships[other]} ships and growth "
+                    f"{game_manager.total_growth[other]}"
+                )
+        return None
+
+
+# Rules that never change a battle result
+SAFE_ADJUDICATION_RULES = (NoRecaptureRule(),)
+# Rules for tournaments - the safe rules and a conservative heuristic
+TOURNAMENT_ADJUDICATION_RULES = (NoRecaptureRule(), ShipRatioRule())
+
+
+if __name__ == "__main__":
+    import contextlib
+    import io
+
+    from planet_wars.battles.tournament import Tournament, get_map_by_id
+    from planet_wars.player_bots.baseline_code.baseline_bot import (
+        AttackWeakestPlanetFromStrongestBot, AttackEnemyWeakestPlanetFromStrongestBot,
+        AttackWeakestPlanetFromStrongestSmarterNumOfShipsBot
+    )
+
+    # Compare the simulated turns and the winners of a baseline tournament with and without adjudication
+    baseline_players = [
+        AttackWeakestPlanetFromStrongestBot(), AttackEnemyWeakestPlanetFromStrongestBot(),
+        AttackWeakestPlanetFromStrongestSmarterNumOfShipsBot()
+    ]
+    baseline_maps = [get_map_by_id(map_id) for map_id in range(1, 21)]
+    results = {}
+    for rules_name, rules in (("none", None), ("safe", SAFE_ADJUDICATION_RULES),
+                              ("tournament", TOURNAMENT_ADJUDICATION_RULES)):
+        with contextlib.redirect_stdout(io.StringIO()):
+            results[rules_name] = Tournament(
+                baseline_players, baseline_maps, seed=0, adjudication_rules=rules
+            ).run_tournament()
+    for rules_name, battle_results in results.items():
+        same_winner = sum(r.winner == full.winner for r, full in zip(battle_results, results["none"]))
+        print(
+            f"{rules_name}: {sum(r.turns for r in battle_results)} turns, "
+            f"{sum(r.adjudicated_turn is not None for r in battle_results)} adjudicated, "
+            f"{same_winner}/{len(battle_results)} same winner as the full battles"
+        )
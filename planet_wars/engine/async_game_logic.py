@@ -0,0 +1,104 @@
+import asyncio
+from contextlib import AsyncExitStack
+from typing import Dict, List, Optional, Sequence
+
+from planet_wars.engine.adjudication import AdjudicationRule
+from planet_wars.engine.game_logic import GameManager
+from planet_wars.engine.remote_player import RemotePlayer, RemoteBotSession
+from planet_wars.engine.resource_limits import ResourceLimits
+from planet_wars.planet_wars import PlanetWars, Player
+
+
+class AsyncGameManager(GameManager):
+    """
+    GameManager variant that runs on asyncio event loop, so many games can share one event loop while
+    waiting for RemotePlayer bots.
+    In-process bots are called directly (like in GameManager), remote bots are awaited.
+    """
+
+    def __init__(
+            self,
+            map_str: str,
+            player_1: Player,
+            player_2: Player,
+            raise_bot_exceptions: bool = False,
+            seed: Optional[int] = None,
+            adjudication_rules: Optional[Sequence[AdjudicationRule]] = None,
+            resource_limits: Optional[ResourceLimits] = None
+    ):
+        super().__init__(map_str, player_1, player_2, raise_bot_exceptions, seed, adjudication_rules, resource_limits)
+        self.remote_sessions: Dict[int, RemoteBotSession] = {}
+
+    async def safely_run_bot_async(self, player_num: int, player: Player, game_object: PlanetWars):
+        """
+        Safely run the player bot, see GameManager.safely_run_bot.
+
+        :param player_num: The player number, 1 or 2
+        :param player: The bot to run
+        :param game_object: The game object to give the bot
+        :return: The bot orders or False if the bot raised Exception of the orders are not iterable
+        """
+        session = self.remote_sessions.get(player_num)
+        if session is None:
+            return self.safely_run_bot(player, game_object, player_num)
+        try:
+            return self.normalize_orders(await session.play_turn(game_object))
+        except Exception as e:
+            return self.handle_bot_exception(player, e)
+
+    async def make_turn_async(self) -> str:
+        """
+        Run one turn, see GameManager.make_turn. Remote bots are asked for their orders at the same time.
+        :return: The game state - tie, player 1 wins, player 2 wins or still in-game
+        """
+        orders_of_player_1, orders_of_player_2 = await asyncio.gather(
+            self.safely_run_bot_async(1, self.player_1, self.get_game_object_for_player(player_num=1)),
+            self.safely_run_bot_async(2, self.player_2, self.get_game_object_for_player(player_num=2))
+        )
+        if orders_of_player_1 is False:
+            return self.PLAYER_2_WIN_STATE
+        if orders_of_player_2 is False:
+            return self.PLAYER_1_WIN_STATE
+
+        return self.execute_turn(orders_of_player_1, orders_of_player_2)
+
+    async def run_game_async(self) -> str:
+        """
+        Run the game - run turns until the game end.
+        Each RemotePlayer holds one connection to its bot server for the whole game.
+        :return: The game finish state - tie, player 1 wins or player 2 wins
+        """
+        async with AsyncExitStack() as stack:
+            for player_num, player in ((1, self.player_1), (2, self.player_2)):
+                if not isinstance(player, RemotePlayer):
+                    continue
+                try:
+                    self.remote_sessions[player_num] = await stack.enter_async_context(player.session())
+                except Exception as e:
+                    self.handle_bot_exception(player, e)
+                    state = self.PLAYER_2_WIN_STATE if player_num == 1 else self.PLAYER_1_WIN_STATE
+                    print(state)
+                    return state
+
+            state = self.IN_GAME_STATE
+            while state == self.IN_GAME_STATE:
+                state = await self.make_turn_async()
+            self.remote_sessions = {}
+        print(state)
+        return state
+
+
+async def run_games(game_managers: List[AsyncGameManager], max_concurrent_games: Optional[int] = 100) -> List[str]:
+    """
+    Run all the given games on the running event loop.
+    :param game_managers: The games to run
+    :param max_concurrent_games: Max number of games running at the same time, None means no limit
+    :return: The finish states of the games, in the same order as the given game managers
+    """
+    semaphore = asyncio.Semaphore(max_concurrent_games or len(game_managers) or 1)
+
+    async def run_game(game_manager: AsyncGameManager) -> str:
+        async with semaphore:
+            return await game_manager.run_game_async()
+
+    return await asyncio.gather(*(run_game(game_manager) for game_manager in game_managers))
@@ -0,0 +1,153 @@
+"""
+Columnar (numpy arrays) view of the game state, for bots that compute over all the planets and fleets at once.
+
+Bots read it from the game object:
+    state = game.columnar
+    my_planets = state.planet_owner == PlanetWars.ME
+    strongest_planet_id = np.argmax(np.where(my_planets, state.planet_num_ships, -1))
+Arrays are indexed by planet_id (planets) and by the position in game.fleets (fleets).
+
+Inside a game the GameManager builds the state once per turn and shares it between both players (player 2 gets
+a copy with switched owners), and the map columns (growth rate, x, y) once per game.
+The state is a snapshot of the game object as given to the bot - changes the bot makes to the game object are not
+reflected in it. The arrays are read only, as they are shared between the players (copy an array to change it).
+"""
+from dataclasses import dataclass, replace
+
+import numpy as np
+
+from planet_wars.planet_wars import PlanetWars
+
+# owner -> owner from player 2 perspective
+SWITCH_PLAYERS_OWNERS = np.array([PlanetWars.NEUTRAL, PlanetWars.ENEMY, PlanetWars.ME])
+
+
+def has_float_ships(game: PlanetWars) -> bool:
+    """
+    :return: True if any planet or fleet has a fractional (not int) number of ships - bots may send fractions of ships
+    """
+    return any(type(p.num_ships) is not int for p in game.planets) or any(
+        type(f.num_ships) is not int for f in game.fleets
+    )
+
+
+def _read_only(array: np.ndarray) -> np.ndarray:
+    """
+    Make the array read only (in place)
+    :return: The array
+    """
+    array.flags.writeable = False
+    return array
+
+
+@dataclass(frozen=True)
+class MapColumns:
+    """
+    The columns that don't change during the game
+    """
+    planet_growth_rate: np.ndarray
+    planet_x: np.ndarray
+    planet_y: np.ndarray
+
+    @staticmethod
+    def from_game(game: PlanetWars) -> "MapColumns":
+        return MapColumns(
+            planet_growth_rate=_read_only(np.array([p.growth_rate for p in game.planets], dtype=np.int64)),
+            planet_x=_read_only(np.array([p.x for p in game.planets], dtype=float)),
+            planet_y=_read_only(np.array([p.y for p in game.planets], dtype=float)),
+        )
+
+
+@dataclass(frozen=True)
+class ColumnarState:
+    """
+    The game state as arrays
+    """
+    map_columns: MapColumns
+    planet_owner: np.ndarray
+    planet_num_ships: np.ndarray
+    fleet_owner: np.ndarray
+    fleet_num_ships: np.ndarray
+    fleet_source_planet_id: np.ndarray
+    fleet_destination_planet_id: np.ndarray
+    fleet_total_trip_length: np.ndarray
+    fleet_turns_remaining: np.ndarray
+
+    @property
+    def planet_growth_rate(self) -> np.ndarray:
+        return self.map_columns.planet_growth_rate
+
+    @property
+    def planet_x(self) -> np.ndarray:
+        return self.map_columns.planet_x
+
+    @property
+    def planet_y(self) -> np.ndarray:
+        return self.map_columns.planet_y
+
+    @staticmethod
+    def from_game(game: PlanetWars, map_columns: MapColumns = None) -> "ColumnarState":
+        """
+        :param game: The game object
+        :param map_columns: The map columns of the game, if already computed
+        :return: The columnar state of the game object. The ship counts are float64 if any of them is fractional,
+                 otherwise int64
+        """
+        ships_dtype = np.float64 if has_float_ships(game) else np.int64
+        fleet_rows = np.array([
+            (f.owner, f.num_ships, f.source_planet_id, f.destination_planet_id, f.total_trip_length, f.turns_remaining)
+            for f in game.fleets
+        ], dtype=ships_dtype).reshape(-1, 6)
+        fleets = _read_only(fleet_rows.astype(np.int64) if ships_dtype is np.float64 else fleet_rows)
+        return ColumnarState(
+            map_columns=map_columns if map_columns is not None else MapColumns.from_game(game),
+            planet_owner=_read_only(np.array([p.owner for p in game.planets], dtype=np.int64)),
+            planet_num_ships=_read_only(np.array([p.num_ships for p in game.planets], dtype=ships_dtype)),
+            fleet_owner=fleets[:, 0],
+            fleet_num_ships=_read_only(fleet_rows[:, 1]),
+            fleet_source_planet_id=fleets[:, 2],
+            fleet_destination_planet_id=fleets[:, 3],
+            fleet_total_trip_length=fleets[:, 4],
+            fleet_turns_remaining=fleets[:, 5],
+        )
+
+    def switch_players(self) -> "ColumnarState":
+        """
+        :return: The state from the other player perspective (player 1 and player 2 switched), sharing the other
+                 (read only) arrays with this state
+        """
+        return replace(
+            self,
+            planet_owner=_read_only(SWITCH_PLAYERS_OWNERS[self.planet_owner]),
+            fleet_owner=_read_only(SWITCH_PLAYERS_OWNERS[self.fleet_owner])
+        )
+
+
+class ColumnarStateCache:
+    """
+    Build the columnar state of a game once per turn, for both players
+    """
+
+    def __init__(self, game: PlanetWars):
+        """
+        :param game: The game object of the GameManager (from player 1 perspective), the cache follows its turns
+        """
+        self.game = game
+        self.map_columns = None
+        self._turn = None
+        self._states = {}
+
+    def get_state(self, turn: int, player_num: int) -> ColumnarState:
+        """
+        :param turn: The current turn
+        :param player_num: The player number, 1 or 2
+        :return: The columnar state of the turn from the player perspective
+        """
+        if turn != self._turn:
+            if self.map_columns is None:
+                self.map_columns = MapColumns.from_game(self.game)
+            self._turn = turn
+            self._states = {1: ColumnarState.from_game(self.game, self.map_columns)}
+        if player_num not in self._states:
+            self._states[player_num] = self._states[1].switch_players()
+        return self._states[player_num]
@@ -0,0 +1,516 @@
+"""
+Differential fuzzing of the engines against the reference GameManager.
+
+Random cases - a map from the map generator and a stream of orders for each player - are played by the reference
+GameManager and by every engine in ENGINES, and the game state is compared after every turn: the planets, the fleets
+(in order), the scores, the turn events (as a multiset - their order is not specified) and the game state.
+The reference state is also checked every turn against the backends in STATE_CHECKS (the running owner totals and
+the binary state encoding).
+A failing case is shrunk to a minimal repro - fewer turns and fewer orders that still fail the same engine.
+The run doubles as a throughput comparison of the engines.
+
+The orders are kept as intents that are valid in any state, so every case (and every shrunk case) is playable:
+    (source index, destination planet index, fraction) - send the fraction of the ships of your source index-th
+    planet (modulo your planets count, by planet_id) to the destination planet (modulo the planets count).
+    Fraction 0 sends the destination's ship count (to provoke ties) and fractions above 1 are illegal orders (more
+    ships than the planet has) that every engine must reject.
+
+New engines are tested by adding them to ENGINES, for example:
+    ENGINES["my_engine"] = Engine("my_engine", lambda map_str, player1, player2: MyGameManager(...))
+
+Usage:
+    python -m planet_wars.engine.differential_fuzz [number of cases] [seed]
+"""
+import asyncio
+import json
+import random
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from planet_wars.engine.async_game_logic import AsyncGameManager
+from planet_wars.engine.game_logic import GameManager
+from planet_wars.engine.map_generator import generate_map, map_to_str
+from planet_wars.engine.multi_player_game_logic import MultiPlayerGameManager
+from planet_wars.engine.seeding import derive_seed, new_seed
+from planet_wars.engine.state_encoding import StateEncoder, StateDecoder
+from planet_wars.planet_wars import PlanetWars, Player, Order
+
+# (source index, destination planet index, fraction), see the module documentation
+Intent = Tuple[int, int, float]
+# The fractions of the random intents - 0 matches the destination ships, above 1 is an illegal order
+FRACTIONS = (0.0, 0.1, 0.25, 0.5, 0.75, 1.0, 1.5)
+REFERENCE_ENGINE = "reference"
+
+
+@dataclass(frozen=True)
+class FuzzCase:
+    """
+    A map and the order intents of both players, the case is played for len(intents) turns (or until the game ends)
+    """
+    case_id: int
+    map_str: str
+    # intents[turn][player_num - 1] - the intents of the player in the turn
+    intents: Tuple[Tuple[Tuple[Intent, ...], Tuple[Intent, ...]], ...]
+
+    @property
+    def turns(self) -> int:
+        return len(self.intents)
+
+    def count_intents(self) -> int:
+        return sum(len(player_intents) for turn_intents in self.intents for player_intents in turn_intents)
+
+    def to_dict(self) -> Dict:
+        return {"case_id": self.case_id, "map_str": self.map_str, "intents": self.intents}
+
+    @staticmethod
+    def from_dict(data: Dict) -> "FuzzCase":
+        return FuzzCase(
+            case_id=data["case_id"],
+            map_str=data["map_str"],
+            intents=tuple(
+                tuple(tuple(tuple(intent) for intent in player_intents) for player_intents in turn_intents)
+                for turn_intents in data["intents"]
+            )
+        )
+
+
+@dataclass
+class Mismatch:
+    """
+    The first difference between an engine and the reference in a case
+    """
+    engine: str
+    case: FuzzCase
+    turn: int  # The game turn after which the states differ
+    field: str  # planets, fleets, scores, events, state, or the name of the failed state check
+    reference: Any
+    other: Any
+    shrunk_from: Optional[FuzzCase] = None  # The original case, if the case was shrunk
+
+    def __str__(self):
+        if isinstance(self.reference, tuple) and isinstance(self.other, tuple) and self.field != "scores":
+            differences = [
+                (i, reference, other) for i, (reference, other) in enumerate(zip(self.reference, self.other))
+                if reference != other
+            ]
+            if len(self.reference) != len(self.other):
+                differences.append(("length", len(self.reference), len(self.other)))
+            details = "\n".join(f"    {i}: reference {reference} {self.engine} {other}"
+                                for i, reference, other in differences[:10])
+        else:
+            details = f"    reference {self.reference} {self.engine} {self.other}"
+        return (f"{self.engine} differs from the reference in case {self.case.case_id} after turn {self.turn} "
+                f"({self.field}, {self.case.turns} turns, {self.case.count_intents()} orders):\n{details}")
+
+
+@dataclass
+class EngineThroughput:
+    """
+    The time an engine took to play the fuzz cases
+    """
+    engine: str
+    cases: int = 0
+    turns: int = 0
+    seconds: float = 0.0
+
+    @property
+    def turns_per_second(self) -> float:
+        return self.turns / self.seconds if self.seconds > 0 else 0.0
+
+
+@dataclass
+class FuzzReport:
+    """
+    The result of a fuzz run
+    """
+    seed: int
+    cases: int = 0
+    mismatches: List[Mismatch] = field(default_factory=list)  # Shrunk, the first mismatch of each engine and case
+    throughput: Dict[str, EngineThroughput] = field(default_factory=dict)
+
+    def get_throughput_data_frame(self):
+        """
+        :return: Data frame with a row for each engine - cases, turns, seconds, turns per second and the speedup
+                 relative to the reference
+        """
+        import pandas as pd
+
+        reference_turns_per_second = self.throughput[REFERENCE_ENGINE].turns_per_second
+        return pd.DataFrame([
+            {
+                "engine": throughput.engine,
+                "cases": throughput.cases,
+                "turns": throughput.turns,
+                "seconds": throughput.seconds,
+                "turns_per_second": throughput.turns_per_second,
+                "speedup": (throughput.turns_per_second / reference_turns_per_second
+                            if reference_turns_per_second > 0 else 0.0),
+                "mismatches": sum(1 for mismatch in self.mismatches if mismatch.engine == throughput.engine),
+            }
+            for throughput in self.throughput.values()
+        ]).set_index("engine")
+
+
+class ScriptedPlayer(Player):
+    """
+    Plays the order intents of a fuzz case, see the module documentation
+    """
+
+    DETERMINISTIC = True
+
+    def __init__(self, intents: List[Tuple[Intent, ...]]):
+        """
+        :param intents: intents[turn] - the player's intents in the turn
+        """
+        self.intents = intents
+
+    def play_turn(self, game: PlanetWars) -> List[Order]:
+        if game.turns >= len(self.intents):
+            return []
+        my_planets = sorted(game.get_planets_by_owner(PlanetWars.ME), key=lambda p: p.planet_id)
+        if len(my_planets) == 0:
+            return []
+        remaining_ships = {p.planet_id: p.num_ships for p in my_planets}
+        orders = []
+        for source_index, destination_index, fraction in self.intents[game.turns]:
+            source = my_planets[source_index % len(my_planets)]
+            destination = game.planets[destination_index % len(game.planets)]
+            if fraction == 0:
+                num_ships = destination.num_ships
+            else:
+                num_ships = int(remaining_ships[source.planet_id] * fraction)
+            if 0 < num_ships <= remaining_ships[source.planet_id]:
+                remaining_ships[source.planet_id] -= num_ships
+            orders.append(Order(source, destination, num_ships))
+        return orders
+
+
+class Engine(NamedTuple):
+    """
+    An engine under test
+    """
+    name: str
+    # (map_str, player 1, player 2) -> the engine's game manager
+    create_game_manager: Callable[[str, Player, Player], GameManager]
+    # Run one turn of the game manager, return the game state. None calls game_manager.make_turn()
+    make_turn: Optional[Callable[[GameManager], str]] = None
+
+
+_event_loop = None
+
+
+def _make_async_turn(game_manager: AsyncGameManager) -> str:
+    global _event_loop
+    if _event_loop is None:
+        _event_loop = asyncio.new_event_loop()
+    return _event_loop.run_until_complete(game_manager.make_turn_async())
+
+
+ENGINES: Dict[str, Engine] = {
+    engine.name: engine for engine in [
+        Engine("multi_player", lambda map_str, player1, player2: MultiPlayerGameManager(map_str, [player1, player2])),
+        Engine("async", AsyncGameManager, _make_async_turn),
+    ]
+}
+
+
+def get_snapshot(game_manager: GameManager) -> Dict[str, Any]:
+    """
+    :return: The compared state of the game, field -> value (in the comparison order)
+    """
+    game = game_manager.game
+    return {
+        "planets": tuple((p.planet_id, p.owner, p.num_ships) for p in game.planets),
+        "fleets": tuple(
+            (f.owner, f.num_ships, f.source_planet_id, f.destination_planet_id, f.total_trip_length, f.turns_remaining)
+            for f in game.fleets
+        ),
+        "scores": (game_manager.get_player_score(1), game_manager.get_player_score(2)),
+        "events": tuple(sorted(repr(event) for event in game_manager.turn_events)),
+    }
+
+
+def check_owner_totals(game_manager: GameManager, _) -> Optional[Tuple[Any, Any]]:
+    """
+    The running owner totals of the game manager against the totals counted from the map
+    """
+    counted = game_manager.game.count_owner_totals()
+    running = game_manager.get_owner_totals(1)
+    owners = sorted(set(counted) | {1, 2})
+    counted_totals = tuple(tuple(counted[owner]) if owner in counted else (0, 0, 0) for owner in owners)
+    running_totals = tuple(tuple(running[owner]) if owner in running else (0, 0, 0) for owner in owners)
+    return None if counted_totals == running_totals else (counted_totals, running_totals)
+
+
+def check_state_encoding(game_manager: GameManager, codec: Tuple[StateEncoder, StateDecoder]):
+    """
+    The state decoded from the encoder stream (full frame, then deltas) against the state
+    """
+    encoder, decoder = codec
+    game = game_manager.get_game_object_for_player(1)
+    decoded = decoder.decode(encoder.encode(game))
+    state = (get_planets_and_fleets(game), game.turns)
+    decoded_state = (get_planets_and_fleets(decoded), decoded.turns)
+    return None if state == decoded_state else (state, decoded_state)
+
+
+def get_planets_and_fleets(game: PlanetWars) -> tuple:
+    return (
+        tuple((p.planet_id, p.owner, p.num_ships, p.growth_rate, p.x, p.y) for p in game.planets),
+        tuple(
+            (f.owner, f.num_ships, f.source_planet_id, f.destination_planet_id, f.total_trip_length, f.turns_remaining)
+            for f in game.fleets
+        )
+    )
+
+
+# name -> (create the check's state for a case, check) - a check returns None or (expected, actual)
+STATE_CHECKS: Dict[str, Tuple[Callable[[], Any], Callable[[GameManager, Any], Optional[Tuple[Any, Any]]]]] = {
+    "owner_totals": (lambda: None, check_owner_totals),
+    "state_encoding": (lambda: (StateEncoder(), StateDecoder()), check_state_encoding),
+}
+
+
+def generate_case(
+        case_id: int,
+        rng: random.Random,
+        max_turns: int = 100,
+        min_planets: int = 4,
+        max_planets: int = 12,
+        max_orders_per_turn: int = 3
+) -> FuzzCase:
+    """
+    :param case_id: The case id
+    :param rng: The random stream of the case
+    :param max_turns: The max number of turns of the case
+    :param min_planets: The min number of planets of the map
+    :param max_planets: The max number of planets of the map (small maps give denser battles and shorter repros)
+    :param max_orders_per_turn: The max number of order intents of a player in a turn
+    :return: A random fuzz case
+    """
+    planets, symmetry_type, pairs = generate_map(rng, min_planets=min_planets, max_planets=max_planets)
+    num_planets = len(planets)
+
+    def random_intents() -> Tuple[Intent, ...]:
+        return tuple(
+            (rng.randrange(num_planets), rng.randrange(num_planets), rng.choice(FRACTIONS))
+            for _ in range(rng.randint(0, max_orders_per_turn))
+        )
+
+    return FuzzCase(
+        case_id=case_id,
+        map_str=map_to_str(planets, symmetry_type, pairs),
+        intents=tuple((random_intents(), random_intents()) for _ in range(rng.randint(1, max_turns)))
+    )
+
+
+def _create_players(case: FuzzCase) -> Tuple[ScriptedPlayer, ScriptedPlayer]:
+    return (
+        ScriptedPlayer([turn_intents[0] for turn_intents in case.intents]),
+        ScriptedPlayer([turn_intents[1] for turn_intents in case.intents])
+    )
+
+
+def _play(
+        case: FuzzCase, engine: Optional[Engine], on_turn: Callable[[GameManager, str], Optional[Mismatch]]
+) -> Tuple[Optional[Mismatch], int]:
+    """
+    Play the case with the engine (None is the reference), call on_turn after each turn
+    :return: (the first mismatch on_turn returned or None, the number of turns played)
+    """
+    player1, player2 = _create_players(case)
+    if engine is None:
+        game_manager = GameManager(case.map_str, player1, player2, raise_bot_exceptions=True)
+        make_turn = GameManager.make_turn
+    else:
+        game_manager = engine.create_game_manager(case.map_str, player1, player2)
+        game_manager.raise_bot_exceptions = True
+        make_turn = engine.make_turn or type(game_manager).make_turn
+    state = GameManager.IN_GAME_STATE
+    while state == GameManager.IN_GAME_STATE and game_manager.turns < case.turns:
+        state = make_turn(game_manager)
+        mismatch = on_turn(game_manager, state)
+        if mismatch is not None:
+            return mismatch, game_manager.turns
+    return None, game_manager.turns
+
+
+def run_reference(case: FuzzCase) -> Tuple[List[Tuple[Dict[str, Any], str]], Optional[Mismatch], float]:
+    """
+    Play the case with the reference GameManager and run the state checks
+    :return: (the snapshot and game state after each turn, the first failed state check, the state checks seconds)
+    """
+    snapshots = []
+    check_states = {name: create_state() for name, (create_state, _) in STATE_CHECKS.items()}
+    check_seconds = 0.0
+
+    def on_turn(game_manager: GameManager, state: str) -> Optional[Mismatch]:
+        nonlocal check_seconds
+        snapshots.append((get_snapshot(game_manager), state))
+        start = time.perf_counter()
+        try:
+            for name, (_, check) in STATE_CHECKS.items():
+                difference = check(game_manager, check_states[name])
+                if difference is not None:
+                    return Mismatch(name, case, game_manager.turns, name, *difference)
+            return None
+        finally:
+            check_seconds += time.perf_counter() - start
+
+    mismatch, _ = _play(case, None, on_turn)
+    return snapshots, mismatch, check_seconds
+
+
+def compare_engine(case: FuzzCase, engine: Engine, snapshots: List[Tuple[Dict[str, Any], str]]) -> Optional[Mismatch]:
+    """
+    Play the case with the engine and compare it to the reference snapshots
+    :return: The first mismatch, None if the engine played like the reference
+    """
+    def on_turn(game_manager: GameManager, state: str) -> Optional[Mismatch]:
+        turn = game_manager.turns
+        if turn > len(snapshots):
+            return Mismatch(engine.name, case, turn, "state", "game over", state)
+        reference_snapshot, reference_state = snapshots[turn - 1]
+        snapshot = get_snapshot(game_manager)
+        for name, reference_value in reference_snapshot.items():
+            if snapshot[name] != reference_value:
+                return Mismatch(engine.name, case, turn, name, reference_value, snapshot[name])
+        if state != reference_state:
+            return Mismatch(engine.name, case, turn, "state", reference_state, state)
+        return None
+
+    mismatch, turns = _play(case, engine, on_turn)
+    if mismatch is None and turns < len(snapshots):
+        mismatch = Mismatch(engine.name, case, turns, "state", snapshots[turns - 1][1], "game over")
+    return mismatch
+
+
+def find_mismatch(case: FuzzCase, engine_name: str) -> Optional[Mismatch]:
+    """
+    :param case: The case to play
+    :param engine_name: An engine name from ENGINES or a state check name from STATE_CHECKS
+    :return: The first mismatch of the engine (or the check) in the case, None if there is none
+    """
+    snapshots, check_mismatch, _ = run_reference(case)
+    if engine_name in STATE_CHECKS:
+        return check_mismatch if check_mismatch is not None and check_mismatch.engine == engine_name else None
+    return compare_engine(case, ENGINES[engine_name], snapshots)
+
+
+def shrink_case(case: FuzzCase, engine_name: str, max_attempts: int = 2000) -> FuzzCase:
+    """
+    Shrink a failing case to a smaller case that still fails the same engine - cut the turns after the mismatch,
+    then remove chunks of intents, halving the chunks size down to single intents (delta debugging)
+    :param case: A case the engine fails
+    :param engine_name: The failing engine (or state check)
+    :param max_attempts: The max number of shrinking attempts (each plays the case)
+    :return: The shrunk case
+    """
+    mismatch = find_mismatch(case, engine_name)
+    assert mismatch is not None, f"case {case.case_id} doesn't fail {engine_name}"
+    case = FuzzCase(case.case_id, case.map_str, case.intents[:mismatch.turn])
+
+    # Flat list of (turn, player index, intent), removing a chunk keeps the turns of the other intents
+    intents = [
+        (turn, player_index, intent)
+        for turn, turn_intents in enumerate(case.intents)
+        for player_index, player_intents in enumerate(turn_intents)
+        for intent in player_intents
+    ]
+
+    def build_case(kept_intents) -> FuzzCase:
+        by_turn = defaultdict(lambda: ([], []))
+        for turn, player_index, intent in kept_intents:
+            by_turn[turn][player_index].append(intent)
+        return FuzzCase(case.case_id, case.map_str, tuple(
+            (tuple(by_turn[turn][0]), tuple(by_turn[turn][1])) for turn in range(case.turns)
+        ))
+
+    attempts = 0
+    chunk_size = max(len(intents) // 2, 1)
+    while chunk_size >= 1 and attempts < max_attempts:
+        start = 0
+        removed_any = False
+        while start < len(intents) and attempts < max_attempts:
+            candidate_intents = intents[:start] + intents[start + chunk_size:]
+            candidate = build_case(candidate_intents)
+            attempts += 1
+            candidate_mismatch = find_mismatch(candidate, engine_name)
+            if candidate_mismatch is not None:
+                intents = candidate_intents
+                case = FuzzCase(case.case_id, case.map_str, candidate.intents[:candidate_mismatch.turn])
+                intents = [intent for intent in intents if intent[0] < case.turns]
+                removed_any = True
+            else:
+                start += chunk_size
+        if not removed_any:
+            chunk_size //= 2
+    return build_case(intents)
+
+
+def run_fuzz(
+        num_cases: int = 100,
+        seed: Optional[int] = None,
+        engines: Optional[List[str]] = None,
+        shrink: bool = True,
+        **case_parameters
+) -> FuzzReport:
+    """
+    Generate random cases, play them with the reference and the engines, compare and shrink the failing cases
+    :param num_cases: The number of cases
+    :param seed: The fuzz seed, case k is generated from derive_seed(seed, "fuzz", k). None uses a random seed
+    :param engines: The engines names to test, None tests all the ENGINES
+    :param shrink: If True the failing cases are shrunk
+    :param case_parameters: Passed to generate_case (max_turns, min_planets, max_planets, max_orders_per_turn)
+    :return: The fuzz report
+    """
+    seed = seed if seed is not None else new_seed()
+    engines = [ENGINES[name] for name in (engines if engines is not None else ENGINES)]
+    report = FuzzReport(seed=seed)
+    report.throughput = {
+        name: EngineThroughput(name) for name in [REFERENCE_ENGINE] + [engine.name for engine in engines]
+    }
+    for case_id in range(num_cases):
+        case = generate_case(case_id, random.Random(derive_seed(seed, "fuzz", case_id)), **case_parameters)
+        report.cases += 1
+
+        start = time.perf_counter()
+        snapshots, check_mismatch, check_seconds = run_reference(case)
+        report.throughput[REFERENCE_ENGINE].seconds += time.perf_counter() - start - check_seconds
+        report.throughput[REFERENCE_ENGINE].turns += len(snapshots)
+        report.throughput[REFERENCE_ENGINE].cases += 1
+        mismatches = [check_mismatch] if check_mismatch is not None else []
+
+        for engine in engines:
+            start = time.perf_counter()
+            mismatch = compare_engine(case, engine, snapshots)
+            report.throughput[engine.name].seconds += time.perf_counter() - start
+            report.throughput[engine.name].turns += mismatch.turn if mismatch is not None else len(snapshots)
+            report.throughput[engine.name].cases += 1
+            if mismatch is not None:
+                mismatches.append(mismatch)
+
+        for mismatch in mismatches:
+            if shrink:
+                shrunk_case = shrink_case(case, mismatch.engine)
+                mismatch = find_mismatch(shrunk_case, mismatch.engine)
+                mismatch.shrunk_from = case
+            print(mismatch)
+            report.mismatches.append(mismatch)
+    return report
+
+
+if __name__ == "__main__":
+    import sys
+
+    fuzz_report = run_fuzz(
+        num_cases=int(sys.argv[1]) if len(sys.argv) > 1 else 100, seed=int(sys.argv[2]) if len(sys.argv) > 2 else None
+    )
+    print(f"seed {fuzz_report.seed}: {fuzz_report.cases} cases, {len(fuzz_report.mismatches)} mismatches")
+    for fuzz_mismatch in fuzz_report.mismatches:
+        print(json.dumps(fuzz_mismatch.case.to_dict()))
+    print(fuzz_report.get_throughput_data_frame().to_string())
+    if fuzz_report.mismatches:
+        sys.exit(1)
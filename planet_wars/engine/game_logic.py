@@ -1,4 +1,17 @@
-from planet_wars.planet_wars import PlanetWars, Player, Planet, Fleet, Order
+from collections import defaultdict
+from functools import partial
+from typing import Callable, Dict, List, Optional, Sequence
+
+from planet_wars.engine.adjudication import AdjudicationRule
+from planet_wars.engine.resource_limits import (
+    BotResourceUsage, ResourceLimitExceeded, ResourceLimits, run_with_resource_accounting
+)
+from planet_wars.engine.sampling_profiler import SamplingProfiler
+from planet_wars.engine.seeding import get_player_rng
+from planet_wars.planet_wars import (
+    PlanetWars, Player, Planet, Fleet, Order, OwnerTotals, TurnEvent, FleetLaunched, FleetArrived, PlanetBattle,
+    PlanetCaptured
+)
 
 
 def clone_game_object(game: PlanetWars) -> PlanetWars:
@@ -13,7 +26,11 @@ def clone_game_object(game: PlanetWars) -> PlanetWars:
         ))
     for p in game.planets:
         cloned_planets.append(Planet(p.planet_id, p.owner, p.num_ships, p.growth_rate, p.x, p.y))
-    return PlanetWars(planets=cloned_planets, fleets=cloned_fleet)
+    cloned_game = PlanetWars(planets=cloned_planets, fleets=cloned_fleet)
+    cloned_game._map_str = game._map_str
+    cloned_game._map_analysis = game._map_analysis
+    cloned_game._spatial_index = game._spatial_index
+    return cloned_game
 
 
 def switch_players_of_game_object(game: PlanetWars):
@@ -33,6 +50,27 @@ def switch_players_of_game_object(game: PlanetWars):
             f.owner = 1
 
 
+def get_events_from_perspective(events: List[TurnEvent], owners: List[int]) -> List[TurnEvent]:
+    """
+    :param events: Turn events
+    :param owners: owner -> owner from the player perspective
+    :return: The events with the owners from the player perspective
+    """
+    perspective_events = []
+    for event in events:
+        if isinstance(event, PlanetBattle):
+            event = event._replace(
+                previous_owner=owners[event.previous_owner], owner=owners[event.owner],
+                forces=tuple((owners[owner], num_ships) for owner, num_ships in event.forces)
+            )
+        elif isinstance(event, PlanetCaptured):
+            event = event._replace(previous_owner=owners[event.previous_owner], owner=owners[event.owner])
+        else:
+            event = event._replace(owner=owners[event.owner])
+        perspective_events.append(event)
+    return perspective_events
+
+
 class GameManager:
     """
     The engine logic - manage the game. Calles the bots play_turn function to get the issued orders and
@@ -48,48 +86,121 @@ class GameManager:
     TIE_STATE = "Tie"
     IN_GAME_STATE = "Still In Game"
 
-    def __init__(self, map_str: str, player_1: Player, player_2: Player, raise_bot_exceptions: bool = False):
+    def __init__(
+            self,
+            map_str: str,
+            player_1: Player,
+            player_2: Player,
+            raise_bot_exceptions: bool = False,
+            seed: Optional[int] = None,
+            adjudication_rules: Optional[Sequence[AdjudicationRule]] = None,
+            resource_limits: Optional[ResourceLimits] = None,
+            profiler: Optional[SamplingProfiler] = None
+    ):
         """
         Initiate a game
         :param map_str: The map to play in, as stirng.
         :param player_1: Player 1 bot
         :param player_2: Player 2 bot
         :param raise_bot_exceptions: If False catch exceptions from the player bots
+        :param seed: The battle seed, the players' game.rng streams are derived from it. None means unseeded
+        :param adjudication_rules: Rules that end decided battles early, see planet_wars.engine.adjudication
+        :param resource_limits: Limits of the bots turns, a bot over the limits forfeits.
+                                See planet_wars.engine.resource_limits
+        :param profiler: If given, the bots turns are sampled into profiler.profiles by player number.
+                         See planet_wars.engine.sampling_profiler
         """
         self.game = PlanetWars.parse_game_state(map_str)
+        self.game._map_str = map_str
         self.original_map = clone_game_object(self.game)
         self.player_1 = player_1
         self.player_2 = player_2
         self.raise_bot_exceptions = raise_bot_exceptions
         self.turns = 0
         self.str_turns_for_display = []
-
-    def safely_run_bot(self, player, game_object):
+        self.columnar_state_cache = None
+        self.seed = seed
+        self.player_rngs = {player_num: get_player_rng(seed, player_num) for player_num in (1, 2)}
+        # player_num -> (owner -> owner from the player perspective)
+        self.perspective_owners = {1: [0, 1, 2], 2: [0, 2, 1]}
+        # Running per owner totals, updated by the turn logic so scoring and endgame checks don't scan the map
+        self.total_ships = defaultdict(int)
+        self.total_planets = defaultdict(int)
+        self.total_growth = defaultdict(int)
+        self.reset_owner_totals()
+        self.adjudication_rules = tuple(adjudication_rules or ())
+        # The turn and the reason the battle was adjudicated, None if it wasn't
+        self.adjudicated_turn = None
+        self.adjudication_reason = None
+        self.resource_limits = resource_limits
+        # player_num -> the resources the player's bot used
+        self.resource_usage: Dict[int, BotResourceUsage] = defaultdict(BotResourceUsage)
+        self.profiler = profiler
+        # The events of the last turn, recorded by execute_order and arrival, see PlanetWars.last_turn_events
+        self.turn_events: List[TurnEvent] = []
+
+    def safely_run_bot(self, player, game_object, player_num: Optional[int] = None):
         """
         Safely run the player bot.
+        The bot resources are added to self.resource_usage and checked against self.resource_limits.
 
         :param player: The bot to run
         :param game_object: The game object to give the bot
-        :return: The bot orders or False if the bot raised Exception of the orders are not iterable
+        :param player_num: The player number, for the resource usage. None finds it by the player
+        :return: The bot orders or False if the bot raised Exception, went over the resource limits or the orders
+                 are not iterable
         """
         # TODO add timeout to the play_turn call
+        if player_num is None:
+            player_num = 1 if player is self.player_1 else 2
+        usage = self.resource_usage[player_num]
         try:
             if self.turns == 0:
-                player.new_game_has_started(game_object)
-            orders = player.play_turn(game_object)
-            # Don't fail if you return None - replace it with empty array
-            orders = orders if orders is not None else []
-            # Don't fail if you return order instead of list of orders
-            if isinstance(orders, Order):
-                orders = [orders]
-            [o for o in orders]  # check orders is iterable
-            return orders
+                run_with_resource_accounting(
+                    self.get_bot_call(partial(player.new_game_has_started, game_object), player_num), usage,
+                    self.resource_limits, count_turn=False
+                )
+            orders = run_with_resource_accounting(
+                self.get_bot_call(partial(player.play_turn, game_object), player_num), usage, self.resource_limits
+            )
+            return self.normalize_orders(orders)
+        except ResourceLimitExceeded as e:
+            # Always a forfeit, also with raise_bot_exceptions - it is the bot's fault, not a bug to debug
+            print(f"Player {player.__class__.__name__} went over the resource limits: {e}")
+            return False
         except Exception as e:
-            if self.raise_bot_exceptions:
-                raise e
+            return self.handle_bot_exception(player, e)
 
-            print(f"Player {player.__class__.__name__} throw exception {e.__class__.__name__}: {e}")
-            return False
+    def get_bot_call(self, call: Callable, player_num: int) -> Callable:
+        """
+        :return: The bot call, sampled by the profiler if there is one
+        """
+        return call if self.profiler is None else partial(self.profiler.run, player_num, call)
+
+    @staticmethod
+    def normalize_orders(orders) -> List[Order]:
+        """
+        Make sure the orders returned by a bot are a list of orders.
+        :param orders: The bot's play_turn return value
+        :return: List of the orders. Raise exception if the orders are not iterable
+        """
+        # Don't fail if you return None - replace it with empty array
+        orders = orders if orders is not None else []
+        # Don't fail if you return order instead of list of orders
+        if isinstance(orders, Order):
+            orders = [orders]
+        return [o for o in orders]  # check orders is iterable
+
+    def handle_bot_exception(self, player: Player, e: Exception) -> bool:
+        """
+        Handle exception raised by a bot, raise it if raise_bot_exceptions is True.
+        :return: False - the bot lost the game
+        """
+        if self.raise_bot_exceptions:
+            raise e
+
+        print(f"Player {player.__class__.__name__} throw exception {e.__class__.__name__}: {e}")
+        return False
 
     def execute_order(self, order: Order, player_id: int) -> bool:
         """
@@ -107,6 +218,7 @@ class GameManager:
         destination_planet = self.game.get_planet_by_id(order.destination_planet_id)
         total_trip_length = Planet.distance_between_planets(source_planet, destination_planet)
 
+        # The ships move from the planet to the fleet, so the owner totals don't change
         source_planet.num_ships -= order.num_ships
 
         fleet = Fleet(
@@ -118,6 +230,9 @@ class GameManager:
             turns_remaining=total_trip_length  # assume speed of 1 per turn
         )
         self.game.fleets.append(fleet)
+        self.turn_events.append(FleetLaunched(
+            player_id, order.num_ships, order.source_planet_id, order.destination_planet_id, total_trip_length
+        ))
         return True
 
     def advance(self):
@@ -134,6 +249,9 @@ class GameManager:
         for planet in self.game.planets:
             if planet.owner != 0:
                 planet.num_ships += planet.growth_rate
+        for owner, growth in self.total_growth.items():
+            if owner != 0:
+                self.total_ships[owner] += growth
 
     def arrival(self):
         """
@@ -143,35 +261,100 @@ class GameManager:
         The player with the most ships wins the battle,
         in case of a tie the current owner stays the owner of the planet.
         """
-        arriving_fleets = [f for f in self.game.fleets if f.turns_remaining == 0]
-        if len(arriving_fleets) == 0:
+        # Group the arriving fleets by destination, so the cost depends on the arrivals and not on the map size
+        arriving_fleets_by_destination = {}
+        for fleet in self.game.fleets:
+            if fleet.turns_remaining == 0:
+                arriving_fleets_by_destination.setdefault(fleet.destination_planet_id, []).append(fleet)
+        if len(arriving_fleets_by_destination) == 0:
             return
 
         self.game.fleets = [f for f in self.game.fleets if f.turns_remaining > 0]
 
-        for planet in self.game.planets:
-
-            # If no fleet is arriving at to the planet - continue
-            if not any(fleet.destination_planet_id == planet.planet_id for fleet in arriving_fleets):
-                continue
+        for destination_planet_id, arriving_fleets in arriving_fleets_by_destination.items():
+            planet = self.game.get_planet_by_id(destination_planet_id)
+            previous_owner, previous_num_ships = planet.owner, planet.num_ships
 
             forces = {0: 0, 1: 0, 2: 0}
             forces[planet.owner] = planet.num_ships
             for fleet in arriving_fleets:
-                if fleet.destination_planet_id == planet.planet_id:
-                    forces[fleet.owner] += fleet.num_ships
+                forces[fleet.owner] += fleet.num_ships
+                self.total_ships[fleet.owner] -= fleet.num_ships
+                self.turn_events.append(FleetArrived(
+                    fleet.owner, fleet.num_ships, fleet.source_planet_id, fleet.destination_planet_id
+                ))
 
             max_force_size = max(list(forces.values()))
             largest_force_owner = [owner for owner, size in forces.items() if size == max_force_size]
             if len(largest_force_owner) > 1:
                 planet.num_ships = 0  # in a tie the original owner keeps the planet with zero ships remaining
-                continue
+            else:
+                # When no tie the planet belongs to the biggest force.
+                # The num_ships in the planet is the biggest force size minus the second biggest force size
+                second_largest_force = max([size for size in forces.values() if size < max_force_size])
+                planet.owner = largest_force_owner[0]
+                planet.num_ships = max_force_size - second_largest_force
+            self.update_planet_totals(planet, previous_owner, previous_num_ships)
+            self.add_battle_events(planet, previous_owner, previous_num_ships, forces)
+
+    def add_battle_events(self, planet: Planet, previous_owner: int, previous_num_ships: int, forces: Dict[int, int]):
+        """
+        Add the PlanetBattle (and PlanetCaptured) events of fleets arriving at a planet, if fleets of another owner
+        arrived
+        :param planet: The planet after the battle
+        :param previous_owner: The planet owner before the battle
+        :param previous_num_ships: The planet ships before the battle
+        :param forces: owner -> the owner's force in the battle
+        """
+        if not any(num_ships > 0 for owner, num_ships in forces.items() if owner != previous_owner):
+            return
+        self.turn_events.append(PlanetBattle(
+            planet.planet_id, previous_owner, previous_num_ships,
+            tuple(
+                (owner, num_ships) for owner, num_ships in forces.items() if num_ships > 0 or owner == previous_owner
+            ),
+            planet.owner, planet.num_ships
+        ))
+        if planet.owner != previous_owner:
+            self.turn_events.append(PlanetCaptured(planet.planet_id, previous_owner, planet.owner, planet.num_ships))
 
-            # When no tie the planet belongs to the biggest force.
-            # The num_ships in the planet is the biggest force size minus the second biggest force size
-            second_largest_force = max([size for size in forces.values() if size < max_force_size])
-            planet.owner = largest_force_owner[0]
-            planet.num_ships = max_force_size - second_largest_force
+    def reset_owner_totals(self):
+        """
+        Count the owner totals from the game state
+        """
+        self.total_ships.clear()
+        self.total_planets.clear()
+        self.total_growth.clear()
+        for owner, totals in self.game.count_owner_totals().items():
+            self.total_ships[owner] = totals.num_ships
+            self.total_planets[owner] = totals.num_planets
+            self.total_growth[owner] = totals.growth_rate
+
+    def update_planet_totals(self, planet: Planet, previous_owner: int, previous_num_ships: int):
+        """
+        Update the owner totals after a battle on the planet
+        :param planet: The planet after the battle
+        :param previous_owner: The planet owner before the battle
+        :param previous_num_ships: The planet ships before the battle
+        """
+        self.total_ships[previous_owner] -= previous_num_ships
+        self.total_ships[planet.owner] += planet.num_ships
+        if planet.owner != previous_owner:
+            self.total_planets[previous_owner] -= 1
+            self.total_planets[planet.owner] += 1
+            self.total_growth[previous_owner] -= planet.growth_rate
+            self.total_growth[planet.owner] += planet.growth_rate
+
+    def get_owner_totals(self, player_num: int = 1) -> Dict[int, OwnerTotals]:
+        """
+        :param player_num: The player perspective
+        :return: owner -> OwnerTotals of the owner, from the given player's perspective
+        """
+        owners = self.perspective_owners[player_num]
+        return {
+            owners[owner]: OwnerTotals(self.total_ships[owner], self.total_planets[owner], self.total_growth[owner])
+            for owner in range(len(owners))
+        }
 
     def get_player_score(self, player_num: int):
         """
@@ -179,7 +362,7 @@ class GameManager:
         :param player_num: The player number
         :return: The player's score
         """
-        return int(self.game.total_ships_by_owner(owner=player_num))
+        return int(self.total_ships[player_num])
 
     def check_endgame_conditions(self):
         """
@@ -204,6 +387,19 @@ class GameManager:
             else:
                 return self.TIE_STATE
 
+        return self.adjudicate()
+
+    def adjudicate(self) -> str:
+        """
+        Check the adjudication rules, the first rule that decides the battle ends it
+        :return: The game state - player 1 wins or player 2 wins if adjudicated, otherwise still in-game
+        """
+        for rule in self.adjudication_rules:
+            decision = rule.adjudicate(self)
+            if decision is not None:
+                winner, self.adjudication_reason = decision
+                self.adjudicated_turn = self.turns
+                return self.PLAYER_1_WIN_STATE if winner == 1 else self.PLAYER_2_WIN_STATE
         return self.IN_GAME_STATE
 
     def make_turn(self) -> str:
@@ -215,20 +411,59 @@ class GameManager:
         :return: The game state - tie, player 1 wins, player 2 wins or still in-game
         """
         # get orders of player 1
-        game_object_for_player_1 = clone_game_object(self.game)
-        game_object_for_player_1.turns = self.turns
-        orders_of_player_1 = self.safely_run_bot(self.player_1, game_object_for_player_1)
+        orders_of_player_1 = self.safely_run_bot(self.player_1, self.get_game_object_for_player(player_num=1), 1)
         if orders_of_player_1 is False:
             return self.PLAYER_2_WIN_STATE
 
         # get orders of player 2
-        game_object_for_player_2 = clone_game_object(self.game)
-        switch_players_of_game_object(game_object_for_player_2)
-        game_object_for_player_2.turns = self.turns
-        orders_of_player_2 = self.safely_run_bot(self.player_2, game_object_for_player_2)
+        orders_of_player_2 = self.safely_run_bot(self.player_2, self.get_game_object_for_player(player_num=2), 2)
         if orders_of_player_2 is False:
             return self.PLAYER_1_WIN_STATE
 
+        return self.execute_turn(orders_of_player_1, orders_of_player_2)
+
+    def get_game_object_for_player(self, player_num: int) -> PlanetWars:
+        """
+        :param player_num: The player number, 1 or 2
+        :return: A clone of the game object from the given player's perspective (the player is always PlanetWars.ME)
+        """
+        game_object = clone_game_object(self.game)
+        if player_num == 2:
+            switch_players_of_game_object(game_object)
+        game_object.turns = self.turns
+        game_object.rng = self.player_rngs[player_num]
+        game_object._owner_totals = self.get_owner_totals(player_num)
+        game_object.last_turn_events = get_events_from_perspective(
+            self.turn_events, self.perspective_owners[player_num]
+        )
+        game_object._columnar_provider = partial(self.get_columnar_state, self.turns, player_num)
+        return game_object
+
+    def get_columnar_state(self, turn: int, player_num: int):
+        """
+        The columnar state of the game, built once per turn for both players
+        :param turn: The turn the state is requested for
+        :param player_num: The player number, 1 or 2
+        :return: ColumnarState from the given player's perspective, None if the game already advanced past the turn
+        """
+        from planet_wars.engine.columnar import ColumnarStateCache
+
+        if turn != self.turns:
+            return None
+        if self.columnar_state_cache is None:
+            self.columnar_state_cache = ColumnarStateCache(self.game)
+        return self.columnar_state_cache.get_state(turn, player_num)
+
+    def execute_turn(self, orders_of_player_1: List[Order], orders_of_player_2: List[Order]) -> str:
+        """
+        Execute the players' orders and advance the game one turn
+        (a.k.a advance flees, increase planets population and handle flees arrival)
+
+        :param orders_of_player_1: The orders issued by player 1
+        :param orders_of_player_2: The orders issued by player 2
+        :return: The game state - tie, player 1 wins, player 2 wins or still in-game
+        """
+        self.turn_events = []
         for order in orders_of_player_1:
             self.execute_order(order, player_id=1)
         for order in orders_of_player_2:
@@ -0,0 +1,313 @@
+"""
+Strategic features of a map, computed once per map instead of by every bot on every turn.
+
+Bots read it from the game object:
+    analysis = game.map_analysis
+    analysis.distances[source_planet_id][destination_planet_id]
+    analysis.nearest_planet_ids[my_home_planet_id][:5]
+All the features are immutable (tuples) and shared by all the game objects of the same map.
+The features only depend on the map (the game state at turn 0), not on the current turn.
+
+The analyses are cached in memory and persisted in maps/analysis/<map hash>.json.
+"""
+import hashlib
+import json
+import os
+import re
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Optional, Tuple
+
+from planet_wars import PLANET_WARS_MODULE_PATH
+from planet_wars.planet_wars import PlanetWars
+
+ANALYSIS_DIRECTORY = os.path.join(PLANET_WARS_MODULE_PATH, "maps", "analysis")
+# Bump when the analysis features change, so the persisted analyses are recomputed
+ANALYSIS_VERSION = 1
+# A neutral planet is contested if the difference between its distances from the two homes is at most this value
+CONTESTED_DISTANCE_MARGIN = 1
+# Max distance between a planet and the mirror image of its pair
+SYMMETRY_TOLERANCE = 1e-3
+# Max number of analyses kept in each memory cache, the oldest is dropped first
+MAX_CACHED_ANALYSES = 1024
+
+RADIAL_SYMMETRY = "radial"
+LINEAR_SYMMETRY = "linear"
+
+
+@dataclass(frozen=True)
+class MapAnalysis:
+    """
+    The strategic features of a map. Planets are referred by planet_id.
+    """
+    map_hash: str
+    # The starting planets of player 1 and player 2, as in the map file (-1 if missing or unknown).
+    # Player 2 bots see the map with switched owners - find your home with game.get_planets_by_owner at turn 0.
+    # The homes are unknown (and so are the contested planets and the symmetry) in the analyses of game objects
+    # without their map string, see get_map_analysis_of_game
+    home_planet_ids: Tuple[int, int]
+    # distances[i][j] is the number of turns a fleet from planet i needs to reach planet j
+    distances: Tuple[Tuple[int, ...], ...]
+    # nearest_planet_ids[i] are all the other planets sorted by distance from planet i (nearest first)
+    nearest_planet_ids: Tuple[Tuple[int, ...], ...]
+    # growth_per_distance_ranking[i] are all the other planets sorted by growth_rate / distance from planet i
+    # (best first) - the planets that pay back the fastest when attacked from planet i
+    growth_per_distance_ranking: Tuple[Tuple[int, ...], ...]
+    # Neutral planets at (almost) equal distance from both homes, sorted by growth rate (best first)
+    contested_planet_ids: Tuple[int, ...]
+    # "radial", "linear" or None if the map is not symmetric
+    symmetry_type: Optional[str]
+    # (i, j) planet pairs where j is the mirror image of i, i <= j. Planets on the symmetry centre or axis are paired
+    # with themselves. Empty if the map is not symmetric
+    symmetry_pairs: Tuple[Tuple[int, int], ...]
+
+    def get_mirror_planet_id(self, planet_id: int) -> Optional[int]:
+        """
+        :return: The id of the mirror image of the given planet, None if the map is not symmetric
+        """
+        for i, j in self.symmetry_pairs:
+            if i == planet_id:
+                return j
+            if j == planet_id:
+                return i
+        return None
+
+    def to_dict(self) -> Dict:
+        return dict(asdict(self), version=ANALYSIS_VERSION)
+
+    @staticmethod
+    def from_dict(data: Dict) -> "MapAnalysis":
+        data = {key: value for key, value in data.items() if key != "version"}
+        return MapAnalysis(
+            map_hash=data["map_hash"],
+            home_planet_ids=tuple(data["home_planet_ids"]),
+            distances=tuple(tuple(row) for row in data["distances"]),
+            nearest_planet_ids=tuple(tuple(row) for row in data["nearest_planet_ids"]),
+            growth_per_distance_ranking=tuple(tuple(row) for row in data["growth_per_distance_ranking"]),
+            contested_planet_ids=tuple(data["contested_planet_ids"]),
+            symmetry_type=data["symmetry_type"],
+            symmetry_pairs=tuple(tuple(pair) for pair in data["symmetry_pairs"])
+        )
+
+
+def get_game_hash(game: PlanetWars) -> str:
+    """
+    :param game: The game object at turn 0
+    :return: Hash of the map (the planets of the game object)
+    """
+    planets_str = "\n".join(
+        f"{p.x!r} {p.y!r} {p.owner} {p.num_ships} {p.growth_rate}" for p in game.planets
+    )
+    return hashlib.sha256(planets_str.encode()).hexdigest()
+
+
+def get_static_map_hash(game: PlanetWars) -> str:
+    """
+    :param game: The game object at any turn
+    :return: Hash of the planets data that doesn't change during the game (planet id, position and growth rate)
+    """
+    planets_str = "\n".join(f"{p.planet_id} {p.x!r} {p.y!r} {p.growth_rate}" for p in game.planets)
+    return hashlib.sha256(planets_str.encode()).hexdigest()
+
+
+def _detect_symmetry(xy, growth_rates, num_ships, home_planet_ids) -> Tuple[Optional[str], List[Tuple[int, int]]]:
+    """
+    Try point symmetry around the middle of the homes (radial) and reflection through the homes perpendicular
+    bisector (linear).
+    """
+    import numpy as np
+
+    if -1 in home_planet_ids:
+        return None, []
+    home_1, home_2 = xy[home_planet_ids[0]], xy[home_planet_ids[1]]
+    middle = (home_1 + home_2) / 2
+    normal = (home_2 - home_1) / np.linalg.norm(home_2 - home_1)
+    candidates = {
+        RADIAL_SYMMETRY: 2 * middle - xy,
+        LINEAR_SYMMETRY: xy - 2 * ((xy - middle) @ normal)[:, None] * normal[None, :]
+    }
+    for symmetry_type, mirrored in candidates.items():
+        mirror_distances = np.linalg.norm(mirrored[:, None, :] - xy[None, :, :], axis=2)
+        mirror_ids = mirror_distances.argmin(axis=1)
+        is_mirror = (
+                (mirror_distances[np.arange(len(xy)), mirror_ids] < SYMMETRY_TOLERANCE) &
+                (growth_rates[mirror_ids] == growth_rates) & (num_ships[mirror_ids] == num_ships)
+        )
+        if is_mirror.all() and (mirror_ids[mirror_ids] == np.arange(len(xy))).all():
+            pairs = sorted({(min(i, j), max(i, j)) for i, j in enumerate(mirror_ids.tolist())})
+            return symmetry_type, pairs
+    return None, []
+
+
+def analyze_map(
+        game: PlanetWars,
+        symmetry_type: Optional[str] = None,
+        symmetry_pairs: Optional[List[Tuple[int, int]]] = None,
+        static_only: bool = False
+) -> MapAnalysis:
+    """
+    Compute the map features.
+    :param game: The game object at turn 0 (from player 1 perspective)
+    :param symmetry_type: The map symmetry, if known (for example from the map generator). Detected if None
+    :param symmetry_pairs: The symmetry pairs, if known
+    :param static_only: Compute only the features that don't depend on the planets owners and ships (for a game
+                        object at any turn and from any perspective) - the homes, contested planets and symmetry are
+                        unknown and map_hash is the static map hash
+    :return: The map analysis
+    """
+    import numpy as np
+
+    planet_ids = np.array([p.planet_id for p in game.planets])
+    assert (planet_ids == np.arange(len(planet_ids))).all(), "planet ids should be the planets indexes"
+    xy = np.array([(p.x, p.y) for p in game.planets], dtype=float).reshape(-1, 2)
+    growth_rates = np.array([p.growth_rate for p in game.planets], dtype=float)
+    num_ships = np.array([p.num_ships for p in game.planets], dtype=float)
+    owners = np.array([p.owner for p in game.planets])
+
+    # Same rounding as Planet.distance_between_planets
+    distances = np.ceil(np.sqrt(((xy[:, None, :] - xy[None, :, :]) ** 2).sum(axis=2))).astype(int)
+    num_planets = len(xy)
+    others = ~np.eye(num_planets, dtype=bool)
+
+    order = np.argsort(distances, axis=1, kind="stable")
+    nearest_planet_ids = [[j for j in row if j != i] for i, row in enumerate(order.tolist())]
+
+    with np.errstate(divide="ignore"):
+        growth_per_distance = np.where(others, growth_rates[None, :] / np.maximum(distances, 1), -np.inf)
+    ranking = np.argsort(-growth_per_distance, axis=1, kind="stable")
+    growth_per_distance_ranking = [[j for j in row if j != i] for i, row in enumerate(ranking.tolist())]
+
+    home_planet_ids = tuple(
+        int(np.flatnonzero(owners == owner)[0]) if (owners == owner).any() and not static_only else -1
+        for owner in (PlanetWars.ME, PlanetWars.ENEMY)
+    )
+    contested_planet_ids = []
+    if -1 not in home_planet_ids:
+        distance_gap = np.abs(distances[home_planet_ids[0]] - distances[home_planet_ids[1]])
+        contested = np.flatnonzero((distance_gap <= CONTESTED_DISTANCE_MARGIN) & (owners == PlanetWars.NEUTRAL))
+        contested_planet_ids = sorted(contested.tolist(), key=lambda i: -growth_rates[i])
+
+    if symmetry_type is None:
+        symmetry_type, symmetry_pairs = _detect_symmetry(xy, growth_rates, num_ships, home_planet_ids)
+
+    return MapAnalysis(
+        map_hash=get_static_map_hash(game) if static_only else get_game_hash(game),
+        home_planet_ids=home_planet_ids,
+        distances=tuple(tuple(row) for row in distances.tolist()),
+        nearest_planet_ids=tuple(tuple(row) for row in nearest_planet_ids),
+        growth_per_distance_ranking=tuple(tuple(row) for row in growth_per_distance_ranking),
+        contested_planet_ids=tuple(contested_planet_ids),
+        symmetry_type=symmetry_type,
+        symmetry_pairs=tuple(tuple(sorted(pair)) for pair in symmetry_pairs or [])
+    )
+
+
+def _parse_symmetry_comments(map_str: str) -> Tuple[Optional[str], Optional[List[Tuple[int, int]]]]:
+    """
+    Read the "# symmetry <type>" and "# pair <i> <j>" comments written by the map generator
+    """
+    symmetry = re.search(r"^#\s*symmetry\s+(\w+)", map_str, re.MULTILINE)
+    if symmetry is None:
+        return None, None
+    pairs = [(int(i), int(j)) for i, j in re.findall(r"^#\s*pair\s+(\d+)\s+(\d+)", map_str, re.MULTILINE)]
+    return symmetry.group(1), pairs
+
+
+_analyses_cache: Dict[str, MapAnalysis] = {}
+_analyses_by_map_str: Dict[str, MapAnalysis] = {}
+_analyses_by_static_map_hash: Dict[str, MapAnalysis] = {}
+
+
+def _cache_analysis(cache: Dict, key, analysis: MapAnalysis) -> MapAnalysis:
+    if len(cache) >= MAX_CACHED_ANALYSES:
+        del cache[next(iter(cache))]
+    cache[key] = analysis
+    return analysis
+
+
+def _get_analysis_path(map_hash: str) -> str:
+    return os.path.join(ANALYSIS_DIRECTORY, f"{map_hash}.json")
+
+
+def get_map_analysis(game: PlanetWars, map_str: Optional[str] = None) -> MapAnalysis:
+    """
+    Get the map analysis from the memory cache, the persisted analyses or compute it (and persist it).
+    :param game: The game object at turn 0 (from player 1 perspective)
+    :param map_str: The map string, if given the symmetry comments of generated maps are used
+    :return: The map analysis
+    """
+    map_hash = get_game_hash(game)
+    if map_hash in _analyses_cache:
+        return _analyses_cache[map_hash]
+
+    analysis = None
+    path = _get_analysis_path(map_hash)
+    if os.path.exists(path):
+        with open(path) as f:
+            data = json.load(f)
+        if data.get("version") == ANALYSIS_VERSION:
+            analysis = MapAnalysis.from_dict(data)
+
+    if analysis is None:
+        symmetry_type, symmetry_pairs = _parse_symmetry_comments(map_str) if map_str else (None, None)
+        analysis = analyze_map(game, symmetry_type, symmetry_pairs)
+        if game.turns != 0:
+            # Not the map's owners and ships - keep it in memory only
+            return _cache_analysis(_analyses_cache, map_hash, analysis)
+        try:
+            os.makedirs(ANALYSIS_DIRECTORY, exist_ok=True)
+            with open(path, "w") as f:
+                json.dump(analysis.to_dict(), f)
+        except OSError:
+            pass  # Read only installation - keep the analysis in memory only
+
+    return _cache_analysis(_analyses_cache, map_hash, analysis)
+
+
+def get_map_analysis_by_map_str(map_str: str) -> MapAnalysis:
+    """
+    Same as get_map_analysis, but skips parsing and hashing the map if it was already analyzed in this process
+    :param map_str: The map string
+    :return: The map analysis
+    """
+    analysis = _analyses_by_map_str.get(map_str)
+    if analysis is None:
+        analysis = get_map_analysis(PlanetWars.parse_game_state(map_str), map_str)
+        _cache_analysis(_analyses_by_map_str, map_str, analysis)
+    return analysis
+
+
+def get_map_analysis_of_game(game: PlanetWars) -> MapAnalysis:
+    """
+    The static features of the map of a game object at any turn and from any perspective, without its map string (for
+    example a remote bot state). The owners and ships of such a state are not the map's, so the homes, contested
+    planets and symmetry are unknown (see analyze_map static_only). The game is matched by its static planets data
+    (get_static_map_hash) and the analysis is kept in memory only.
+    :param game: The game object
+    :return: The map analysis
+    """
+    static_map_hash = get_static_map_hash(game)
+    analysis = _analyses_by_static_map_hash.get(static_map_hash)
+    if analysis is None:
+        analysis = _cache_analysis(
+            _analyses_by_static_map_hash, static_map_hash, analyze_map(game, static_only=True)
+        )
+    return analysis
+
+
+def build_map_analyses():
+    """
+    Compute and persist the analyses of all the maps in the maps folder
+    """
+    maps_directory = os.path.join(PLANET_WARS_MODULE_PATH, "maps")
+    for file_name in sorted(os.listdir(maps_directory)):
+        if not file_name.endswith(".txt"):
+            continue
+        with open(os.path.join(maps_directory, file_name)) as f:
+            map_str = f.read()
+        analysis = get_map_analysis_by_map_str(map_str)
+        print(f"{file_name}: {len(analysis.distances)} planets, symmetry {analysis.symmetry_type}, "
+              f"{len(analysis.contested_planet_ids)} contested planets")
+
+
+if __name__ == "__main__":
+    build_map_analyses()
@@ -2,6 +2,8 @@
 
 import math
 import random
+import sys
+from collections import defaultdict
 
 # minimum and maximum total number of planets in map
 minPlanets = 15
@@ -28,19 +30,30 @@ maxRadius = 15
 # this is to try and avoid rounding errors causing different distances to be
 # calculated on different platforms and languages
 epsilon = 0.002
+# maps with more planets than maxPlanets are large maps - their planets are checked only against the planets in
+# this distance (instead of all the planets), otherwise generating thousands of planets is quadratic and the
+# rounding (epsilon) check against all the planets almost never passes
+largeMapCheckDistance = 8
+# symmetry types
+RADIAL_SYMMETRY = 1
+LINEAR_SYMMETRY = -1
+SYMMETRY_NAMES = {RADIAL_SYMMETRY: "radial", LINEAR_SYMMETRY: "linear"}
 
 def make_planet(x, y, owner, num_ships, growth_rate):
     return {"x" : x, "y" : y, "owner" : owner, "num_ships" : num_ships,
             "growth_rate" : growth_rate}
 
-def print_planet(p):
+def planet_to_str(p):
     out = ["P", p["x"], p["y"], p["owner"], p["num_ships"], p["growth_rate"]]
-    print(" ".join(str(i) for i in out))
+    return " ".join(str(i) for i in out)
+
+def print_planet(p):
+    print(planet_to_str(p))
 
-def translate_planets(planets):
+def translate_planets(planets, max_radius=maxRadius):
     for p in planets:
-        p["x"] += maxRadius
-        p["y"] += maxRadius
+        p["x"] += max_radius
+        p["y"] += max_radius
 
 def generate_coordinates(p, r, theta):
     if theta < 0:
@@ -50,13 +63,13 @@ def generate_coordinates(p, r, theta):
     p["x"] = r * math.cos( math.radians(theta) )
     p["y"] = r * math.sin( math.radians(theta) )
 
-def rand_num(min, max):
-    return ( random.random() * (max-min) ) + min
+def rand_num(rng, min, max):
+    return ( rng.random() * (max-min) ) + min
 
-def rand_radius(min_r, max_r):
+def rand_radius(rng, min_r, max_r):
     val = min_r - 1
     while val < min_r:
-        val = math.sqrt(random.random()) * max_r
+        val = math.sqrt(rng.random()) * max_r
     return val
 
 def distance(p1, p2):
@@ -67,142 +80,283 @@ def actual_distance(p1, p2):
     dy = p1["y"] - p2["y"]
     return math.sqrt(dx * dx + dy * dy)
 
-def not_valid(p1, p2):
+class PlanetGrid:
+    """
+    The generated planets list, bucketed by location so the validity checks of large maps look only at the
+    planets around the new planet. With check_distance None the checks look at all the planets.
+    """
+
+    def __init__(self, check_distance=None):
+        self.planets = []
+        self.check_distance = check_distance
+        self.cells = defaultdict(list)
+
+    def _cell(self, p):
+        return (int(math.floor(p["x"] / self.check_distance)),
+                int(math.floor(p["y"] / self.check_distance)))
+
+    def append(self, p):
+        self.planets.append(p)
+        if self.check_distance is not None:
+            self.cells[self._cell(p)].append(p)
+
+    def near(self, p):
+        """
+        :return: The planets to check the planet p against
+        """
+        if self.check_distance is None:
+            return self.planets
+        cx, cy = self._cell(p)
+        return [q for dx in (-1, 0, 1) for dy in (-1, 0, 1) for q in self.cells.get((cx + dx, cy + dy), ())]
+
+    def __getitem__(self, i):
+        return self.planets[i]
+
+    def __len__(self):
+        return len(self.planets)
+
+def not_valid(planets, p1, p2):
     adist = actual_distance(p1, p2)
     if distance(p1, p2) < minDistance or abs(adist - round(adist)) < epsilon:
         return True
-    for p in planets:
-        adist1 = actual_distance(p, p1)
-        adist2 = actual_distance(p, p2)
-        if (distance(p, p1) < minDistance
-                or distance(p, p2) < minDistance
-                or abs(adist1-round(adist1)) < epsilon
-                or abs(adist2-round(adist2)) < epsilon):
-            return True
-    return False
+    return not_valids(planets, p1) or not_valids(planets, p2)
 
-def not_valids(p1):
-    for p in planets:
+def not_valids(planets, p1):
+    for p in planets.near(p1):
         adist = actual_distance(p, p1)
         if distance(p, p1) < minDistance or abs(adist-round(adist)) < epsilon:
             return True
     return False
 
-#works out information about the map
-planetsToGenerate = random.randint(minPlanets, maxPlanets)
-if random.randint(0, 1):
-    symmetryType = 1 # radial symmetry
-    # can only generate an odd number of planets in this symmetry
-    while planetsToGenerate % 2 == 0:
-        if planetsToGenerate == maxPlanets:
-            planetsToGenerate = minPlanets
-        else:
-            planetsToGenerate += 1
-else:
-    symmetryType = -1 # linear symmetry
-
-planets = []
-
-#adds the centre planet
-planets.append(make_planet(0, 0, 0, random.randint(minShips, maxShips),
-    random.randint(0, maxGrowth)))
-planetsToGenerate -= 1
-
-#picks out the home planets
-r = rand_radius(minDistance, maxRadius)
-theta1 = rand_num(0, 360)
-if symmetryType == 1 and theta1 < 180:
-    theta2 = theta1+180
-elif symmetryType == 1:
-    theta2 = theta1-180
-else:
-    theta2 = rand_num(0, 360)
-
-p1 = make_planet(0, 0, 1, 100, 5)
-p2 = make_planet(0, 0, 2, 100, 5)
-generate_coordinates(p1, r, theta1)
-generate_coordinates(p2, r, theta2)
-
-while not_valid(p1, p2) or distance(p1, p2) < minStartingDistance:
-    r = rand_radius(minDistance, maxRadius)
-    theta1 = rand_num(0, 360)
+def generate_map(rng=random, min_planets=minPlanets, max_planets=maxPlanets, max_radius=None):
+    """
+    Generate a random symmetric map.
+    :param rng: The random generator to use (random.Random object or the random module)
+    :param min_planets: Minimum total number of planets
+    :param max_planets: Maximum total number of planets, above maxPlanets generates a large map
+    :param max_radius: Maximum radius from the map center, None scales maxRadius to keep the density of the
+                       default maps
+    :return: The planets, the symmetry type (RADIAL_SYMMETRY or LINEAR_SYMMETRY) and the symmetry pairs - (i, j)
+             planets indexes where planet j is the mirror image of planet i. Planets on the symmetry centre or axis
+             are paired with themselves.
+    """
+    if max_radius is None:
+        max_radius = maxRadius if max_planets <= maxPlanets else maxRadius * math.sqrt(max_planets / maxPlanets)
+    # (i, j) pairs of planets indexes where planet j is the mirror image of planet i
+    pairs = []
+
+    #works out information about the map
+    planetsToGenerate = rng.randint(min_planets, max_planets)
+    # a single even number of planets can't be generated in radial symmetry
+    if rng.randint(0, 1) and not (min_planets == max_planets and min_planets % 2 == 0):
+        symmetryType = 1 # radial symmetry
+        # can only generate an odd number of planets in this symmetry
+        while planetsToGenerate % 2 == 0:
+            if planetsToGenerate == max_planets:
+                planetsToGenerate = min_planets
+            else:
+                planetsToGenerate += 1
+    else:
+        symmetryType = -1 # linear symmetry
+
+    planets = PlanetGrid(largeMapCheckDistance if max_planets > maxPlanets else None)
+
+    #adds the centre planet
+    planets.append(make_planet(0, 0, 0, rng.randint(minShips, maxShips),
+        rng.randint(0, maxGrowth)))
+    pairs.append((0, 0))
+    planetsToGenerate -= 1
+
+    #picks out the home planets
+    r = rand_radius(rng, minDistance, max_radius)
+    theta1 = rand_num(rng, 0, 360)
     if symmetryType == 1 and theta1 < 180:
         theta2 = theta1+180
     elif symmetryType == 1:
         theta2 = theta1-180
     else:
-        theta2 = rand_num(0, 360)
+        theta2 = rand_num(rng, 0, 360)
 
+    p1 = make_planet(0, 0, 1, 100, 5)
+    p2 = make_planet(0, 0, 2, 100, 5)
     generate_coordinates(p1, r, theta1)
     generate_coordinates(p2, r, theta2)
-planets.append(p1)
-planets.append(p2)
-planetsToGenerate -= 2
-
-#makes the center neutral planets
-if symmetryType == 1:
-    noCenterNeutrals = 2*random.randint(0, maxCentral//2)
-    thetaA = (theta1+theta2)//2
-    thetaB = thetaA + 180
-    for i in range(noCenterNeutrals//2):
-        r = rand_radius(minDistance, maxRadius)
-        num_ships = random.randint(minShips, maxShips)
-        growth_rate = random.randint(minGrowth, maxGrowth)
-        p1 = make_planet(0, 0, 0, num_ships, growth_rate)
-        p2 = make_planet(0, 0, 0, num_ships, growth_rate)
-        generate_coordinates(p1, r, thetaA)
-        generate_coordinates(p2, r, thetaB)
-        while not_valid(p1, p2):
-            r = rand_radius(minDistance, maxRadius)
+
+    while not_valid(planets, p1, p2) or distance(p1, p2) < minStartingDistance:
+        r = rand_radius(rng, minDistance, max_radius)
+        theta1 = rand_num(rng, 0, 360)
+        if symmetryType == 1 and theta1 < 180:
+            theta2 = theta1+180
+        elif symmetryType == 1:
+            theta2 = theta1-180
+        else:
+            theta2 = rand_num(rng, 0, 360)
+
+        generate_coordinates(p1, r, theta1)
+        generate_coordinates(p2, r, theta2)
+    planets.append(p1)
+    planets.append(p2)
+    pairs.append((1, 2))
+    planetsToGenerate -= 2
+
+    #makes the center neutral planets
+    if symmetryType == 1:
+        noCenterNeutrals = 2*rng.randint(0, maxCentral//2)
+        thetaA = (theta1+theta2)//2
+        thetaB = thetaA + 180
+        for i in range(noCenterNeutrals//2):
+            r = rand_radius(rng, minDistance, max_radius)
+            num_ships = rng.randint(minShips, maxShips)
+            growth_rate = rng.randint(minGrowth, maxGrowth)
+            p1 = make_planet(0, 0, 0, num_ships, growth_rate)
+            p2 = make_planet(0, 0, 0, num_ships, growth_rate)
             generate_coordinates(p1, r, thetaA)
             generate_coordinates(p2, r, thetaB)
+            while not_valid(planets, p1, p2):
+                r = rand_radius(rng, minDistance, max_radius)
+                generate_coordinates(p1, r, thetaA)
+                generate_coordinates(p2, r, thetaB)
+            planets.append(p1)
+            planets.append(p2)
+            pairs.append((len(planets) - 2, len(planets) - 1))
+            planetsToGenerate -= 2
+    else:
+        # must have an even number of planets left to generate after this
+        minCentral = planetsToGenerate % 2
+        noCenterNeutrals = rng.randrange(minCentral, maxCentral+1, 2)
+        theta = (theta1+theta2)//2
+        if rng.randint(0, 1) == 1:
+            theta += 180
+        for i in range(noCenterNeutrals):
+            r = rand_radius(rng, 0, max_radius)
+            num_ships = rng.randint(minShips, maxShips)
+            growth_rate = rng.randint(minGrowth, maxGrowth)
+            p = make_planet(0, 0, 0, num_ships, growth_rate)
+            generate_coordinates(p, r, theta)
+            while not_valids(planets, p):
+                r = rand_radius(rng, 0, max_radius)
+                generate_coordinates(p, r, theta)
+            planets.append(p)
+            pairs.append((len(planets) - 1, len(planets) - 1))
+            planetsToGenerate -= 1
+
+    #picks out the rest of the neutral planets
+    assert planetsToGenerate % 2 == 0, "Error: odd number of planets left to add"
+    for i in range(planetsToGenerate//2):
+        r = rand_radius(rng, minDistance, max_radius)
+        theta = rand_num(rng, 0, 360)
+        if i == 0:
+            planet_max = min(100, 5 * distance(planets[1], planets[2]) - 1)
+            num_ships = rng.randint(minShips, planet_max)
+        else:
+            num_ships = rng.randint(minShips, maxShips)
+        growth_rate = rng.randint(minGrowth, maxGrowth)
+        p1 = make_planet(0, 0, 0, num_ships, growth_rate)
+        p2 = make_planet(0, 0, 0, num_ships, growth_rate)
+        generate_coordinates(p1, r, theta1+theta)
+        generate_coordinates(p2, r, theta2 + symmetryType*theta)
+
+        while not_valid(planets, p1, p2):
+            r = rand_radius(rng, minDistance, max_radius)
+            theta = rand_num(rng, 0, 360)
+            generate_coordinates(p1, r, theta1 + theta)
+            generate_coordinates(p2, r, theta2 + symmetryType*theta)
         planets.append(p1)
         planets.append(p2)
-        planetsToGenerate -= 2
-else:
-    # must have an even number of planets left to generate after this
-    minCentral = planetsToGenerate % 2
-    noCenterNeutrals = random.randrange(minCentral, maxCentral+1, 2)
-    theta = (theta1+theta2)//2
-    if random.randint(0, 1) == 1:
-        theta += 180
-    for i in range(noCenterNeutrals):
-        r = rand_radius(0, maxRadius)
-        num_ships = random.randint(minShips, maxShips)
-        growth_rate = random.randint(minGrowth, maxGrowth)
-        p = make_planet(0, 0, 0, num_ships, growth_rate)
-        generate_coordinates(p, r, theta)
-        while not_valids(p):
-            r = rand_radius(0, maxRadius)
-            generate_coordinates(p, r, theta)
+        pairs.append((len(planets) - 2, len(planets) - 1))
+
+    planets = planets.planets
+    translate_planets(planets, max_radius)
+    return planets, symmetryType, pairs
+
+def group_not_valid(planets, group):
+    """
+    :return: True if the group of new planets is too close (or in a rounding risky distance) to the existing
+             planets or to each other
+    """
+    for i, p1 in enumerate(group):
+        for p2 in group[i + 1:]:
+            adist = actual_distance(p1, p2)
+            if distance(p1, p2) < minDistance or abs(adist - round(adist)) < epsilon:
+                return True
+        if not_valids(planets, p1):
+            return True
+    return False
+
+def generate_multi_player_map(num_players, rng=random, min_planets_per_player=4, max_planets_per_player=10,
+                              max_radius=None):
+    """
+    Generate a random map for num_players players with num_players-fold rotational symmetry - every player's
+    home planet and neutral planets are the same as the other players' rotated around the map center.
+    :param num_players: The number of players, the home planet of player k has owner k
+    :param rng: The random generator to use (random.Random object or the random module)
+    :param min_planets_per_player: Minimum number of planets (home included) in each player's sector
+    :param max_planets_per_player: Maximum number of planets (home included) in each player's sector
+    :param max_radius: Maximum radius from the map center, None scales maxRadius with the number of players
+    :return: The planets
+    """
+    assert num_players >= 2, "a map needs at least 2 players"
+    if max_radius is None:
+        max_radius = maxRadius * math.sqrt(num_players / 2)
+    sector = 360 / num_players
+    planets = PlanetGrid(largeMapCheckDistance if num_players * max_planets_per_player > maxPlanets else None)
+
+    #adds the centre planet
+    planets.append(make_planet(0, 0, 0, rng.randint(minShips, maxShips), rng.randint(0, maxGrowth)))
+
+    #picks out the home planets
+    theta0 = rand_num(rng, 0, 360)
+    while True:
+        r = rand_radius(rng, minDistance, max_radius)
+        homes = [make_planet(0, 0, k + 1, 100, 5) for k in range(num_players)]
+        for k, p in enumerate(homes):
+            generate_coordinates(p, r, theta0 + k * sector)
+        if distance(homes[0], homes[1]) >= minStartingDistance and not group_not_valid(planets, homes):
+            break
+    for p in homes:
         planets.append(p)
-        planetsToGenerate -= 1
-
-#picks out the rest of the neutral planets
-assert planetsToGenerate % 2 == 0, "Error: odd number of planets left to add"
-for i in range(planetsToGenerate//2):
-    r = rand_radius(minDistance, maxRadius)
-    theta = rand_num(0, 360)
-    if i == 0:
-        planet_max = min(100, 5 * distance(planets[1], planets[2]) - 1)
-        num_ships = random.randint(minShips, planet_max)
-    else:
-        num_ships = random.randint(minShips, maxShips)
-    growth_rate = random.randint(minGrowth, maxGrowth)
-    p1 = make_planet(0, 0, 0, num_ships, growth_rate)
-    p2 = make_planet(0, 0, 0, num_ships, growth_rate)
-    generate_coordinates(p1, r, theta1+theta)
-    generate_coordinates(p2, r, theta2 + symmetryType*theta)
-
-    while not_valid(p1, p2):
-        r = rand_radius(minDistance, maxRadius)
-        theta = rand_num(0, 360)
-        generate_coordinates(p1, r, theta1 + theta)
-        generate_coordinates(p2, r, theta2 + symmetryType*theta)
-    planets.append(p1)
-    planets.append(p2)
 
-translate_planets(planets)
+    #picks out the neutral planets, the same planet in every sector
+    for i in range(rng.randint(min_planets_per_player, max_planets_per_player) - 1):
+        num_ships = rng.randint(minShips, maxShips)
+        growth_rate = rng.randint(minGrowth, maxGrowth)
+        group = [make_planet(0, 0, 0, num_ships, growth_rate) for _ in range(num_players)]
+        while True:
+            r = rand_radius(rng, minDistance, max_radius)
+            theta = rand_num(rng, 0, 360)
+            for k, p in enumerate(group):
+                generate_coordinates(p, r, theta0 + theta + k * sector)
+            if not group_not_valid(planets, group):
+                break
+        for p in group:
+            planets.append(p)
+
+    planets = planets.planets
+    translate_planets(planets, max_radius)
+    return planets
 
-for p in planets:
-    print_planet(p)
+def multi_player_map_to_str(planets):
+    """
+    :return: The map in the maps/*.txt format, with the number of players as a comment
+    """
+    num_players = max(p["owner"] for p in planets)
+    return "\n".join([planet_to_str(p) for p in planets] + ["# players %d" % num_players])
+
+def map_to_str(planets, symmetryType, pairs):
+    """
+    :return: The map in the maps/*.txt format. The symmetry type and pairs are kept as comments
+    """
+    lines = [planet_to_str(p) for p in planets]
+    lines.append("# symmetry " + SYMMETRY_NAMES[symmetryType])
+    lines.extend("# pair %d %d" % pair for pair in pairs)
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    # map_generator.py [number of planets] - a large map with exactly the given number of planets
+    # map_generator.py players [number of players] - a multi player map
+    if len(sys.argv) > 2 and sys.argv[1] == "players":
+        print(multi_player_map_to_str(generate_multi_player_map(int(sys.argv[2]))))
+    elif len(sys.argv) > 1:
+        print(map_to_str(*generate_map(min_planets=int(sys.argv[1]), max_planets=int(sys.argv[1]))))
+    else:
+        print(map_to_str(*generate_map()))
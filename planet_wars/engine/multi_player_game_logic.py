@@ -0,0 +1,231 @@
+"""
+Free-for-all games between N players (a whole heat in one simulation instead of a duel per pair).
+
+The rules are the 2 players rules generalized:
+    Each player's bot sees the game from its perspective - it is always PlanetWars.ME (1), the next player (in seat
+    order) is PlanetWars.ENEMY (2) and the other players are 3, 4, ... (the seat order continues cyclically), so
+    2 players bots can play as is (they attack the ENEMY player or every planet that isn't theirs).
+    When fleets arrive at a planet the largest force takes the planet with the difference from the second largest
+    force, in a tie between the largest forces the owner keeps the planet with zero ships.
+    A player without ships is out. A bot that raises an exception forfeits - its planets become neutral and its
+    fleets disappear.
+    The game ends when at most one player is left (the winner), or after MAX_TURNS turns - then the player with the
+    most ships wins, a tie between the leaders is a tie.
+
+Maps with N home planets are generated by planet_wars.engine.map_generator.generate_multi_player_map.
+"""
+from typing import List, Optional
+
+from planet_wars.engine.game_logic import GameManager, get_events_from_perspective
+from planet_wars.engine.resource_limits import ResourceLimits
+from planet_wars.engine.seeding import get_player_rng
+from planet_wars.planet_wars import PlanetWars, Player, Planet, Fleet, FleetArrived
+
+
+def get_perspective_owners(player_num: int, num_players: int) -> List[int]:
+    """
+    :param player_num: The player the perspective is of
+    :param num_players: The number of players
+    :return: owner -> owner from the player perspective. The player is 1, the next players are 2, 3, ...
+    """
+    return [PlanetWars.NEUTRAL] + [(owner - player_num) % num_players + 1 for owner in range(1, num_players + 1)]
+
+
+class MultiPlayerGameManager(GameManager):
+    """
+    The engine logic of a game between N players, see the module documentation for the rules
+    """
+
+    def __init__(
+            self,
+            map_str: str,
+            players: List[Player],
+            raise_bot_exceptions: bool = False,
+            seed: Optional[int] = None,
+            resource_limits: Optional[ResourceLimits] = None
+    ):
+        """
+        Initiate a game
+        :param map_str: The map to play in, with a home planet for each player (owners 1 to len(players))
+        :param players: The players' bots, players[k] is player k + 1
+        :param raise_bot_exceptions: If False catch exceptions from the player bots
+        :param seed: The battle seed, the players' game.rng streams are derived from it. None means unseeded
+        :param resource_limits: Limits of the bots turns, see GameManager
+        """
+        assert len(players) >= 2, "a game needs at least 2 players"
+        super().__init__(map_str, players[0], players[1], raise_bot_exceptions, seed, resource_limits=resource_limits)
+        self.players = players
+        self.num_players = len(players)
+        owners = {p.owner for p in self.game.planets} - {PlanetWars.NEUTRAL}
+        assert owners <= set(range(1, self.num_players + 1)), f"the map has planets of players {sorted(owners)}"
+        self.player_rngs = {
+            player_num: get_player_rng(seed, player_num) for player_num in range(1, self.num_players + 1)
+        }
+        self.perspective_owners = {
+            player_num: get_perspective_owners(player_num, self.num_players)
+            for player_num in range(1, self.num_players + 1)
+        }
+        # Players whose bot raised an exception
+        self.forfeited_players = set()
+
+    @staticmethod
+    def get_player_win_state(player_num: int) -> str:
+        """
+        :return: The finish state of a game the given player won ("Player 3 Wins")
+        """
+        return f"Player {player_num} Wins"
+
+    @staticmethod
+    def get_winner(finish_state: str) -> Optional[int]:
+        """
+        :return: The winner player number of the finish state, 0 for a tie and None if the game didn't end
+        """
+        if finish_state == GameManager.TIE_STATE:
+            return 0
+        if finish_state.startswith("Player ") and finish_state.endswith(" Wins"):
+            return int(finish_state.split(" ")[1])
+        return None
+
+    def get_game_object_for_player(self, player_num: int) -> PlanetWars:
+        """
+        :param player_num: The player number
+        :return: The game from the given player's perspective, built in one pass over the planets and fleets
+                 (no clone and switch).
+        """
+        owners = self.perspective_owners[player_num]
+        game_object = PlanetWars(
+            planets=[Planet(p.planet_id, owners[p.owner], p.num_ships, p.growth_rate, p.x, p.y)
+                     for p in self.game.planets],
+            fleets=[Fleet(owners[f.owner], f.num_ships, f.source_planet_id, f.destination_planet_id,
+                          f.total_trip_length, f.turns_remaining) for f in self.game.fleets]
+        )
+        game_object._spatial_index = self.game._spatial_index
+        game_object.turns = self.turns
+        game_object.rng = self.player_rngs[player_num]
+        game_object._owner_totals = self.get_owner_totals(player_num)
+        game_object.last_turn_events = get_events_from_perspective(
+            self.turn_events, self.perspective_owners[player_num]
+        )
+        return game_object
+
+    def is_in_game(self, player_num: int) -> bool:
+        """
+        :return: True if the player didn't forfeit and still has ships
+        """
+        return player_num not in self.forfeited_players and self.get_player_score(player_num) > 0
+
+    def forfeit(self, player_num: int):
+        """
+        Take the player out of the game - its planets become neutral and its fleets disappear
+        """
+        self.forfeited_players.add(player_num)
+        for planet in self.game.planets:
+            if planet.owner == player_num:
+                planet.owner = PlanetWars.NEUTRAL
+        self.game.fleets = [f for f in self.game.fleets if f.owner != player_num]
+        self.reset_owner_totals()
+
+    def make_turn(self) -> str:
+        """
+        Run one turn - get the orders of all the players in the game, execute them and advance the game one turn.
+        :return: The game state - tie, player k wins or still in-game
+        """
+        orders_by_player = {}
+        for player_num, player in enumerate(self.players, start=1):
+            if not self.is_in_game(player_num):
+                continue
+            orders = self.safely_run_bot(player, self.get_game_object_for_player(player_num), player_num)
+            if orders is False:
+                self.forfeit(player_num)
+                continue
+            orders_by_player[player_num] = orders
+
+        self.turn_events = []
+        for player_num, orders in orders_by_player.items():
+            for order in orders:
+                self.execute_order(order, player_id=player_num)
+
+        self.advance()
+        self.population_growth()
+        self.arrival()
+
+        self.turns += 1
+        self.add_turn_for_display()
+
+        return self.check_endgame_conditions()
+
+    def arrival(self):
+        """
+        Handle the fleets arriving at planets this turn - all the battles of the turn are resolved together:
+        the forces of each owner at each destination are summed in one matrix and reduced to the largest and
+        second largest force.
+        """
+        import numpy as np
+
+        arriving_fleets = [f for f in self.game.fleets if f.turns_remaining == 0]
+        if len(arriving_fleets) == 0:
+            return
+        self.game.fleets = [f for f in self.game.fleets if f.turns_remaining > 0]
+        for fleet in arriving_fleets:
+            self.total_ships[fleet.owner] -= fleet.num_ships
+            self.turn_events.append(FleetArrived(
+                fleet.owner, fleet.num_ships, fleet.source_planet_id, fleet.destination_planet_id
+            ))
+
+        destination_ids, destination_index = np.unique(
+            [f.destination_planet_id for f in arriving_fleets], return_inverse=True
+        )
+        planets = [self.game.get_planet_by_id(planet_id) for planet_id in destination_ids.tolist()]
+        ships = [p.num_ships for p in planets] + [f.num_ships for f in arriving_fleets]
+        dtype = np.int64 if all(isinstance(num_ships, int) for num_ships in ships) else float
+
+        # forces[i, owner] is the force of the owner at the i-th destination - the planet ships and the fleets
+        forces = np.zeros((len(planets), self.num_players + 1), dtype=dtype)
+        forces[np.arange(len(planets)), [p.owner for p in planets]] = [p.num_ships for p in planets]
+        np.add.at(
+            forces,
+            (destination_index.reshape(-1), [f.owner for f in arriving_fleets]),
+            np.array([f.num_ships for f in arriving_fleets], dtype=dtype)
+        )
+
+        top_two = -np.partition(-forces, 1, axis=1)[:, :2]
+        largest_force_owners = forces.argmax(axis=1)
+        for planet, largest_force_owner, (largest_force, second_largest_force), planet_forces in zip(
+                planets, largest_force_owners.tolist(), top_two.tolist(), forces.tolist()
+        ):
+            previous_owner, previous_num_ships = planet.owner, planet.num_ships
+            if largest_force == second_largest_force:
+                planet.num_ships = 0  # in a tie the original owner keeps the planet with zero ships remaining
+            else:
+                planet.owner = largest_force_owner
+                planet.num_ships = largest_force - second_largest_force
+            self.update_planet_totals(planet, previous_owner, previous_num_ships)
+            self.add_battle_events(planet, previous_owner, previous_num_ships, dict(enumerate(planet_forces)))
+
+    def get_player_scores(self) -> List[int]:
+        """
+        :return: The score (number of ships) of each player, players[k] score is in place k
+        """
+        return [
+            0 if player_num in self.forfeited_players else self.get_player_score(player_num)
+            for player_num in range(1, self.num_players + 1)
+        ]
+
+    def check_endgame_conditions(self) -> str:
+        """
+        The game ends if at most one player has ships or we reached MAX_TURNS
+        :return: The game state - tie, player k wins or still in-game
+        """
+        scores = self.get_player_scores()
+        in_game = [player_num for player_num, score in enumerate(scores, start=1) if score > 0]
+        if len(in_game) == 0:
+            return self.TIE_STATE
+        if len(in_game) == 1:
+            return self.get_player_win_state(in_game[0])
+
+        if self.turns >= self.MAX_TURNS:
+            max_score = max(scores)
+            leaders = [player_num for player_num, score in enumerate(scores, start=1) if score == max_score]
+            return self.get_player_win_state(leaders[0]) if len(leaders) == 1 else self.TIE_STATE
+
+        return self.IN_GAME_STATE
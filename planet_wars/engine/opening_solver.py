@@ -0,0 +1,273 @@
+"""
+Opening solver - which neutral planets to capture from the home planet in the first turns, solved once per map and
+side instead of by every bot under its turn budget.
+
+The model: each turn until the horizon the home planet can send fleets to the neutral planets. Capturing a neutral
+planet costs its ships + 1, and it pays back its growth rate every turn from the capture until the horizon. Each turn
+the solver picks the captures that pay back the most with the ships at home (0/1 knapsack over the ships).
+Neutral planets the enemy home reaches first are skipped (the enemy can take them before us).
+Safe plans (the default) never leave the home open to the enemy rush: an enemy sending all its starting ships at
+turn 0 arrives after distance(home, enemy home) turns, when the home grew growth_rate * distance ships. So until
+then the plan sends less than that - the map generator caps the nearest neutral ships at this budget for the same
+reason.
+
+Bots get the plan of their home planet from the game object, in new_game_has_started:
+    self.opening_plan = game.opening_plan
+and in play_turn:
+    orders = self.opening_plan.get_orders(game)
+The plans are cached in memory and persisted in maps/openings/<map hash>-<home planet id>-<parameters>.json.
+"""
+import json
+import os
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Optional, Tuple
+
+from planet_wars import PLANET_WARS_MODULE_PATH
+from planet_wars.engine.map_analysis import _cache_analysis, get_map_analysis
+from planet_wars.planet_wars import PlanetWars, Order
+
+OPENINGS_DIRECTORY = os.path.join(PLANET_WARS_MODULE_PATH, "maps", "openings")
+# Bump when the solver changes, so the persisted plans are recomputed
+OPENING_SOLVER_VERSION = 1
+# The horizon of maps without an enemy home
+DEFAULT_HORIZON = 30
+
+
+@dataclass(frozen=True)
+class OpeningPlan:
+    """
+    The opening of a map from a home planet. Planets are referred by planet_id (the same for both players).
+    """
+    map_hash: str
+    home_planet_id: int
+    enemy_home_planet_id: int  # -1 if the map has no enemy home
+    horizon: int  # The plan is optimized for the ships and growth at this turn
+    safe: bool  # If True the home is never open to an enemy rush
+    # (turn, destination_planet_id, num_ships) - the fleets to send from the home planet, by turn
+    orders: Tuple[Tuple[int, int, int], ...]
+    # The ships the captured planets gain until the horizon minus the ships spent capturing them
+    expected_gain: int
+
+    def get_orders(self, game: PlanetWars) -> List[Order]:
+        """
+        :param game: The current game
+        :return: The plan orders of the current turn that can still be executed - the home is still yours with enough
+                 ships and the destination is still neutral
+        """
+        home = game.get_planet_by_id(self.home_planet_id)
+        if home.owner != PlanetWars.ME:
+            return []
+        orders = []
+        ships = home.num_ships
+        for turn, destination_planet_id, num_ships in self.orders:
+            if turn != game.turns:
+                continue
+            destination = game.get_planet_by_id(destination_planet_id)
+            if destination.owner != PlanetWars.NEUTRAL or num_ships <= destination.num_ships or num_ships > ships:
+                continue
+            ships -= num_ships
+            orders.append(Order(home, destination, num_ships))
+        return orders
+
+    def get_target_planet_ids(self) -> Tuple[int, ...]:
+        """
+        :return: The planets the plan captures, in the order they are sent to
+        """
+        return tuple(destination_planet_id for _, destination_planet_id, _ in self.orders)
+
+    def to_dict(self) -> Dict:
+        return dict(asdict(self), version=OPENING_SOLVER_VERSION)
+
+    @staticmethod
+    def from_dict(data: Dict) -> "OpeningPlan":
+        return OpeningPlan(
+            map_hash=data["map_hash"],
+            home_planet_id=data["home_planet_id"],
+            enemy_home_planet_id=data["enemy_home_planet_id"],
+            horizon=data["horizon"],
+            safe=data["safe"],
+            orders=tuple(tuple(order) for order in data["orders"]),
+            expected_gain=data["expected_gain"]
+        )
+
+
+def _knapsack(items: List[Tuple[int, int, int]], budget: int) -> List[int]:
+    """
+    0/1 knapsack
+    :param items: (item id, cost, value) - positive integer costs
+    :param budget: The max total cost
+    :return: The ids of the items with the max total value
+    """
+    if budget <= 0 or len(items) == 0:
+        return []
+    # best[c] is the max value with total cost at most c, taken[i][c] - item i is in the best choice of cost c
+    best = [0] * (budget + 1)
+    taken = []
+    for _, cost, value in items:
+        item_taken = [False] * (budget + 1)
+        for c in range(budget, cost - 1, -1):
+            if best[c - cost] + value > best[c]:
+                best[c] = best[c - cost] + value
+                item_taken[c] = True
+        taken.append(item_taken)
+    chosen = []
+    c = budget
+    for i in range(len(items) - 1, -1, -1):
+        if taken[i][c]:
+            chosen.append(items[i][0])
+            c -= items[i][1]
+    return chosen[::-1]
+
+
+def solve_opening(
+        game: PlanetWars,
+        home_planet_id: int,
+        horizon: Optional[int] = None,
+        safe: bool = True,
+        map_hash: Optional[str] = None
+) -> OpeningPlan:
+    """
+    Solve the opening of the given home planet, see the module documentation
+    :param game: The game at turn 0
+    :param home_planet_id: The home planet to plan from
+    :param horizon: The turn the plan is optimized for, None means twice the distance between the homes
+    :param safe: If True, until the enemy rush can arrive send less than the home grows in that time
+    :param map_hash: The map hash, None computes it from the map analysis
+    :return: The opening plan
+    """
+    analysis = get_map_analysis(game)
+    distances = analysis.distances
+    home = game.get_planet_by_id(home_planet_id)
+    enemy_home_planet_ids = [
+        planet_id for planet_id in analysis.home_planet_ids if planet_id not in (-1, home_planet_id)
+    ]
+    enemy_home_planet_id = enemy_home_planet_ids[0] if enemy_home_planet_ids else -1
+    rush_distance = distances[home_planet_id][enemy_home_planet_id] if enemy_home_planet_id != -1 else None
+    if horizon is None:
+        horizon = 2 * rush_distance if rush_distance is not None else DEFAULT_HORIZON
+
+    candidates = [
+        p for p in game.planets
+        if p.owner == PlanetWars.NEUTRAL and p.growth_rate > 0 and distances[home_planet_id][p.planet_id] < horizon and
+        (enemy_home_planet_id == -1 or
+         distances[home_planet_id][p.planet_id] <= distances[enemy_home_planet_id][p.planet_id])
+    ]
+    home_ships = home.num_ships
+    # Ships the plan may still send before the enemy rush can arrive
+    safe_budget = home.growth_rate * rush_distance - 1 if safe and rush_distance is not None else None
+    orders = []
+    expected_gain = 0
+    for turn in range(horizon):
+        budget = home_ships if safe_budget is None or turn >= rush_distance else min(home_ships, safe_budget)
+        items = []
+        for planet in candidates:
+            # The planet is captured with 1 ship when the fleet arrives and grows until the horizon
+            arrival_turn = turn + distances[home_planet_id][planet.planet_id]
+            value = planet.growth_rate * (horizon - arrival_turn) - planet.num_ships
+            if value > 0:
+                items.append((planet.planet_id, planet.num_ships + 1, value))
+        chosen = set(_knapsack(items, budget))
+        for planet_id, cost, value in items:
+            if planet_id in chosen:
+                orders.append((turn, planet_id, cost))
+                expected_gain += value
+                home_ships -= cost
+                if safe_budget is not None and turn < rush_distance:
+                    safe_budget -= cost
+        candidates = [p for p in candidates if p.planet_id not in chosen]
+        home_ships += home.growth_rate
+
+    return OpeningPlan(
+        map_hash=map_hash if map_hash is not None else analysis.map_hash,
+        home_planet_id=home_planet_id,
+        enemy_home_planet_id=enemy_home_planet_id,
+        horizon=horizon,
+        safe=safe,
+        orders=tuple(orders),
+        expected_gain=expected_gain
+    )
+
+
+# Bounded like the map analyses caches (map_analysis.MAX_CACHED_ANALYSES), the oldest plan is dropped first
+_plans_cache: Dict[Tuple[str, int, Optional[int], bool], OpeningPlan] = {}
+_plans_by_map_str: Dict[Tuple[str, int, Optional[int], bool], OpeningPlan] = {}
+
+
+def _get_plan_path(map_hash: str, home_planet_id: int, horizon: Optional[int], safe: bool) -> str:
+    return os.path.join(
+        OPENINGS_DIRECTORY, f"{map_hash}-{home_planet_id}-{'auto' if horizon is None else horizon}-{int(safe)}.json"
+    )
+
+
+def get_opening_plan(
+        game: PlanetWars, home_planet_id: int, horizon: Optional[int] = None, safe: bool = True
+) -> OpeningPlan:
+    """
+    Get the opening plan from the memory cache, the persisted plans or solve it (and persist it).
+    :param game: The game at turn 0
+    :param home_planet_id: The home planet to plan from
+    :param horizon: See solve_opening
+    :param safe: See solve_opening
+    :return: The opening plan
+    """
+    map_hash = get_map_analysis(game).map_hash
+    key = (map_hash, home_planet_id, horizon, safe)
+    if key in _plans_cache:
+        return _plans_cache[key]
+
+    plan = None
+    path = _get_plan_path(*key)
+    if os.path.exists(path):
+        with open(path) as f:
+            data = json.load(f)
+        if data.get("version") == OPENING_SOLVER_VERSION:
+            plan = OpeningPlan.from_dict(data)
+
+    if plan is None:
+        plan = solve_opening(game, home_planet_id, horizon, safe, map_hash)
+        try:
+            os.makedirs(OPENINGS_DIRECTORY, exist_ok=True)
+            with open(path, "w") as f:
+                json.dump(plan.to_dict(), f)
+        except OSError:
+            pass  # Read only installation - keep the plan in memory only
+
+    return _cache_analysis(_plans_cache, key, plan)
+
+
+def get_opening_plan_by_map_str(
+        map_str: str, home_planet_id: int, horizon: Optional[int] = None, safe: bool = True
+) -> OpeningPlan:
+    """
+    Same as get_opening_plan, but skips parsing and hashing the map if it was already solved in this process
+    :param map_str: The map string
+    """
+    key = (map_str, home_planet_id, horizon, safe)
+    plan = _plans_by_map_str.get(key)
+    if plan is None:
+        plan = get_opening_plan(PlanetWars.parse_game_state(map_str), home_planet_id, horizon, safe)
+        _cache_analysis(_plans_by_map_str, key, plan)
+    return plan
+
+
+def build_opening_plans():
+    """
+    Solve and persist the opening plans of both homes of all the maps in the maps folder
+    """
+    maps_directory = os.path.join(PLANET_WARS_MODULE_PATH, "maps")
+    for file_name in sorted(os.listdir(maps_directory)):
+        if not file_name.endswith(".txt"):
+            continue
+        with open(os.path.join(maps_directory, file_name)) as f:
+            map_str = f.read()
+        game = PlanetWars.parse_game_state(map_str)
+        for home_planet_id in get_map_analysis(game, map_str).home_planet_ids:
+            if home_planet_id == -1:
+                continue
+            plan = get_opening_plan_by_map_str(map_str, home_planet_id)
+            print(f"{file_name} home {home_planet_id}: {len(plan.orders)} captures, "
+                  f"expected gain {plan.expected_gain} by turn {plan.horizon}")
+
+
+if __name__ == "__main__":
+    build_opening_plans()
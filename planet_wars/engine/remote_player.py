@@ -0,0 +1,482 @@
+"""
+Run bots out of process - as separate processes or as services behind a local socket.
+
+Two wire formats are supported, the bot server detects the format of each message:
+binary (default) - see planet_wars.engine.state_encoding:
+    The engine sends:          Full frame on the first turn of each game and delta frames on the next turns.
+    The bot server answers:    Orders frame, or error frame if the bot failed.
+text - line based, using the PlanetWars.__str__ format for the game state:
+    The engine sends:          "turn <turn number>", the game state lines and a "go" line.
+    The bot server answers:    One "<source planet id> <destination planet id> <num ships>" line per order and a
+                               "go" line, or an "error <message>" line and a "go" line if the bot failed.
+A turn 0 message tells the bot server a new game has started on this connection.
+
+Host a bot:
+    python -m planet_wars.engine.remote_player planet_wars.player_bots.baseline_code.baseline_bot:AttackWeakestPlanetFromStrongestBot --port 9000
+
+And play against it with RemotePlayer("127.0.0.1", 9000) using the AsyncGameManager
+(or Tournament.run_battles_concurrently), or using the GameManager - then the turns are played one at a time.
+"""
+import argparse
+import asyncio
+import importlib
+import subprocess
+import sys
+from contextlib import asynccontextmanager
+from typing import Callable, List, Optional, Union
+
+from planet_wars.engine import state_encoding
+from planet_wars.engine.game_logic import GameManager
+from planet_wars.engine.state_encoding import StateEncoder, StateDecoder
+from planet_wars.planet_wars import Player, PlanetWars, Order
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 9000
+END_OF_MESSAGE = "go"
+TURN_HEADER = "turn"
+ERROR_HEADER = "error"
+BINARY_WIRE_FORMAT = "binary"
+TEXT_WIRE_FORMAT = "text"
+
+
+class RemoteBotError(Exception):
+    """
+    The remote bot failed to play its turn - exception in the bot, bad response, timeout or lost connection
+    """
+
+
+class BotServerError(RemoteBotError):
+    """
+    The bot raised exception in the bot server, the connection is still usable
+    """
+
+
+def format_game_state_message(game: PlanetWars, turn: int) -> bytes:
+    """
+    :param game: The game object to send to the bot
+    :param turn: The turn number
+    :return: The game state message to send to the bot server
+    """
+    return f"{TURN_HEADER} {turn}\n{game}\n{END_OF_MESSAGE}\n".encode()
+
+
+def format_orders_message(orders: List[Order]) -> bytes:
+    """
+    :param orders: The orders the bot issued
+    :return: The orders message to send back to the engine
+    """
+    return "".join(f"{order}\n" for order in orders).encode() + f"{END_OF_MESSAGE}\n".encode()
+
+
+def format_error_message(e: Exception) -> bytes:
+    """
+    :param e: The exception the bot raised
+    :return: The error message to send back to the engine
+    """
+    message = f"{e.__class__.__name__}: {e}".replace("\n", " ")
+    return f"{ERROR_HEADER} {message}\n{END_OF_MESSAGE}\n".encode()
+
+
+def _parse_number(token: str) -> Union[int, float]:
+    try:
+        return int(token)
+    except ValueError:
+        return float(token)
+
+
+def parse_orders_message(lines: List[str]) -> List[Order]:
+    """
+    Parse the bot server response.
+    :param lines: The response lines, without the "go" line
+    :return: The orders. Raise RemoteBotError if the bot failed or the response is malformed
+    """
+    orders = []
+    for line in lines:
+        if line.startswith(ERROR_HEADER):
+            raise BotServerError(line[len(ERROR_HEADER):].strip())
+        tokens = line.split()
+        if len(tokens) == 0:
+            continue
+        if len(tokens) != 3:
+            raise RemoteBotError(f"malformed order line {line!r}")
+        try:
+            orders.append(Order(int(tokens[0]), int(tokens[1]), _parse_number(tokens[2])))
+        except ValueError:
+            raise RemoteBotError(f"malformed order line {line!r}")
+    return orders
+
+
+async def read_message(reader: asyncio.StreamReader) -> Optional[List[str]]:
+    """
+    Read lines until the "go" line.
+    :return: The message lines without the "go" line, None if the connection was closed
+    """
+    lines = []
+    while True:
+        line = await reader.readline()
+        if not line:
+            return None
+        line = line.decode().rstrip("\r\n")
+        if line == END_OF_MESSAGE:
+            return lines
+        lines.append(line)
+
+
+class RemoteBotConnection:
+    """
+    A connection to a bot server. Can be reused by many games, one game at a time.
+    """
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+
+    async def request(self, message: bytes) -> List[str]:
+        """
+        Send text message and wait for the response
+        :return: The response lines, without the "go" line
+        """
+        self.writer.write(message)
+        await self.writer.drain()
+        lines = await read_message(self.reader)
+        if lines is None:
+            raise RemoteBotError("connection closed by the bot server")
+        return lines
+
+    async def request_binary(self, frame: bytes) -> List[Order]:
+        """
+        Send state frame and wait for the response
+        :return: The orders
+        """
+        self.writer.write(frame)
+        await self.writer.drain()
+        try:
+            header = await self.reader.readexactly(state_encoding.RESPONSE_HEADER.size)
+            frame_type, body_size = state_encoding.get_response_body_size(header)
+            body = await self.reader.readexactly(body_size)
+        except asyncio.IncompleteReadError:
+            raise RemoteBotError("connection closed by the bot server")
+        except state_encoding.StateEncodingError as e:
+            raise RemoteBotError(str(e))
+        if frame_type == state_encoding.ERROR_FRAME:
+            raise BotServerError(body.decode(errors="replace"))
+        return state_encoding.decode_orders(body)
+
+    def close(self):
+        self.writer.close()
+
+
+class RemoteBotSession:
+    """
+    A single game played by a RemotePlayer over a single connection.
+    """
+
+    def __init__(self, connection: RemoteBotConnection, timeout: Optional[float], wire_format: str):
+        """
+        :param connection: The connection to the bot server, used only by this game until the session ends
+        :param timeout: Max seconds to wait for each turn orders. None means no timeout
+        :param wire_format: "binary" or "text"
+        """
+        self.connection = connection
+        self.timeout = timeout
+        self.wire_format = wire_format
+        self.state_encoder = StateEncoder()
+        # After timeout or broken response the connection is not in sync with the server and can't be reused
+        self.reusable = True
+
+    async def play_turn(self, game: PlanetWars) -> List[Order]:
+        """
+        Send the game state to the bot server and return the bot orders.
+        Raise RemoteBotError if the bot failed or did not answer in time.
+        """
+        if self.wire_format == BINARY_WIRE_FORMAT:
+            if game.turns == 0:
+                self.state_encoder.reset()
+            request = self.connection.request_binary(self.state_encoder.encode(game))
+        else:
+            request = self.connection.request(format_game_state_message(game, game.turns))
+        try:
+            response = await asyncio.wait_for(request, self.timeout)
+        except asyncio.TimeoutError:
+            self.reusable = False
+            raise RemoteBotError(f"bot did not answer in {self.timeout} seconds")
+        except BotServerError:
+            raise
+        except (OSError, RemoteBotError) as e:
+            self.reusable = False
+            raise RemoteBotError(str(e))
+        return response if self.wire_format == BINARY_WIRE_FORMAT else parse_orders_message(response)
+
+
+class RemotePlayer(Player):
+    """
+    Player adapter for a bot that runs in a bot server (see serve_player).
+    The AsyncGameManager plays the turns asynchronously (see session), other game managers call play_turn, which
+    waits for the orders on a private event loop.
+
+    Connections are reused between games, each game holds one connection while it runs.
+    max_connections bounds the number of games that play with this bot at the same time, the other games wait for
+    a free connection (backpressure).
+    """
+
+    # The bot code runs on the server - the battle cache can't know when it changes
+    DETERMINISTIC = False
+
+    def __init__(
+            self,
+            host: str = DEFAULT_HOST,
+            port: int = DEFAULT_PORT,
+            name: Optional[str] = None,
+            timeout: Optional[float] = 1.0,
+            connect_timeout: float = 5.0,
+            max_connections: int = 64,
+            wire_format: str = BINARY_WIRE_FORMAT
+    ):
+        """
+        :param host: The bot server host
+        :param port: The bot server port
+        :param name: The player name, if None uses host:port
+        :param timeout: Max seconds to wait for each turn orders, if the bot doesn't answer in time it loses the game.
+                        None means no timeout
+        :param connect_timeout: Max seconds to wait for a new connection to the bot server
+        :param max_connections: Max number of open connections (and concurrent games) to the bot server
+        :param wire_format: "binary" (compact frames, only changes are sent after the first turn) or "text"
+        """
+        assert wire_format in (BINARY_WIRE_FORMAT, TEXT_WIRE_FORMAT), f"unknown wire format {wire_format}"
+        self.NAME = name if name is not None else f"RemotePlayer({host}:{port})"
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.max_connections = max_connections
+        self.wire_format = wire_format
+        self._loop = None
+        self._connections_semaphore = None
+        self._idle_connections = []
+        # The private event loop of play_turn and the (session context, session) of its current game
+        self._sync_loop = None
+        self._sync_session = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.update(_loop=None, _connections_semaphore=None, _idle_connections=[], _sync_loop=None, _sync_session=None)
+        return state
+
+    def play_turn(self, game: PlanetWars) -> List[Order]:
+        """
+        Play a turn synchronously, for the game managers that don't run on an event loop. The turn is sent on a
+        private event loop, each game holds one connection from its turn 0 until the next game starts (then the
+        connection is reused) or close_sync is called. One game at a time - use the AsyncGameManager to play many.
+        Raise RemoteBotError if the bot failed or did not answer in time.
+        """
+        if self._sync_loop is None:
+            self._sync_loop = asyncio.new_event_loop()
+        if game.turns == 0 or self._sync_session is None:
+            self._end_sync_session()
+            session_context = self.session()
+            self._sync_session = (session_context, self._sync_loop.run_until_complete(session_context.__aenter__()))
+        try:
+            return self._sync_loop.run_until_complete(self._sync_session[1].play_turn(game))
+        except Exception:
+            # The bot lost the game - release the connection (it is closed if it is out of sync)
+            self._end_sync_session()
+            raise
+
+    def _end_sync_session(self):
+        if self._sync_session is not None:
+            session_context, self._sync_session = self._sync_session[0], None
+            self._sync_loop.run_until_complete(session_context.__aexit__(None, None, None))
+
+    def close_sync(self):
+        """
+        Close the connections and the private event loop of play_turn
+        """
+        if self._sync_loop is None:
+            return
+        self._end_sync_session()
+        self._sync_loop.run_until_complete(self.close())
+        self._sync_loop.close()
+        self._sync_loop = None
+
+    def _bind_to_running_loop(self):
+        """
+        Connections and semaphore belong to an event loop - reset them when running in a new loop
+        """
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            for connection in self._idle_connections:
+                connection.close()
+            self._idle_connections = []
+            self._connections_semaphore = asyncio.Semaphore(self.max_connections)
+            self._loop = loop
+
+    async def _get_connection(self) -> RemoteBotConnection:
+        if self._idle_connections:
+            return self._idle_connections.pop()
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port), self.connect_timeout
+        )
+        return RemoteBotConnection(reader, writer)
+
+    @asynccontextmanager
+    async def session(self):
+        """
+        Reserve a connection for a game.
+        Usage:
+            async with remote_player.session() as session:
+                orders = await session.play_turn(game)
+        """
+        self._bind_to_running_loop()
+        async with self._connections_semaphore:
+            try:
+                connection = await self._get_connection()
+            except (OSError, asyncio.TimeoutError) as e:
+                raise RemoteBotError(f"can not connect to {self.host}:{self.port} - {e}")
+            session = RemoteBotSession(connection, self.timeout, self.wire_format)
+            try:
+                yield session
+            finally:
+                if session.reusable:
+                    self._idle_connections.append(connection)
+                else:
+                    connection.close()
+
+    async def close(self):
+        """
+        Close all the idle connections
+        """
+        for connection in self._idle_connections:
+            connection.close()
+        self._idle_connections = []
+
+
+def run_bot(player: Player, game: PlanetWars) -> List[Order]:
+    """
+    Run the bot turn, on the first turn of the game call new_game_has_started first.
+    :return: The bot orders
+    """
+    if game.turns == 0:
+        player.new_game_has_started(game)
+    return GameManager.normalize_orders(player.play_turn(game))
+
+
+def play_turn_message(player: Player, lines: List[str]) -> bytes:
+    """
+    Run the bot on a text game state message.
+    :param player: The bot
+    :param lines: The game state message lines (without the "go" line)
+    :return: The response message
+    """
+    try:
+        header = lines[0].split()
+        if len(header) != 2 or header[0] != TURN_HEADER:
+            raise ValueError(f"malformed message header {lines[0]!r}")
+        game = PlanetWars.parse_game_state("\n".join(lines[1:]))
+        if game == 0:
+            raise ValueError("malformed game state")
+        game.turns = int(header[1])
+        return format_orders_message(run_bot(player, game))
+    except Exception as e:
+        return format_error_message(e)
+
+
+def play_turn_frame(player: Player, state_decoder: StateDecoder, frame: bytes) -> bytes:
+    """
+    Run the bot on a binary game state frame.
+    :param player: The bot
+    :param state_decoder: The connection's state decoder
+    :param frame: The game state frame
+    :return: The response frame
+    """
+    try:
+        return state_encoding.encode_orders(run_bot(player, state_decoder.decode(frame)))
+    except Exception as e:
+        return state_encoding.encode_error(f"{e.__class__.__name__}: {e}")
+
+
+async def read_request(reader: asyncio.StreamReader) -> Union[bytes, List[str], None]:
+    """
+    Read the next request, binary or text.
+    :return: The binary frame or the text message lines, None if the connection was closed
+    """
+    try:
+        start = await reader.readexactly(len(state_encoding.MAGIC))
+    except asyncio.IncompleteReadError:
+        return None
+    if start != state_encoding.MAGIC:
+        first_line = (start + await reader.readline()).decode().rstrip("\r\n")
+        lines = await read_message(reader)
+        return None if lines is None else [first_line] + lines
+
+    frame = start + await reader.readexactly(state_encoding.HEADER.size - len(start))
+    frame_size = state_encoding.get_frame_size(frame)
+    if frame_size is None:
+        frame += await reader.readexactly(state_encoding.DELTA_HEADER.size)
+        frame_size = state_encoding.get_frame_size(frame)
+    return frame + await reader.readexactly(frame_size - len(frame))
+
+
+async def serve_player(player_factory: Callable[[], Player], host: str = DEFAULT_HOST, port: int = DEFAULT_PORT):
+    """
+    Run a bot server. Each connection gets its own bot object, created with player_factory.
+    The bots run in a thread pool so a slow bot doesn't block the other connections.
+
+    :param player_factory: Creates a new bot, usually the bot class
+    :param host: The host to listen on
+    :param port: The port to listen on
+    """
+    loop = asyncio.get_running_loop()
+
+    async def handle_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        player = player_factory()
+        state_decoder = StateDecoder()
+        try:
+            while True:
+                request = await read_request(reader)
+                if request is None:
+                    break
+                if isinstance(request, bytes):
+                    response = await loop.run_in_executor(None, play_turn_frame, player, state_decoder, request)
+                else:
+                    response = await loop.run_in_executor(None, play_turn_message, player, request)
+                writer.write(response)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, state_encoding.StateEncodingError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle_connection, host, port)
+    async with server:
+        await server.serve_forever()
+
+
+def load_player_class(player_spec: str) -> Callable[[], Player]:
+    """
+    :param player_spec: "module.path:ClassName"
+    :return: The bot class
+    """
+    module_name, class_name = player_spec.split(":")
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def start_player_process(player_spec: str, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> subprocess.Popen:
+    """
+    Start a bot server in a new process.
+    :param player_spec: "module.path:ClassName" of the bot to serve
+    :param host: The host to listen on
+    :param port: The port to listen on
+    :return: The bot server process, call terminate() on it when done
+    """
+    return subprocess.Popen(
+        [sys.executable, "-m", "planet_wars.engine.remote_player", player_spec, "--host", host, "--port", str(port)]
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a PlanetWars bot over a local socket")
+    parser.add_argument("player", help="The bot to serve, as module.path:ClassName")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    args = parser.parse_args()
+    asyncio.run(serve_player(load_player_class(args.player), args.host, args.port))
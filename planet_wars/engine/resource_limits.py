@@ -0,0 +1,292 @@
+"""
+Per bot resource accounting and limits.
+
+Every bot call (new_game_has_started and play_turn) is measured and added to the totals, only the play_turn calls
+are counted as turns (BotResourceUsage.turns):
+    CPU time - time.process_time of the turn, so the CPU of the threads the bot starts is counted too (and so is the
+               CPU of other threads running in the process during the turn).
+    Turn memory - the peak of the memory the bot allocated during the turn (tracemalloc). Tracing slows the bot
+                  down (and inflates its CPU time), so it is measured only when the GameManager is given
+                  ResourceLimits with max_turn_memory or track_memory=True.
+    Process peak RSS - the process peak resident memory after the turn. The bot shares the process with the engine
+                       and the other bot, so it is not the bot's own memory and is not in the tournament scores. The
+                       max_rss limit is checked against the current RSS.
+    Threads - the threads the bot started and left running.
+The usage is summed per bot in BotResourceUsage (GameManager.resource_usage, BattleResult.resource_usage) and in the
+tournament PlayerScore.
+
+A bot that goes over one of the ResourceLimits forfeits the battle, even when the GameManager raises the bots
+exceptions. The CPU time, turn memory and RSS limits are enforced while the turn runs: a watchdog thread checks the
+running turn every WATCHDOG_INTERVAL seconds and stops a turn that went over them, by raising an exception in the
+bot's thread. Python can only raise it between bytecodes, so a bot stuck in one long native call (time.sleep, a huge
+numpy operation) is stopped when that call returns. Run untrusted bots in their own process (SharedMemoryPlayer or
+RemotePlayer) with OS limits for stronger isolation.
+
+Usage:
+    limits = ResourceLimits(max_turn_cpu_time=1.0, max_turn_memory=512 * 1024 ** 2)
+    tournament = Tournament(players, maps, resource_limits=limits)
+"""
+import ctypes
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import Callable, List, Optional, TypeVar
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+T = TypeVar("T")
+
+# Seconds between the watchdog checks of a running bot turn
+WATCHDOG_INTERVAL = 0.01
+
+
+class ResourceLimitExceeded(Exception):
+    """
+    Raised when a bot goes over its resource limits, the bot forfeits the battle
+    """
+    pass
+
+
+@dataclass(frozen=True)
+class ResourceLimits:
+    """
+    Hard limits of a bot turn, None means no limit
+    """
+    max_turn_cpu_time: Optional[float] = None  # CPU seconds of a single turn
+    max_turn_memory: Optional[int] = None  # Bytes allocated (at the peak) during a single turn
+    max_rss: Optional[int] = None  # Bytes of process resident memory during the turn (current, not peak)
+    max_new_threads: Optional[int] = None  # Threads the bot started in a turn and left running
+    track_memory: bool = False  # Measure the turn memory (with tracemalloc) even without max_turn_memory
+
+
+@dataclass
+class BotResourceUsage:
+    """
+    The resources a bot used in a battle
+    """
+    turns: int = 0  # The number of measured turns
+    cpu_time: float = 0.0  # Total CPU seconds
+    max_turn_cpu_time: float = 0.0  # CPU seconds of the slowest turn
+    total_turn_memory: int = 0  # Sum of the turns peak allocated bytes, 0 if memory was not tracked
+    peak_turn_memory: int = 0  # The largest turn peak allocated bytes
+    process_peak_rss: int = 0  # The process peak RSS after the bot's last turn (not the bot's own memory)
+    new_threads: int = 0  # Threads the bot started and left running
+    limit_exceeded: Optional[str] = None  # The limit the bot went over, None if it didn't
+
+    @property
+    def mean_turn_cpu_time(self) -> float:
+        return self.cpu_time / self.turns if self.turns > 0 else 0.0
+
+
+def get_peak_rss() -> int:
+    """
+    :return: The process peak resident memory in bytes, 0 if unknown
+    """
+    if resource is None:
+        return 0
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == "darwin" else max_rss * 1024  # bytes on macOS, KB on Linux
+
+
+def get_rss() -> int:
+    """
+    :return: The current process resident memory in bytes (the peak RSS where the current isn't available)
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return get_peak_rss()
+
+
+class _LimitInterrupt(BaseException):
+    """
+    Raised by the watchdog in the thread of a bot turn that went over its limits. A BaseException, so bots catching
+    Exception don't swallow it.
+    """
+
+
+def _set_async_exception(thread_id: int, exception: Optional[type]):
+    """
+    Raise the exception in the thread at its next bytecode, None cancels a pending exception
+    """
+    ctypes.pythonapi.PyThreadState_SetAsyncExc(
+        ctypes.c_ulong(thread_id), ctypes.py_object(exception) if exception is not None else None
+    )
+
+
+class _WatchedTurn:
+    """
+    A running bot turn, checked by the watchdog
+    """
+
+    def __init__(self, limits: ResourceLimits, cpu_time_at_start: float, memory_at_start: Optional[int]):
+        self.thread_id = threading.get_ident()
+        self.limits = limits
+        self.cpu_time_at_start = cpu_time_at_start
+        self.memory_at_start = memory_at_start  # None if memory is not traced
+        self.exceeded: Optional[str] = None  # The limit the turn went over
+        self.running = True
+        self.interrupting = False
+
+    def check(self) -> Optional[str]:
+        """
+        :return: The limit the turn went over so far, None if it didn't
+        """
+        limits = self.limits
+        cpu_time = time.process_time() - self.cpu_time_at_start
+        if limits.max_turn_cpu_time is not None and cpu_time > limits.max_turn_cpu_time:
+            return f"turn CPU time {cpu_time:.3f}s > {limits.max_turn_cpu_time}s"
+        if limits.max_turn_memory is not None and self.memory_at_start is not None:
+            turn_memory = tracemalloc.get_traced_memory()[0] - self.memory_at_start
+            if turn_memory > limits.max_turn_memory:
+                return f"turn memory {turn_memory} bytes > {limits.max_turn_memory} bytes"
+        if limits.max_rss is not None and (rss := get_rss()) > limits.max_rss:
+            return f"RSS {rss} bytes > {limits.max_rss} bytes"
+        return None
+
+
+class _Watchdog:
+    """
+    Checks the running bot turns every WATCHDOG_INTERVAL seconds. Its thread is parked while no turn runs.
+    """
+
+    def __init__(self):
+        self._turns: List[_WatchedTurn] = []
+        self._has_turns = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """
+        Start the watchdog thread, if not started yet - before the turn's new threads are counted
+        """
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="resource-watchdog", daemon=True)
+            self._thread.start()
+
+    def watch(self, turn: _WatchedTurn):
+        self._turns.append(turn)
+        self._has_turns.set()
+
+    def unwatch(self, turn: _WatchedTurn):
+        """
+        Stop watching the turn, called by the turn's thread. Safe to call again if the watchdog's exception
+        interrupted it.
+        """
+        turn.running = False
+        # The watchdog may be raising the exception in this thread right now - wait for it, then cancel the
+        # exception if it wasn't raised yet, so it is not raised in the engine code after the turn
+        while turn.interrupting:
+            time.sleep(0)
+        if turn.exceeded is not None:
+            _set_async_exception(turn.thread_id, None)
+        if turn in self._turns:
+            self._turns.remove(turn)
+        if not self._turns:
+            self._has_turns.clear()
+            if self._turns:  # A turn of another thread started meanwhile
+                self._has_turns.set()
+
+    def _run(self):
+        while True:
+            self._has_turns.wait()
+            time.sleep(WATCHDOG_INTERVAL)
+            for turn in list(self._turns):
+                if turn.exceeded is not None:
+                    continue
+                exceeded = turn.check()
+                if exceeded is None:
+                    continue
+                turn.exceeded = exceeded
+                # running is checked after interrupting is set, and unwatch sets running before it reads interrupting,
+                # so a finished turn is never interrupted
+                turn.interrupting = True
+                if turn.running:
+                    _set_async_exception(turn.thread_id, _LimitInterrupt)
+                turn.interrupting = False
+
+
+_watchdog = _Watchdog()
+
+
+def run_with_resource_accounting(
+        func: Callable[[], T], usage: BotResourceUsage, limits: Optional[ResourceLimits] = None, count_turn: bool = True
+) -> T:
+    """
+    Run a bot call, add its resources to the usage and enforce the limits
+    :param func: The bot call
+    :param usage: The bot usage to update
+    :param limits: The bot limits, None means no limits and no memory tracking
+    :param count_turn: Count the call as a turn (False for the calls that are not turns, like new_game_has_started)
+    :return: The call result. Raise ResourceLimitExceeded if the call went over the limits
+    """
+    track_memory = limits is not None and (limits.track_memory or limits.max_turn_memory is not None)
+    watch = limits is not None and (
+            limits.max_turn_cpu_time is not None or limits.max_turn_memory is not None or limits.max_rss is not None
+    )
+    if watch:
+        _watchdog.start()
+    started_tracing = False
+    memory_at_start = 0
+    if track_memory:
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+            memory_at_start = tracemalloc.get_traced_memory()[0]
+        else:
+            tracemalloc.start()
+            started_tracing = True
+    threads_at_start = threading.active_count()
+    cpu_time_at_start = time.process_time()
+    turn = None
+    if watch:
+        turn = _WatchedTurn(limits, cpu_time_at_start, memory_at_start if track_memory else None)
+        _watchdog.watch(turn)
+    result = None
+    try:
+        try:
+            result = func()
+        finally:
+            if turn is not None:
+                _watchdog.unwatch(turn)
+    except _LimitInterrupt:
+        # Raised by the watchdog, maybe after the call returned (then unwatch was interrupted - finish it)
+        _watchdog.unwatch(turn)
+    finally:
+        cpu_time = time.process_time() - cpu_time_at_start
+        new_threads = max(threading.active_count() - threads_at_start, 0)
+        turn_memory = 0
+        if track_memory:
+            turn_memory = max(tracemalloc.get_traced_memory()[1] - memory_at_start, 0)
+            if started_tracing:
+                tracemalloc.stop()
+
+        if count_turn:
+            usage.turns += 1
+        usage.cpu_time += cpu_time
+        usage.max_turn_cpu_time = max(usage.max_turn_cpu_time, cpu_time)
+        usage.total_turn_memory += turn_memory
+        usage.peak_turn_memory = max(usage.peak_turn_memory, turn_memory)
+        usage.process_peak_rss = get_peak_rss()
+        usage.new_threads += new_threads
+
+    if limits is not None:
+        exceeded = turn.exceeded if turn is not None else None  # The limit the watchdog stopped the call on
+        if exceeded is None:
+            if limits.max_turn_cpu_time is not None and cpu_time > limits.max_turn_cpu_time:
+                exceeded = f"turn CPU time {cpu_time:.3f}s > {limits.max_turn_cpu_time}s"
+            elif limits.max_turn_memory is not None and turn_memory > limits.max_turn_memory:
+                exceeded = f"turn memory {turn_memory} bytes > {limits.max_turn_memory} bytes"
+            elif limits.max_rss is not None and (rss := get_rss()) > limits.max_rss:
+                exceeded = f"RSS {rss} bytes > {limits.max_rss} bytes"
+            elif limits.max_new_threads is not None and new_threads > limits.max_new_threads:
+                exceeded = f"{new_threads} new threads > {limits.max_new_threads}"
+        if exceeded is not None:
+            usage.limit_exceeded = exceeded
+            raise ResourceLimitExceeded(exceeded)
+    return result
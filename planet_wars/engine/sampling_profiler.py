@@ -0,0 +1,217 @@
+"""
+Sampling profiler of the bots - where inside play_turn the bots spend their time, over many turns, maps and battles.
+
+While a bot turn runs (GameManager.safely_run_bot), a background thread wakes every interval seconds and takes the
+stack of the thread running the bot (sys._current_frames), from the bot call down. The stacks are counted per
+player in a BotProfile. Only the sampled thread's frames are walked and nothing is traced, so the overhead doesn't
+grow with the amount of code the bot runs - about 1 microsecond per bot call plus a stack walk per sample.
+Between the bot calls the thread is parked: when it wakes up and no call ran since its last wake up (between the
+battles, or while the engine plays a long turn) it waits for the next call instead of waking every interval. While the
+calls keep coming it wakes every interval - waking it at the start of every call would cost more than these wake ups,
+and the calls shorter than the interval would never be sampled.
+Python switches threads every sys.getswitchinterval() seconds (5 ms by default), so shorter intervals don't give
+more samples.
+
+The battle profiles are in BattleResult.bot_profiles and the tournament merges them per bot:
+    tournament = Tournament(players, maps, sampling_interval=0.005)
+    tournament.run_tournament()
+    print(tournament.get_hotspots_data_frame())
+    tournament.write_collapsed_stacks("profiles")  # one <bot name>.collapsed file per bot, for flame graph tools
+"""
+import os
+import sys
+import threading
+from _thread import get_ident
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Tuple, TypeVar
+
+T = TypeVar("T")
+
+DEFAULT_SAMPLING_INTERVAL = 0.005
+
+
+@dataclass
+class BotProfile:
+    """
+    The sampled stacks of a bot. A stack is a tuple of function labels from the bot call (outermost) to the running
+    function.
+    """
+    interval: float = DEFAULT_SAMPLING_INTERVAL
+    stacks: Dict[Tuple[str, ...], int] = field(default_factory=Counter)  # stack -> number of samples
+
+    @property
+    def total_samples(self) -> int:
+        return sum(self.stacks.values())
+
+    def merge(self, other: "BotProfile"):
+        """
+        Add the samples of the other profile to this profile
+        """
+        for stack, count in other.stacks.items():
+            self.stacks[stack] = self.stacks.get(stack, 0) + count
+
+    def get_collapsed_stacks(self) -> str:
+        """
+        :return: The profile in the collapsed stacks format ("outer;inner;innermost count" lines), the input of
+                 flame graph tools
+        """
+        return "\n".join(
+            f"{';'.join(stack)} {count}" for stack, count in sorted(self.stacks.items(), key=lambda item: -item[1])
+        )
+
+    def get_hotspots_data_frame(self):
+        """
+        :return: Data frame with a row for each function (most self samples first):
+                 self_samples - samples the function was running in, total_samples - samples the function was on the
+                 stack in, their percent of all the samples and the estimated seconds (samples * interval)
+        """
+        import pandas as pd
+
+        self_samples = Counter()
+        total_samples = Counter()
+        for stack, count in self.stacks.items():
+            self_samples[stack[-1]] += count
+            for label in set(stack):
+                total_samples[label] += count
+        samples = max(self.total_samples, 1)
+        df = pd.DataFrame(
+            [
+                {
+                    "function": label,
+                    "self_samples": self_samples[label],
+                    "total_samples": total,
+                    "self_percent": 100 * self_samples[label] / samples,
+                    "total_percent": 100 * total / samples,
+                    "self_seconds": self_samples[label] * self.interval,
+                    "total_seconds": total * self.interval,
+                }
+                for label, total in total_samples.items()
+            ],
+            columns=["function", "self_samples", "total_samples", "self_percent", "total_percent", "self_seconds",
+                     "total_seconds"]
+        )
+        return df.sort_values(["self_samples", "total_samples"], ascending=False).set_index("function")
+
+
+class SamplingProfiler:
+    """
+    Samples the stacks of the calls made through run, see the module documentation
+    """
+
+    def __init__(self, interval: float = DEFAULT_SAMPLING_INTERVAL):
+        """
+        The sampling thread starts here, before any call is run, so it isn't counted as a thread started by a bot turn
+        (ResourceLimits.max_new_threads).
+        :param interval: Seconds between samples
+        """
+        self.interval = interval
+        # key -> the profile of the calls run with the key (the GameManager uses the player number), a key is added
+        # with its first sample
+        self.profiles: Dict[object, BotProfile] = {}
+        # (thread id, the frame of run, key) of the running call, None when no call runs
+        self._target = None
+        self._labels = {}
+        # The number of calls run, the sampling thread parks (waits for _wake) when no call ran since its last wake up
+        self._calls = 0
+        self._parked = False
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._sample, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def _get_label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            label = (f"{getattr(code, 'co_qualname', code.co_name)} "
+                     f"({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            self._labels[code] = label
+        return label
+
+    def _sample(self):
+        calls_seen = 0
+        while not self._stopped.wait(self.interval):
+            target = self._target
+            if target is None and self._calls == calls_seen:
+                self._parked = True
+                self._wake.clear()
+                # A call that started before _parked was set doesn't wake the thread - check again after it is set
+                if self._target is None and self._calls == calls_seen:
+                    self._wake.wait()
+                self._parked = False
+            calls_seen = self._calls
+            if target is None:
+                continue
+            thread_id, root_frame, key = target
+            frame = sys._current_frames().get(thread_id)
+            stack = []
+            while frame is not None and frame is not root_frame:
+                stack.append(self._get_label(frame.f_code))
+                frame = frame.f_back
+            # No root frame - the call returned before the stack was taken
+            if frame is None or len(stack) == 0:
+                continue
+            if key not in self.profiles:
+                self.profiles[key] = BotProfile(self.interval)
+            stacks = self.profiles[key].stacks
+            stack = tuple(reversed(stack))
+            stacks[stack] = stacks.get(stack, 0) + 1
+
+    def run(self, key, func: Callable[[], T]) -> T:
+        """
+        Run the call and sample its stacks into the key's profile
+        :param key: The profile key
+        :param func: The call
+        :return: The call result
+        """
+        self._target = (get_ident(), sys._getframe(), key)
+        self._calls += 1
+        if self._parked:
+            self._wake.set()
+        try:
+            return func()
+        finally:
+            self._target = None
+
+    def stop(self):
+        """
+        Stop the sampling thread. The thread wakes up and exits at once, stop doesn't wait for it.
+        """
+        self._stopped.set()
+        self._wake.set()
+
+
+if __name__ == "__main__":
+    import contextlib
+    import io
+    import time
+
+    from planet_wars.battles.tournament import Tournament, get_map_by_id
+    from planet_wars.player_bots.baseline_code.baseline_bot import (
+        AttackWeakestPlanetFromStrongestBot, AttackEnemyWeakestPlanetFromStrongestBot,
+        AttackWeakestPlanetFromStrongestSmarterNumOfShipsBot
+    )
+
+    benchmark_players = [
+        AttackWeakestPlanetFromStrongestBot(), AttackEnemyWeakestPlanetFromStrongestBot(),
+        AttackWeakestPlanetFromStrongestSmarterNumOfShipsBot()
+    ]
+    benchmark_maps = [get_map_by_id(map_id) for map_id in range(1, 11)]
+    times = {}
+    tournaments = {}
+    for sampling_interval in [None, DEFAULT_SAMPLING_INTERVAL, None, DEFAULT_SAMPLING_INTERVAL]:
+        tournament = Tournament(benchmark_players, benchmark_maps, seed=0, sampling_interval=sampling_interval)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            tournament.run_tournament()
+        elapsed = time.perf_counter() - start
+        times[sampling_interval] = min(times.get(sampling_interval, elapsed), elapsed)
+        tournaments[sampling_interval] = tournament
+
+    profiled = tournaments[DEFAULT_SAMPLING_INTERVAL]
+    for player_name, hotspots in profiled.get_hotspots_data_frame(top=5).groupby(level="player_name"):
+        print(player_name)
+        print(hotspots.droplevel("player_name").to_string())
+        print()
+    print(f"without profiling {times[None]:.2f}s, with profiling {times[DEFAULT_SAMPLING_INTERVAL]:.2f}s "
+          f"({100 * (times[DEFAULT_SAMPLING_INTERVAL] / times[None] - 1):+.1f}%)")
@@ -0,0 +1,70 @@
+"""
+Deterministic seeding - every random stream in a tournament is derived from one tournament seed.
+
+    tournament seed
+        -> the tournament's own random (knockout pairs shuffle, matchmaking ties)
+        -> a seed per battle (by its position in the schedule, so serial and parallel runs get the same seeds)
+            -> a random.Random per player, given to the bot as game.rng
+            -> the global random module, reseeded for each battle for bots that use it directly (and restored after
+               the battle, so the caller's global random stream is not affected by the battles)
+
+A battle is reproduced with GameManager(map_str, player_1, player_2, seed=battle_result.seed) (after calling
+seed_global_random(battle_result.seed) if the bots use the global random module).
+"""
+import hashlib
+import random
+import sys
+from contextlib import contextmanager
+
+
+def derive_seed(*parts) -> int:
+    """
+    Derive a seed from a parent seed and labels, the same in every process and python run (unlike hash()).
+    derive_seed(seed, "battle", 7) and derive_seed(seed, "battle", 8) are independent streams.
+    :param parts: ints and strings
+    :return: 63 bit seed
+    """
+    return int.from_bytes(hashlib.sha256(repr(parts).encode()).digest()[:8], "little") >> 1
+
+
+def new_seed() -> int:
+    """
+    :return: A fresh random seed (for runs without a given seed - record it to reproduce the run)
+    """
+    return random.SystemRandom().getrandbits(63)
+
+
+def get_player_rng(battle_seed, player_num: int) -> random.Random:
+    """
+    :param battle_seed: The battle seed, None gives an unseeded random
+    :param player_num: The player number
+    :return: The random stream of the player in the battle
+    """
+    return random.Random(derive_seed(battle_seed, "player", player_num) if battle_seed is not None else None)
+
+
+def seed_global_random(battle_seed: int):
+    """
+    Reseed the global random module (and numpy's global random, if numpy is loaded) for the battle.
+    """
+    random.seed(derive_seed(battle_seed, "global random"))
+    if "numpy" in sys.modules:
+        sys.modules["numpy"].random.seed(derive_seed(battle_seed, "numpy random") % 2 ** 32)
+
+
+@contextmanager
+def seeded_global_random(battle_seed: int):
+    """
+    Reseed the global random module (and numpy's global random, if numpy is loaded) for the battle run in the with
+    block, and restore their states after it.
+    """
+    numpy = sys.modules.get("numpy")
+    random_state = random.getstate()
+    numpy_state = numpy.random.get_state() if numpy is not None else None
+    seed_global_random(battle_seed)
+    try:
+        yield
+    finally:
+        random.setstate(random_state)
+        if numpy_state is not None:
+            numpy.random.set_state(numpy_state)
@@ -0,0 +1,498 @@
+"""
+Game state in shared memory, for bots running in worker processes.
+
+Instead of pickling the PlanetWars object graph every turn, the engine writes the planets and fleets arrays into a
+multiprocessing.shared_memory segment and the bot worker maps them zero-copy (numpy views on the segment). The bot
+answers with its orders as a compact float64 array in a second segment. Only tiny control messages (segments names
+and sequence number) go through the pipe. The engine side creates and frees both segments.
+
+State segment layout (all little endian, every section 8 bytes aligned):
+    header      STATE_HEADER, padded to HEADER_SIZE
+    map         planet_growth_rate int64[max_planets], planet_x float64[max_planets], planet_y float64[max_planets]
+    planets     planet_owner int64[max_planets], planet_num_ships int64/float64[max_planets]
+    fleets      owner, num_ships, source_planet_id, destination_planet_id, total_trip_length, turns_remaining
+                each int64[max_fleets] (num_ships is float64 when the FLOAT_SHIPS_FLAG is set)
+Orders segment layout:
+    header      ORDERS_HEADER, padded to HEADER_SIZE
+    orders      float64[max_orders, 3] - source_planet_id, destination_planet_id, num_ships
+
+The sequence number in the headers is incremented on every write, a reader checks it matches the sequence it was told
+to read so it never uses a stale state.
+
+Usage:
+    player = SharedMemoryPlayer(MyBot())   # MyBot runs in its own process
+    ...
+    player.close()
+"""
+import multiprocessing
+import random
+import struct
+from dataclasses import dataclass
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import List, Optional
+
+import numpy as np
+
+from planet_wars.engine.columnar import ColumnarState, MapColumns, has_float_ships
+from planet_wars.engine.game_logic import GameManager
+from planet_wars.planet_wars import PlanetWars, Planet, Fleet, Order, Player
+
+STATE_MAGIC = b"PWSM"
+ORDERS_MAGIC = b"PWOR"
+FORMAT_VERSION = 1
+FLOAT_SHIPS_FLAG = 1
+# magic, version, flags, sequence, turn, num_planets, num_fleets, max_planets, max_fleets
+STATE_HEADER = struct.Struct("<4sHHqqqqqq")
+# magic, version, flags, sequence, num_orders, max_orders
+ORDERS_HEADER = struct.Struct("<4sHHqqq")
+HEADER_SIZE = 64
+ITEM_SIZE = 8
+
+DEFAULT_MAX_PLANETS = 64
+DEFAULT_MAX_FLEETS = 1024
+DEFAULT_MAX_ORDERS = 64
+
+FLEET_COLUMNS = [
+    "owner", "num_ships", "source_planet_id", "destination_planet_id", "total_trip_length", "turns_remaining"
+]
+
+
+class SharedStateError(Exception):
+    """
+    Bad segment (wrong magic / version / stale sequence) or the bot worker failed
+    """
+
+
+def _get_state_size(max_planets: int, max_fleets: int) -> int:
+    return HEADER_SIZE + ITEM_SIZE * (5 * max_planets + len(FLEET_COLUMNS) * max_fleets)
+
+
+@dataclass
+class _StateArrays:
+    """
+    numpy views on a state segment
+    """
+    growth_rate: np.ndarray
+    x: np.ndarray
+    y: np.ndarray
+    owner: np.ndarray
+    num_ships_int: np.ndarray
+    num_ships_float: np.ndarray
+    fleets_int: np.ndarray  # (6, max_fleets)
+    fleets_float: np.ndarray  # (6, max_fleets), only the num_ships row is used
+
+
+class SharedGameState:
+    """
+    A game state segment. The engine creates it and writes to it, the bot worker attaches to it by name and reads it.
+    """
+
+    def __init__(self, shared_memory: SharedMemory, owner: bool):
+        self.shared_memory = shared_memory
+        self.owner = owner
+        _, _, _, _, _, _, _, self.max_planets, self.max_fleets = self._read_header()
+        self.sequence = 0
+        buffer = shared_memory.buf
+        offset = HEADER_SIZE
+
+        def view(dtype, count, shape=None):
+            nonlocal offset
+            array = np.ndarray((count,) if shape is None else shape, dtype=dtype, buffer=buffer, offset=offset)
+            offset += ITEM_SIZE * count
+            return array
+
+        growth_rate = view(np.int64, self.max_planets)
+        x = view(np.float64, self.max_planets)
+        y = view(np.float64, self.max_planets)
+        owner_offset = offset
+        owner_array = view(np.int64, self.max_planets)
+        num_ships_offset = offset
+        num_ships_int = view(np.int64, self.max_planets)
+        num_ships_float = np.ndarray((self.max_planets,), np.float64, buffer, num_ships_offset)
+        fleets_offset = offset
+        fleets_int = view(np.int64, len(FLEET_COLUMNS) * self.max_fleets, (len(FLEET_COLUMNS), self.max_fleets))
+        fleets_float = np.ndarray((len(FLEET_COLUMNS), self.max_fleets), np.float64, buffer, fleets_offset)
+        assert owner_offset < num_ships_offset < fleets_offset
+        self._arrays = _StateArrays(growth_rate, x, y, owner_array, num_ships_int, num_ships_float, fleets_int,
+                                    fleets_float)
+
+    @staticmethod
+    def create(max_planets: int = DEFAULT_MAX_PLANETS, max_fleets: int = DEFAULT_MAX_FLEETS) -> "SharedGameState":
+        """
+        Create a new segment
+        """
+        shared_memory = SharedMemory(create=True, size=_get_state_size(max_planets, max_fleets))
+        STATE_HEADER.pack_into(shared_memory.buf, 0, STATE_MAGIC, FORMAT_VERSION, 0, 0, 0, 0, 0, max_planets,
+                               max_fleets)
+        return SharedGameState(shared_memory, owner=True)
+
+    @staticmethod
+    def attach(name: str) -> "SharedGameState":
+        """
+        Attach to an existing segment
+        """
+        state = SharedGameState(SharedMemory(name=name), owner=False)
+        return state
+
+    @property
+    def name(self) -> str:
+        return self.shared_memory.name
+
+    def _read_header(self):
+        header = STATE_HEADER.unpack_from(self.shared_memory.buf, 0)
+        if header[0] != STATE_MAGIC:
+            raise SharedStateError(f"Not a game state segment: {self.shared_memory.name}")
+        if header[1] != FORMAT_VERSION:
+            raise SharedStateError(f"Unsupported game state format version {header[1]}")
+        return header
+
+    def fits(self, game: PlanetWars) -> bool:
+        """
+        :return: True if the game planets and fleets fit in the segment
+        """
+        return len(game.planets) <= self.max_planets and len(game.fleets) <= self.max_fleets
+
+    def write(self, game: PlanetWars) -> int:
+        """
+        Write the game state to the segment
+        :param game: The game object (from the bot's perspective)
+        :return: The sequence number of the written state
+        """
+        if not self.fits(game):
+            raise SharedStateError(
+                f"{len(game.planets)} planets and {len(game.fleets)} fleets don't fit in the segment "
+                f"({self.max_planets} planets, {self.max_fleets} fleets)"
+            )
+        arrays = self._arrays
+        num_planets, num_fleets = len(game.planets), len(game.fleets)
+        float_ships = has_float_ships(game)
+        arrays.growth_rate[:num_planets] = [p.growth_rate for p in game.planets]
+        arrays.x[:num_planets] = [p.x for p in game.planets]
+        arrays.y[:num_planets] = [p.y for p in game.planets]
+        arrays.owner[:num_planets] = [p.owner for p in game.planets]
+        planet_num_ships = arrays.num_ships_float if float_ships else arrays.num_ships_int
+        planet_num_ships[:num_planets] = [p.num_ships for p in game.planets]
+        if num_fleets > 0:
+            fleets = np.array([
+                (f.owner, f.num_ships, f.source_planet_id, f.destination_planet_id, f.total_trip_length,
+                 f.turns_remaining)
+                for f in game.fleets
+            ], dtype=np.float64 if float_ships else np.int64).T
+            arrays.fleets_int[:, :num_fleets] = fleets
+            if float_ships:
+                arrays.fleets_float[1, :num_fleets] = fleets[1]
+        self.sequence += 1
+        STATE_HEADER.pack_into(
+            self.shared_memory.buf, 0, STATE_MAGIC, FORMAT_VERSION, FLOAT_SHIPS_FLAG if float_ships else 0,
+            self.sequence, game.turns, num_planets, num_fleets, self.max_planets, self.max_fleets
+        )
+        return self.sequence
+
+    def read_columnar(self, sequence: Optional[int] = None) -> ColumnarState:
+        """
+        :param sequence: The expected sequence number, None to skip the check
+        :return: The state as ColumnarState of zero-copy views on the segment - valid until the next write
+        """
+        _, _, flags, state_sequence, _, num_planets, num_fleets, _, _ = self._read_header()
+        if sequence is not None and state_sequence != sequence:
+            raise SharedStateError(f"Stale game state: sequence {state_sequence}, expected {sequence}")
+        arrays = self._arrays
+        float_ships = bool(flags & FLOAT_SHIPS_FLAG)
+        fleets = arrays.fleets_int[:, :num_fleets]
+        return ColumnarState(
+            map_columns=MapColumns(
+                planet_growth_rate=arrays.growth_rate[:num_planets],
+                planet_x=arrays.x[:num_planets],
+                planet_y=arrays.y[:num_planets]
+            ),
+            planet_owner=arrays.owner[:num_planets],
+            planet_num_ships=(arrays.num_ships_float if float_ships else arrays.num_ships_int)[:num_planets],
+            fleet_owner=fleets[0],
+            fleet_num_ships=arrays.fleets_float[1, :num_fleets] if float_ships else fleets[1],
+            fleet_source_planet_id=fleets[2],
+            fleet_destination_planet_id=fleets[3],
+            fleet_total_trip_length=fleets[4],
+            fleet_turns_remaining=fleets[5],
+        )
+
+    def read_game(self, sequence: Optional[int] = None) -> PlanetWars:
+        """
+        :param sequence: The expected sequence number, None to skip the check
+        :return: The state as PlanetWars object, with its columnar state mapped on the segment
+        """
+        state = self.read_columnar(sequence)
+        turn = self._read_header()[4]
+        planet_num_ships = state.planet_num_ships.tolist()
+        planets = [
+            Planet(planet_id, owner, num_ships, growth_rate, x, y)
+            for planet_id, (owner, num_ships, growth_rate, x, y) in enumerate(zip(
+                state.planet_owner.tolist(), planet_num_ships, state.planet_growth_rate.tolist(),
+                state.planet_x.tolist(), state.planet_y.tolist()
+            ))
+        ]
+        fleets = [
+            Fleet(*values) for values in zip(
+                state.fleet_owner.tolist(), state.fleet_num_ships.tolist(), state.fleet_source_planet_id.tolist(),
+                state.fleet_destination_planet_id.tolist(), state.fleet_total_trip_length.tolist(),
+                state.fleet_turns_remaining.tolist()
+            )
+        ]
+        game = PlanetWars(planets, fleets)
+        game.turns = turn
+        game._columnar = state
+        return game
+
+    def close(self):
+        """
+        Detach from the segment, the creator also frees it
+        """
+        self._arrays = None
+        self.shared_memory.close()
+        if self.owner:
+            self.shared_memory.unlink()
+
+
+class SharedOrders:
+    """
+    An orders segment. The engine creates it, the bot worker attaches to it and writes its orders to it.
+    """
+
+    def __init__(self, shared_memory: SharedMemory, owner: bool):
+        self.shared_memory = shared_memory
+        self.owner = owner
+        header = ORDERS_HEADER.unpack_from(shared_memory.buf, 0)
+        if header[0] != ORDERS_MAGIC or header[1] != FORMAT_VERSION:
+            raise SharedStateError(f"Not an orders segment of version {FORMAT_VERSION}: {shared_memory.name}")
+        self.max_orders = header[5]
+        self.sequence = 0
+        self._orders = np.ndarray((self.max_orders, 3), np.float64, shared_memory.buf, HEADER_SIZE)
+
+    @staticmethod
+    def create(max_orders: int = DEFAULT_MAX_ORDERS) -> "SharedOrders":
+        shared_memory = SharedMemory(create=True, size=HEADER_SIZE + ITEM_SIZE * 3 * max_orders)
+        ORDERS_HEADER.pack_into(shared_memory.buf, 0, ORDERS_MAGIC, FORMAT_VERSION, 0, 0, 0, max_orders)
+        return SharedOrders(shared_memory, owner=True)
+
+    @staticmethod
+    def attach(name: str) -> "SharedOrders":
+        return SharedOrders(SharedMemory(name=name), owner=False)
+
+    @property
+    def name(self) -> str:
+        return self.shared_memory.name
+
+    def write(self, orders: List[Order], sequence: int):
+        """
+        :param orders: The bot orders
+        :param sequence: The sequence of the state the orders answer
+        """
+        if len(orders) > self.max_orders:
+            raise SharedStateError(f"{len(orders)} orders don't fit in the segment ({self.max_orders} orders)")
+        if orders:
+            self._orders[:len(orders)] = [
+                (o.source_planet_id, o.destination_planet_id, o.num_ships) for o in orders
+            ]
+        ORDERS_HEADER.pack_into(
+            self.shared_memory.buf, 0, ORDERS_MAGIC, FORMAT_VERSION, 0, sequence, len(orders), self.max_orders
+        )
+
+    def read(self, sequence: int) -> List[Order]:
+        """
+        :param sequence: The sequence of the state the orders should answer
+        :return: The orders. Orders with a missing (None is written as NaN) or non-finite value, or with a planet id
+                 that is not a non-negative integer are dropped - the engine ignores them when run in-process
+        """
+        _, _, _, orders_sequence, num_orders, _ = ORDERS_HEADER.unpack_from(self.shared_memory.buf, 0)
+        if orders_sequence != sequence:
+            raise SharedStateError(f"Stale orders: sequence {orders_sequence}, expected {sequence}")
+        orders = self._orders[:num_orders]
+        planet_ids = orders[:, :2]
+        valid = np.isfinite(orders).all(axis=1) & ((planet_ids >= 0) & (planet_ids == np.floor(planet_ids))).all(axis=1)
+        return [
+            Order(int(source_planet_id), int(destination_planet_id),
+                  int(num_ships) if num_ships.is_integer() else num_ships)
+            for source_planet_id, destination_planet_id, num_ships in orders[valid].tolist()
+        ]
+
+    def close(self):
+        self._orders = None
+        self.shared_memory.close()
+        if self.owner:
+            self.shared_memory.unlink()
+
+
+def _run_worker(player: Player, connection):
+    """
+    The bot worker process loop. Messages:
+        ("new_game", state_name, orders_name, sequence, map_str, rng_state) / ("turn", state_name, orders_name,
+        sequence)
+            -> ("orders", None) if the orders were written to the orders segment,
+               ("orders", [(source_planet_id, destination_planet_id, num_ships), ...]) if they don't fit in it,
+               or ("error", message)
+        ("stop",)
+    The engine creates and frees the segments, the worker only attaches to them.
+    The bot's game.rng is created from the engine's player rng state (rng_state) in new_game, and goes on for all the
+    turns of the game, like the engine's player rng.
+    """
+    state = None
+    orders_segment = None
+    rng = None
+    try:
+        while True:
+            message = connection.recv()
+            if message[0] == "stop":
+                break
+            _, state_name, orders_name, sequence = message[:4]
+            try:
+                if state is None or state.name != state_name:
+                    if state is not None:
+                        state.close()
+                    state = SharedGameState.attach(state_name)
+                if orders_segment is None or orders_segment.name != orders_name:
+                    if orders_segment is not None:
+                        orders_segment.close()
+                    orders_segment = SharedOrders.attach(orders_name)
+                game = state.read_game(sequence)
+                if message[0] == "new_game":
+                    rng = None
+                    if message[5] is not None:
+                        rng = random.Random()
+                        rng.setstate(message[5])
+                    game.rng = rng
+                    game._map_str = message[4]
+                    player.new_game_has_started(game)
+                    orders = []
+                else:
+                    game.rng = rng
+                    orders = GameManager.normalize_orders(player.play_turn(game))
+                if len(orders) <= orders_segment.max_orders:
+                    orders_segment.write(orders, sequence)
+                    connection.send(("orders", None))
+                else:
+                    connection.send(("orders", [
+                        (o.source_planet_id, o.destination_planet_id, o.num_ships) for o in orders
+                    ]))
+            except Exception as e:
+                connection.send(("error", f"{type(e).__name__}: {e}"))
+    finally:
+        if state is not None:
+            state.close()
+        if orders_segment is not None:
+            orders_segment.close()
+
+
+class SharedMemoryPlayer(Player):
+    """
+    Run a bot in a worker process, passing the game state through shared memory.
+    The worker starts on first use and serves all the games of this player, call close() when done.
+    """
+
+    def __init__(
+            self,
+            player: Player,
+            timeout: Optional[float] = None,
+            max_planets: int = DEFAULT_MAX_PLANETS,
+            max_fleets: int = DEFAULT_MAX_FLEETS,
+            max_orders: int = DEFAULT_MAX_ORDERS
+    ):
+        """
+        :param player: The bot to run in the worker process (pickled once, when the worker starts)
+        :param timeout: Max seconds to wait for the bot orders, None waits forever. A timeout loses the game
+        :param max_planets: Initial planets capacity of the state segment (grows when needed)
+        :param max_fleets: Initial fleets capacity of the state segment (grows when needed)
+        :param max_orders: Capacity of the orders segment, more orders are sent through the pipe
+        """
+        self.player = player
+        self.NAME = player.NAME if player.NAME != Player.NAME else type(player).__name__
+        self.DETERMINISTIC = player.DETERMINISTIC
+        self.SEED_REPRODUCIBLE = player.SEED_REPRODUCIBLE
+        self.VERSION = player.VERSION
+        self.timeout = timeout
+        self.max_planets = max_planets
+        self.max_fleets = max_fleets
+        self.max_orders = max_orders
+        self._process = None
+        self._connection = None
+        self._state = None
+        self._orders = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.update(_process=None, _connection=None, _state=None, _orders=None)
+        return state
+
+    def _start(self):
+        if self._process is None:
+            # Share the parent's resource tracker, so the segments are tracked (and freed) only by their creator
+            resource_tracker.ensure_running()
+            self._connection, worker_connection = multiprocessing.Pipe()
+            self._process = multiprocessing.Process(
+                target=_run_worker, args=(self.player, worker_connection), daemon=True
+            )
+            self._process.start()
+            worker_connection.close()
+        if self._orders is None:
+            self._orders = SharedOrders.create(self.max_orders)
+
+    def _write_state(self, game: PlanetWars) -> int:
+        if self._state is not None and not self._state.fits(game):
+            self._state.close()
+            self._state = None
+        if self._state is None:
+            self.max_planets = max(self.max_planets, len(game.planets))
+            self.max_fleets = max(self.max_fleets, 2 * len(game.fleets))
+            self._state = SharedGameState.create(self.max_planets, self.max_fleets)
+        return self._state.write(game)
+
+    def _request(self, message_type: str, game: PlanetWars) -> List[Order]:
+        self._start()
+        sequence = self._write_state(game)
+        message = (message_type, self._state.name, self._orders.name, sequence)
+        if message_type == "new_game":
+            message += (game._map_str, game.rng.getstate() if game.rng is not None else None)
+        self._connection.send(message)
+        if self.timeout is not None and not self._connection.poll(self.timeout):
+            # The worker is stuck in the turn, stop it so the next games start with a new worker
+            self.close()
+            raise TimeoutError(f"{self.NAME} didn't answer in {self.timeout} seconds")
+        response_type, orders = self._connection.recv()
+        if response_type == "error":
+            raise SharedStateError(f"{self.NAME} failed: {orders}")
+        if orders is None:
+            return self._orders.read(sequence)
+        return [Order(*order) for order in orders]
+
+    def new_game_has_started(self, game: PlanetWars):
+        self._request("new_game", game)
+
+    def play_turn(self, game: PlanetWars) -> List[Order]:
+        return self._request("turn", game)
+
+    def close(self):
+        """
+        Stop the worker process and free the shared memory
+        """
+        if self._process is not None:
+            try:
+                self._connection.send(("stop",))
+            except OSError:
+                pass
+            self._process.join(timeout=1)
+            if self._process.is_alive():
+                self._process.terminate()
+                self._process.join()
+            self._connection.close()
+            self._process = None
+            self._connection = None
+        for segment in (self._state, self._orders):
+            if segment is not None:
+                segment.close()
+        self._state = None
+        self._orders = None
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
@@ -0,0 +1,170 @@
+"""
+Grid spatial index of the planets - k nearest planets and planets in range queries that look only at the planets
+around the query point, for large maps (thousands of planets) where scanning all the planets every turn is too slow.
+
+Bots use it from the game object:
+    nearest_enemy_planets = game.get_nearest_planets(planet, k=3, owner=PlanetWars.ENEMY)
+    planets_in_range = game.get_planets_in_range(planet, distance=10)
+The planets don't move, so the index is built once per game (on the first query) and shared between the turns and
+both players. It holds planet ids, the queries filter by the current owners through the accept function.
+"""
+import heapq
+import math
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from planet_wars.planet_wars import PlanetWars, Planet
+
+# The average number of planets in a grid cell
+PLANETS_PER_CELL = 2
+
+
+class SpatialIndex:
+    """
+    Uniform grid over the planets locations
+    """
+
+    def __init__(self, planets: List[Planet], cell_size: Optional[float] = None):
+        """
+        :param planets: The planets to index
+        :param cell_size: The grid cell size, None sizes the cells to hold PLANETS_PER_CELL planets on average
+        """
+        self.xy: Dict[int, Tuple[float, float]] = {p.planet_id: (p.x, p.y) for p in planets}
+        if cell_size is None:
+            cell_size = self._get_default_cell_size(planets)
+        self.cell_size = cell_size
+        self.cells: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+        for planet_id, (x, y) in self.xy.items():
+            self.cells[self._get_cell(x, y)].append(planet_id)
+        self.cells = dict(self.cells)
+        # The grid bounds, to know when a search covered all the cells
+        if self.cells:
+            self.min_cell_x = min(cx for cx, _ in self.cells)
+            self.max_cell_x = max(cx for cx, _ in self.cells)
+            self.min_cell_y = min(cy for _, cy in self.cells)
+            self.max_cell_y = max(cy for _, cy in self.cells)
+
+    @staticmethod
+    def _get_default_cell_size(planets: List[Planet]) -> float:
+        if len(planets) < 2:
+            return 1.0
+        width = max(p.x for p in planets) - min(p.x for p in planets)
+        height = max(p.y for p in planets) - min(p.y for p in planets)
+        area = max(width * height, width, height, 1.0)
+        return max(math.sqrt(area * PLANETS_PER_CELL / len(planets)), 1e-6)
+
+    def _get_cell(self, x: float, y: float) -> Tuple[int, int]:
+        return int(math.floor(x / self.cell_size)), int(math.floor(y / self.cell_size))
+
+    def _get_ring(self, cx: int, cy: int, r: int) -> List[List[int]]:
+        """
+        :return: The planet ids lists of the cells in distance r (in cells, Chebyshev) from the cell (cx, cy)
+        """
+        if r == 0:
+            cells = [(cx, cy)]
+        else:
+            cells = [(cx + dx, cy + dy) for dx in range(-r, r + 1) for dy in (-r, r)]
+            cells.extend((cx + dx, cy + dy) for dx in (-r, r) for dy in range(-r + 1, r))
+        return [self.cells[cell] for cell in cells if cell in self.cells]
+
+    def _covers_grid(self, cx: int, cy: int, r: int) -> bool:
+        return (
+                cx - r <= self.min_cell_x and cx + r >= self.max_cell_x and
+                cy - r <= self.min_cell_y and cy + r >= self.max_cell_y
+        )
+
+    def nearest(
+            self, x: float, y: float, k: int = 1, accept: Optional[Callable[[int], bool]] = None
+    ) -> List[int]:
+        """
+        :param x: The query point x
+        :param y: The query point y
+        :param k: The number of planets to return
+        :param accept: Only planets this function returns True for (given the planet id) are returned
+        :return: The ids of the k nearest accepted planets, nearest first (ties by planet id)
+        """
+        if k <= 0 or not self.cells:
+            return []
+        cx, cy = self._get_cell(x, y)
+        # Max heap (negated) of the k best (squared distance, planet id) found so far
+        best = []
+        r = 0
+        while True:
+            for planet_ids in self._get_ring(cx, cy, r):
+                for planet_id in planet_ids:
+                    if accept is not None and not accept(planet_id):
+                        continue
+                    px, py = self.xy[planet_id]
+                    candidate = (-((px - x) ** 2 + (py - y) ** 2), -planet_id)
+                    if len(best) < k:
+                        heapq.heappush(best, candidate)
+                    elif candidate > best[0]:
+                        heapq.heapreplace(best, candidate)
+            # Planets outside the searched cells are farther than r * cell_size from the query point
+            if len(best) == k and -best[0][0] <= (r * self.cell_size) ** 2:
+                break
+            if self._covers_grid(cx, cy, r):
+                break
+            r += 1
+        return [-planet_id for _, planet_id in sorted(best, reverse=True)]
+
+    def in_range(
+            self, x: float, y: float, radius: float, accept: Optional[Callable[[int], bool]] = None
+    ) -> List[int]:
+        """
+        :param x: The query point x
+        :param y: The query point y
+        :param radius: The max distance from the query point
+        :param accept: Only planets this function returns True for (given the planet id) are returned
+        :return: The ids of the accepted planets within the radius, nearest first (ties by planet id)
+        """
+        if radius < 0 or not self.cells:
+            return []
+        min_cx, min_cy = self._get_cell(x - radius, y - radius)
+        max_cx, max_cy = self._get_cell(x + radius, y + radius)
+        min_cx, max_cx = max(min_cx, self.min_cell_x), min(max_cx, self.max_cell_x)
+        min_cy, max_cy = max(min_cy, self.min_cell_y), min(max_cy, self.max_cell_y)
+        found = []
+        for cell_x in range(min_cx, max_cx + 1):
+            for cell_y in range(min_cy, max_cy + 1):
+                for planet_id in self.cells.get((cell_x, cell_y), ()):
+                    px, py = self.xy[planet_id]
+                    distance = (px - x) ** 2 + (py - y) ** 2
+                    if distance <= radius * radius and (accept is None or accept(planet_id)):
+                        found.append((distance, planet_id))
+        found.sort()
+        return [planet_id for _, planet_id in found]
+
+
+def _brute_force_nearest(game: PlanetWars, planet: Planet, k: int) -> List[int]:
+    return [
+        p.planet_id for p in sorted(
+            (p for p in game.planets if p.planet_id != planet.planet_id),
+            key=lambda p: ((p.x - planet.x) ** 2 + (p.y - planet.y) ** 2, p.planet_id)
+        )[:k]
+    ]
+
+
+if __name__ == "__main__":
+    import random
+    import time
+
+    from planet_wars.engine.map_generator import generate_map, map_to_str
+
+    # Compare the index queries with scanning all the planets on a large generated map
+    large_map = PlanetWars.parse_game_state(map_to_str(*generate_map(
+        random.Random(0), min_planets=5001, max_planets=5001
+    )))
+    start = time.perf_counter()
+    index = large_map.spatial_index
+    print(f"{len(large_map.planets)} planets, index built in {time.perf_counter() - start:.3f}s")
+
+    query_planets = random.Random(1).sample(large_map.planets, 200)
+    start = time.perf_counter()
+    indexed = [[p.planet_id for p in large_map.get_nearest_planets(planet, k=5)] for planet in query_planets]
+    indexed_time = time.perf_counter() - start
+    start = time.perf_counter()
+    brute_force = [_brute_force_nearest(large_map, planet, k=5) for planet in query_planets]
+    brute_force_time = time.perf_counter() - start
+    assert indexed == brute_force, "the index and the brute force search disagree"
+    print(f"200 5-nearest queries: index {indexed_time:.3f}s, brute force {brute_force_time:.3f}s")
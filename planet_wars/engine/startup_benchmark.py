@@ -0,0 +1,80 @@
+"""
+Startup time benchmark of the core engine modules.
+
+Bots, the engine and the tournament runners are imported by every worker process and every remote player, so they
+must import fast - pandas (and numpy / pyarrow under it) is imported only by the functions that build data frames.
+Each module is imported in a fresh interpreter, the import time is measured and the heavy modules it loaded are
+reported. Exits with a nonzero status if a core module loads a heavy module or is slower than the budget.
+
+Usage:
+    python -m planet_wars.engine.startup_benchmark [budget_ms]
+"""
+import subprocess
+import sys
+from typing import List, Tuple
+
+# The modules that must import without the heavy modules
+CORE_MODULES = [
+    "planet_wars.planet_wars",
+    "planet_wars.engine.game_logic",
+    "planet_wars.engine.multi_player_game_logic",
+    "planet_wars.engine.async_game_logic",
+    "planet_wars.battles.tournament",
+    "planet_wars.battles.parallel",
+    "planet_wars.player_bots.baseline_code.baseline_bot",
+]
+HEAVY_MODULES = ["pandas", "numpy", "pyarrow"]
+# The default import time budget of a core module, in milliseconds
+DEFAULT_BUDGET_MS = 200
+# The number of fresh interpreters per module, the best time is reported
+REPEATS = 3
+
+_MEASURE_SCRIPT = """
+import sys, time
+start = time.perf_counter()
+import {module}
+elapsed_ms = (time.perf_counter() - start) * 1000
+print(elapsed_ms)
+print(",".join(m for m in {heavy_modules!r} if m in sys.modules))
+"""
+
+
+def measure_import(module: str) -> Tuple[float, List[str]]:
+    """
+    :param module: The module to import
+    :return: (best import time in milliseconds, the heavy modules the import loaded)
+    """
+    times = []
+    heavy_loaded = []
+    for _ in range(REPEATS):
+        output = subprocess.run(
+            [sys.executable, "-c", _MEASURE_SCRIPT.format(module=module, heavy_modules=HEAVY_MODULES)],
+            capture_output=True, text=True, check=True
+        ).stdout.splitlines()
+        times.append(float(output[0]))
+        heavy_loaded = [m for m in output[1].split(",") if m]
+    return min(times), heavy_loaded
+
+
+def run_benchmark(budget_ms: float = DEFAULT_BUDGET_MS) -> bool:
+    """
+    Measure the import of the core modules and print a table
+    :param budget_ms: The max import time of a core module
+    :return: True if all the core modules are within the budget and don't load heavy modules
+    """
+    ok = True
+    for module in CORE_MODULES:
+        elapsed_ms, heavy_loaded = measure_import(module)
+        problems = []
+        if heavy_loaded:
+            problems.append(f"loads {', '.join(heavy_loaded)}")
+        if elapsed_ms > budget_ms:
+            problems.append(f"over the {budget_ms:.0f} ms budget")
+        ok = ok and not problems
+        print(f"{module:55} {elapsed_ms:8.1f} ms   {'; '.join(problems) or 'ok'}")
+    return ok
+
+
+if __name__ == "__main__":
+    if not run_benchmark(float(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_BUDGET_MS):
+        sys.exit(1)
@@ -0,0 +1,334 @@
+"""
+Compact binary encoding of PlanetWars game states.
+
+Every frame starts with a versioned header:
+    magic "PW", format version, frame type, flags, turns, planets count, fleets count
+Frame types:
+    FULL_FRAME -  All the planets and fleets.
+    DELTA_FRAME - Only what changed since a base state: the planets whose owner or num_ships changed, which of the
+                  base state fleets are still flying (they all advanced the same number of turns) and the new fleets.
+                  Decoding a delta frame requires the base state.
+    ORDERS_FRAME / ERROR_FRAME - A bot's response, used by the remote bots protocol.
+
+The text format (PlanetWars.__str__ and PlanetWars.parse_game_state) stays the human readable fallback.
+"""
+import struct
+from typing import List, Optional, Tuple
+
+from planet_wars.engine.game_logic import clone_game_object
+from planet_wars.planet_wars import PlanetWars, Planet, Fleet, Order
+
+MAGIC = b"PW"
+FORMAT_VERSION = 1
+
+FULL_FRAME = 0
+DELTA_FRAME = 1
+ORDERS_FRAME = 2
+ERROR_FRAME = 3
+
+# Set when num_ships values are not all integers (a bot may send a float number of ships)
+FLOAT_SHIPS_FLAG = 1
+
+# magic, version, frame type, flags, turns, planets count, fleets count
+HEADER = struct.Struct("<2sBBBiII")
+# base state turns, base state fleets count, turns the base state fleets advanced
+DELTA_HEADER = struct.Struct("<iIi")
+# magic, version, frame type, orders count (or error message length)
+RESPONSE_HEADER = struct.Struct("<2sBBI")
+
+# owner, num_ships, growth_rate, x, y
+PLANET_RECORD = {False: struct.Struct("<Biidd"), True: struct.Struct("<Bdidd")}
+# planet_id, owner, num_ships
+PLANET_DELTA_RECORD = {False: struct.Struct("<IBi"), True: struct.Struct("<IBd")}
+# owner, num_ships, source_planet_id, destination_planet_id, total_trip_length, turns_remaining
+FLEET_RECORD = {False: struct.Struct("<BiIIii"), True: struct.Struct("<BdIIii")}
+# source_planet_id, destination_planet_id, num_ships
+ORDER_RECORD = struct.Struct("<IId")
+
+
+class StateEncodingError(ValueError):
+    """
+    Malformed or unsupported frame
+    """
+
+
+def _has_float_ships(planets: List[Planet], fleets: List[Fleet]) -> bool:
+    return any(type(p.num_ships) is not int for p in planets) or any(type(f.num_ships) is not int for f in fleets)
+
+
+def _pack_fleets(fleets: List[Fleet], float_ships: bool) -> bytes:
+    record = FLEET_RECORD[float_ships]
+    return b"".join(
+        record.pack(
+            f.owner, f.num_ships, f.source_planet_id, f.destination_planet_id,
+            int(f.total_trip_length), f.turns_remaining
+        )
+        for f in fleets
+    )
+
+
+def _unpack_fleets(data: bytes, offset: int, count: int, float_ships: bool) -> Tuple[List[Fleet], int]:
+    record = FLEET_RECORD[float_ships]
+    end = offset + count * record.size
+    fleets = [Fleet(*values) for values in record.iter_unpack(data[offset:end])]
+    return fleets, end
+
+
+def encode_game_state(game: PlanetWars) -> bytes:
+    """
+    :param game: The game object to encode
+    :return: The game state as full frame
+    """
+    float_ships = _has_float_ships(game.planets, game.fleets)
+    planet_record = PLANET_RECORD[float_ships]
+    header = HEADER.pack(
+        MAGIC, FORMAT_VERSION, FULL_FRAME, FLOAT_SHIPS_FLAG if float_ships else 0,
+        game.turns, len(game.planets), len(game.fleets)
+    )
+    planets = b"".join(planet_record.pack(p.owner, p.num_ships, p.growth_rate, p.x, p.y) for p in game.planets)
+    return header + planets + _pack_fleets(game.fleets, float_ships)
+
+
+def _same_map(previous: PlanetWars, game: PlanetWars) -> bool:
+    if len(previous.planets) != len(game.planets):
+        return False
+    return all(
+        p.planet_id == q.planet_id and p.growth_rate == q.growth_rate and p.x == q.x and p.y == q.y
+        for p, q in zip(previous.planets, game.planets)
+    )
+
+
+def _is_same_fleet_advanced(previous_fleet: Fleet, fleet: Fleet, turns_advanced: int) -> bool:
+    return (
+        previous_fleet.owner == fleet.owner and
+        previous_fleet.num_ships == fleet.num_ships and
+        previous_fleet.source_planet_id == fleet.source_planet_id and
+        previous_fleet.destination_planet_id == fleet.destination_planet_id and
+        previous_fleet.total_trip_length == fleet.total_trip_length and
+        previous_fleet.turns_remaining - turns_advanced == fleet.turns_remaining
+    )
+
+
+def encode_delta(previous: PlanetWars, game: PlanetWars) -> bytes:
+    """
+    Encode only what changed between the previous state and the given state.
+    If the states don't share the same map, or the fleets can't be described as the previous fleets that are still
+    flying followed by new fleets, a full frame is returned.
+
+    :param previous: The base state, the receiver must have it to decode the delta
+    :param game: The game object to encode
+    :return: Delta frame (or full frame)
+    """
+    turns_advanced = game.turns - previous.turns
+    if turns_advanced < 0 or not _same_map(previous, game):
+        return encode_game_state(game)
+
+    # The engine keeps the flying fleets in order and appends the new fleets at the end
+    kept_bitmap = bytearray((len(previous.fleets) + 7) // 8)
+    num_kept = 0
+    for i, previous_fleet in enumerate(previous.fleets):
+        if num_kept >= len(game.fleets):
+            break
+        if _is_same_fleet_advanced(previous_fleet, game.fleets[num_kept], turns_advanced):
+            kept_bitmap[i // 8] |= 1 << (i % 8)
+            num_kept += 1
+    new_fleets = game.fleets[num_kept:]
+
+    changed_planets = [
+        p for p, previous_planet in zip(game.planets, previous.planets)
+        if p.owner != previous_planet.owner or p.num_ships != previous_planet.num_ships
+    ]
+    float_ships = _has_float_ships(changed_planets, new_fleets)
+    planet_record = PLANET_DELTA_RECORD[float_ships]
+    header = HEADER.pack(
+        MAGIC, FORMAT_VERSION, DELTA_FRAME, FLOAT_SHIPS_FLAG if float_ships else 0,
+        game.turns, len(changed_planets), len(new_fleets)
+    )
+    delta_header = DELTA_HEADER.pack(previous.turns, len(previous.fleets), turns_advanced)
+    planets = b"".join(planet_record.pack(p.planet_id, p.owner, p.num_ships) for p in changed_planets)
+    return header + delta_header + planets + bytes(kept_bitmap) + _pack_fleets(new_fleets, float_ships)
+
+
+def _unpack_header(data: bytes) -> Tuple[int, int, int, int, int]:
+    if len(data) < HEADER.size:
+        raise StateEncodingError(f"frame too short ({len(data)} bytes)")
+    magic, version, frame_type, flags, turns, num_planets, num_fleets = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise StateEncodingError(f"bad magic {magic!r}")
+    if version != FORMAT_VERSION:
+        raise StateEncodingError(f"unsupported format version {version}")
+    return frame_type, flags, turns, num_planets, num_fleets
+
+
+def get_frame_size(data: bytes) -> Optional[int]:
+    """
+    Compute the size of a state frame from its beginning - used to read frames from a stream.
+    :param data: The beginning of the frame
+    :return: The frame size, or None if more bytes are needed to know it (HEADER.size + DELTA_HEADER.size is enough)
+    """
+    if len(data) < HEADER.size:
+        return None
+    frame_type, flags, turns, num_planets, num_fleets = _unpack_header(data)
+    float_ships = bool(flags & FLOAT_SHIPS_FLAG)
+    fleets_size = num_fleets * FLEET_RECORD[float_ships].size
+    if frame_type == FULL_FRAME:
+        return HEADER.size + num_planets * PLANET_RECORD[float_ships].size + fleets_size
+    if frame_type == DELTA_FRAME:
+        if len(data) < HEADER.size + DELTA_HEADER.size:
+            return None
+        base_turns, base_num_fleets, turns_advanced = DELTA_HEADER.unpack_from(data, HEADER.size)
+        return (
+                HEADER.size + DELTA_HEADER.size + num_planets * PLANET_DELTA_RECORD[float_ships].size +
+                (base_num_fleets + 7) // 8 + fleets_size
+        )
+    raise StateEncodingError(f"unknown state frame type {frame_type}")
+
+
+def decode_game_state(data: bytes, previous: Optional[PlanetWars] = None) -> PlanetWars:
+    """
+    Decode full or delta frame.
+    :param data: The frame
+    :param previous: The base state - required for delta frames. It is not modified.
+    :return: The decoded game object
+    """
+    frame_type, flags, turns, num_planets, num_fleets = _unpack_header(data)
+    if get_frame_size(data) != len(data):
+        raise StateEncodingError(f"frame size mismatch ({len(data)} bytes)")
+    float_ships = bool(flags & FLOAT_SHIPS_FLAG)
+    offset = HEADER.size
+
+    if frame_type == FULL_FRAME:
+        planet_record = PLANET_RECORD[float_ships]
+        end = offset + num_planets * planet_record.size
+        planets = [
+            Planet(planet_id, owner, num_ships, growth_rate, x, y)
+            for planet_id, (owner, num_ships, growth_rate, x, y)
+            in enumerate(planet_record.iter_unpack(data[offset:end]))
+        ]
+        fleets, _ = _unpack_fleets(data, end, num_fleets, float_ships)
+    else:
+        if previous is None:
+            raise StateEncodingError("delta frame requires the previous state")
+        base_turns, base_num_fleets, turns_advanced = DELTA_HEADER.unpack_from(data, offset)
+        if base_turns != previous.turns or base_num_fleets != len(previous.fleets):
+            raise StateEncodingError(f"delta frame base (turn {base_turns}) doesn't match the previous state")
+        offset += DELTA_HEADER.size
+
+        planets = [Planet(p.planet_id, p.owner, p.num_ships, p.growth_rate, p.x, p.y) for p in previous.planets]
+        planet_record = PLANET_DELTA_RECORD[float_ships]
+        end = offset + num_planets * planet_record.size
+        for planet_id, owner, num_ships in planet_record.iter_unpack(data[offset:end]):
+            if planet_id >= len(planets):
+                raise StateEncodingError(f"unknown planet id {planet_id}")
+            planets[planet_id].owner = owner
+            planets[planet_id].num_ships = num_ships
+        offset = end
+
+        kept_bitmap = data[offset:offset + (base_num_fleets + 7) // 8]
+        offset += len(kept_bitmap)
+        fleets = [
+            Fleet(
+                f.owner, f.num_ships, f.source_planet_id, f.destination_planet_id, f.total_trip_length,
+                f.turns_remaining - turns_advanced
+            )
+            for i, f in enumerate(previous.fleets) if kept_bitmap[i // 8] & (1 << (i % 8))
+        ]
+        new_fleets, _ = _unpack_fleets(data, offset, num_fleets, float_ships)
+        fleets.extend(new_fleets)
+
+    game = PlanetWars(planets, fleets)
+    game.turns = turns
+    return game
+
+
+class StateEncoder:
+    """
+    Encode a stream of game states - the first state is sent as full frame and the rest as deltas.
+    """
+
+    def __init__(self):
+        self.previous: Optional[PlanetWars] = None
+
+    def encode(self, game: PlanetWars) -> bytes:
+        frame = encode_game_state(game) if self.previous is None else encode_delta(self.previous, game)
+        # Keep our own copy - the caller (or the bot) may change the given game object
+        self.previous = clone_game_object(game)
+        self.previous.turns = game.turns
+        return frame
+
+    def reset(self):
+        """
+        Next frame will be a full frame, call it when the receiver lost the stream (for example new connection)
+        """
+        self.previous = None
+
+
+class StateDecoder:
+    """
+    Decode a stream of frames created by StateEncoder.
+    """
+
+    def __init__(self):
+        self.previous: Optional[PlanetWars] = None
+
+    def decode(self, data: bytes) -> PlanetWars:
+        """
+        :return: The decoded game object, a new object that is safe to modify
+        """
+        game = decode_game_state(data, self.previous)
+        # Keep our own copy - the bot may change the returned game object
+        self.previous = clone_game_object(game)
+        self.previous.turns = game.turns
+        return game
+
+
+def _pack_order(order: Order) -> Optional[bytes]:
+    try:
+        return ORDER_RECORD.pack(order.source_planet_id, order.destination_planet_id, order.num_ships)
+    except struct.error:
+        # None, negative or too large planet id, or num_ships that is not a number
+        return None
+
+
+def encode_orders(orders: List[Order]) -> bytes:
+    """
+    Orders that can't be encoded (planet ids that are not planet ids) are dropped - the engine ignores them anyway.
+    :return: The orders as orders frame
+    """
+    records = [record for record in map(_pack_order, orders) if record is not None]
+    return RESPONSE_HEADER.pack(MAGIC, FORMAT_VERSION, ORDERS_FRAME, len(records)) + b"".join(records)
+
+
+def encode_error(message: str) -> bytes:
+    """
+    :return: The message as error frame
+    """
+    message = message.encode()
+    return RESPONSE_HEADER.pack(MAGIC, FORMAT_VERSION, ERROR_FRAME, len(message)) + message
+
+
+def get_response_body_size(header: bytes) -> Tuple[int, int]:
+    """
+    :param header: Response header, RESPONSE_HEADER.size bytes
+    :return: The response frame type and the size of the rest of the frame
+    """
+    magic, version, frame_type, count = RESPONSE_HEADER.unpack(header)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        raise StateEncodingError(f"bad response header {header!r}")
+    if frame_type == ORDERS_FRAME:
+        return frame_type, count * ORDER_RECORD.size
+    if frame_type == ERROR_FRAME:
+        return frame_type, count
+    raise StateEncodingError(f"unknown response frame type {frame_type}")
+
+
+def decode_orders(body: bytes) -> List[Order]:
+    """
+    :param body: The orders frame without its header
+    :return: The orders
+    """
+    orders = []
+    for source_planet_id, destination_planet_id, num_ships in ORDER_RECORD.iter_unpack(body):
+        num_ships = int(num_ships) if num_ships.is_integer() else num_ships
+        orders.append(Order(source_planet_id, destination_planet_id, num_ships))
+    return orders
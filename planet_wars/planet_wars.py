@@ -2,14 +2,16 @@ from abc import abstractmethod
 from collections import defaultdict
 from math import ceil, sqrt
 from sys import stdout
-from typing import Union, Iterable, List
+from typing import Union, Iterable, List, Dict, NamedTuple, Tuple, TYPE_CHECKING
 
-import pandas as pd
+if TYPE_CHECKING:
+    import pandas as pd
 
 
-def list_to_data_frame(lst: List, columns: List[str]):
+def list_to_data_frame(lst: List, columns: List[str]) -> "pd.DataFrame":
     """
     Create a data frame from a list of objects.
+    pandas is imported here (and not when the module is imported), so the engine and the bots load fast.
     The logic is, for each string in columns set
         df[column] = [obj.column for obj in lst]
 
@@ -22,6 +24,8 @@ def list_to_data_frame(lst: List, columns: List[str]):
     for obj in lst:
         for member in columns:
             data[member].append(getattr(obj, member))
+
+    import pandas as pd
     return pd.DataFrame(data)
 
 
@@ -75,6 +79,64 @@ class Planet:
         return int(ceil(sqrt(dx * dx + dy * dy)))
 
 
+class OwnerTotals(NamedTuple):
+    """
+    Totals of the planets and fleets of an owner
+    """
+    num_ships: int  # The ships on the owner's planets and fleets - the owner score
+    num_planets: int  # How many planets the owner has
+    growth_rate: int  # The sum of the owner's planets growth rates - how many ships the owner gains each turn
+
+
+class FleetLaunched(NamedTuple):
+    """
+    Turn event - an order was executed and a new fleet left its source planet
+    """
+    owner: int
+    num_ships: int
+    source_planet_id: int
+    destination_planet_id: int
+    total_trip_length: int
+
+
+class FleetArrived(NamedTuple):
+    """
+    Turn event - a fleet reached its destination planet (it fought or reinforced the planet)
+    """
+    owner: int
+    num_ships: int
+    source_planet_id: int
+    destination_planet_id: int
+
+
+class PlanetBattle(NamedTuple):
+    """
+    Turn event - fleets arrived at a planet of another owner and fought.
+    forces is the force of each owner in the battle - (owner, num_ships) pairs, the planet owner force includes the
+    planet ships (after the growth) and its arriving fleets.
+    """
+    planet_id: int
+    previous_owner: int
+    previous_num_ships: int
+    forces: Tuple[Tuple[int, int], ...]
+    owner: int  # The owner after the battle
+    num_ships: int  # The planet ships after the battle
+
+
+class PlanetCaptured(NamedTuple):
+    """
+    Turn event - a planet changed owner in a battle
+    """
+    planet_id: int
+    previous_owner: int
+    owner: int
+    num_ships: int
+
+
+# The types of the events in PlanetWars.last_turn_events
+TurnEvent = Union[FleetLaunched, FleetArrived, PlanetBattle, PlanetCaptured]
+
+
 class PlanetWars:
     """
     The main object of the game -
@@ -94,6 +156,117 @@ class PlanetWars:
         self.planets = planets
         self.fleets = fleets
         self.turns = 0
+        # The map the game started from, set by the GameManager. Used by map_analysis
+        self._map_str = None
+        self._map_analysis = None
+        # Set by the GameManager to share the columnar state between the players, see columnar
+        self._columnar_provider = None
+        self._columnar = None
+        # Built on the first query and shared by the clones of the game (the planets don't move), see spatial_index
+        self._spatial_index = None
+        # owner -> OwnerTotals at the start of the turn, set by the GameManager from its running counters
+        self._owner_totals = None
+        # The player's random stream, seeded per battle by the GameManager - use it instead of the random module
+        # to make your bot reproducible
+        self.rng = None
+        # What happened in the last turn, from the player perspective, set by the GameManager: the fleets launched
+        # (FleetLaunched, by both players), then for each planet fleets arrived at - the arrivals (FleetArrived), the
+        # battle (PlanetBattle, if fleets of another owner arrived) and the capture (PlanetCaptured, if the owner
+        # changed). The growth of the owned planets is not an event. Keep your own model of the game up to date
+        # from these events instead of scanning all the planets and fleets every turn.
+        self.last_turn_events: List[TurnEvent] = []
+
+    @property
+    def map_analysis(self):
+        """
+        Strategic features of the map - distances, nearest planets, contested planets, symmetry etc.
+        Computed once per map and shared by all the turns, see planet_wars.engine.map_analysis.MapAnalysis.
+        Note: the planet ids in the analysis are the same for both players, home_planet_ids is from the map file.
+        Game objects without the map string (not created by the GameManager) get only the static features - the
+        homes, contested planets and symmetry are unknown.
+        The analysis keeps all the distances between planets - on large maps use the spatial index queries instead.
+        """
+        if self._map_analysis is None:
+            from planet_wars.engine.map_analysis import get_map_analysis_by_map_str, get_map_analysis_of_game
+            if self._map_str is not None:
+                self._map_analysis = get_map_analysis_by_map_str(self._map_str)
+            else:
+                # No map string (the game object wasn't created by the GameManager), the state may be of any turn
+                self._map_analysis = get_map_analysis_of_game(self)
+        return self._map_analysis
+
+    @property
+    def opening_plan(self):
+        """
+        Which neutral planets to capture from your home planet in the first turns - solved once per map and side,
+        see planet_wars.engine.opening_solver.OpeningPlan. Get it in new_game_has_started and play its orders with
+        opening_plan.get_orders(game).
+        Your home planet is the starting planet you own, None if you own none of them or the game object has no map
+        string (the homes are unknown, see map_analysis).
+        """
+        from planet_wars.engine.opening_solver import get_opening_plan_by_map_str
+
+        if self._map_str is None:
+            return None
+        home_planet_ids = [
+            planet_id for planet_id in self.map_analysis.home_planet_ids
+            if planet_id != -1 and self.get_planet_by_id(planet_id).owner == PlanetWars.ME
+        ]
+        if len(home_planet_ids) == 0:
+            return None
+        return get_opening_plan_by_map_str(self._map_str, home_planet_ids[0])
+
+    @property
+    def columnar(self):
+        """
+        The game state as numpy arrays (owners, ships, growth rates, fleets etc.), for vectorized bots.
+        A snapshot taken on the first access, see planet_wars.engine.columnar.ColumnarState.
+        """
+        if self._columnar is None:
+            if self._columnar_provider is not None:
+                self._columnar = self._columnar_provider()
+            if self._columnar is None:
+                from planet_wars.engine.columnar import ColumnarState
+                self._columnar = ColumnarState.from_game(self)
+        return self._columnar
+
+    @property
+    def spatial_index(self):
+        """
+        Grid index of the planets locations, see planet_wars.engine.spatial_index.SpatialIndex.
+        """
+        if self._spatial_index is None:
+            from planet_wars.engine.spatial_index import SpatialIndex
+            self._spatial_index = SpatialIndex(self.planets)
+        return self._spatial_index
+
+    def get_nearest_planets(self, planet: Planet, k: int = 1, owner: int = None) -> List[Planet]:
+        """
+        self.get_nearest_planets(planet, k=3, owner=PlanetWars.ENEMY) will return the 3 nearest enemy planets
+        :param planet: The planet to search around (not included in the result)
+        :param k: The number of planets to return
+        :param owner: If given return only planets of this owner
+        :return: The k nearest planets, nearest first
+        """
+        return [self.get_planet_by_id(planet_id) for planet_id in self.spatial_index.nearest(
+            planet.x, planet.y, k, self._get_planet_filter(planet, owner)
+        )]
+
+    def get_planets_in_range(self, planet: Planet, distance: int, owner: int = None) -> List[Planet]:
+        """
+        :param planet: The planet to search around (not included in the result)
+        :param distance: Max distance - fleets from planet reach the returned planets in at most distance turns
+        :param owner: If given return only planets of this owner
+        :return: The planets in range, nearest first
+        """
+        return [self.get_planet_by_id(planet_id) for planet_id in self.spatial_index.in_range(
+            planet.x, planet.y, distance, self._get_planet_filter(planet, owner)
+        )]
+
+    def _get_planet_filter(self, planet: Planet, owner: int = None):
+        if owner is None:
+            return lambda planet_id: planet_id != planet.planet_id
+        return lambda planet_id: planet_id != planet.planet_id and self.get_planet_by_id(planet_id).owner == owner
 
     def get_planets_by_owner(self, owner):
         """
@@ -104,6 +277,13 @@ class PlanetWars:
         return [p for p in self.planets if p.owner == owner]
 
     def get_planet_by_id(self, planet_id):
+        # The planets are parsed in planet_id order, so the planet is usually in its planet_id place
+        try:
+            p = self.planets[planet_id]
+            if p.planet_id == planet_id:
+                return p
+        except (IndexError, TypeError):
+            pass
         for p in self.planets:
             if p.planet_id == planet_id:
                 return p
@@ -115,6 +295,32 @@ class PlanetWars:
         """
         return [f for f in self.fleets if f.owner == owner]
 
+    def get_owner_totals(self, owner) -> OwnerTotals:
+        """
+        self.get_owner_totals(owner=PlanetWars.ENEMY).num_ships is the enemy score
+        self.get_owner_totals(owner=PlanetWars.ME).growth_rate is how many ships you gain each turn
+        In a game the engine keeps the totals as running counters so this is O(1). The totals are from the start of
+        the turn - changes you make to the game object are not counted.
+        """
+        if self._owner_totals is None:
+            self._owner_totals = self.count_owner_totals()
+        return self._owner_totals.get(owner, OwnerTotals(0, 0, 0))
+
+    def count_owner_totals(self) -> Dict[int, OwnerTotals]:
+        """
+        :return: owner -> OwnerTotals, counted from the planets and fleets
+        """
+        num_ships = defaultdict(int)
+        num_planets = defaultdict(int)
+        growth_rate = defaultdict(int)
+        for p in self.planets:
+            num_ships[p.owner] += p.num_ships
+            num_planets[p.owner] += 1
+            growth_rate[p.owner] += p.growth_rate
+        for f in self.fleets:
+            num_ships[f.owner] += f.num_ships
+        return {owner: OwnerTotals(num_ships[owner], num_planets[owner], growth_rate[owner]) for owner in num_ships}
+
     def total_ships_by_owner(self, owner):
         """
         Return all the ships owned by the given owner.
@@ -265,6 +471,16 @@ class Player:
     """
 
     NAME = "Give The Player Name Here"
+    # Set to True if the bot always plays the same orders given the same game states (it uses no randomness, time or
+    # outside state), so its battle results can be cached. False by default - caching the battles of a bot that isn't
+    # deterministic would replay one random outcome forever (see also SEED_REPRODUCIBLE)
+    DETERMINISTIC = False
+    # Optional bot version - changing it invalidates the cached battle results of the bot.
+    # The cache also detects changes in the bot's code and parameters, so usually there is no need to set it
+    VERSION = None
+    # Set to True if the bot's only randomness is game.rng or the global random module - the engine seeds both per
+    # battle, so the bot's battles are reproducible and can be cached by the battle seed
+    SEED_REPRODUCIBLE = False
 
     @abstractmethod
     def play_turn(self, game: PlanetWars) -> Iterable[Order]:
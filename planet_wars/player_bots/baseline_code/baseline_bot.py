@@ -4,14 +4,15 @@ from typing import Iterable, List
 from planet_wars.planet_wars import Player, PlanetWars, Order, Planet
 from planet_wars.battles.tournament import get_map_by_id, run_and_view_battle, TestBot
 
-import pandas as pd
-
 
 class AttackWeakestPlanetFromStrongestBot(Player):
     """
     Example of very simple bot - it send flee from its strongest planet to the weakest enemy/neutral planet
     """
 
+    # No randomness - the same game states always get the same orders, so the battles can be cached
+    DETERMINISTIC = True
+
     def get_planets_to_attack(self, game: PlanetWars) -> List[Planet]:
         """
         :param game: PlanetWars object representing the map
@@ -75,23 +76,33 @@ class AttackWeakestPlanetFromStrongestSmarterNumOfShipsBot(AttackWeakestPlanetFr
     If it is enemy send most of your ships to fight!
 
     Will it out preform AttackWeakestPlanetFromStrongestBot? see test_bot function.
+    The margin and the fraction are parameters - see planet_wars.battles.sweep for searching the best values.
     """
 
+    def __init__(self, neutral_margin: int = 5, enemy_fraction: float = 0.75):
+        """
+        :param neutral_margin: Ships to send to a neutral planet on top of its population
+        :param enemy_fraction: The fraction of the source planet ships to send to an enemy planet
+        """
+        self.neutral_margin = neutral_margin
+        self.enemy_fraction = enemy_fraction
+
     def ships_to_send_in_a_flee(self, source_planet: Planet, dest_planet: Planet) -> int:
         original_num_of_ships = source_planet.num_ships // 2
         if dest_planet.owner == PlanetWars.NEUTRAL:
             if dest_planet.num_ships < original_num_of_ships:
-                return dest_planet.num_ships + 5
+                return dest_planet.num_ships + self.neutral_margin
         if dest_planet.owner == PlanetWars.ENEMY:
-            return int(source_planet.num_ships * 0.75)
+            return int(source_planet.num_ships * self.enemy_fraction)
         return original_num_of_ships
 
 
-def get_random_map():
+def get_random_map(rng: random.Random = None):
     """
+    :param rng: The random generator to pick the map with, by default the random module
     :return: A string of a random map in the maps directory
     """
-    random_map_id = random.randrange(1, 100)
+    random_map_id = (rng or random).randrange(1, 100)
     return get_map_by_id(random_map_id)
 
 
@@ -124,6 +135,8 @@ def check_bot():
     )
     tester.run_tournament()
 
+    import pandas as pd
+
     # for a nicer df printing
     pd.set_option('display.max_columns', 30)
     pd.set_option('expand_frame_repr', False)
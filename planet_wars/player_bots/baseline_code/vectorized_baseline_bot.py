@@ -0,0 +1,87 @@
+from typing import Iterable
+
+import numpy as np
+
+from planet_wars.planet_wars import Player, PlanetWars, Order
+from planet_wars.engine.columnar import ColumnarState
+
+MIN_SHIPS = np.iinfo(np.int64).min
+MAX_SHIPS = np.iinfo(np.int64).max
+
+
+class VectorizedAttackWeakestPlanetFromStrongestBot(Player):
+    """
+    AttackWeakestPlanetFromStrongestBot on the columnar state - gives exactly the same orders.
+    Used as a cheap sparring partner in bots evaluation.
+    Ties are broken like max / min over the planets list: argmax / argmin return the first (lowest planet_id) match.
+    """
+
+    DETERMINISTIC = True
+
+    def get_planets_to_attack_mask(self, state: ColumnarState) -> np.ndarray:
+        """
+        :param state: The columnar game state
+        :return: Boolean mask of the planets we need to attack
+        """
+        return state.planet_owner != PlanetWars.ME
+
+    def ships_to_send_in_a_flee(self, state: ColumnarState, source_planet_id: int, dest_planet_id: int) -> int:
+        return state.planet_num_ships[source_planet_id].item() // 2
+
+    def play_turn(self, game: PlanetWars) -> Iterable[Order]:
+        """
+        See player.play_turn documentation.
+        :param game: PlanetWars object representing the map - use it to fetch all the planets and flees in the map.
+        :return: List of orders to execute, each order sends ship from a planet I own to other planet.
+        """
+        state = game.columnar
+
+        # (1) If we currently have a fleet in flight, just do nothing.
+        if (state.fleet_owner == PlanetWars.ME).any():
+            return []
+
+        # (2) Find my strongest planet.
+        my_planets = state.planet_owner == PlanetWars.ME
+        if not my_planets.any():
+            return []
+        my_strongest_planet_id = int(np.argmax(np.where(my_planets, state.planet_num_ships, MIN_SHIPS)))
+
+        # (3) Find the weakest enemy or neutral planet.
+        planets_to_attack = self.get_planets_to_attack_mask(state)
+        if not planets_to_attack.any():
+            return []
+        weakest_planet_id = int(np.argmin(np.where(planets_to_attack, state.planet_num_ships, MAX_SHIPS)))
+
+        # (4) Send half the ships from my strongest planet to the weakest planet that I do not own.
+        return [Order(
+            my_strongest_planet_id,
+            weakest_planet_id,
+            self.ships_to_send_in_a_flee(state, my_strongest_planet_id, weakest_planet_id)
+        )]
+
+
+class VectorizedAttackEnemyWeakestPlanetFromStrongestBot(VectorizedAttackWeakestPlanetFromStrongestBot):
+    """
+    AttackEnemyWeakestPlanetFromStrongestBot on the columnar state - attacks only enemy planets.
+    """
+
+    def get_planets_to_attack_mask(self, state: ColumnarState) -> np.ndarray:
+        return state.planet_owner == PlanetWars.ENEMY
+
+
+class VectorizedAttackWeakestPlanetFromStrongestSmarterNumOfShipsBot(VectorizedAttackWeakestPlanetFromStrongestBot):
+    """
+    AttackWeakestPlanetFromStrongestSmarterNumOfShipsBot on the columnar state - smarter flee size.
+    """
+
+    def ships_to_send_in_a_flee(self, state: ColumnarState, source_planet_id: int, dest_planet_id: int) -> int:
+        source_num_ships = state.planet_num_ships[source_planet_id].item()
+        dest_num_ships = state.planet_num_ships[dest_planet_id].item()
+        dest_owner = state.planet_owner[dest_planet_id]
+        original_num_of_ships = source_num_ships // 2
+        if dest_owner == PlanetWars.NEUTRAL:
+            if dest_num_ships < original_num_of_ships:
+                return dest_num_ships + 5
+        if dest_owner == PlanetWars.ENEMY:
+            return int(source_num_ships * 0.75)
+        return original_num_of_ships
@@ -0,0 +1,334 @@
+"""
+Vectorized analytics over the replays of many battles (whole rounds).
+
+The replays are decoded chunk by chunk into columnar numpy arrays, with a row per (battle, turn, planet) and a row per
+(battle, turn, fleet), the queries run on the arrays of each chunk and only their (small) results are kept, so a round
+is analyzed without holding all the description_for_display strings or all the decoded turns in memory.
+
+Usage:
+    results = analyze_battle_results("planet_wars/rounds/round1/battle_results_df.parquet")
+    results["lead_changes"]        # on which turns the lead changed, per battle
+    results["ship_counts"]         # ships of each player per battle and turn
+    get_bot_ship_curves(results["ship_counts"], results["battles"])   # mean ship-count curve per bot per map
+"""
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, Iterator, List, Union
+
+import numpy as np
+import pandas as pd
+
+from planet_wars.battles.battle_cache import get_map_hash
+
+DEFAULT_CHUNK_SIZE = 64
+BATTLE_DETAILS_COLUMNS = ["player_1_name", "player_2_name", "winner", "finish_state", "turns"]
+
+
+@dataclass
+class BattleArrays:
+    """
+    The decoded replay of a single battle. Row k of the turn arrays is turn k + 1 (the state after the k + 1 turn),
+    the start of the battle is the map. A battle that ended before its first turn (a bot forfeited) has no turn rows.
+    """
+    map_hash: str
+    growth_rates: np.ndarray  # (planets,)
+    map_owners: np.ndarray  # (planets,) the planet owners in the map
+    owners: np.ndarray  # (turns, planets)
+    num_ships: np.ndarray  # (turns, planets)
+    fleets: np.ndarray  # (fleets, 6): owner, num_ships, source, destination, total_trip_length, turns_remaining
+    fleet_turns: np.ndarray  # (fleets,) the turn row of each fleet (its turn - 1)
+
+    @property
+    def num_turns(self) -> int:
+        return self.owners.shape[0]
+
+
+def decode_replay(description_for_display: str) -> BattleArrays:
+    """
+    Decode a replay into arrays. Each turn is split once, the numbers of all the turns are converted together.
+    :param description_for_display: The battle description (BattleResult.description_for_display)
+    :return: The battle arrays
+    """
+    map_str, turns_str = description_for_display.split("|", 1)
+    planets = np.array(map_str.replace(":", ",").split(","), dtype=float).reshape(-1, 5)
+    num_planets = len(planets)
+    turns = turns_str.split(":") if turns_str else []
+
+    planet_parts = []
+    fleet_parts = []
+    fleet_counts = []
+    for turn_str in turns:
+        items = turn_str.split(",", num_planets)
+        if len(items) > num_planets:
+            fleet_parts.append(items.pop())
+            fleet_counts.append(fleet_parts[-1].count(",") + 1)
+        else:
+            fleet_counts.append(0)
+        planet_parts.append(",".join(items))
+
+    if turns:
+        planet_values = np.array(",".join(planet_parts).replace(".", ",").split(","), dtype=np.int64)
+        planet_values = planet_values.reshape(len(turns), num_planets, 2)
+    else:
+        planet_values = np.zeros((0, num_planets, 2), dtype=np.int64)
+    if fleet_parts:
+        fleets = np.array(",".join(fleet_parts).replace(".", ",").split(","), dtype=np.int64).reshape(-1, 6)
+    else:
+        fleets = np.zeros((0, 6), dtype=np.int64)
+
+    return BattleArrays(
+        map_hash=get_map_hash(map_str)[:16],
+        growth_rates=planets[:, 4].astype(np.int64),
+        map_owners=planets[:, 2].astype(np.int64),
+        owners=planet_values[:, :, 0],
+        num_ships=planet_values[:, :, 1],
+        fleets=fleets,
+        fleet_turns=np.repeat(np.arange(len(turns)), fleet_counts)
+    )
+
+
+@dataclass
+class ReplayChunk:
+    """
+    The decoded replays of a chunk of battles, as columns.
+    Planet rows are ordered by battle, turn and planet. planet_turn_row / fleet_turn_row map each row to its (battle,
+    turn) row in turn_battle_ids / turn_numbers.
+    """
+    battles: pd.DataFrame  # The battles details, indexed by battle_id, with map_hash and num_turns columns
+    # A row per (battle, turn)
+    turn_battle_ids: np.ndarray
+    turn_numbers: np.ndarray
+    # A row per (battle, turn, planet)
+    planet_turn_row: np.ndarray
+    planet_id: np.ndarray
+    owner: np.ndarray
+    previous_owner: np.ndarray  # The planet owner in the previous turn (the map owner in the first turn)
+    num_ships: np.ndarray
+    growth_rate: np.ndarray
+    # A row per (battle, turn, fleet)
+    fleet_turn_row: np.ndarray
+    fleet_owner: np.ndarray
+    fleet_num_ships: np.ndarray
+    fleet_total_trip_length: np.ndarray
+    fleet_turns_remaining: np.ndarray
+
+    @property
+    def num_turn_rows(self) -> int:
+        return len(self.turn_battle_ids)
+
+    @staticmethod
+    def from_descriptions(battle_ids: List[int], descriptions: List[str], details: List[Dict]) -> "ReplayChunk":
+        battles_arrays = [decode_replay(description) for description in descriptions]
+        turn_offsets = np.cumsum([0] + [b.num_turns for b in battles_arrays])
+
+        columns = {name: [] for name in [
+            "planet_turn_row", "planet_id", "owner", "previous_owner", "num_ships", "growth_rate", "fleet_turn_row",
+            "fleet_owner", "fleet_num_ships", "fleet_total_trip_length", "fleet_turns_remaining"
+        ]}
+        for battle, turn_offset in zip(battles_arrays, turn_offsets):
+            num_turns, num_planets = battle.owners.shape
+            columns["planet_turn_row"].append(np.repeat(np.arange(num_turns) + turn_offset, num_planets))
+            columns["planet_id"].append(np.tile(np.arange(num_planets), num_turns))
+            columns["owner"].append(battle.owners.ravel())
+            columns["previous_owner"].append(np.concatenate([battle.map_owners[None], battle.owners])[:-1].ravel())
+            columns["num_ships"].append(battle.num_ships.ravel())
+            columns["growth_rate"].append(np.tile(battle.growth_rates, num_turns))
+            columns["fleet_turn_row"].append(battle.fleet_turns + turn_offset)
+            for i, name in ((0, "fleet_owner"), (1, "fleet_num_ships"), (4, "fleet_total_trip_length"),
+                            (5, "fleet_turns_remaining")):
+                columns[name].append(battle.fleets[:, i])
+
+        battles = pd.DataFrame(details, index=pd.Index(battle_ids, name="battle_id"))
+        battles["map_hash"] = [b.map_hash for b in battles_arrays]
+        battles["num_turns"] = [b.num_turns for b in battles_arrays]
+        return ReplayChunk(
+            battles=battles,
+            turn_battle_ids=np.repeat(battle_ids, [b.num_turns for b in battles_arrays]),
+            turn_numbers=np.concatenate([np.arange(1, b.num_turns + 1) for b in battles_arrays]),
+            **{name: np.concatenate(arrays) for name, arrays in columns.items()}
+        )
+
+
+def iter_replay_chunks(
+        source: Union[str, Iterable],
+        chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> Iterator[ReplayChunk]:
+    """
+    Read and decode the replays chunk by chunk.
+    :param source: Battle results file (.parquet / .csv, see Tournament.get_battle_results_data_frame) or an iterable
+                   of BattleResult
+    :param chunk_size: Number of battles per chunk
+    :return: Iterator over the chunks
+    """
+    if isinstance(source, str) and source.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        parquet_file = pq.ParquetFile(source)
+        columns = [c for c in ["battle_id", "description_for_display"] + BATTLE_DETAILS_COLUMNS
+                   if c in parquet_file.schema_arrow.names]
+        batches = (batch.to_pandas() for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=columns))
+    elif isinstance(source, str):
+        batches = pd.read_csv(source, chunksize=chunk_size)
+    else:
+        batches = _iter_battle_results_batches(source, chunk_size)
+
+    for batch in batches:
+        if "battle_id" not in batch.columns:
+            batch = batch.reset_index()  # Saved data frames are indexed by battle_id
+        details = batch[[c for c in BATTLE_DETAILS_COLUMNS if c in batch.columns]].to_dict("records")
+        yield ReplayChunk.from_descriptions(
+            batch["battle_id"].tolist(), batch["description_for_display"].tolist(), details
+        )
+
+
+def _iter_battle_results_batches(battle_results: Iterable, chunk_size: int) -> Iterator[pd.DataFrame]:
+    batch = []
+    for battle_result in battle_results:
+        batch.append({
+            "battle_id": battle_result.battle_id, "description_for_display": battle_result.description_for_display,
+            **{column: getattr(battle_result, column) for column in BATTLE_DETAILS_COLUMNS}
+        })
+        if len(batch) == chunk_size:
+            yield pd.DataFrame(batch)
+            batch = []
+    if batch:
+        yield pd.DataFrame(batch)
+
+
+def _sum_by_turn(chunk: ReplayChunk, turn_row: np.ndarray, values: np.ndarray) -> np.ndarray:
+    return np.bincount(turn_row, weights=values, minlength=chunk.num_turn_rows).astype(np.int64)
+
+
+def get_ship_counts(chunk: ReplayChunk) -> pd.DataFrame:
+    """
+    :return: Data frame with the ships of each player (on planets and in fleets) per battle and turn
+    """
+    df = pd.DataFrame({"battle_id": chunk.turn_battle_ids, "turn": chunk.turn_numbers})
+    for player in (1, 2):
+        planet_ships = _sum_by_turn(chunk, chunk.planet_turn_row, chunk.num_ships * (chunk.owner == player))
+        fleet_ships = _sum_by_turn(chunk, chunk.fleet_turn_row, chunk.fleet_num_ships * (chunk.fleet_owner == player))
+        df[f"player_{player}_ships"] = planet_ships + fleet_ships
+        df[f"player_{player}_fleet_ships"] = fleet_ships
+    return df
+
+
+def get_territory(chunk: ReplayChunk) -> pd.DataFrame:
+    """
+    :return: Data frame with the planets and total growth rate of each player per battle and turn
+    """
+    df = pd.DataFrame({"battle_id": chunk.turn_battle_ids, "turn": chunk.turn_numbers})
+    for player in (1, 2):
+        owned = chunk.owner == player
+        df[f"player_{player}_planets"] = _sum_by_turn(chunk, chunk.planet_turn_row, owned)
+        df[f"player_{player}_growth"] = _sum_by_turn(chunk, chunk.planet_turn_row, chunk.growth_rate * owned)
+    return df
+
+
+def get_lead_changes(chunk: ReplayChunk) -> pd.DataFrame:
+    """
+    The turns in which the leader (the player with more ships) changed. Turns with equal ships keep the previous
+    leader. The first row of each battle is the first turn someone leads.
+    :return: Data frame with battle_id, turn and leader columns
+    """
+    ship_counts = get_ship_counts(chunk)
+    leader = np.sign(ship_counts["player_2_ships"].to_numpy() - ship_counts["player_1_ships"].to_numpy())
+    battle_start = np.r_[True, chunk.turn_battle_ids[1:] != chunk.turn_battle_ids[:-1]]
+    # Forward fill the ties with the last leader of the same battle
+    rows = np.arange(len(leader))
+    last_decided = np.maximum.accumulate(np.where((leader != 0) | battle_start, rows, 0))
+    leader = leader[last_decided]
+    changed = (leader != 0) & (battle_start | (leader != np.r_[0, leader[:-1]]))
+    return pd.DataFrame({
+        "battle_id": chunk.turn_battle_ids[changed],
+        "turn": chunk.turn_numbers[changed],
+        "leader": np.where(leader[changed] > 0, 2, 1)
+    })
+
+
+def get_fleet_efficiency(chunk: ReplayChunk) -> pd.DataFrame:
+    """
+    How well each player converts the ships it sends into territory.
+    A fleet is counted as launched in the turn it first appears (turns_remaining == total_trip_length - 1, the
+    fleets advance in the turn they are sent).
+    :return: Data frame with a row per battle and player: ships_launched, planets_captured (from neutral or enemy),
+             growth_captured, planets_lost and ships_per_growth_captured
+    """
+    battle_ids = chunk.battles.index.to_numpy()
+    battle_index = np.searchsorted(battle_ids, chunk.turn_battle_ids) if np.all(np.diff(battle_ids) > 0) \
+        else pd.Index(battle_ids).get_indexer(chunk.turn_battle_ids)
+    planet_battle = battle_index[chunk.planet_turn_row]
+    fleet_battle = battle_index[chunk.fleet_turn_row]
+    launched = chunk.fleet_turns_remaining == chunk.fleet_total_trip_length - 1
+    ownership_changed = chunk.owner != chunk.previous_owner
+
+    rows = []
+    for player in (1, 2):
+        captured = ownership_changed & (chunk.owner == player)
+        lost = ownership_changed & (chunk.previous_owner == player)
+        ships_launched = np.bincount(
+            fleet_battle, weights=chunk.fleet_num_ships * (launched & (chunk.fleet_owner == player)),
+            minlength=len(battle_ids)
+        )
+        growth_captured = np.bincount(planet_battle, weights=chunk.growth_rate * captured, minlength=len(battle_ids))
+        df = pd.DataFrame({
+            "battle_id": battle_ids,
+            "player": player,
+            "ships_launched": ships_launched.astype(np.int64),
+            "planets_captured": np.bincount(planet_battle, weights=captured, minlength=len(battle_ids)).astype(int),
+            "growth_captured": growth_captured.astype(np.int64),
+            "planets_lost": np.bincount(planet_battle, weights=lost, minlength=len(battle_ids)).astype(int),
+        })
+        with np.errstate(divide="ignore", invalid="ignore"):
+            df["ships_per_growth_captured"] = np.where(growth_captured > 0, ships_launched / growth_captured, np.nan)
+        rows.append(df)
+    return pd.concat(rows, ignore_index=True).sort_values(["battle_id", "player"], ignore_index=True)
+
+
+QUERIES: Dict[str, Callable[[ReplayChunk], pd.DataFrame]] = {
+    "ship_counts": get_ship_counts,
+    "territory": get_territory,
+    "lead_changes": get_lead_changes,
+    "fleet_efficiency": get_fleet_efficiency,
+}
+
+
+def analyze_battle_results(
+        source: Union[str, Iterable],
+        queries: Iterable[str] = tuple(QUERIES),
+        chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> Dict[str, pd.DataFrame]:
+    """
+    Run the queries over all the battles, chunk by chunk.
+    :param source: Battle results file (.parquet / .csv) or an iterable of BattleResult
+    :param queries: The names of the queries to run, see QUERIES
+    :param chunk_size: Number of battles decoded together
+    :return: query name -> the query results of all the battles, and "battles" -> the battles details
+    """
+    results = {name: [] for name in queries}
+    results["battles"] = []
+    for chunk in iter_replay_chunks(source, chunk_size):
+        results["battles"].append(chunk.battles)
+        for name in queries:
+            results[name].append(QUERIES[name](chunk))
+    return {name: pd.concat(dfs) if name == "battles" else pd.concat(dfs, ignore_index=True)
+            for name, dfs in results.items() if dfs}
+
+
+def get_bot_ship_curves(ship_counts: pd.DataFrame, battles: pd.DataFrame) -> pd.DataFrame:
+    """
+    The mean ship-count curve of each bot on each map (over all its battles, as player 1 or player 2)
+    :param ship_counts: The ship_counts query results
+    :param battles: The battles details (the "battles" results of analyze_battle_results)
+    :return: Data frame with player_name, map_hash, turn, ships (mean), enemy_ships (mean) and battle_count
+    """
+    df = ship_counts.join(battles[["player_1_name", "player_2_name", "map_hash"]], on="battle_id")
+    per_side = [
+        pd.DataFrame({
+            "player_name": df[f"player_{player}_name"], "map_hash": df["map_hash"], "turn": df["turn"],
+            "ships": df[f"player_{player}_ships"], "enemy_ships": df[f"player_{3 - player}_ships"],
+            "battle_id": df["battle_id"]
+        })
+        for player in (1, 2)
+    ]
+    return pd.concat(per_side, ignore_index=True).groupby(["player_name", "map_hash", "turn"]).agg(
+        ships=("ships", "mean"), enemy_ships=("enemy_ships", "mean"), battle_count=("battle_id", "nunique")
+    ).reset_index()
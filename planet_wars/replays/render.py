@@ -0,0 +1,344 @@
+"""
+Headless battle renderer - PNG frames and animated PNG (APNG) files, pure python (zlib only), no GUI or java needed.
+
+The map layer (background and planet outlines) is rendered once per map and size and cached, each turn copies it
+and draws only the turn state: planets owners and ships, fleets and the turn number.
+Many battles are rendered in parallel with render_battles.
+
+Usage:
+    render_apng(battle_result.description_for_display, "battle.png")
+    render_battles([(br.description_for_display, f"battle_{br.battle_id}.png") for br in battle_results])
+    python -m planet_wars.replays.render planet_wars/rounds/round1/battle_results_df.parquet output_directory
+"""
+import argparse
+import os
+import struct
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from planet_wars.replays.replay import Replay
+
+DEFAULT_SIZE = 400
+DEFAULT_FPS = 10
+
+BACKGROUND_COLOR = (12, 12, 24)
+OUTLINE_COLOR = (200, 200, 200)
+TEXT_COLOR = (255, 255, 255)
+OWNER_COLORS = {
+    0: (110, 110, 110),
+    1: (214, 64, 64),
+    2: (64, 118, 214),
+}
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# 3x5 pixels digits, a string of 15 bits per digit (row by row)
+DIGITS_FONT = {
+    "0": "111101101101111", "1": "010110010010111", "2": "111001111100111", "3": "111001111001111",
+    "4": "101101111001001", "5": "111100111001111", "6": "111100111101111", "7": "111001010010010",
+    "8": "111101111101111", "9": "111101111001111",
+}
+DIGIT_WIDTH = 3
+DIGIT_HEIGHT = 5
+
+# A horizontal run of pixels: (row, first column, last column + 1)
+Span = Tuple[int, int, int]
+
+
+def _disc_spans(center_x: float, center_y: float, radius: float, size: int) -> List[Span]:
+    """
+    :return: The horizontal pixels runs covering the disc, clipped to the image
+    """
+    spans = []
+    for row in range(max(0, int(center_y - radius)), min(size, int(center_y + radius) + 1)):
+        half_width = (radius * radius - (row - center_y) ** 2)
+        if half_width < 0:
+            continue
+        half_width = half_width ** 0.5
+        start, stop = max(0, int(round(center_x - half_width))), min(size, int(round(center_x + half_width)) + 1)
+        if start < stop:
+            spans.append((row, start, stop))
+    return spans
+
+
+class Canvas:
+    """
+    RGB image as a flat bytearray
+    """
+
+    def __init__(self, size: int, pixels: bytearray):
+        self.size = size
+        self.pixels = pixels
+
+    @staticmethod
+    def blank(size: int, color: Tuple[int, int, int]) -> "Canvas":
+        return Canvas(size, bytearray(bytes(color) * (size * size)))
+
+    def copy(self) -> "Canvas":
+        return Canvas(self.size, bytearray(self.pixels))
+
+    def fill_spans(self, spans: Iterable[Span], color: Tuple[int, int, int]):
+        color = bytes(color)
+        for row, start, stop in spans:
+            offset = (row * self.size) * 3
+            self.pixels[offset + start * 3:offset + stop * 3] = color * (stop - start)
+
+    def fill_rect(self, x: int, y: int, width: int, height: int, color: Tuple[int, int, int]):
+        x0, x1 = max(0, x), min(self.size, x + width)
+        self.fill_spans(((row, x0, x1) for row in range(max(0, y), min(self.size, y + height)) if x0 < x1), color)
+
+    def draw_number(self, number: int, center_x: int, center_y: int, scale: int, color: Tuple[int, int, int]):
+        text = str(number)
+        width = (len(text) * (DIGIT_WIDTH + 1) - 1) * scale
+        x = center_x - width // 2
+        y = center_y - DIGIT_HEIGHT * scale // 2
+        for char in text:
+            bits = DIGITS_FONT[char]
+            for i, bit in enumerate(bits):
+                if bit == "1":
+                    row, column = divmod(i, DIGIT_WIDTH)
+                    self.fill_rect(x + column * scale, y + row * scale, scale, scale, color)
+            x += (DIGIT_WIDTH + 1) * scale
+
+    def get_png_rows(self) -> bytes:
+        """
+        :return: The PNG image data (before compression) - each row with filter type 0
+        """
+        row_length = self.size * 3
+        pixels = bytes(self.pixels)
+        return b"".join(
+            b"\x00" + pixels[offset:offset + row_length] for offset in range(0, len(pixels), row_length)
+        )
+
+
+def _png_chunk(chunk_type: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", zlib.crc32(chunk_type + data))
+
+
+def _png_header(size: int) -> bytes:
+    return _png_chunk(b"IHDR", struct.pack(">IIBBBBB", size, size, 8, 2, 0, 0, 0))
+
+
+def encode_png(canvas: Canvas, compression_level: int = 6) -> bytes:
+    """
+    :return: The canvas as PNG file content
+    """
+    return (
+            PNG_SIGNATURE + _png_header(canvas.size) +
+            _png_chunk(b"IDAT", zlib.compress(canvas.get_png_rows(), compression_level)) + _png_chunk(b"IEND", b"")
+    )
+
+
+class MapLayer:
+    """
+    The static part of the frames of a map: the background and the planets outlines, and the planets positions
+    """
+
+    def __init__(self, replay: Replay, size: int):
+        self.size = size
+        planets = replay.map_planets
+        min_x, max_x = min(p.x for p in planets), max(p.x for p in planets)
+        min_y, max_y = min(p.y for p in planets), max(p.y for p in planets)
+        margin = size * 0.08
+        scale = (size - 2 * margin) / max(max_x - min_x, max_y - min_y, 1e-9)
+        # The y axis goes up in the map and down in the image
+        self.positions = [
+            (margin + (p.x - min_x) * scale, size - margin - (p.y - min_y) * scale) for p in planets
+        ]
+        self.radiuses = [size * (0.018 + 0.006 * p.growth_rate) for p in planets]
+        self.number_scale = max(1, size // 300)
+        self.planet_spans = [
+            _disc_spans(x, y, radius, size) for (x, y), radius in zip(self.positions, self.radiuses)
+        ]
+        self.canvas = Canvas.blank(size, BACKGROUND_COLOR)
+        for (x, y), radius in zip(self.positions, self.radiuses):
+            self.canvas.fill_spans(_disc_spans(x, y, radius + max(1.0, size / 300), size), OUTLINE_COLOR)
+
+
+_map_layers: Dict[Tuple[str, int], MapLayer] = {}
+
+
+def get_map_layer(replay: Replay, size: int) -> MapLayer:
+    """
+    :return: The cached map layer of the replay's map
+    """
+    key = (replay.description_for_display[:replay.description_for_display.find("|")], size)
+    if key not in _map_layers:
+        _map_layers[key] = MapLayer(replay, size)
+    return _map_layers[key]
+
+
+def render_turn(replay: Replay, turn: int, size: int = DEFAULT_SIZE) -> Canvas:
+    """
+    :param replay: The battle replay
+    :param turn: The turn to render
+    :param size: The image width and height in pixels
+    :return: The rendered turn
+    """
+    layer = get_map_layer(replay, size)
+    frame = replay.get_turn(turn)
+    canvas = layer.canvas.copy()
+    fleet_size = max(2, size // 130)
+    for fleet in frame.fleets:
+        source_x, source_y = layer.positions[fleet.source_planet_id]
+        destination_x, destination_y = layer.positions[fleet.destination_planet_id]
+        progress = 1 - fleet.turns_remaining / max(fleet.total_trip_length, 1)
+        x = source_x + (destination_x - source_x) * progress
+        y = source_y + (destination_y - source_y) * progress
+        canvas.fill_rect(int(x) - fleet_size // 2, int(y) - fleet_size // 2, fleet_size, fleet_size,
+                         OWNER_COLORS.get(fleet.owner, TEXT_COLOR))
+    for planet, spans, (x, y) in zip(frame.planets, layer.planet_spans, layer.positions):
+        canvas.fill_spans(spans, OWNER_COLORS.get(planet.owner, TEXT_COLOR))
+        canvas.draw_number(planet.num_ships, int(x), int(y), layer.number_scale, TEXT_COLOR)
+    scale = layer.number_scale
+    canvas.draw_number(frame.turn, (DIGIT_WIDTH * 2 + 4) * scale, (DIGIT_HEIGHT + 4) * scale, scale, TEXT_COLOR)
+    return canvas
+
+
+def _get_replay(replay: Union[str, Replay]) -> Replay:
+    return replay if isinstance(replay, Replay) else Replay(replay)
+
+
+def _get_turns(replay: Replay, start: int, stop: Optional[int], step: int) -> range:
+    return range(*slice(start, stop, step).indices(replay.num_turns))
+
+
+def render_png_frames(
+        replay: Union[str, Replay],
+        directory: str,
+        start: int = 0,
+        stop: Optional[int] = None,
+        step: int = 1,
+        size: int = DEFAULT_SIZE
+) -> List[str]:
+    """
+    Render turns of the battle to PNG files, turn_<turn>.png
+    :param replay: The battle description_for_display or Replay
+    :param directory: The output directory
+    :param start: First turn to render
+    :param stop: Stop before this turn, None means until the end of the battle
+    :param step: Render every step turns
+    :param size: The image width and height in pixels
+    :return: The paths of the rendered frames
+    """
+    replay = _get_replay(replay)
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for turn in _get_turns(replay, start, stop, step):
+        path = os.path.join(directory, f"turn_{turn:04d}.png")
+        with open(path, "wb") as f:
+            f.write(encode_png(render_turn(replay, turn, size)))
+        paths.append(path)
+    return paths
+
+
+def render_apng(
+        replay: Union[str, Replay],
+        path: str,
+        start: int = 0,
+        stop: Optional[int] = None,
+        step: int = 1,
+        size: int = DEFAULT_SIZE,
+        fps: int = DEFAULT_FPS
+) -> str:
+    """
+    Render the battle to an animated PNG (opens in any browser). Frames are written as they are rendered.
+    :param replay: The battle description_for_display or Replay
+    :param path: The output file
+    :param start: First turn to render
+    :param stop: Stop before this turn, None means until the end of the battle
+    :param step: Render every step turns
+    :param size: The image width and height in pixels
+    :param fps: Frames per second
+    :return: The output path
+    """
+    replay = _get_replay(replay)
+    turns = _get_turns(replay, start, stop, step)
+    if len(turns) == 0:
+        raise ValueError("No turns to render")
+    sequence_number = 0
+    with open(path, "wb") as f:
+        f.write(PNG_SIGNATURE + _png_header(size))
+        f.write(_png_chunk(b"acTL", struct.pack(">II", len(turns), 0)))
+        for i, turn in enumerate(turns):
+            f.write(_png_chunk(b"fcTL", struct.pack(
+                ">IIIIIHHBB", sequence_number, size, size, 0, 0, 1, fps, 0, 0
+            )))
+            sequence_number += 1
+            data = zlib.compress(render_turn(replay, turn, size).get_png_rows())
+            if i == 0:
+                f.write(_png_chunk(b"IDAT", data))
+            else:
+                f.write(_png_chunk(b"fdAT", struct.pack(">I", sequence_number) + data))
+                sequence_number += 1
+        f.write(_png_chunk(b"IEND", b""))
+    return path
+
+
+def _render_battle(description_for_display: str, path: str, step: int, size: int, fps: int) -> str:
+    """
+    Render a battle to a file, module level function so it can run in a worker process
+    """
+    if path.endswith(".png"):
+        return render_apng(description_for_display, path, step=step, size=size, fps=fps)
+    render_png_frames(description_for_display, path, step=step, size=size)
+    return path
+
+
+def render_battles(
+        battles: Sequence[Tuple[str, str]],
+        step: int = 1,
+        size: int = DEFAULT_SIZE,
+        fps: int = DEFAULT_FPS,
+        max_workers: Optional[int] = None
+) -> List[str]:
+    """
+    Render many battles in parallel.
+    :param battles: List of (description_for_display, output path) - a .png path renders an animated PNG,
+                    other paths are directories of PNG frames
+    :param step: Render every step turns
+    :param size: The image width and height in pixels
+    :param fps: Frames per second of the animated PNGs
+    :param max_workers: Number of worker processes, None uses the number of CPUs, 0 renders in this process
+    :return: The output paths, in the order of the battles
+    """
+    # Battles of the same map go to the same worker one after the other, so its map layer is reused
+    order = sorted(range(len(battles)), key=lambda i: battles[i][0][:battles[i][0].find("|")])
+    paths = [None] * len(battles)
+    if max_workers == 0:
+        for i in order:
+            paths[i] = _render_battle(battles[i][0], battles[i][1], step, size, fps)
+        return paths
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {i: executor.submit(_render_battle, battles[i][0], battles[i][1], step, size, fps) for i in order}
+        for i, future in futures.items():
+            paths[i] = future.result()
+    return paths
+
+
+if __name__ == "__main__":
+    from planet_wars.replays.store import ReplayStore
+
+    parser = argparse.ArgumentParser(description="Render PlanetWars battles to animated PNG files")
+    parser.add_argument("replays", help="Battle results file (.parquet / .csv) or a directory of replay files")
+    parser.add_argument("output_directory")
+    parser.add_argument("--step", type=int, default=1)
+    parser.add_argument("--size", type=int, default=DEFAULT_SIZE)
+    parser.add_argument("--fps", type=int, default=DEFAULT_FPS)
+    parser.add_argument("--max-workers", type=int, default=None)
+    args = parser.parse_args()
+    if args.replays.endswith((".parquet", ".csv")):
+        store = ReplayStore.from_battle_results_file(args.replays)
+    else:
+        store = ReplayStore.from_directory(args.replays)
+    os.makedirs(args.output_directory, exist_ok=True)
+    paths = render_battles(
+        [
+            (store.get_replay(battle_id).description_for_display,
+             os.path.join(args.output_directory, f"battle_{battle_id}.png"))
+            for battle_id in store.get_battle_ids()
+        ],
+        args.step, args.size, args.fps, args.max_workers
+    )
+    print("\n".join(paths))
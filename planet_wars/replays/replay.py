@@ -0,0 +1,220 @@
+"""
+Random access to the turns of a battle replay (the description_for_display string of a BattleResult).
+
+The replay format is:
+    <map>|<after turn 1>:<after turn 2>:...
+where the map is ":" separated planets "x,y,owner,num_ships,growth_rate" and each turn is "," separated planets
+"owner.num_ships" (in the map order) followed by the fleets "owner.num_ships.source.destination.total_trip.remaining".
+Turn 0 (the start of the battle) is not recorded - it is the map (the map's starting fleets are not in the replay).
+Turn k is the state after the k-th turn. A battle that ended before its first turn (a bot forfeited) has only turn 0.
+
+Replay only indexes the turns offsets (once, on the first turn access) and parses the requested turns, so scrubbing
+to the end of a long battle doesn't parse the whole battle.
+"""
+import json
+from dataclasses import dataclass
+from typing import Iterator, List, Optional
+
+from planet_wars.planet_wars import PlanetWars, Planet, Fleet
+
+
+@dataclass
+class MapPlanet:
+    """
+    Planet as it appears in the replay map (turn 0)
+    """
+    x: float
+    y: float
+    owner: int
+    num_ships: int
+    growth_rate: int
+
+
+@dataclass
+class PlanetFrame:
+    """
+    Planet state in a turn
+    """
+    owner: int
+    num_ships: int
+
+
+@dataclass
+class FleetFrame:
+    """
+    Fleet state in a turn
+    """
+    owner: int
+    num_ships: int
+    source_planet_id: int
+    destination_planet_id: int
+    total_trip_length: int
+    turns_remaining: int
+
+
+@dataclass
+class TurnFrame:
+    """
+    The state of the game in a turn, planets are in the map order
+    """
+    turn: int
+    planets: List[PlanetFrame]
+    fleets: List[FleetFrame]
+
+    def to_dict(self):
+        return {
+            "turn": self.turn,
+            "planets": [[p.owner, p.num_ships] for p in self.planets],
+            "fleets": [
+                [f.owner, f.num_ships, f.source_planet_id, f.destination_planet_id, f.total_trip_length,
+                 f.turns_remaining]
+                for f in self.fleets
+            ]
+        }
+
+
+class ReplayFormatError(ValueError):
+    pass
+
+
+class Replay:
+    """
+    A battle replay with random access to its turns
+    """
+
+    def __init__(self, description_for_display: str):
+        """
+        :param description_for_display: The battle description (BattleResult.description_for_display)
+        """
+        separator = description_for_display.find("|")
+        if separator == -1:
+            raise ReplayFormatError("Replay should have a map and turns separated by '|'")
+        self.description_for_display = description_for_display
+        self._turns_start = separator + 1
+        self._map_str = description_for_display[:separator]
+        self._map_planets: Optional[List[MapPlanet]] = None
+        self._turn_offsets: Optional[List[int]] = None
+
+    @property
+    def map_planets(self) -> List[MapPlanet]:
+        """
+        :return: The planets of the map
+        """
+        if self._map_planets is None:
+            self._map_planets = []
+            for planet_str in self._map_str.split(":"):
+                x, y, owner, num_ships, growth_rate = planet_str.split(",")
+                self._map_planets.append(MapPlanet(float(x), float(y), int(owner), int(num_ships), int(growth_rate)))
+        return self._map_planets
+
+    def _index_turns(self) -> List[int]:
+        """
+        :return: The start offset of each recorded turn (and the end offset of the last turn), turn k starts at
+                 offsets[k - 1]
+        """
+        if self._turn_offsets is None:
+            description = self.description_for_display
+            if self._turns_start == len(description):
+                self._turn_offsets = [self._turns_start]
+                return self._turn_offsets
+            offsets = [self._turns_start]
+            position = description.find(":", self._turns_start)
+            while position != -1:
+                offsets.append(position + 1)
+                position = description.find(":", position + 1)
+            offsets.append(len(description) + 1)
+            self._turn_offsets = offsets
+        return self._turn_offsets
+
+    @property
+    def num_turns(self) -> int:
+        """
+        :return: The number of turns in the replay (including turn 0)
+        """
+        return len(self._index_turns())
+
+    def __len__(self):
+        return self.num_turns
+
+    def get_turn_str(self, turn: int) -> str:
+        """
+        :param turn: The turn number, negative numbers count from the end
+        :return: The raw turn description
+        """
+        offsets = self._index_turns()
+        if turn < 0:
+            turn += self.num_turns
+        if not 0 <= turn < self.num_turns:
+            raise IndexError(f"Turn {turn} is out of range, the replay has {self.num_turns} turns")
+        if turn == 0:
+            return ",".join(f"{p.owner}.{p.num_ships}" for p in self.map_planets)
+        return self.description_for_display[offsets[turn - 1]:offsets[turn] - 1]
+
+    def get_turn(self, turn: int) -> TurnFrame:
+        """
+        :param turn: The turn number, negative numbers count from the end
+        :return: The game state in the given turn
+        """
+        if turn < 0:
+            turn += self.num_turns
+        items = self.get_turn_str(turn).split(",")
+        num_planets = len(self.map_planets)
+        if len(items) < num_planets:
+            raise ReplayFormatError(f"Turn {turn} has {len(items)} planets, the map has {num_planets}")
+        try:
+            planets = [PlanetFrame(*(int(v) for v in item.split("."))) for item in items[:num_planets]]
+            fleets = [FleetFrame(*(int(v) for v in item.split("."))) for item in items[num_planets:]]
+        except (TypeError, ValueError) as e:
+            raise ReplayFormatError(f"Can't parse turn {turn}: {e}")
+        return TurnFrame(turn=turn, planets=planets, fleets=fleets)
+
+    def iter_turns(self, start: int = 0, stop: Optional[int] = None, step: int = 1) -> Iterator[TurnFrame]:
+        """
+        Iterate over a range of turns, parsing one turn at a time
+        """
+        for turn in range(*slice(start, stop, step).indices(self.num_turns)):
+            yield self.get_turn(turn)
+
+    def get_game_object(self, turn: int) -> PlanetWars:
+        """
+        :param turn: The turn number
+        :return: The game state in the given turn as PlanetWars object (from player 1 perspective)
+        """
+        frame = self.get_turn(turn)
+        planets = [
+            Planet(planet_id, p.owner, p.num_ships, m.growth_rate, m.x, m.y)
+            for planet_id, (p, m) in enumerate(zip(frame.planets, self.map_planets))
+        ]
+        fleets = [
+            Fleet(f.owner, f.num_ships, f.source_planet_id, f.destination_planet_id, f.total_trip_length,
+                  f.turns_remaining)
+            for f in frame.fleets
+        ]
+        game = PlanetWars(planets, fleets)
+        game.turns = frame.turn
+        return game
+
+    def get_map_dict(self):
+        """
+        :return: The map and the number of turns, as json serializable dict
+        """
+        return {
+            "planets": [[p.x, p.y, p.owner, p.num_ships, p.growth_rate] for p in self.map_planets],
+            "num_turns": self.num_turns
+        }
+
+
+def export_frames(replay: Replay, path: str, start: int = 0, stop: Optional[int] = None, step: int = 1):
+    """
+    Export turns of the replay as json lines file - the map in the first line and a TurnFrame dict per line.
+    Only the exported turns are parsed, so exporting a window of a long battle is cheap.
+    :param replay: The replay to export
+    :param path: The output file
+    :param start: First turn to export
+    :param stop: Stop before this turn, None means until the end of the battle
+    :param step: Export every step turns
+    """
+    with open(path, "w") as f:
+        f.write(json.dumps(replay.get_map_dict()) + "\n")
+        for frame in replay.iter_turns(start, stop, step):
+            f.write(json.dumps(frame.to_dict()) + "\n")
@@ -0,0 +1,166 @@
+"""
+Local HTTP service that streams battle replays turn by turn, with random access to any turn.
+
+Endpoints (all json, except description):
+    GET /battles                                    The battle ids and details
+    GET /battles/<battle_id>                        The battle details, the map and the number of turns
+    GET /battles/<battle_id>/turns/<turn>           A single turn (negative turns count from the end)
+    GET /battles/<battle_id>/turns?start=&stop=&step=
+                                                    A range of turns, streamed as json lines (a turn per line)
+    GET /battles/<battle_id>/description            The raw description_for_display, for the java viewer:
+        curl http://127.0.0.1:8000/battles/7/description | java -jar planet_wars/viewer/ShowGame.jar
+
+Run:
+    python -m planet_wars.replays.server planet_wars/rounds/round1/battle_results_df.parquet --port 8000
+"""
+import argparse
+import json
+import re
+import threading
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import urlparse, parse_qs
+
+from planet_wars.replays.replay import ReplayFormatError
+from planet_wars.replays.store import ReplayStore
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8000
+
+BATTLES_PATH = re.compile(r"^/battles/?$")
+BATTLE_PATH = re.compile(r"^/battles/(\d+)/?$")
+TURN_PATH = re.compile(r"^/battles/(\d+)/turns/(-?\d+)/?$")
+TURNS_PATH = re.compile(r"^/battles/(\d+)/turns/?$")
+DESCRIPTION_PATH = re.compile(r"^/battles/(\d+)/description/?$")
+
+
+class ReplayRequestHandler(BaseHTTPRequestHandler):
+    """
+    Handle the replay requests, self.server.replay_store is the ReplayStore to serve from
+    """
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass  # Don't print every request
+
+    def _send(self, body: bytes, content_type: str = "application/json", status: HTTPStatus = HTTPStatus.OK):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, obj, status: HTTPStatus = HTTPStatus.OK):
+        self._send(json.dumps(obj).encode(), status=status)
+
+    def _send_error(self, status: HTTPStatus, message: str):
+        self._send_json({"error": message}, status)
+
+    def _stream_turns(self, battle_id: int, query: dict):
+        replay = self.server.replay_store.get_replay(battle_id)
+        start, stop, step = (
+            int(query[name][0]) if name in query else default
+            for name, default in (("start", 0), ("stop", None), ("step", 1))
+        )
+        if step == 0:
+            raise ValueError("step can't be 0")
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        for frame in replay.iter_turns(start, stop, step):
+            line = (json.dumps(frame.to_dict()) + "\n").encode()
+            self.wfile.write(f"{len(line):X}\r\n".encode() + line + b"\r\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        store: ReplayStore = self.server.replay_store
+        try:
+            if BATTLES_PATH.match(url.path):
+                self._send_json([
+                    dict(store.get_battle_details(battle_id), battle_id=battle_id)
+                    for battle_id in store.get_battle_ids()
+                ])
+            elif match := BATTLE_PATH.match(url.path):
+                battle_id = int(match.group(1))
+                self._send_json(dict(
+                    store.get_battle_details(battle_id), battle_id=battle_id,
+                    **store.get_replay(battle_id).get_map_dict()
+                ))
+            elif match := TURN_PATH.match(url.path):
+                replay = store.get_replay(int(match.group(1)))
+                self._send_json(replay.get_turn(int(match.group(2))).to_dict())
+            elif match := TURNS_PATH.match(url.path):
+                self._stream_turns(int(match.group(1)), parse_qs(url.query))
+            elif match := DESCRIPTION_PATH.match(url.path):
+                replay = store.get_replay(int(match.group(1)))
+                self._send(replay.description_for_display.encode(), "text/plain")
+            else:
+                self._send_error(HTTPStatus.NOT_FOUND, f"Unknown path {url.path}")
+        except KeyError as e:
+            self._send_error(HTTPStatus.NOT_FOUND, f"No battle {e}")
+        except IndexError as e:
+            self._send_error(HTTPStatus.NOT_FOUND, str(e))
+        except ReplayFormatError as e:
+            self._send_error(HTTPStatus.INTERNAL_SERVER_ERROR, str(e))
+        except ValueError as e:
+            self._send_error(HTTPStatus.BAD_REQUEST, str(e))
+
+
+class ReplayServer:
+    """
+    Serve the replays of a ReplayStore over HTTP.
+    Use serve_forever() to block, or start() to serve from a background thread (for notebooks and tests).
+    """
+
+    def __init__(self, replay_store: ReplayStore, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT):
+        """
+        :param replay_store: The replays to serve
+        :param host: The host to listen on, local only by default
+        :param port: The port to listen on, 0 picks a free port
+        """
+        self.http_server = ThreadingHTTPServer((host, port), ReplayRequestHandler)
+        self.http_server.daemon_threads = True
+        self.http_server.replay_store = replay_store
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.http_server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def serve_forever(self):
+        print(f"Serving replays on {self.url}")
+        self.http_server.serve_forever()
+
+    def start(self) -> "ReplayServer":
+        """
+        Serve in a background thread
+        """
+        self._thread = threading.Thread(target=self.http_server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def shutdown(self):
+        self.http_server.shutdown()
+        self.http_server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve PlanetWars battle replays")
+    parser.add_argument("replays", help="Battle results file (.parquet / .csv) or a directory of replay files")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    args = parser.parse_args()
+    if args.replays.endswith((".parquet", ".csv")):
+        store = ReplayStore.from_battle_results_file(args.replays)
+    else:
+        store = ReplayStore.from_directory(args.replays)
+    ReplayServer(store, args.host, args.port).serve_forever()
@@ -0,0 +1,127 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List
+
+from planet_wars.replays.replay import Replay
+
+REPLAY_FILE_SUFFIX = ".replay.txt"
+
+
+class ReplayStore:
+    """
+    Access to stored battle replays by battle id.
+    The replays are loaded on demand, and the recently used replays are kept in memory (with their turns index).
+
+    Create it with one of:
+        ReplayStore.from_battle_results_file("rounds/round1/battle_results_df.parquet")
+        ReplayStore.from_directory("replays_directory")
+        ReplayStore.from_battle_results(tournament.battle_results)
+    """
+
+    def __init__(
+            self,
+            battles: Dict[int, Dict],
+            load_description: Callable[[int], str],
+            max_cached_replays: int = 16
+    ):
+        """
+        :param battles: battle_id -> battle details (player names, winner etc.), json serializable
+        :param load_description: Function that returns the description_for_display of the given battle_id
+        :param max_cached_replays: Number of replays to keep in memory
+        """
+        self.battles = battles
+        self._load_description = load_description
+        self.max_cached_replays = max_cached_replays
+        self._replays: "OrderedDict[int, Replay]" = OrderedDict()
+        # The replay server calls get_replay from its request threads
+        self._lock = threading.Lock()
+
+    def get_battle_ids(self) -> List[int]:
+        return sorted(self.battles)
+
+    def get_battle_details(self, battle_id: int) -> Dict:
+        """
+        :return: The battle details, raises KeyError if there is no such battle
+        """
+        return self.battles[battle_id]
+
+    def get_replay(self, battle_id: int) -> Replay:
+        """
+        :return: The replay of the given battle, raises KeyError if there is no such battle
+        """
+        with self._lock:
+            if battle_id in self._replays:
+                self._replays.move_to_end(battle_id)
+                return self._replays[battle_id]
+        if battle_id not in self.battles:
+            raise KeyError(battle_id)
+        # Load outside the lock, so loading a large replay doesn't block the other requests
+        replay = Replay(self._load_description(battle_id))
+        with self._lock:
+            self._replays[battle_id] = replay
+            self._replays.move_to_end(battle_id)
+            while len(self._replays) > self.max_cached_replays:
+                self._replays.popitem(last=False)
+        return replay
+
+    @staticmethod
+    def from_battle_results(battle_results: List) -> "ReplayStore":
+        """
+        :param battle_results: List of BattleResult (for example tournament.battle_results)
+        """
+        details_fields = ["player_1_name", "player_2_name", "winner", "finish_state", "turns"]
+        battles = {
+            br.battle_id: {field: getattr(br, field) for field in details_fields} for br in battle_results
+        }
+        descriptions = {br.battle_id: br.description_for_display for br in battle_results}
+        return ReplayStore(battles, descriptions.__getitem__)
+
+    @staticmethod
+    def from_battle_results_file(path: str) -> "ReplayStore":
+        """
+        :param path: Battle results data frame saved as parquet or csv (see Tournament.get_battle_results_data_frame)
+        """
+        import pandas as pd
+
+        if path.endswith(".parquet"):
+            df = pd.read_parquet(path)
+        else:
+            df = pd.read_csv(path, index_col="battle_id")
+        if "battle_id" in df.columns:
+            df = df.set_index("battle_id")
+        details_columns = [c for c in df.columns if c != "description_for_display"]
+        battles = {
+            int(battle_id): {c: row[c].item() if hasattr(row[c], "item") else row[c] for c in details_columns}
+            for battle_id, row in df[details_columns].iterrows()
+        }
+        descriptions = df["description_for_display"]
+        return ReplayStore(battles, lambda battle_id: descriptions.loc[battle_id])
+
+    @staticmethod
+    def from_directory(directory: str) -> "ReplayStore":
+        """
+        :param directory: Directory with <battle_id>.replay.txt files (see save_replays)
+        """
+        battles = {
+            int(file_name[:-len(REPLAY_FILE_SUFFIX)]): {}
+            for file_name in os.listdir(directory) if file_name.endswith(REPLAY_FILE_SUFFIX)
+        }
+
+        def load_description(battle_id: int) -> str:
+            with open(os.path.join(directory, f"{battle_id}{REPLAY_FILE_SUFFIX}")) as f:
+                return f.read()
+
+        return ReplayStore(battles, load_description)
+
+
+def save_replays(battle_results: List, directory: str):
+    """
+    Save the replays of the given battles to the given directory, one file per battle
+    :param battle_results: List of BattleResult
+    :param directory: The directory to save to
+    """
+    os.makedirs(directory, exist_ok=True)
+    for battle_result in battle_results:
+        with open(os.path.join(directory, f"{battle_result.battle_id}{REPLAY_FILE_SUFFIX}"), "w") as f:
+            f.write(battle_result.description_for_display)
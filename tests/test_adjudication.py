@@ -0,0 +1,40 @@
+from planet_wars.engine.adjudication import NoRecaptureRule, SAFE_ADJUDICATION_RULES
+from planet_wars.engine.game_logic import GameManager
+from planet_wars.planet_wars import Player
+
+LATE_FLEETS_MAP = "\n".join(
+    ["P 0 0 1 6 5", "P 10 0 0 1 1"] + [f"F 2 4 1 0 40 {turns_remaining}" for turns_remaining in range(1, 31)]
+)
+
+
+class IdleBot(Player):
+    def play_turn(self, game):
+        return []
+
+
+def play_from_turn(map_str, turns, adjudication_rules=None):
+    game_manager = GameManager(map_str, IdleBot(), IdleBot(), adjudication_rules=adjudication_rules)
+    game_manager.turns = turns
+    state = GameManager.IN_GAME_STATE
+    while state == GameManager.IN_GAME_STATE:
+        state = game_manager.make_turn()
+    return state, game_manager.turns
+
+
+def test_loser_fleets_flying_at_max_turns_are_not_adjudicated():
+    assert play_from_turn(LATE_FLEETS_MAP, 190) == ("Player 2 Wins", 200)
+    assert play_from_turn(LATE_FLEETS_MAP, 190, SAFE_ADJUDICATION_RULES) == ("Player 2 Wins", 200)
+
+
+def test_loser_fleets_arriving_before_max_turns_are_adjudicated():
+    state, turns = play_from_turn(LATE_FLEETS_MAP, 100, SAFE_ADJUDICATION_RULES)
+    assert state == play_from_turn(LATE_FLEETS_MAP, 100)[0] == "Player 1 Wins"
+    assert turns == 101
+
+
+def test_winner_growth_outscores_late_fleets():
+    map_str = "\n".join(["P 0 0 1 6 50", "P 10 0 0 1 1", "F 2 4 1 0 40 30"])
+    game_manager = GameManager(map_str, IdleBot(), IdleBot())
+    game_manager.turns = 190
+    assert NoRecaptureRule().adjudicate(game_manager)[0] == 1
+    assert play_from_turn(map_str, 190)[0] == "Player 1 Wins"
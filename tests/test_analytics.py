@@ -0,0 +1,40 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from planet_wars.replays.analytics import analyze_battle_results, decode_replay
+
+MAP = "1,2,1,10,5:3,4,2,10,5:5,5,0,3,2"
+# Player 1 captures the neutral planet in the first turn, player 2 captures it back in the second turn
+BATTLE = f"{MAP}|1.15,2.15,1.2,1.3.0.2.4.3:1.20,2.20,2.1"
+FORFEITED_BATTLE = f"{MAP}|"
+
+
+def make_battle_result(battle_id, description):
+    return SimpleNamespace(
+        battle_id=battle_id, description_for_display=description, player_1_name="a", player_2_name="b",
+        winner="a", finish_state="Player 1 Wins", turns=0
+    )
+
+
+def test_decode_forfeited_battle():
+    battle = decode_replay(FORFEITED_BATTLE)
+    assert battle.num_turns == 0
+    assert battle.owners.shape == (0, 3)
+    assert battle.fleets.shape == (0, 6)
+    assert battle.map_owners.tolist() == [1, 2, 0]
+
+
+def test_analyze_battle_results_with_a_forfeited_battle():
+    results = analyze_battle_results([make_battle_result(1, BATTLE), make_battle_result(2, FORFEITED_BATTLE)])
+    assert results["battles"]["num_turns"].tolist() == [2, 0]
+    ship_counts = results["ship_counts"]
+    assert ship_counts["turn"].tolist() == [1, 2]
+    assert ship_counts["player_1_ships"].tolist() == [15 + 2 + 3, 20]
+
+    efficiency = results["fleet_efficiency"].set_index(["battle_id", "player"])
+    assert efficiency.loc[(1, 1), "planets_captured"] == 1
+    assert efficiency.loc[(1, 1), "planets_lost"] == 1
+    assert efficiency.loc[(1, 2), "planets_captured"] == 1
+    assert np.all(efficiency.loc[2, "planets_captured"] == 0)
+    assert results["lead_changes"]["battle_id"].tolist() == [1, 1]
@@ -0,0 +1,60 @@
+import random
+
+import numpy as np
+
+from planet_wars.battles.battle_cache import get_player_fingerprint, is_cacheable
+from planet_wars.planet_wars import Player
+from planet_wars.player_bots.baseline_code.baseline_bot import AttackEnemyWeakestPlanetFromStrongestBot
+
+
+class Strategy:
+    def __init__(self, aggression):
+        self.aggression = aggression
+
+
+class SlottedWeights:
+    __slots__ = ("weights",)
+
+    def __init__(self, weights):
+        self.weights = weights
+
+
+class ParametrizedBot(Player):
+    def __init__(self, aggression=1.0, seed=0):
+        self.strategy = Strategy(aggression)
+        self.weights = SlottedWeights(np.array([aggression, 2.0]))
+        self.rng = random.Random(seed)
+        self.history = {"scores": [aggression], "names": {"a", "b"}}
+        self.on_turn = print
+        self.me = self
+
+    def play_turn(self, game):
+        return []
+
+
+def test_fingerprint_is_the_same_for_bots_with_the_same_state():
+    assert get_player_fingerprint(ParametrizedBot()) == get_player_fingerprint(ParametrizedBot())
+
+
+def test_fingerprint_changes_with_nested_state():
+    fingerprint = get_player_fingerprint(ParametrizedBot())
+    assert get_player_fingerprint(ParametrizedBot(aggression=2.0)) != fingerprint
+    assert get_player_fingerprint(ParametrizedBot(seed=1)) != fingerprint
+    bot = ParametrizedBot()
+    bot.weights.weights[1] = 3.0
+    assert get_player_fingerprint(bot) != fingerprint
+
+
+class SeededBot(Player):
+    SEED_REPRODUCIBLE = True
+
+    def play_turn(self, game):
+        return []
+
+
+def test_only_bots_that_opt_in_are_cacheable():
+    baseline_bot = AttackEnemyWeakestPlanetFromStrongestBot()
+    assert is_cacheable(baseline_bot, baseline_bot)
+    assert not is_cacheable(baseline_bot, ParametrizedBot(), seed=1)
+    assert not is_cacheable(baseline_bot, SeededBot())
+    assert is_cacheable(baseline_bot, SeededBot(), seed=1)
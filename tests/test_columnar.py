@@ -0,0 +1,20 @@
+import numpy as np
+import pytest
+
+from planet_wars.battles.tournament import get_map_by_id
+from planet_wars.engine.game_logic import GameManager
+from planet_wars.player_bots.baseline_code.baseline_bot import AttackWeakestPlanetFromStrongestBot
+
+
+def test_states_of_both_players_are_read_only():
+    game_manager = GameManager(
+        get_map_by_id(1), AttackWeakestPlanetFromStrongestBot(), AttackWeakestPlanetFromStrongestBot()
+    )
+    game_manager.make_turn()
+    states = [game_manager.get_columnar_state(game_manager.turns, player_num) for player_num in (1, 2)]
+    assert np.shares_memory(states[0].planet_num_ships, states[1].planet_num_ships)
+    for state in states:
+        for array in (state.planet_owner, state.planet_num_ships, state.fleet_owner, state.fleet_num_ships,
+                      state.fleet_turns_remaining, state.planet_growth_rate):
+            with pytest.raises(ValueError):
+                array[:1] = 0
@@ -0,0 +1,50 @@
+import pytest
+
+from planet_wars.battles import evaluation, tournament
+from planet_wars.battles.evaluation import BETTER, UNDECIDED, WORSE, EarlyStoppingTestBot
+from planet_wars.player_bots.baseline_code.baseline_bot import (
+    AttackEnemyWeakestPlanetFromStrongestBot, AttackWeakestPlanetFromStrongestBot
+)
+
+
+def test_wilson_interval():
+    # The textbook example: 8 wins in 10 battles
+    assert evaluation.wilson_interval(8, 10, 0.95) == pytest.approx((0.4902, 0.9433), abs=1e-4)
+    assert evaluation.wilson_interval(0, 0, 0.95) == (0.0, 1.0)
+
+
+def get_decisions(stopping_rule: str, winners: list) -> list:
+    """
+    :param winners: The winner of each battle, the tested player is always player 1
+    :return: The decision after each battle
+    """
+    test_bot = EarlyStoppingTestBot(
+        AttackWeakestPlanetFromStrongestBot(), [AttackEnemyWeakestPlanetFromStrongestBot()],
+        [tournament.get_map_by_id(1)], max_workers=0, stopping_rule=stopping_rule, min_battles=6
+    )
+    competitor_evaluation = test_bot._new_evaluation(test_bot.competitors[0], len(winners))
+    decisions = []
+    for winner in winners:
+        battle_result = tournament.BattleResult(
+            battle_id=0, player_1_name="", player_2_name="", player_1_score=0, player_2_score=0, winner=winner,
+            finish_state="", turns=0, description_for_display="", end_game_object=None
+        )
+        test_bot._update_evaluation(competitor_evaluation, battle_result, player_number=1)
+        decisions.append(competitor_evaluation.decision)
+    return decisions
+
+
+def test_wilson_stopping_rule():
+    # 5 wins are enough (lower bound 0.566), but not before min_battles
+    assert get_decisions(EarlyStoppingTestBot.WILSON, [1] * 6) == [UNDECIDED] * 5 + [BETTER]
+    assert get_decisions(EarlyStoppingTestBot.WILSON, [2] * 6) == [UNDECIDED] * 5 + [WORSE]
+    assert get_decisions(EarlyStoppingTestBot.WILSON, [1, 2] * 20)[-1] == UNDECIDED
+    assert get_decisions(EarlyStoppingTestBot.WILSON, [0] * 40)[-1] == UNDECIDED
+
+
+def test_sprt_stopping_rule():
+    # Each win adds log(0.6 / 0.4) to the log likelihood ratio, 8 wins pass log(0.95 / 0.05)
+    assert get_decisions(EarlyStoppingTestBot.SPRT, [1] * 8) == [UNDECIDED] * 7 + [BETTER]
+    assert get_decisions(EarlyStoppingTestBot.SPRT, [2] * 8) == [UNDECIDED] * 7 + [WORSE]
+    assert get_decisions(EarlyStoppingTestBot.SPRT, [1, 2] * 20)[-1] == UNDECIDED
+    assert get_decisions(EarlyStoppingTestBot.SPRT, [0] * 40)[-1] == UNDECIDED
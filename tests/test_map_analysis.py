@@ -0,0 +1,42 @@
+import contextlib
+import io
+
+from planet_wars.battles.tournament import get_map_by_id
+from planet_wars.engine import map_analysis
+from planet_wars.engine.game_logic import GameManager
+from planet_wars.planet_wars import PlanetWars
+from planet_wars.player_bots.baseline_code.baseline_bot import AttackWeakestPlanetFromStrongestBot
+
+
+def test_game_without_map_str_gets_the_static_features_once_per_map(tmp_path, monkeypatch):
+    monkeypatch.setattr(map_analysis, "ANALYSIS_DIRECTORY", str(tmp_path))
+    game_manager = GameManager(
+        get_map_by_id(1), AttackWeakestPlanetFromStrongestBot(), AttackWeakestPlanetFromStrongestBot()
+    )
+    analyses = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        game_manager.make_turn()
+        for turn in range(20):
+            # Parsed from the state text, as a remote bot gets it - without the map string, from a later turn and
+            # from both perspectives
+            game = PlanetWars.parse_game_state(str(game_manager.get_game_object_for_player(1 + turn % 2)))
+            analyses.append(game.map_analysis)
+            assert game.opening_plan is None
+            game_manager.make_turn()
+    assert all(analysis is analyses[0] for analysis in analyses)
+    assert analyses[0].home_planet_ids == (-1, -1)
+    assert analyses[0].contested_planet_ids == () and analyses[0].symmetry_type is None
+    assert list(tmp_path.iterdir()) == []
+
+    map_str_analysis = map_analysis.get_map_analysis_by_map_str(get_map_by_id(1))
+    assert analyses[0].distances == map_str_analysis.distances
+    assert analyses[0].nearest_planet_ids == map_str_analysis.nearest_planet_ids
+    assert analyses[0].growth_per_distance_ranking == map_str_analysis.growth_per_distance_ranking
+
+
+def test_map_analysis_caches_are_bounded(monkeypatch):
+    monkeypatch.setattr(map_analysis, "MAX_CACHED_ANALYSES", 2)
+    cache = {}
+    for key in range(5):
+        map_analysis._cache_analysis(cache, key, None)
+    assert list(cache) == [3, 4]
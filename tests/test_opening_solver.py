@@ -0,0 +1,17 @@
+from planet_wars.battles.tournament import get_map_by_id
+from planet_wars.engine import map_analysis, opening_solver
+
+
+def test_opening_plan_caches_are_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(map_analysis, "MAX_CACHED_ANALYSES", 2)
+    monkeypatch.setattr(map_analysis, "ANALYSIS_DIRECTORY", str(tmp_path / "analysis"))
+    monkeypatch.setattr(opening_solver, "OPENINGS_DIRECTORY", str(tmp_path / "openings"))
+    monkeypatch.setattr(opening_solver, "_plans_cache", {})
+    monkeypatch.setattr(opening_solver, "_plans_by_map_str", {})
+    for map_id in range(1, 6):
+        map_str = get_map_by_id(map_id)
+        home_planet_id = map_analysis.get_map_analysis_by_map_str(map_str).home_planet_ids[0]
+        plan = opening_solver.get_opening_plan_by_map_str(map_str, home_planet_id)
+        assert opening_solver.get_opening_plan_by_map_str(map_str, home_planet_id) is plan
+    assert len(opening_solver._plans_cache) == 2
+    assert len(opening_solver._plans_by_map_str) == 2
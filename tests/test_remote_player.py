@@ -0,0 +1,144 @@
+import asyncio
+import contextlib
+import io
+import socket
+import threading
+import time
+
+import pytest
+
+from planet_wars.battles.tournament import get_map_by_id
+from planet_wars.engine.async_game_logic import AsyncGameManager, run_games
+from planet_wars.engine.game_logic import GameManager
+from planet_wars.engine.remote_player import (
+    BINARY_WIRE_FORMAT, TEXT_WIRE_FORMAT, RemotePlayer, serve_player
+)
+from planet_wars.planet_wars import Player
+from planet_wars.player_bots.baseline_code.baseline_bot import (
+    AttackEnemyWeakestPlanetFromStrongestBot, AttackWeakestPlanetFromStrongestBot
+)
+
+
+class SlowBot(Player):
+    def play_turn(self, game):
+        time.sleep(0.5)
+        return []
+
+
+class FailingBot(Player):
+    def play_turn(self, game):
+        raise ValueError("bad turn")
+
+
+class BotList(list):
+    port: int
+
+
+def start_bot_server(player_class) -> BotList:
+    """
+    Serve the bot in a background thread
+    :return: The bots the server created (one per connection), with the server port
+    """
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    bots = BotList()
+    bots.port = port
+
+    def player_factory():
+        bots.append(player_class())
+        return bots[-1]
+
+    threading.Thread(target=lambda: asyncio.run(serve_player(player_factory, port=port)), daemon=True).start()
+    for _ in range(100):
+        try:
+            socket.create_connection(("127.0.0.1", port)).close()
+            break
+        except OSError:
+            time.sleep(0.05)
+    # Wait for the probe connection bot, so it is not counted
+    while not bots:
+        time.sleep(0.01)
+    bots.clear()
+    return bots
+
+
+@pytest.fixture(scope="module")
+def baseline_bots():
+    return start_bot_server(AttackWeakestPlanetFromStrongestBot)
+
+
+def run_local_game(map_id: int) -> list:
+    """
+    :return: The turns of the game with the served bot played locally
+    """
+    game_manager = GameManager(
+        get_map_by_id(map_id), AttackWeakestPlanetFromStrongestBot(), AttackEnemyWeakestPlanetFromStrongestBot()
+    )
+    with contextlib.redirect_stdout(io.StringIO()):
+        game_manager.run_game()
+    return game_manager.str_turns_for_display
+
+
+@pytest.mark.parametrize("wire_format", [BINARY_WIRE_FORMAT, TEXT_WIRE_FORMAT])
+def test_sync_games_play_like_local_games_and_reuse_the_connection(baseline_bots, wire_format):
+    remote_player = RemotePlayer(port=baseline_bots.port, wire_format=wire_format)
+    bots_before = len(baseline_bots)
+    try:
+        for map_id in (1, 2):
+            game_manager = GameManager(get_map_by_id(map_id), remote_player, AttackEnemyWeakestPlanetFromStrongestBot())
+            with contextlib.redirect_stdout(io.StringIO()):
+                game_manager.run_game()
+            assert game_manager.str_turns_for_display == run_local_game(map_id)
+    finally:
+        remote_player.close_sync()
+    assert len(baseline_bots) - bots_before == 1
+
+
+def test_async_games_share_the_connections(baseline_bots):
+    remote_player = RemotePlayer(port=baseline_bots.port, max_connections=2)
+    map_ids = [1, 2, 3, 4, 5, 6]
+    game_managers = [
+        AsyncGameManager(get_map_by_id(map_id), remote_player, AttackEnemyWeakestPlanetFromStrongestBot())
+        for map_id in map_ids
+    ]
+    bots_before = len(baseline_bots)
+
+    async def run():
+        try:
+            return await run_games(game_managers)
+        finally:
+            await remote_player.close()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        asyncio.run(run())
+    # At most max_connections games played at the same time, the other games waited and reused their connections
+    assert len(baseline_bots) - bots_before <= 2
+    for map_id, game_manager in zip(map_ids, game_managers):
+        assert game_manager.str_turns_for_display == run_local_game(map_id)
+
+
+def test_bot_that_does_not_answer_in_time_loses_and_its_connection_is_not_reused():
+    slow_bots = start_bot_server(SlowBot)
+    remote_player = RemotePlayer(port=slow_bots.port, timeout=0.1)
+    try:
+        for _ in range(2):
+            game_manager = GameManager(get_map_by_id(1), remote_player, AttackEnemyWeakestPlanetFromStrongestBot())
+            with contextlib.redirect_stdout(io.StringIO()):
+                assert game_manager.run_game() == GameManager.PLAYER_2_WIN_STATE
+    finally:
+        remote_player.close_sync()
+    assert len(slow_bots) == 2
+
+
+def test_bot_server_exception_loses_and_keeps_the_connection():
+    failing_bots = start_bot_server(FailingBot)
+    remote_player = RemotePlayer(port=failing_bots.port)
+    try:
+        for _ in range(2):
+            game_manager = GameManager(get_map_by_id(1), AttackEnemyWeakestPlanetFromStrongestBot(), remote_player)
+            with contextlib.redirect_stdout(io.StringIO()):
+                assert game_manager.run_game() == GameManager.PLAYER_1_WIN_STATE
+    finally:
+        remote_player.close_sync()
+    assert len(failing_bots) == 1
@@ -0,0 +1,19 @@
+import os
+
+import pytest
+
+from planet_wars.replays.render import render_battles
+
+FIRST_MAP_BATTLE = "5,5,1,10,5:1,1,2,10,5|1.15,2.15"
+FORFEITED_BATTLE = "1,2,1,10,5:3,4,2,10,5|"
+
+
+@pytest.mark.parametrize("max_workers", [0, 2])
+def test_render_battles_keeps_the_input_order(tmp_path, max_workers):
+    battles = [
+        (FIRST_MAP_BATTLE, os.path.join(tmp_path, "first.png")),
+        (FORFEITED_BATTLE, os.path.join(tmp_path, "forfeited.png")),
+        (FIRST_MAP_BATTLE, os.path.join(tmp_path, "frames")),
+    ]
+    assert render_battles(battles, max_workers=max_workers) == [path for _, path in battles]
+    assert all(os.path.exists(path) for _, path in battles)
@@ -0,0 +1,18 @@
+from planet_wars.replays.replay import Replay
+
+MAP = "1,2,1,10,5:3,4,2,10,5"
+
+
+def test_turns_are_numbered_from_the_map():
+    replay = Replay(f"{MAP}|1.15,2.15:1.20,2.3,1.2.1.0.4.3")
+    assert replay.num_turns == 3
+    assert [frame.turn for frame in replay.iter_turns()] == [0, 1, 2]
+    assert replay.get_turn(0).to_dict() == Replay(f"{MAP}|").get_turn(0).to_dict()
+    assert len(replay.get_turn(2).fleets) == 1
+
+
+def test_forfeited_battle_has_only_the_map():
+    replay = Replay(f"{MAP}|")
+    assert replay.num_turns == 1
+    assert replay.get_turn(-1).turn == 0
+    assert [(planet.owner, planet.num_ships) for planet in replay.get_turn(0).planets] == [(1, 10), (2, 10)]
@@ -0,0 +1,93 @@
+import contextlib
+import io
+import threading
+import time
+
+from planet_wars.battles.tournament import get_map_by_id
+from planet_wars.engine.game_logic import GameManager
+from planet_wars.engine.resource_limits import ResourceLimits
+from planet_wars.planet_wars import Player
+from planet_wars.player_bots.baseline_code.baseline_bot import (
+    AttackEnemyWeakestPlanetFromStrongestBot, AttackWeakestPlanetFromStrongestBot
+)
+
+
+class SpinningBot(Player):
+    def play_turn(self, game):
+        while True:
+            pass
+
+
+class MemoryGrowingBot(Player):
+    def play_turn(self, game):
+        memory = []
+        while True:
+            memory.append([0] * 1000)
+
+
+class SpawningBot(Player):
+    """
+    Burns CPU in a thread it starts and joins, in its first turn
+    """
+    def play_turn(self, game):
+        if game.turns > 0:
+            return []
+
+        def spin():
+            end = time.process_time() + 0.05
+            while time.process_time() < end:
+                pass
+
+        thread = threading.Thread(target=spin)
+        thread.start()
+        thread.join()
+        return []
+
+
+def run_game(resource_limits: ResourceLimits, player_1: Player = None, raise_bot_exceptions: bool = False
+             ) -> GameManager:
+    game_manager = GameManager(
+        get_map_by_id(1), player_1 or AttackWeakestPlanetFromStrongestBot(), AttackEnemyWeakestPlanetFromStrongestBot(),
+        raise_bot_exceptions=raise_bot_exceptions, resource_limits=resource_limits
+    )
+    with contextlib.redirect_stdout(io.StringIO()):
+        game_manager.run_game()
+    return game_manager
+
+
+def test_new_game_has_started_is_not_counted_as_a_turn():
+    game_manager = run_game(ResourceLimits(max_turn_cpu_time=10.0))
+    assert [game_manager.resource_usage[player_num].turns for player_num in (1, 2)] == [game_manager.turns] * 2
+
+
+def test_memory_is_traced_only_when_asked():
+    assert run_game(ResourceLimits(max_turn_cpu_time=10.0)).resource_usage[1].peak_turn_memory == 0
+    assert run_game(ResourceLimits(max_turn_memory=1024 ** 3)).resource_usage[1].peak_turn_memory > 0
+    assert run_game(ResourceLimits(track_memory=True)).resource_usage[1].peak_turn_memory > 0
+
+
+def test_spinning_bot_is_stopped_during_the_turn():
+    game_manager = run_game(ResourceLimits(max_turn_cpu_time=0.1), SpinningBot())
+    usage = game_manager.resource_usage[1]
+    assert usage.turns == 1
+    assert "CPU time" in usage.limit_exceeded
+    assert usage.cpu_time < 1.0
+
+
+def test_memory_growing_bot_is_stopped_during_the_turn():
+    game_manager = run_game(ResourceLimits(max_turn_memory=10 * 1024 ** 2), MemoryGrowingBot())
+    usage = game_manager.resource_usage[1]
+    assert "memory" in usage.limit_exceeded
+    assert usage.peak_turn_memory < 1024 ** 3
+
+
+def test_going_over_the_limits_is_a_forfeit_when_raising_bot_exceptions():
+    game_manager = run_game(ResourceLimits(max_turn_cpu_time=0.1), SpinningBot(), raise_bot_exceptions=True)
+    assert game_manager.resource_usage[1].limit_exceeded is not None
+    assert game_manager.resource_usage[1].turns == 1
+
+
+def test_cpu_of_the_bot_threads_is_counted():
+    game_manager = run_game(ResourceLimits(max_turn_cpu_time=10.0), SpawningBot())
+    usage = game_manager.resource_usage[1]
+    assert usage.max_turn_cpu_time >= 0.05
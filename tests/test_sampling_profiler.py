@@ -0,0 +1,100 @@
+import contextlib
+import io
+import threading
+import time
+
+import pytest
+
+from planet_wars.battles import evaluation, swiss, sweep, tournament, work_queue
+from planet_wars.engine.resource_limits import ResourceLimits
+from planet_wars.engine.sampling_profiler import SamplingProfiler
+from planet_wars.player_bots.baseline_code.baseline_bot import (
+    AttackEnemyWeakestPlanetFromStrongestBot, AttackWeakestPlanetFromStrongestBot
+)
+
+
+def run_test_bot(**kwargs):
+    test_bot = tournament.TestBot(
+        AttackWeakestPlanetFromStrongestBot(), [AttackEnemyWeakestPlanetFromStrongestBot()],
+        [tournament.get_map_by_id(1)], seed=0, **kwargs
+    )
+    with contextlib.redirect_stdout(io.StringIO()):
+        test_bot.run_tournament()
+    return [(battle.finish_state, battle.turns) for battle in test_bot.battle_results]
+
+
+def test_profiling_does_not_count_as_a_new_bot_thread():
+    limits = ResourceLimits(max_new_threads=0)
+    assert run_test_bot(sampling_interval=0.005, resource_limits=limits) == run_test_bot(resource_limits=limits)
+
+
+def test_sampling_thread_is_parked_between_calls():
+    profiler = SamplingProfiler(0.001)
+    wakeups = []
+
+    class CountingEvent(threading.Event):
+        def wait(self, timeout=None):
+            wakeups.append(timeout)
+            return super().wait(timeout)
+
+    profiler._stopped = CountingEvent()
+    time.sleep(0.05)
+    # Parked after its first wake up found no call
+    assert len(wakeups) <= 1
+
+    def spin():
+        end = time.perf_counter() + 0.05
+        while time.perf_counter() < end:
+            pass
+
+    profiler.run("bot", spin)
+    profiler.stop()
+    assert len(wakeups) > 0 and profiler.profiles["bot"].total_samples > 0
+
+
+class ConfiguredBot(AttackWeakestPlanetFromStrongestBot):
+    def __init__(self, parameter):
+        self.parameter = parameter
+
+
+def run_early_stopping_test_bot(players, maps, sampling_interval, tmp_path):
+    test_bot = evaluation.EarlyStoppingTestBot(
+        players[0], players[1:], maps, max_workers=0, sampling_interval=sampling_interval
+    )
+    test_bot.run_tournament()
+    return test_bot.battle_results
+
+
+def run_swiss_tournament(players, maps, sampling_interval, tmp_path):
+    swiss_tournament = swiss.SwissTournament(
+        players, maps, rounds=1, max_workers=0, sampling_interval=sampling_interval
+    )
+    return swiss_tournament.run_tournament()
+
+
+def run_parameter_sweep(players, maps, sampling_interval, tmp_path):
+    parameter_sweep = sweep.ParameterSweep(
+        ConfiguredBot, {"parameter": [1]}, players[1:], maps, maps_in_first_round=1, max_workers=0,
+        sampling_interval=sampling_interval
+    )
+    parameter_sweep.run()
+    return parameter_sweep.testers[0].battle_results
+
+
+def run_distributed_tournament(players, maps, sampling_interval, tmp_path):
+    distributed_tournament = work_queue.DistributedTournament(
+        players, maps, str(tmp_path / "queue.sqlite"), local_workers=1, poll_interval=0.05,
+        sampling_interval=sampling_interval
+    )
+    return distributed_tournament.run_tournament()
+
+
+@pytest.mark.parametrize("run", [
+    run_early_stopping_test_bot, run_swiss_tournament, run_parameter_sweep, run_distributed_tournament
+])
+def test_battle_runners_profile_the_battles_when_given_a_sampling_interval(run, tmp_path):
+    players = [AttackWeakestPlanetFromStrongestBot(), AttackEnemyWeakestPlanetFromStrongestBot()]
+    with contextlib.redirect_stdout(io.StringIO()):
+        battle_results = run(players, [tournament.get_map_by_id(1)], 0.005, tmp_path)
+    assert len(battle_results) > 0
+    assert all(battle_result.bot_profiles is not None for battle_result in battle_results)
@@ -0,0 +1,58 @@
+import contextlib
+import io
+import random
+
+import numpy as np
+import pytest
+
+from planet_wars.battles import evaluation, tournament
+from planet_wars.engine.seeding import seeded_global_random
+from planet_wars.player_bots.baseline_code.baseline_bot import (
+    AttackEnemyWeakestPlanetFromStrongestBot, AttackWeakestPlanetFromStrongestBot,
+    AttackWeakestPlanetFromStrongestSmarterNumOfShipsBot
+)
+
+
+def test_seeded_global_random_restores_the_caller_state():
+    random.seed(1)
+    np.random.seed(1)
+    expected = (random.random(), np.random.random())
+    random.seed(1)
+    np.random.seed(1)
+    with seeded_global_random(7):
+        in_battle = (random.random(), np.random.random())
+    assert (random.random(), np.random.random()) == expected
+    with seeded_global_random(7):
+        assert (random.random(), np.random.random()) == in_battle
+
+
+def test_run_battle_doesnt_change_the_global_random_stream():
+    random.seed(1)
+    expected = random.random()
+    random.seed(1)
+    test_bot = tournament.TestBot(
+        AttackWeakestPlanetFromStrongestBot(), [AttackEnemyWeakestPlanetFromStrongestBot()],
+        [tournament.get_map_by_id(1)], seed=0
+    )
+    with contextlib.redirect_stdout(io.StringIO()):
+        test_bot.run_tournament()
+    assert random.random() == expected
+
+
+@pytest.mark.parametrize("always_be_player_1", [False, True])
+def test_early_stopping_test_bot_uses_the_test_bot_seeds(always_be_player_1):
+    arguments = (
+        AttackWeakestPlanetFromStrongestBot(),
+        [AttackEnemyWeakestPlanetFromStrongestBot(), AttackWeakestPlanetFromStrongestSmarterNumOfShipsBot()],
+        [tournament.get_map_by_id(map_id) for map_id in (1, 2)], always_be_player_1
+    )
+    seeds = []
+    for test_bot in (tournament.TestBot(*arguments, seed=3),
+                     evaluation.EarlyStoppingTestBot(*arguments, max_workers=0, min_battles=100, seed=3)):
+        with contextlib.redirect_stdout(io.StringIO()):
+            test_bot.run_tournament()
+        seeds.append(sorted(
+            (b.description_for_display.split("|")[0], b.player_1_name, b.player_2_name, b.seed)
+            for b in test_bot.battle_results
+        ))
+    assert seeds[0] == seeds[1]
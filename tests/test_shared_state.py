@@ -0,0 +1,63 @@
+import contextlib
+import io
+
+import pytest
+
+from planet_wars.battles.tournament import get_map_by_id
+from planet_wars.engine.game_logic import GameManager
+from planet_wars.engine.shared_state import SharedMemoryPlayer
+from planet_wars.planet_wars import Order, PlanetWars, Player
+from planet_wars.player_bots.baseline_code.baseline_bot import AttackWeakestPlanetFromStrongestBot
+
+
+class NoOrdersBot(Player):
+    def play_turn(self, game):
+        return None
+
+
+class SingleOrderBot(Player):
+    def play_turn(self, game):
+        orders = AttackWeakestPlanetFromStrongestBot().play_turn(game)
+        return orders[0] if orders else None
+
+
+class InvalidOrdersBot(Player):
+    def play_turn(self, game):
+        return [Order(None, 3, 5), Order(-1, 3, 5), Order(0.5, 3, 5)] + AttackWeakestPlanetFromStrongestBot().play_turn(
+            game
+        )
+
+
+class RngBot(Player):
+    SEED_REPRODUCIBLE = True
+
+    def new_game_has_started(self, game):
+        self.first_draw = game.rng.random()
+
+    def play_turn(self, game):
+        my_planets = game.get_planets_by_owner(PlanetWars.ME)
+        if not my_planets or game.rng.random() < 0.5:
+            return []
+        source = game.rng.choice(my_planets)
+        return [Order(source, game.rng.choice(game.planets), source.num_ships // 2)]
+
+
+@pytest.mark.parametrize("bot_class", [NoOrdersBot, SingleOrderBot, InvalidOrdersBot, RngBot])
+def test_shared_memory_player_plays_like_in_process(bot_class):
+    finish_states = []
+    for player in (bot_class(), SharedMemoryPlayer(bot_class())):
+        game_manager = GameManager(
+            get_map_by_id(1), player, AttackWeakestPlanetFromStrongestBot(), raise_bot_exceptions=True, seed=5
+        )
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                finish_states.append((game_manager.run_game(), game_manager.turns))
+        finally:
+            if isinstance(player, SharedMemoryPlayer):
+                player.close()
+    assert finish_states[0] == finish_states[1]
+
+
+def test_shared_memory_player_copies_the_cache_flags():
+    player = SharedMemoryPlayer(RngBot())
+    assert (player.DETERMINISTIC, player.SEED_REPRODUCIBLE) == (RngBot.DETERMINISTIC, RngBot.SEED_REPRODUCIBLE)
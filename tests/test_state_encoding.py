@@ -0,0 +1,118 @@
+import contextlib
+import io
+import random
+
+import pytest
+
+from planet_wars.battles.tournament import get_map_by_id
+from planet_wars.engine import state_encoding
+from planet_wars.engine.differential_fuzz import get_planets_and_fleets
+from planet_wars.engine.game_logic import GameManager
+from planet_wars.engine.state_encoding import StateDecoder, StateEncoder, StateEncodingError
+from planet_wars.planet_wars import Fleet, Order, Planet, PlanetWars
+from planet_wars.player_bots.baseline_code.baseline_bot import (
+    AttackEnemyWeakestPlanetFromStrongestBot, AttackWeakestPlanetFromStrongestBot
+)
+
+
+def random_game(rng: random.Random, float_ships: bool = False) -> PlanetWars:
+    num_planets = rng.randint(1, 30)
+
+    def num_ships():
+        return rng.uniform(0, 1000) if float_ships and rng.random() < 0.5 else rng.randint(0, 1000)
+
+    planets = [
+        Planet(planet_id, rng.randint(0, 2), num_ships(), rng.randint(0, 5), rng.uniform(0, 30), rng.uniform(0, 30))
+        for planet_id in range(num_planets)
+    ]
+    fleets = []
+    for _ in range(rng.randint(0, 40)):
+        total_trip_length = rng.randint(1, 30)
+        fleets.append(Fleet(
+            rng.randint(1, 2), num_ships(), rng.randrange(num_planets), rng.randrange(num_planets), total_trip_length,
+            rng.randint(1, total_trip_length)
+        ))
+    game = PlanetWars(planets, fleets)
+    game.turns = rng.randint(0, 200)
+    return game
+
+
+def get_state(game: PlanetWars) -> tuple:
+    return get_planets_and_fleets(game), game.turns
+
+
+@pytest.mark.parametrize("float_ships", [False, True])
+def test_full_frame_round_trip_fuzz(float_ships):
+    rng = random.Random(0)
+    for _ in range(200):
+        game = random_game(rng, float_ships)
+        frame = state_encoding.encode_game_state(game)
+        assert state_encoding.get_frame_size(frame) == len(frame)
+        assert get_state(state_encoding.decode_game_state(frame)) == get_state(game)
+
+
+def test_delta_frames_round_trip_over_a_battle():
+    encoder, decoder = StateEncoder(), StateDecoder()
+    game_manager = GameManager(
+        get_map_by_id(7), AttackWeakestPlanetFromStrongestBot(), AttackEnemyWeakestPlanetFromStrongestBot()
+    )
+    with contextlib.redirect_stdout(io.StringIO()):
+        while True:
+            game = game_manager.get_game_object_for_player(1)
+            assert get_state(decoder.decode(encoder.encode(game))) == get_state(game)
+            if game_manager.make_turn() != GameManager.IN_GAME_STATE:
+                break
+
+
+def test_delta_frame_of_unrelated_states_round_trip_fuzz():
+    rng = random.Random(1)
+    for _ in range(200):
+        previous, game = random_game(rng), random_game(rng)
+        game.turns = previous.turns + rng.randint(0, 3)
+        frame = state_encoding.encode_delta(previous, game)
+        assert get_state(state_encoding.decode_game_state(frame, previous)) == get_state(game)
+
+
+def test_corrupted_frames_raise_state_encoding_error():
+    rng = random.Random(2)
+    for _ in range(200):
+        frame = bytearray(state_encoding.encode_game_state(random_game(rng)))
+        if rng.random() < 0.5:
+            frame = frame[:rng.randrange(len(frame))]
+        else:
+            frame[rng.randrange(state_encoding.HEADER.size)] ^= 1 << rng.randrange(8)
+        try:
+            state_encoding.decode_game_state(bytes(frame))
+        except StateEncodingError:
+            pass
+
+
+def decode_orders_frame(frame: bytes):
+    frame_type, body_size = state_encoding.get_response_body_size(frame[:state_encoding.RESPONSE_HEADER.size])
+    assert frame_type == state_encoding.ORDERS_FRAME
+    assert len(frame) == state_encoding.RESPONSE_HEADER.size + body_size
+    body = frame[state_encoding.RESPONSE_HEADER.size:]
+    return [(o.source_planet_id, o.destination_planet_id, o.num_ships) for o in state_encoding.decode_orders(body)]
+
+
+def test_orders_round_trip_fuzz():
+    rng = random.Random(3)
+    for _ in range(200):
+        orders = [
+            (rng.randint(0, 2 ** 32 - 1), rng.randint(0, 100), rng.choice([rng.randint(0, 1000), rng.uniform(0, 1000)]))
+            for _ in range(rng.randint(0, 20))
+        ]
+        assert decode_orders_frame(state_encoding.encode_orders([Order(*order) for order in orders])) == orders
+
+
+def test_orders_with_bad_planet_ids_are_dropped():
+    orders = [Order(None, 1, 3), Order(-1, 2, 3), Order(1, 2 ** 32, 3), Order(1.5, 2, 3), Order(1, 2, None),
+              Order(1, 2, 3)]
+    assert decode_orders_frame(state_encoding.encode_orders(orders)) == [(1, 2, 3)]
+
+
+def test_error_frame():
+    frame = state_encoding.encode_error("ValueError: bad")
+    frame_type, body_size = state_encoding.get_response_body_size(frame[:state_encoding.RESPONSE_HEADER.size])
+    assert frame_type == state_encoding.ERROR_FRAME
+    assert frame[state_encoding.RESPONSE_HEADER.size:].decode() == "ValueError: bad"
@@ -0,0 +1,37 @@
+from collections import defaultdict
+
+from planet_wars.battles.swiss import SwissTournament
+from planet_wars.battles.tournament import get_map_by_id
+from planet_wars.player_bots.baseline_code.baseline_bot import AttackWeakestPlanetFromStrongestBot
+
+
+def create_tournament(num_players: int, opponents) -> SwissTournament:
+    players = [AttackWeakestPlanetFromStrongestBot() for _ in range(num_players)]
+    tournament = SwissTournament(players, [get_map_by_id(1)])
+    tournament.points = {i: 0.0 for i in range(num_players)}
+    tournament.opponents = defaultdict(set)
+    tournament.byes = {i: 0 for i in range(num_players)}
+    for i, j in opponents:
+        tournament.opponents[i].add(j)
+        tournament.opponents[j].add(i)
+    return tournament
+
+
+def get_rematches(tournament: SwissTournament, pairs) -> list:
+    return [(i, j) for i, j in pairs if j in tournament.opponents[i]]
+
+
+def test_players_are_paired_without_rematches_when_possible():
+    tournament = create_tournament(6, [(0, 1), (2, 3), (4, 5)])
+    pairs = tournament._get_round_pairs()
+    assert sorted(i for pair in pairs for i in pair) == list(range(6))
+    assert get_rematches(tournament, pairs) == []
+
+
+def test_pairing_without_a_rematch_free_pairing_is_fast_and_has_few_rematches():
+    # The last player fought everyone, so there is no pairing without rematches
+    num_players = 40
+    tournament = create_tournament(num_players, [(i, num_players - 1) for i in range(num_players - 1)])
+    pairs = tournament._get_round_pairs()
+    assert sorted(i for pair in pairs for i in pair) == list(range(num_players))
+    assert len(get_rematches(tournament, pairs)) == 1
@@ -0,0 +1,63 @@
+import contextlib
+import io
+
+import pytest
+
+from planet_wars.battles.tournament import get_map_by_id
+from planet_wars.engine.game_logic import GameManager
+from planet_wars.planet_wars import Order, PlanetWars, Player
+from planet_wars.player_bots.baseline_code.baseline_bot import (
+    AttackEnemyWeakestPlanetFromStrongestBot, AttackWeakestPlanetFromStrongestBot,
+    AttackWeakestPlanetFromStrongestSmarterNumOfShipsBot
+)
+from planet_wars.player_bots.baseline_code.vectorized_baseline_bot import (
+    VectorizedAttackEnemyWeakestPlanetFromStrongestBot, VectorizedAttackWeakestPlanetFromStrongestBot,
+    VectorizedAttackWeakestPlanetFromStrongestSmarterNumOfShipsBot
+)
+
+BOT_PAIRS = [
+    (AttackWeakestPlanetFromStrongestBot, VectorizedAttackWeakestPlanetFromStrongestBot),
+    (AttackEnemyWeakestPlanetFromStrongestBot, VectorizedAttackEnemyWeakestPlanetFromStrongestBot),
+    (
+        AttackWeakestPlanetFromStrongestSmarterNumOfShipsBot,
+        VectorizedAttackWeakestPlanetFromStrongestSmarterNumOfShipsBot
+    ),
+]
+
+
+class FractionalShipsBot(Player):
+    """
+    Sends a third of the ships of each planet it owns to the weakest planet it doesn't own
+    """
+
+    def play_turn(self, game: PlanetWars):
+        targets = [planet for planet in game.planets if planet.owner != PlanetWars.ME]
+        if len(targets) == 0:
+            return []
+        target = min(targets, key=lambda planet: planet.num_ships)
+        return [Order(planet, target, planet.num_ships / 3) for planet in game.get_planets_by_owner(PlanetWars.ME)]
+
+
+def get_orders(bot: Player, game: PlanetWars):
+    return [(o.source_planet_id, o.destination_planet_id, o.num_ships) for o in GameManager.normalize_orders(
+        bot.play_turn(game)
+    )]
+
+
+@pytest.mark.parametrize("player_1_class", [FractionalShipsBot, AttackWeakestPlanetFromStrongestBot])
+def test_vectorized_bots_give_the_same_orders(player_1_class):
+    fractional_turns = 0
+    for map_id in range(1, 6):
+        game_manager = GameManager(get_map_by_id(map_id), player_1_class(), AttackWeakestPlanetFromStrongestBot())
+        with contextlib.redirect_stdout(io.StringIO()):
+            while True:
+                for player_num in (1, 2):
+                    for bot_class, vectorized_bot_class in BOT_PAIRS:
+                        assert get_orders(
+                            vectorized_bot_class(), game_manager.get_game_object_for_player(player_num)
+                        ) == get_orders(bot_class(), game_manager.get_game_object_for_player(player_num))
+                game = game_manager.get_game_object_for_player(1)
+                fractional_turns += any(type(planet.num_ships) is not int for planet in game.planets)
+                if game_manager.make_turn() != GameManager.IN_GAME_STATE:
+                    break
+    assert (fractional_turns > 0) == (player_1_class is FractionalShipsBot)